@@ -0,0 +1,31 @@
+"""http cache
+
+Revision ID: 3f6a91c2d8e4
+Revises: d27a6c3b9f15
+Create Date: 2026-10-19 18:04:37.918245
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3f6a91c2d8e4'
+down_revision = 'd27a6c3b9f15'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('http_cache_entry',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('url', sa.Text(), nullable=False, index=True, unique=True),
+        sa.Column('etag', sa.Text(), nullable=True),
+        sa.Column('last_modified', sa.Text(), nullable=True),
+        sa.Column('body', sa.LargeBinary(), nullable=False),
+        sa.Column('fetched_on', sa.DateTime, nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('http_cache_entry')
@@ -0,0 +1,31 @@
+"""directory size index
+
+Revision ID: 5b8e2d1c7a94
+Revises: 0e35fff276f3
+Create Date: 2026-10-19 09:12:41.503217
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5b8e2d1c7a94'
+down_revision = '0e35fff276f3'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('directory_size',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('path', sa.Text(), nullable=False, index=True, unique=True),
+        sa.Column('size', sa.BigInteger, nullable=False),
+        sa.Column('files', sa.Integer, nullable=False),
+        sa.Column('mtime', sa.Float, nullable=False),
+        sa.Column('scanned_on', sa.DateTime, nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('directory_size')
@@ -0,0 +1,42 @@
+"""update journal
+
+Revision ID: 8c41f0d9e2b3
+Revises: 5b8e2d1c7a94
+Create Date: 2026-10-19 14:03:27.118464
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '8c41f0d9e2b3'
+down_revision = '5b8e2d1c7a94'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('update_journal',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('game_dir', sa.Text(), nullable=False),
+        sa.Column('build', sa.Text(), nullable=False),
+        sa.Column('downloaded_file', sa.Text(), nullable=True),
+        sa.Column('staged', sa.Boolean, nullable=False),
+        sa.Column('started_on', sa.DateTime, nullable=False),
+    )
+
+    op.create_table('update_journal_entry',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('journal', sa.Integer, sa.ForeignKey('update_journal.id'),
+            nullable=False, index=True),
+        sa.Column('kind', sa.String(16), nullable=False),
+        sa.Column('name', sa.Text(), nullable=False),
+        sa.Column('target', sa.Text(), nullable=True),
+        sa.Column('created_on', sa.DateTime, nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('update_journal_entry')
+    op.drop_table('update_journal')
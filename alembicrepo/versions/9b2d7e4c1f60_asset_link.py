@@ -0,0 +1,29 @@
+"""asset link
+
+Revision ID: 9b2d7e4c1f60
+Revises: f4a7c2e9d813
+Create Date: 2026-10-20 14:12:37.590412
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '9b2d7e4c1f60'
+down_revision = 'f4a7c2e9d813'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('asset_link',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('entry', sa.Text(), nullable=False, index=True),
+        sa.Column('path', sa.Text(), nullable=False, unique=True),
+        sa.Column('linked_on', sa.DateTime, nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('asset_link')
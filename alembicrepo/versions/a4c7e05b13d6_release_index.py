@@ -0,0 +1,41 @@
+"""release index
+
+Revision ID: a4c7e05b13d6
+Revises: 3f6a91c2d8e4
+Create Date: 2026-10-19 18:47:12.330581
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'a4c7e05b13d6'
+down_revision = '3f6a91c2d8e4'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('github_release',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('release_id', sa.Integer, nullable=False, index=True,
+            unique=True),
+        sa.Column('name', sa.Text(), nullable=False),
+        sa.Column('build', sa.String(32), nullable=True, index=True),
+        sa.Column('created_at', sa.DateTime, nullable=False, index=True),
+        sa.Column('synced_on', sa.DateTime, nullable=False),
+    )
+
+    op.create_table('github_release_asset',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('release', sa.Integer, sa.ForeignKey('github_release.id'),
+            nullable=False, index=True),
+        sa.Column('name', sa.Text(), nullable=False),
+        sa.Column('url', sa.Text(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('github_release_asset')
+    op.drop_table('github_release')
@@ -0,0 +1,30 @@
+"""remote file info
+
+Revision ID: b6f1d2e8c930
+Revises: a4c7e05b13d6
+Create Date: 2026-10-19 20:12:40.518237
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'b6f1d2e8c930'
+down_revision = 'a4c7e05b13d6'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('remote_file_info',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('url', sa.Text(), nullable=False, index=True, unique=True),
+        sa.Column('size', sa.Integer, nullable=True),
+        sa.Column('last_modified', sa.DateTime, nullable=True),
+        sa.Column('probed_on', sa.DateTime, nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('remote_file_info')
@@ -0,0 +1,31 @@
+"""mirror stat
+
+Revision ID: c5e92a7d41b8
+Revises: b6f1d2e8c930
+Create Date: 2026-10-19 21:03:17.240918
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c5e92a7d41b8'
+down_revision = 'b6f1d2e8c930'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('mirror_stat',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('source', sa.Text(), nullable=False, index=True, unique=True),
+        sa.Column('latency', sa.Float, nullable=True),
+        sa.Column('throughput', sa.Float, nullable=True),
+        sa.Column('measured_on', sa.DateTime, nullable=True),
+        sa.Column('failed_on', sa.DateTime, nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_table('mirror_stat')
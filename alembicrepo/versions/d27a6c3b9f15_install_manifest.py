@@ -0,0 +1,42 @@
+"""install manifest
+
+Revision ID: d27a6c3b9f15
+Revises: 8c41f0d9e2b3
+Create Date: 2026-10-19 16:21:52.604311
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'd27a6c3b9f15'
+down_revision = '8c41f0d9e2b3'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('install_manifest',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('game_dir', sa.Text(), nullable=False, index=True,
+            unique=True),
+        sa.Column('build', sa.String(16), nullable=True),
+        sa.Column('archive', sa.Text(), nullable=True),
+        sa.Column('created_on', sa.DateTime, nullable=False),
+    )
+
+    op.create_table('install_manifest_file',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('manifest', sa.Integer,
+            sa.ForeignKey('install_manifest.id'), nullable=False, index=True),
+        sa.Column('path', sa.Text(), nullable=False),
+        sa.Column('size', sa.BigInteger, nullable=False),
+        sa.Column('crc32', sa.BigInteger, nullable=False),
+        sa.Column('mtime', sa.Float, nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_table('install_manifest_file')
+    op.drop_table('install_manifest')
@@ -0,0 +1,33 @@
+"""asset ident
+
+Revision ID: e8b3f5a1c247
+Revises: c5e92a7d41b8
+Create Date: 2026-10-19 22:41:05.873214
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'e8b3f5a1c247'
+down_revision = 'c5e92a7d41b8'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('asset_ident',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('directory', sa.Text(), nullable=False, index=True),
+        sa.Column('name', sa.Text(), nullable=False),
+        sa.Column('file_name', sa.Text(), nullable=False),
+        sa.Column('mtime', sa.Float, nullable=False),
+        sa.Column('size', sa.BigInteger, nullable=False),
+        sa.Column('ident', sa.Text(), nullable=True),
+        sa.Column('scanned_on', sa.DateTime, nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('asset_ident')
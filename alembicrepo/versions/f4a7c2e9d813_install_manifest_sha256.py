@@ -0,0 +1,27 @@
+"""install manifest sha256
+
+Revision ID: f4a7c2e9d813
+Revises: e8b3f5a1c247
+Create Date: 2026-10-19 23:58:12.406731
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'f4a7c2e9d813'
+down_revision = 'e8b3f5a1c247'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    with op.batch_alter_table('install_manifest_file') as batch_op:
+        batch_op.add_column(sa.Column('sha256', sa.String(64),
+            nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('install_manifest_file') as batch_op:
+        batch_op.drop_column('sha256')
@@ -0,0 +1,392 @@
+import bz2
+import logging
+import os
+import zipfile
+import zlib
+
+import pylzma
+import rarfile
+from py7zlib import (
+    Archive7z, ArchiveError as Archive7zError, NoPasswordGivenError,
+    COMPRESSION_METHOD_COPY, COMPRESSION_METHOD_LZMA, COMPRESSION_METHOD_LZMA2,
+    COMPRESSION_METHOD_MISC_ZIP, COMPRESSION_METHOD_MISC_BZIP
+)
+
+import cddagl.constants as cons
+from cddagl.constants import get_cddagl_path
+from cddagl.fileops import OperationCancelled
+from cddagl.i18n import proxy_gettext as _
+
+logger = logging.getLogger('cddagl')
+
+rarfile.UNRAR_TOOL = get_cddagl_path('UnRAR.exe')
+
+class ArchiveError(Exception):
+    """An archive cannot be read. The message can be shown to the user."""
+    pass
+
+
+def open_archive(path):
+    """Open a mod or soundpack archive. zip, rar and 7z archives are
+    supported and are handled the same way afterwards."""
+    extension = os.path.splitext(path)[1]
+
+    lower_extension = extension.lower()
+    if lower_extension == '.zip':
+        archive_class = ZipArchive
+    elif lower_extension == '.rar':
+        archive_class = RarArchive
+    elif lower_extension == '.7z':
+        archive_class = SevenZipArchive
+    else:
+        raise ArchiveError(_('Unknown downloaded archive format ({extension})'
+            ).format(extension=extension))
+
+    try:
+        return archive_class(path)
+    except ArchiveError:
+        raise
+    except NoPasswordGivenError:
+        raise ArchiveError(_('Selected file is a password protected archive '
+            'file'))
+    except (zipfile.BadZipFile, rarfile.Error, Archive7zError) as e:
+        logger.info('Could not open archive %s: %s', path, e)
+        raise ArchiveError(_('Selected file is a bad archive file'))
+
+
+def member_path(target_dir, name):
+    """Return where a member of an archive goes in target_dir. Like zipfile,
+    absolute paths, drives and parent directories are dropped so that nothing
+    can be written outside of target_dir."""
+    parts = []
+    for part in name.replace('\\', '/').split('/'):
+        part = os.path.splitdrive(part)[1]
+        if part not in ('', '.', '..'):
+            parts.append(part)
+
+    if len(parts) == 0:
+        return None
+    return os.path.join(target_dir, *parts)
+
+
+class ArchiveMember:
+    def __init__(self, name, size, is_dir, info):
+        self.name = name
+        self.size = size
+        self.is_dir = is_dir
+        self.info = info
+
+
+class Archive:
+    """A zip, rar or 7z archive.
+
+    Members are streamed to disk in chunks of at most COPY_BUFFER_SIZE bytes
+    so that extracting a large member does not need to hold it in memory.
+    Subclasses fill members and implement _member_chunks.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.members = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        pass
+
+    @property
+    def total_size(self):
+        return sum(member.size for member in self.members)
+
+    def test(self):
+        """Raise ArchiveError if the archive is damaged."""
+        pass
+
+    def extract(self, target_dir, progress=None, cancelled=None):
+        """Extract every member in target_dir. progress is called with the
+        name of the member being extracted, the number of bytes extracted so
+        far and the total number of bytes. cancelled is an optional callable
+        checked between chunks."""
+        total_size = self.total_size
+        extracted = 0
+
+        try:
+            for member, chunks in self._member_chunks():
+                if cancelled is not None and cancelled():
+                    raise OperationCancelled()
+
+                destination = member_path(target_dir, member.name)
+                if destination is None:
+                    continue
+
+                if member.is_dir:
+                    os.makedirs(destination, exist_ok=True)
+                    continue
+
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+                if progress is not None:
+                    progress(member.name, extracted, total_size)
+
+                with open(destination, 'wb') as dest_file:
+                    for chunk in chunks:
+                        if cancelled is not None and cancelled():
+                            raise OperationCancelled()
+
+                        dest_file.write(chunk)
+                        extracted += len(chunk)
+
+                        if progress is not None:
+                            progress(member.name, extracted, total_size)
+        except NoPasswordGivenError:
+            raise ArchiveError(_('Selected file is a password protected '
+                'archive file'))
+        except (zipfile.BadZipFile, rarfile.Error, Archive7zError,
+            zlib.error, EOFError, ValueError) as e:
+            logger.info('Could not extract archive %s: %s', self.path, e)
+            raise ArchiveError(_('Downloaded archive is invalid'))
+
+    def _member_chunks(self):
+        """Yield each member with an iterator over its content."""
+        raise NotImplementedError()
+
+
+def extract_archive(path, target_dir, progress=None, cancelled=None):
+    """Test and extract a mod or soundpack archive in target_dir. See
+    Archive.extract for progress and cancelled."""
+    with open_archive(path) as archive:
+        archive.test()
+        archive.extract(target_dir, progress, cancelled)
+
+
+def _stream_chunks(stream):
+    with stream:
+        while True:
+            chunk = stream.read(cons.COPY_BUFFER_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+class ZipArchive(Archive):
+    def __init__(self, path):
+        super(ZipArchive, self).__init__(path)
+
+        self.archive = zipfile.ZipFile(path)
+        for info in self.archive.infolist():
+            if info.flag_bits & 0x1:
+                self.archive.close()
+                raise ArchiveError(_('Selected file is a password protected '
+                    'archive file'))
+
+            self.members.append(ArchiveMember(info.filename, info.file_size,
+                info.is_dir(), info))
+
+    def close(self):
+        self.archive.close()
+
+    def test(self):
+        try:
+            if self.archive.testzip() is not None:
+                raise ArchiveError(_('Downloaded archive is invalid'))
+        except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+            logger.info('Could not test archive %s: %s', self.path, e)
+            raise ArchiveError(_('Downloaded archive is invalid'))
+
+    def _member_chunks(self):
+        # Reading a member checks its CRC once the end is reached
+        for member in self.members:
+            if member.is_dir:
+                yield member, None
+            else:
+                yield member, _stream_chunks(self.archive.open(member.info))
+
+
+class RarArchive(Archive):
+    def __init__(self, path):
+        super(RarArchive, self).__init__(path)
+
+        self.archive = rarfile.RarFile(path)
+        if self.archive.needs_password():
+            self.archive.close()
+            raise ArchiveError(_('Selected file is a password protected '
+                'archive file'))
+
+        for info in self.archive.infolist():
+            self.members.append(ArchiveMember(info.filename, info.file_size,
+                info.is_dir(), info))
+
+    def close(self):
+        self.archive.close()
+
+    def test(self):
+        try:
+            if self.archive.testrar() is not None:
+                raise ArchiveError(_('Downloaded archive is invalid'))
+        except rarfile.Error as e:
+            logger.info('Could not test archive %s: %s', self.path, e)
+            raise ArchiveError(_('Downloaded archive is invalid'))
+
+    def _member_chunks(self):
+        for member in self.members:
+            if member.is_dir:
+                yield member, None
+            else:
+                yield member, _stream_chunks(self.archive.open(member.info))
+
+
+def _no_flush():
+    return b''
+
+
+def _7z_decompressor(coder):
+    """Return the functions decompressing the next chunk of packed data of a
+    7z folder and flushing what is left at the end of the packed data, or
+    None when the compression method is not supported here. Each call
+    returns at most COPY_BUFFER_SIZE bytes, the input which was not used yet
+    is kept by the decompressor and an empty chunk gets more of its output.
+    Methods are matched like py7zlib does, by dropping their last bytes until
+    a known method is found."""
+    method = coder['method']
+    while method:
+        if method == COMPRESSION_METHOD_COPY:
+            return (lambda data: data), _no_flush
+        elif method in (COMPRESSION_METHOD_LZMA, COMPRESSION_METHOD_LZMA2):
+            decompressor = pylzma.decompressobj(
+                lzma2=method == COMPRESSION_METHOD_LZMA2)
+            properties = coder.get('properties', None)
+            if properties:
+                decompressor.decompress(properties)
+            return (lambda data: decompressor.decompress(data,
+                cons.COPY_BUFFER_SIZE)), decompressor.flush
+        elif method == COMPRESSION_METHOD_MISC_ZIP:
+            decompressor = zlib.decompressobj(-15)
+            return (lambda data: decompressor.decompress(
+                decompressor.unconsumed_tail + data, cons.COPY_BUFFER_SIZE)
+                ), decompressor.flush
+        elif method == COMPRESSION_METHOD_MISC_BZIP:
+            decompressor = bz2.BZ2Decompressor()
+            return (lambda data: decompressor.decompress(data,
+                cons.COPY_BUFFER_SIZE)), _no_flush
+        method = method[:-1]
+
+    return None
+
+
+class SevenZipArchive(Archive):
+    """A 7z archive.
+
+    py7zlib decompresses a whole solid block in memory to read any of its
+    files. Here, each block is decompressed once, in order, and its files are
+    cut from the decompressed stream as it goes. Blocks using more than one
+    coder, like encrypted or BCJ filtered ones, are still read with py7zlib.
+    """
+
+    def __init__(self, path):
+        super(SevenZipArchive, self).__init__(path)
+
+        self.file = open(path, 'rb')
+        try:
+            self.archive = Archive7z(self.file)
+        except BaseException:
+            self.file.close()
+            raise
+
+        # py7zlib does not list directories, they are created with the files
+        for archive_file in self.archive.getmembers():
+            self.members.append(ArchiveMember(archive_file.filename,
+                archive_file.size, False, archive_file))
+
+    def close(self):
+        self.file.close()
+
+    def _member_chunks(self):
+        members = self.members
+        index = 0
+        while index < len(members):
+            folder = members[index].info._folder
+            if folder is None:
+                # Empty file
+                yield members[index], iter(())
+                index += 1
+                continue
+
+            folder_members = []
+            while (index < len(members) and
+                members[index].info._folder is folder):
+                folder_members.append(members[index])
+                index += 1
+
+            decompressor = None
+            if len(folder.coders) == 1:
+                decompressor = _7z_decompressor(folder.coders[0])
+
+            if decompressor is None:
+                for member in folder_members:
+                    yield member, self._read_member(member)
+            else:
+                yield from self._folder_chunks(folder_members, *decompressor)
+
+    def _read_member(self, member):
+        if member.size > 0:
+            data = member.info.read()
+            self._check_digest(member, zlib.crc32(data))
+            yield data
+
+    def _check_digest(self, member, crc):
+        digest = member.info.digest
+        if digest is not None and crc != digest:
+            raise ArchiveError(_('Downloaded archive is invalid'))
+
+    def _folder_chunks(self, folder_members, decompress, flush):
+        first = folder_members[0].info
+        self.file.seek(first._src_start)
+        packed_left = first.compressed
+
+        pending = b''
+
+        def unpacked(size):
+            """Yield the next size bytes of the decompressed stream."""
+            nonlocal pending, packed_left
+            while size > 0:
+                if len(pending) == 0:
+                    data = self.file.read(min(packed_left,
+                        cons.READ_BUFFER_SIZE))
+                    packed_left -= len(data)
+                    pending = decompress(data)
+                    if len(pending) == 0 and len(data) == 0:
+                        # Some decoders keep their last bytes until flushed
+                        pending = flush()
+                        if len(pending) == 0:
+                            raise ArchiveError(_('Downloaded archive is '
+                                'invalid'))
+
+                chunk = pending[:size]
+                pending = pending[size:]
+                size -= len(chunk)
+                yield chunk
+
+        position = 0
+        for member in folder_members:
+            # Skip anything between two files, there should be nothing
+            for chunk in unpacked(member.info._start - position):
+                pass
+
+            def member_chunks(member=member):
+                crc = 0
+                for chunk in unpacked(member.size):
+                    crc = zlib.crc32(chunk, crc)
+                    yield chunk
+                self._check_digest(member, crc)
+
+            chunks = member_chunks()
+            yield member, chunks
+
+            # Make sure the member was fully read before going to the next
+            for chunk in chunks:
+                pass
+            position = member.info._start + member.size
@@ -0,0 +1,196 @@
+import threading
+import time
+
+from PyQt5.QtCore import QObject, QTimer
+
+import cddagl.constants as cons
+from cddagl.fileops import OperationCancelled
+from cddagl.sql.functions import get_config_value
+
+FOREGROUND = 'foreground'
+QUEUED = 'queued'
+BACKGROUND = 'background'
+
+
+class TokenBucket:
+    """Hand out bytes at a limited rate in bytes per second. A rate of 0
+    means no limit. Unused bytes pile up for at most a second so that a
+    paused transfer cannot go over the limit when it resumes."""
+
+    def __init__(self, rate=0):
+        self.lock = threading.Lock()
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        with self.lock:
+            self.rate = rate
+            self.tokens = 0
+            self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens +
+            (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self):
+        """Return how many seconds to wait before more bytes can be used."""
+        with self.lock:
+            if self.rate == 0:
+                return 0
+
+            self.refill()
+            if self.tokens > 0:
+                return 0
+            return -self.tokens / self.rate
+
+    def consume(self, size):
+        """Take size bytes from the bucket. The bucket can go in debt, the
+        next delay is longer to make up for it."""
+        with self.lock:
+            if self.rate == 0:
+                return
+
+            self.refill()
+            self.tokens -= size
+
+
+class BandwidthLimiter:
+    """Limit the rate of every download of the launcher.
+
+    Foreground downloads, the ones started by the user, share a limit and
+    background downloads share another one. Downloads of the install queue
+    were also asked for by the user and share the foreground limit, but they
+    wait as long as another foreground download is running. Background
+    downloads wait as long as any of the others is running.
+    """
+
+    def __init__(self):
+        foreground_bucket = TokenBucket()
+        self.buckets = {
+            FOREGROUND: foreground_bucket,
+            QUEUED: foreground_bucket,
+            BACKGROUND: TokenBucket()
+        }
+        self.lock = threading.Lock()
+        self.transfers = {
+            FOREGROUND: 0,
+            QUEUED: 0
+        }
+
+        self.set_limit(FOREGROUND, int(get_config_value(
+            'foreground_download_limit', '0')))
+        self.set_limit(BACKGROUND, int(get_config_value(
+            'background_download_limit',
+            str(cons.BACKGROUND_DOWNLOAD_LIMIT))))
+
+    def set_limit(self, kind, limit):
+        """Set the limit of a kind of downloads in KiB per second."""
+        self.buckets[kind].set_rate(limit * 1024)
+
+    def begin(self, kind):
+        if kind in self.transfers:
+            with self.lock:
+                self.transfers[kind] += 1
+
+    def end(self, kind):
+        if kind in self.transfers:
+            with self.lock:
+                self.transfers[kind] -= 1
+
+    def delay(self, kind):
+        if kind == QUEUED and self.transfers[FOREGROUND] > 0:
+            return cons.BACKGROUND_YIELD_DELAY
+        if kind == BACKGROUND and (self.transfers[FOREGROUND] > 0 or
+            self.transfers[QUEUED] > 0):
+            return cons.BACKGROUND_YIELD_DELAY
+        return self.buckets[kind].delay()
+
+    def consume(self, kind, size):
+        self.buckets[kind].consume(size)
+
+    def throttle(self, kind, cancelled=None):
+        """Block the calling thread until the next bytes of a download can be
+        read."""
+        while True:
+            if cancelled is not None and cancelled():
+                raise OperationCancelled()
+
+            delay = self.delay(kind)
+            if delay <= 0:
+                return
+            # Short naps to notice a cancellation quickly
+            time.sleep(min(delay, cons.BACKGROUND_YIELD_DELAY))
+
+
+_limiter = None
+
+
+def bandwidth_limiter():
+    global _limiter
+    if _limiter is None:
+        _limiter = BandwidthLimiter()
+    return _limiter
+
+
+class ThrottledReply(QObject):
+    """Read a network reply no faster than the bandwidth limiter allows.
+
+    The read buffer of the reply is kept small so that Qt stops reading from
+    the socket while the data is held back. ready_read is called with every
+    chunk of data read. The finished handler of the reply must call finish()
+    to get the data left in the buffer. Replies which have a throttled
+    attribute, like MirroredReply, get it set once data was held back.
+    """
+
+    def __init__(self, reply, kind, ready_read):
+        super(ThrottledReply, self).__init__()
+
+        self.reply = reply
+        self.kind = kind
+        self.ready_read = ready_read
+        self.done = False
+
+        timer = QTimer()
+        timer.setSingleShot(True)
+        timer.timeout.connect(self.read)
+        self.timer = timer
+
+        bandwidth_limiter().begin(kind)
+
+        reply.setReadBufferSize(cons.THROTTLED_READ_BUFFER_SIZE)
+        reply.readyRead.connect(self.read)
+
+    def read(self):
+        if self.done or self.timer.isActive():
+            return
+
+        limiter = bandwidth_limiter()
+        while self.reply.bytesAvailable() > 0:
+            delay = limiter.delay(self.kind)
+            if delay > 0:
+                if hasattr(self.reply, 'throttled'):
+                    self.reply.throttled = True
+                self.timer.start(int(delay * 1000) + 1)
+                return
+
+            data = bytes(self.reply.read(cons.READ_BUFFER_SIZE))
+            limiter.consume(self.kind, len(data))
+            self.ready_read(data)
+
+    def finish(self):
+        if self.done:
+            return
+        self.done = True
+
+        self.timer.stop()
+
+        limiter = bandwidth_limiter()
+        limiter.end(self.kind)
+
+        while True:
+            data = bytes(self.reply.read(cons.READ_BUFFER_SIZE))
+            if not data:
+                break
+            limiter.consume(self.kind, len(data))
+            self.ready_read(data)
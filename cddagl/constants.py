@@ -5,6 +5,43 @@ SAVES_WARNING_SIZE = 150 * 1024 * 1024
 
 READ_BUFFER_SIZE = 16 * 1024
 
+COPY_BUFFER_SIZE = 1024 * 1024
+LARGE_FILE_SIZE = 4 * 1024 * 1024
+FILE_OPERATION_WORKERS = 8
+INSTALL_QUEUE_DOWNLOADS = 2
+DELETE_DIR_BATCH_SIZE = 64
+PROGRESS_REFRESH_INTERVAL = 250
+# Hex digits of the content hash naming the copies in the asset store
+ASSET_DIGEST_LENGTH = 16
+
+RANGE_READ_SIZE = 128 * 1024
+DIRECTORY_SIZE_TTL = 60 * 60
+
+BUILD_CACHE_MAX_ARCHIVES = 3
+MAX_BUILD_CACHE_ARCHIVES = 20
+NETWORK_CACHE_SIZE = 50 * 1024 * 1024
+REMOTE_PROBE_CONCURRENCY = 4
+# Seconds before the size of a remote file is probed again
+REMOTE_FILE_INFO_TTL = 7 * 24 * 60 * 60
+# Default limit of background downloads in KiB per second
+BACKGROUND_DOWNLOAD_LIMIT = 1024
+MAX_DOWNLOAD_LIMIT = 1024 * 1024
+
+# Bytes requested from each download source to measure it
+MIRROR_PROBE_SIZE = 256 * 1024
+MIRROR_PROBE_TIMEOUT = 5
+# Seconds before the download sources are measured again
+MIRROR_RANKING_TTL = 60 * 60
+# Seconds during which a source that failed is tried last
+MIRROR_FAILURE_PENALTY = 10 * 60
+# Sources are ranked on the time they would take to send this many bytes
+MIRROR_REFERENCE_SIZE = 50 * 1024 * 1024
+DOWNLOAD_TIMEOUT = 60
+# Seconds between checks of a background download waiting for the foreground
+BACKGROUND_YIELD_DELAY = 0.25
+THROTTLED_READ_BUFFER_SIZE = 64 * 1024
+VERIFY_PROGRESS_FILES = 64
+
 MAX_GAME_DIRECTORIES = 6
 
 GITHUB_REST_API_URL = 'https://api.github.com'
@@ -12,6 +49,16 @@ GITHUB_API_VERSION = b'application/vnd.github.v3+json'
 
 GITHUB_XRL_REMAINING = b'X-RateLimit-Remaining'
 GITHUB_XRL_RESET = b'X-RateLimit-Reset'
+GITHUB_RATE_LIMIT_WARNING = 10
+# Requests kept for the user once background requests are deferred
+GITHUB_BACKGROUND_RESERVE = 20
+GITHUB_MAX_REQUESTS = 4
+
+GITHUB_RELEASES_PER_PAGE = 100
+GITHUB_RELEASES_MAX_PAGES = 10
+BUILDS_LIST_SIZE = 30
+FIND_BUILD_CONCURRENCY = 4
+FIND_BUILD_MAX_RANGE = 50
 
 CDDA_RELEASES = '/repos/CleverRaven/Cataclysm-DDA/releases'
 CDDA_RELEASE_BY_TAG = lambda tag: f'/repos/CleverRaven/Cataclysm-DDA/releases/tags/{tag}'
@@ -0,0 +1,342 @@
+import logging
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import zipfile
+
+from datetime import datetime, timedelta
+from urllib.parse import unquote, urlsplit
+
+import cddagl.constants as cons
+from cddagl import __version__ as version
+from cddagl.bandwidth import FOREGROUND, bandwidth_limiter
+from cddagl.fileops import tree_size
+from cddagl.install import cached_archive
+from cddagl.mirrors import urlopen_mirrored
+from cddagl.network import offline_mode
+from cddagl.sql.functions import (
+    get_config_value, set_config_value, get_directory_size, set_directory_size,
+    delete_directory_sizes, config_true
+)
+
+logger = logging.getLogger('cddagl')
+
+PREVIOUS_DIRS = ('config', 'save', 'templates', 'memorial', 'graveyard',
+    'save_backups')
+
+CONTENT_RANGE_REGEX = re.compile(r'bytes (\d+)-(\d+)/(\d+)')
+
+
+class HttpRangeFile:
+    """Read-only file object over a remote file using HTTP range requests.
+
+    This is enough for zipfile to read the central directory of a remote
+    archive without downloading the whole archive. Requests go through the
+    download mirrors and the bandwidth limiter like build downloads. The
+    first request reads the end of the file, where the central directory is,
+    and gives the size of the file.
+    """
+
+    def __init__(self, url, kind=FOREGROUND):
+        self.url = url
+        self.kind = kind
+
+        self.size = None
+        content_range, data = self.fetch_range('-{0}'.format(
+            cons.RANGE_READ_SIZE))
+
+        match = CONTENT_RANGE_REGEX.match(content_range)
+        if match is None:
+            raise OSError('Server sent an invalid range for ' + url)
+        self.size = int(match.group(3))
+
+        self.position = 0
+        self.cache_start = int(match.group(1))
+        self.cache = data
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.cache = b''
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self.position = max(0, min(offset, self.size))
+        return self.position
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self.position
+        end = min(self.position + size, self.size)
+
+        if not (self.cache_start <= self.position and
+                end <= self.cache_start + len(self.cache)):
+            # Read at least a whole block, zipfile does many small reads near
+            # the end of the archive
+            start = self.position
+            if end - start < cons.RANGE_READ_SIZE:
+                start = max(0, min(start, self.size - cons.RANGE_READ_SIZE))
+                fetch_end = min(start + cons.RANGE_READ_SIZE, self.size)
+            else:
+                fetch_end = end
+            self.cache = self.fetch(start, fetch_end)
+            self.cache_start = start
+
+        offset = self.position - self.cache_start
+        data = self.cache[offset:offset + end - self.position]
+        self.position += len(data)
+        return data
+
+    def fetch(self, start, end):
+        return self.fetch_range('{0}-{1}'.format(start, end - 1))[1]
+
+    def fetch_range(self, byte_range):
+        """Return the Content-Range header and the content of a range
+        request."""
+        limiter = bandwidth_limiter()
+        limiter.begin(self.kind)
+        try:
+            response = urlopen_mirrored(self.url, {
+                'User-Agent': 'CDDA-Game-Launcher/' + version,
+                'Range': 'bytes=' + byte_range})
+            with response:
+                # Do not download the whole archive when ranges are ignored
+                if response.status != 206:
+                    raise OSError('Server does not support range requests '
+                        'for ' + self.url)
+
+                chunks = []
+                while True:
+                    limiter.throttle(self.kind)
+                    buf = response.read(cons.READ_BUFFER_SIZE)
+                    if len(buf) == 0:
+                        break
+                    limiter.consume(self.kind, len(buf))
+                    chunks.append(buf)
+
+                return (response.headers.get('Content-Range', ''),
+                    b''.join(chunks))
+        finally:
+            limiter.end(self.kind)
+
+
+def remote_zip_size(url):
+    """Return the archive size, the extracted size and the number of files of
+    a remote zip archive by only reading its central directory."""
+    with HttpRangeFile(url) as remote_file:
+        with zipfile.ZipFile(remote_file) as z:
+            infolist = z.infolist()
+            return (remote_file.size, sum(x.file_size for x in infolist),
+                len(infolist))
+
+
+def zip_extracted_size(path):
+    """Return the extracted size and the number of files of a local zip
+    archive."""
+    with zipfile.ZipFile(path) as z:
+        infolist = z.infolist()
+        return sum(x.file_size for x in infolist), len(infolist)
+
+
+def archive_name(url):
+    return posixpath.basename(unquote(urlsplit(url).path))
+
+
+def directory_size(path):
+    """Return the size of a directory tree using the directory-size index.
+
+    Only sizes measured by a launcher operation that walked the whole tree
+    are indexed, see index_directory_size. The modification time of the
+    top directory does not change when files deeper in the tree do, so
+    scans made here are never reused. The index is also cleared for a game
+    directory when the game is launched since it writes to its saves.
+    """
+    if not os.path.isdir(path):
+        return 0
+
+    path = os.path.normcase(os.path.abspath(path))
+
+    indexed = get_directory_size(path)
+    if (indexed is not None and indexed['mtime'] == os.stat(path).st_mtime
+        and datetime.utcnow() - indexed['scanned_on'] <
+            timedelta(seconds=cons.DIRECTORY_SIZE_TTL)):
+        return indexed['size']
+
+    return tree_size(path)[1]
+
+
+def index_directory_size(path, files, size):
+    """Store a directory size that was measured while doing something
+    else."""
+    if os.path.isdir(path):
+        path = os.path.normcase(os.path.abspath(path))
+        set_directory_size(path, files, size, os.stat(path).st_mtime)
+
+
+def forget_directory_sizes(path):
+    """Remove the indexed sizes of a directory and of every directory in
+    it."""
+    delete_directory_sizes(os.path.normcase(os.path.abspath(path)))
+
+
+def entry_size(path):
+    if os.path.isdir(path):
+        return directory_size(path)
+    elif os.path.isfile(path):
+        return os.path.getsize(path)
+    return 0
+
+
+def existing_parent(path):
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def same_volume(path, other):
+    try:
+        return (os.stat(existing_parent(path)).st_dev ==
+            os.stat(existing_parent(other)).st_dev)
+    except OSError:
+        return False
+
+
+def record_throughput(name, transferred, seconds):
+    """Remember the throughput of an operation to estimate the next ones."""
+    if transferred <= 0 or seconds <= 0:
+        return
+
+    measured = transferred / seconds
+
+    config_name = '{0}_throughput'.format(name)
+    try:
+        previous = float(get_config_value(config_name, '0'))
+    except ValueError:
+        previous = 0
+
+    # Smooth the value since a single run can be slowed down by many things
+    if previous > 0:
+        measured = previous * 0.7 + measured * 0.3
+
+    set_config_value(config_name, str(measured))
+
+
+def throughput(name):
+    try:
+        value = float(get_config_value('{0}_throughput'.format(name), '0'))
+    except ValueError:
+        return None
+    return value if value > 0 else None
+
+
+def estimated_duration(volumes):
+    """Return the estimated duration in seconds for a dict of operation name
+    to volume in bytes. Operations without any measured throughput are
+    ignored. Return None when nothing can be estimated."""
+    duration = None
+    for name, volume in volumes.items():
+        rate = throughput(name)
+        if rate is not None and volume > 0:
+            duration = (duration or 0) + volume / rate
+    return duration
+
+
+def estimate_update(url, game_dir):
+    """Estimate the disk space and the time needed to update the game in
+    game_dir with the archive at url. An archive already in the build cache
+    is read instead of the remote one, which is not looked at in offline
+    mode."""
+    cached_path = cached_archive(archive_name(url))
+    if cached_path is not None:
+        # Nothing needs to be downloaded
+        download_size = 0
+        extracted_size, files = zip_extracted_size(cached_path)
+    elif offline_mode():
+        raise OSError('The build archive is not cached and the launcher is '
+            'in offline mode')
+    else:
+        download_size, extracted_size, files = remote_zip_size(url)
+
+    prevent_save_move = config_true(get_config_value('prevent_save_move',
+        'False'))
+
+    previous_version_dir = os.path.join(game_dir, 'previous_version')
+
+    # The current game is moved in previous_version, which does not use more
+    # space, and some directories are copied back after the extraction
+    move_size = 0
+    copy_size = 0
+    if os.path.isdir(game_dir):
+        for entry in os.listdir(game_dir):
+            if entry == 'previous_version' or (entry == 'save' and
+                prevent_save_move):
+                continue
+
+            size = entry_size(os.path.join(game_dir, entry))
+            move_size += size
+            if entry in PREVIOUS_DIRS:
+                copy_size += size
+
+    reclaimed_size = directory_size(previous_version_dir)
+
+    required_size = extracted_size + copy_size - reclaimed_size
+    temp_dir = tempfile.gettempdir()
+    temp_same_volume = same_volume(temp_dir, game_dir)
+    if temp_same_volume:
+        required_size += download_size
+
+    free_size = shutil.disk_usage(existing_parent(game_dir)).free
+    temp_free_size = shutil.disk_usage(temp_dir).free
+
+    enough_space = required_size <= free_size and (temp_same_volume or
+        download_size <= temp_free_size)
+
+    return {
+        'download_size': download_size,
+        'extracted_size': extracted_size,
+        'files': files,
+        'move_size': move_size,
+        'copy_size': copy_size,
+        'reclaimed_size': reclaimed_size,
+        'required_size': max(required_size, 0),
+        'free_size': free_size,
+        'temp_free_size': temp_free_size,
+        'enough_space': enough_space,
+        'duration': estimated_duration({
+            'download': download_size,
+            'extract': extracted_size,
+            'copy': copy_size
+        })
+    }
+
+
+def estimate_backup(backup_dir, saves_size):
+    """Estimate the disk space and the time needed to backup the saves.
+    Compression is assumed to save nothing to stay on the safe side."""
+    free_size = shutil.disk_usage(existing_parent(backup_dir)).free
+
+    return {
+        'required_size': saves_size,
+        'free_size': free_size,
+        'enough_space': saves_size <= free_size,
+        'duration': estimated_duration({'compress': saves_size})
+    }
@@ -0,0 +1,454 @@
+import logging
+import os
+import shutil
+import stat
+import sys
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, ALL_COMPLETED
+
+import cddagl.constants as cons
+
+logger = logging.getLogger('cddagl')
+
+
+class OperationCancelled(Exception):
+    pass
+
+
+def walk_entries(top, skip=None, topdown=True):
+    """Lazily yield the DirEntry objects found in a directory tree.
+
+    The entries of a directory are yielded before descending into any of its
+    subdirectories and only one directory is scanned at a time, so memory
+    use depends on the depth of the tree, not on its size. DirEntry caches
+    its stat result, calling entry.stat() does not hit the disk again on
+    Windows.
+
+    skip is an optional predicate called with each entry. Skipped entries
+    are not yielded and skipped directories are not walked. Directories are
+    only checked once all the files of their parent were yielded, so the
+    predicate can depend on what was found there. When topdown is False,
+    directories are yielded after their content.
+    """
+    subdirs = []
+    with os.scandir(top) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry)
+            elif skip is None or not skip(entry):
+                yield entry
+
+    for entry in subdirs:
+        if skip is not None and skip(entry):
+            continue
+        if topdown:
+            yield entry
+        yield from walk_entries(entry.path, skip, topdown)
+        if not topdown:
+            yield entry
+
+
+def tree_size(top, skip=None, cancelled=None):
+    """Return the number of files and their total size in a directory
+    tree."""
+    files = 0
+    size = 0
+    for entry in walk_entries(top, skip):
+        if cancelled is not None and cancelled.is_set():
+            raise OperationCancelled()
+        if entry.is_file():
+            files += 1
+            size += entry.stat().st_size
+    return files, size
+
+
+def _kernel_copy(copy_chunk, progress, cancelled):
+    """Copy using a kernel copy function until it reports the end of the file.
+
+    Return False when the function is not supported for these files and
+    nothing was copied yet so that the caller can fallback to a regular copy.
+    """
+    total = 0
+    try:
+        while True:
+            if cancelled is not None and cancelled.is_set():
+                raise OperationCancelled()
+            copied = copy_chunk(total)
+            if copied == 0:
+                return True
+            total += copied
+            if progress is not None:
+                progress(copied)
+    except OSError:
+        if total > 0:
+            raise
+        return False
+
+
+def copy_large_file(src, dst, progress=None, cancelled=None):
+    """Copy a large file using the fastest method available on the platform.
+
+    progress is called with the number of bytes copied after each chunk and
+    cancelled is an optional threading.Event checked between chunks.
+    """
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        infd = fsrc.fileno()
+        outfd = fdst.fileno()
+
+        if hasattr(os, 'copy_file_range'):
+            if _kernel_copy(lambda offset: os.copy_file_range(infd, outfd,
+                    cons.COPY_BUFFER_SIZE), progress, cancelled):
+                return
+        elif hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+            if _kernel_copy(lambda offset: os.sendfile(outfd, infd, offset,
+                    cons.COPY_BUFFER_SIZE), progress, cancelled):
+                return
+
+        buf = bytearray(cons.COPY_BUFFER_SIZE)
+        with memoryview(buf) as view:
+            while True:
+                if cancelled is not None and cancelled.is_set():
+                    raise OperationCancelled()
+                read = fsrc.readinto(buf)
+                if read == 0:
+                    return
+                fdst.write(view[:read])
+                if progress is not None:
+                    progress(read)
+
+
+# Linux ioctl sharing the extents of a file, supported by Btrfs and XFS
+FICLONE = 0x40049409
+
+
+def clone_file(src, dst):
+    """Create dst as a copy on write clone of src. Both files share their
+    data until one of them is written to. OSError is raised when the file
+    system cannot clone files, dst is not created in that case."""
+    if sys.platform == 'win32':
+        from cddagl.win32 import clone_file as clone_win32_file
+        clone_win32_file(src, dst)
+    else:
+        import fcntl
+
+        with open(src, 'rb') as fsrc, open(dst, 'xb') as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            except OSError:
+                fdst.close()
+                os.unlink(dst)
+                raise
+
+    shutil.copystat(src, dst)
+
+
+def make_read_only(path):
+    """Clear the write permissions of a file. On Windows, this sets its
+    read-only attribute which is shared by all of its hard links."""
+    mode = stat.S_IMODE(os.stat(path).st_mode)
+    read_only_mode = mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH)
+    if read_only_mode != mode:
+        os.chmod(path, read_only_mode)
+
+
+def merge_move(src, dst):
+    """Move src to dst with renames. When dst already exists, a directory is
+    merged into it and a file that is already there is kept, like the save
+    directory or the launcher left in a game directory during an update.
+    Nothing is left at src."""
+    if not os.path.lexists(dst):
+        os.rename(src, dst)
+        return
+
+    if (os.path.isdir(src) and not os.path.islink(src) and
+        os.path.isdir(dst) and not os.path.islink(dst)):
+        for name in os.listdir(src):
+            merge_move(os.path.join(src, name), os.path.join(dst, name))
+        remove_path(src, os.rmdir)
+        return
+
+    logger.info('Keeping %s which is already there', dst)
+    if os.path.isdir(src) and not os.path.islink(src):
+        shutil.rmtree(src)
+    else:
+        remove_path(src, os.unlink)
+
+
+def copy_symlink(src, dst):
+    """Create a symbolic link at dst pointing where the src link points."""
+    target = os.readlink(src)
+    os.symlink(target, dst, target_is_directory=os.path.isdir(src))
+    try:
+        shutil.copystat(src, dst, follow_symlinks=False)
+    except NotImplementedError:
+        # The platform cannot change the attributes of a link
+        pass
+
+
+class CopyEngine:
+    """Copy entries from a source tree into a destination tree using a pool of
+    worker threads.
+
+    Entries are DirEntry-like objects found under src. Directories are created
+    in order by the feeding thread and files are copied in parallel. Symbolic
+    links are copied as links, like shutil.copytree does with symlinks=True.
+    Progress counters can be read from any thread while the copy is running.
+    """
+
+    def __init__(self, src, dst, workers=cons.FILE_OPERATION_WORKERS):
+        self.src = src
+        self.dst = dst
+        self.workers = workers
+
+        self.counting = False
+        self.total_bytes = 0
+        self.total_files = 0
+        self.copied_bytes = 0
+        self.copied_files = 0
+        self.current_path = None
+        self.error = None
+        self.finished = False
+
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._thread = None
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def start(self, entries, count_entries=None):
+        """Start copying entries. When count_entries is given, it is walked
+        on its own thread to fill total_bytes and total_files while the copy
+        is already running."""
+        if count_entries is not None:
+            self.counting = True
+            threading.Thread(target=self._count, args=(count_entries,),
+                daemon=True).start()
+
+        self._thread = threading.Thread(target=self._run, args=(entries,),
+            daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _count(self, entries):
+        try:
+            for entry in entries:
+                if self._cancelled.is_set():
+                    break
+                if entry.is_file(follow_symlinks=False):
+                    self.total_bytes += entry.stat().st_size
+                    self.total_files += 1
+        except OSError:
+            logger.exception('Error while analysing %s', self.src)
+        finally:
+            self.counting = False
+
+    def _add_progress(self, copied_bytes=0, copied_files=0):
+        with self._lock:
+            self.copied_bytes += copied_bytes
+            self.copied_files += copied_files
+
+    def _run(self, entries):
+        max_pending = self.workers * 4
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                pending = set()
+                try:
+                    for entry in entries:
+                        if self._cancelled.is_set():
+                            break
+
+                        relpath = os.path.relpath(entry.path, self.src)
+                        dstpath = os.path.join(self.dst, relpath)
+
+                        if entry.is_symlink():
+                            os.makedirs(os.path.dirname(dstpath),
+                                exist_ok=True)
+                            copy_symlink(entry.path, dstpath)
+                        elif entry.is_dir(follow_symlinks=False):
+                            os.makedirs(dstpath, exist_ok=True)
+                        elif entry.is_file(follow_symlinks=False):
+                            if len(pending) >= max_pending:
+                                done, pending = wait(pending,
+                                    return_when=FIRST_COMPLETED)
+                                for future in done:
+                                    future.result()
+
+                            pending.add(executor.submit(self._copy_file,
+                                entry.path, dstpath, entry.stat().st_size))
+
+                    done, pending = wait(pending)
+                    for future in done:
+                        future.result()
+                except BaseException:
+                    self._cancelled.set()
+                    raise
+        except OperationCancelled:
+            pass
+        except BaseException as e:
+            logger.exception('Error while copying %s to %s', self.src,
+                self.dst)
+            self.error = e
+        finally:
+            self.finished = True
+
+    def _copy_file(self, src, dst, size):
+        if self._cancelled.is_set():
+            raise OperationCancelled()
+
+        self.current_path = src
+
+        if size >= cons.LARGE_FILE_SIZE:
+            copy_large_file(src, dst, self._add_progress, self._cancelled)
+        else:
+            shutil.copyfile(src, dst)
+            self._add_progress(copied_bytes=size)
+
+        shutil.copystat(src, dst)
+        self._add_progress(copied_files=1)
+
+
+def remove_path(path, remove):
+    """Remove a path with remove (os.unlink or os.rmdir). Retry after clearing
+    the read-only attribute and ignore paths that are already gone. Files
+    are deleted without clearing the attribute where Windows allows it."""
+    try:
+        remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        if remove is os.unlink and sys.platform == 'win32':
+            # Clearing the attribute would also make the other hard links of
+            # a shared game file writable
+            from cddagl.win32 import delete_file
+            try:
+                delete_file(path)
+                return
+            except FileNotFoundError:
+                return
+            except OSError:
+                pass
+
+        # Remove read-only and try again
+        try:
+            os.chmod(path, stat.S_IWRITE)
+            remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class DeleteEngine:
+    """Delete a whole directory tree using a pool of worker threads.
+
+    The tree is first counted, then files are unlinked in parallel and
+    directories are removed bottom-up in batches once all the files they
+    contained are gone. The first error stops the engine and is kept in
+    failure so that the caller can decide to retry.
+    """
+
+    def __init__(self, src, workers=cons.FILE_OPERATION_WORKERS):
+        self.src = src
+        self.workers = workers
+
+        self.analysing = True
+        self.total_files = 0
+        self.deleted_files = 0
+        self.current_path = None
+        self.failure = None
+        self.finished = False
+
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            for entry in walk_entries(self.src):
+                if self._cancelled.is_set():
+                    return
+                if not entry.is_dir(follow_symlinks=False):
+                    self.total_files += 1
+            self.analysing = False
+
+            self._delete()
+        except OperationCancelled:
+            pass
+        except OSError as e:
+            self.failure = e
+        except BaseException:
+            logger.exception('Error while deleting %s', self.src)
+            raise
+        finally:
+            self.analysing = False
+            self.finished = True
+
+    def _delete(self):
+        max_pending = self.workers * 4
+        dir_batch = []
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = set()
+            try:
+                def wait_pending(return_when):
+                    nonlocal pending
+                    done, pending = wait(pending, return_when=return_when)
+                    for future in done:
+                        future.result()
+
+                def remove_dirs():
+                    wait_pending(ALL_COMPLETED)
+                    for dirpath in dir_batch:
+                        if self._cancelled.is_set():
+                            raise OperationCancelled()
+                        self.current_path = dirpath
+                        remove_path(dirpath, os.rmdir)
+                    dir_batch.clear()
+
+                # Walking bottom-up yields every directory after its content
+                for entry in walk_entries(self.src, topdown=False):
+                    if self._cancelled.is_set():
+                        raise OperationCancelled()
+
+                    if entry.is_dir(follow_symlinks=False):
+                        dir_batch.append(entry.path)
+                        if len(dir_batch) >= cons.DELETE_DIR_BATCH_SIZE:
+                            remove_dirs()
+                    else:
+                        if len(pending) >= max_pending:
+                            wait_pending(FIRST_COMPLETED)
+                        pending.add(executor.submit(self._unlink, entry.path))
+
+                dir_batch.append(self.src)
+                remove_dirs()
+            except BaseException:
+                self._cancelled.set()
+                raise
+
+    def _unlink(self, path):
+        if self._cancelled.is_set():
+            raise OperationCancelled()
+
+        self.current_path = path
+        remove_path(path, os.unlink)
+
+        with self._lock:
+            self.deleted_files += 1
@@ -0,0 +1,240 @@
+import logging
+
+import arrow
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from PyQt5.QtNetwork import QNetworkRequest
+
+import cddagl.constants as cons
+from cddagl.functions import tryint
+from cddagl.httpcache import github_api_request
+from cddagl.network import network_access_manager
+
+logger = logging.getLogger('cddagl')
+
+USER = 0
+BACKGROUND = 1
+
+
+class GithubReply(QObject):
+    """Stand in for the QNetworkReply of a scheduled GitHub API request.
+
+    Several requests for the same URL can share a single network reply, each
+    one of them gets its own copy of the received data.
+    """
+
+    finished = pyqtSignal()
+    readyRead = pyqtSignal()
+    downloadProgress = pyqtSignal('qint64', 'qint64')
+
+    def __init__(self, scheduler, url, priority):
+        super(GithubReply, self).__init__()
+
+        self.scheduler = scheduler
+        self.url = url
+        self.priority = priority
+        self.reply = None
+        self.buffer = bytearray()
+        self.done = False
+
+    def attribute(self, code):
+        return self.reply.attribute(code)
+
+    def hasRawHeader(self, name):
+        return self.reply.hasRawHeader(name)
+
+    def rawHeader(self, name):
+        return self.reply.rawHeader(name)
+
+    def request(self):
+        return self.reply.request()
+
+    def readAll(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+    def isRunning(self):
+        return not self.done
+
+    def abort(self):
+        """Drop the request. No signal is emitted afterwards."""
+        self.scheduler.abort(self)
+
+
+class GithubScheduler(QObject):
+    """Send every GitHub API request of the launcher.
+
+    The remaining rate limit budget and its reset time are tracked from the
+    headers of every reply. Requests made by the user go before background
+    ones and background requests wait for the reset once the budget is low.
+    A request for a URL which is already being requested shares its reply
+    as long as no data was received yet.
+    """
+
+    rate_limit_low = pyqtSignal(int, object)
+
+    def __init__(self):
+        super(GithubScheduler, self).__init__()
+
+        self.qnam = network_access_manager()
+        self.remaining = None
+        self.reset = None
+        self.queue = []
+        self.running = []
+
+        reset_timer = QTimer()
+        reset_timer.setSingleShot(True)
+        reset_timer.timeout.connect(self.budget_reset)
+        self.reset_timer = reset_timer
+
+    def get(self, url, priority=USER):
+        github_reply = GithubReply(self, url, priority)
+
+        for running in self.running:
+            if running['url'] == url and running['received'] == 0:
+                running['replies'].append(github_reply)
+                github_reply.reply = running['reply']
+                return github_reply
+
+        self.queue.append(github_reply)
+        # Stable sort, requests of the same priority keep their order
+        self.queue.sort(key=lambda queued: queued.priority)
+
+        self.schedule()
+        return github_reply
+
+    def background_allowed(self):
+        """Return False when background requests would use the requests kept
+        for the user."""
+        if self.remaining is None or self.reset is None:
+            return True
+        if self.reset <= arrow.utcnow():
+            return True
+        return self.remaining > cons.GITHUB_BACKGROUND_RESERVE
+
+    def requests_left(self):
+        """Return how many more requests fit in the rate limit budget once
+        the running and queued ones are sent, or None when it is unknown."""
+        if self.remaining is None or self.reset is None:
+            return None
+        if self.reset <= arrow.utcnow():
+            return None
+        return max(self.remaining - len(self.running) - len(self.queue), 0)
+
+    def schedule(self):
+        while (len(self.queue) > 0 and
+            len(self.running) < cons.GITHUB_MAX_REQUESTS):
+            github_reply = self.queue[0]
+            if (github_reply.priority == BACKGROUND and
+                not self.background_allowed()):
+                break
+
+            del self.queue[0]
+            self.start(github_reply)
+
+        if (len(self.queue) > 0 and not self.background_allowed() and
+            not self.reset_timer.isActive()):
+            delay = (self.reset - arrow.utcnow()).total_seconds()
+            logger.info('GitHub rate limit is low, background requests are '
+                'deferred for %d seconds', delay)
+            self.reset_timer.start(int(delay * 1000) + 1000)
+
+    def start(self, github_reply):
+        reply = self.qnam.get(github_api_request(github_reply.url))
+
+        running = {
+            'url': github_reply.url,
+            'reply': reply,
+            'replies': [github_reply],
+            'received': 0
+        }
+
+        # Queued requests for the same URL share this reply
+        for queued in list(self.queue):
+            if queued.url == github_reply.url:
+                self.queue.remove(queued)
+                running['replies'].append(queued)
+
+        for shared_reply in running['replies']:
+            shared_reply.reply = reply
+
+        reply.readyRead.connect(lambda: self.ready_read(running))
+        reply.downloadProgress.connect(lambda bytes_read, total_bytes:
+            self.download_progress(running, bytes_read, total_bytes))
+        reply.finished.connect(lambda: self.finished(running))
+
+        self.running.append(running)
+
+    def ready_read(self, running):
+        data = bytes(running['reply'].readAll())
+        running['received'] += len(data)
+
+        for github_reply in list(running['replies']):
+            github_reply.buffer.extend(data)
+            github_reply.readyRead.emit()
+
+    def download_progress(self, running, bytes_read, total_bytes):
+        for github_reply in list(running['replies']):
+            github_reply.downloadProgress.emit(bytes_read, total_bytes)
+
+    def finished(self, running):
+        self.running.remove(running)
+
+        self.update_budget(running['reply'])
+
+        for github_reply in running['replies']:
+            github_reply.done = True
+            github_reply.finished.emit()
+
+        self.schedule()
+
+    def abort(self, github_reply):
+        github_reply.done = True
+
+        if github_reply in self.queue:
+            self.queue.remove(github_reply)
+            return
+
+        for running in self.running:
+            if github_reply in running['replies']:
+                running['replies'].remove(github_reply)
+                if len(running['replies']) == 0:
+                    running['reply'].abort()
+                return
+
+    def update_budget(self, reply):
+        # The headers of a cached reply tell an outdated budget
+        if reply.attribute(QNetworkRequest.SourceIsFromCacheAttribute):
+            return
+        if not reply.hasRawHeader(cons.GITHUB_XRL_REMAINING):
+            return
+
+        remaining = tryint(reply.rawHeader(cons.GITHUB_XRL_REMAINING))
+        if not isinstance(remaining, int):
+            return
+
+        reset = None
+        if reply.hasRawHeader(cons.GITHUB_XRL_RESET):
+            reset = tryint(reply.rawHeader(cons.GITHUB_XRL_RESET))
+            reset = arrow.get(reset) if isinstance(reset, int) else None
+
+        self.remaining = remaining
+        self.reset = reset
+
+        if remaining <= cons.GITHUB_RATE_LIMIT_WARNING:
+            self.rate_limit_low.emit(remaining, reset)
+
+    def budget_reset(self):
+        self.remaining = None
+        self.reset = None
+        self.schedule()
+
+
+_scheduler = None
+
+
+def github_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = GithubScheduler()
+    return _scheduler
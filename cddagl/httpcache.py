@@ -0,0 +1,82 @@
+import logging
+
+from PyQt5.QtCore import QUrl
+from PyQt5.QtNetwork import QNetworkRequest
+
+import cddagl.constants as cons
+from cddagl.network import network_request
+from cddagl.sql.functions import get_http_cache, set_http_cache
+
+logger = logging.getLogger('cddagl')
+
+HTTP_NOT_MODIFIED = 304
+
+
+def github_api_request(url):
+    """Return a request for the GitHub API. When a previous response is
+    cached, the request is made conditional so that an unchanged answer comes
+    back as 304 Not Modified, which does not count against the rate limit.
+    Responses still in the disk cache are revalidated by the network access
+    manager itself and come back as a 200 from the cache."""
+    request = network_request(url)
+    request.setRawHeader(b'Accept', cons.GITHUB_API_VERSION)
+
+    cached = get_http_cache(request.url().toString())
+    if cached is not None:
+        if cached['etag'] is not None:
+            request.setRawHeader(b'If-None-Match',
+                cached['etag'].encode('utf8'))
+        if cached['last_modified'] is not None:
+            request.setRawHeader(b'If-Modified-Since',
+                cached['last_modified'].encode('utf8'))
+
+    return request
+
+
+def cached_body(url):
+    """Return the body of the last successful answer for a GitHub API url
+    or None. It can be used right away while the request is revalidated.
+    Replies cached without their body give None."""
+    cached = get_http_cache(QUrl(url).toString())
+    if cached is None or len(cached['body']) == 0:
+        return None
+    return cached['body']
+
+
+def reply_content(reply, content):
+    """Return the status code and the body of a finished GitHub API reply
+    which was read in the content buffer. A 304 Not Modified reply is
+    answered from the cache as a 200 and a 200 reply updates the cache."""
+    url = reply.request().url().toString()
+    status_code = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+
+    if status_code == HTTP_NOT_MODIFIED:
+        cached = get_http_cache(url)
+        if cached is not None:
+            logger.debug('Not modified, using the cached response: %s', url)
+            return 200, cached['body']
+        return status_code, b''
+
+    body = content.getvalue()
+
+    if status_code == 200:
+        cache_reply(reply, body)
+
+    return status_code, body
+
+
+def cache_reply(reply, body=b''):
+    """Keep the validators of a successful reply with its body. Replies
+    which are parsed while they are received are cached without their body:
+    a 304 Not Modified answer then only means nothing changed."""
+    etag = None
+    if reply.hasRawHeader(b'ETag'):
+        etag = bytes(reply.rawHeader(b'ETag')).decode('utf8')
+    last_modified = None
+    if reply.hasRawHeader(b'Last-Modified'):
+        last_modified = bytes(reply.rawHeader(b'Last-Modified')).decode(
+            'utf8')
+
+    if etag is not None or last_modified is not None:
+        set_http_cache(reply.request().url().toString(), etag, last_modified,
+            body)
@@ -0,0 +1,205 @@
+import codecs
+import json
+import os
+import re
+
+from concurrent.futures import ThreadPoolExecutor
+
+import cddagl.constants as cons
+from cddagl.sql.functions import get_asset_idents, set_asset_idents
+
+TILESET = 'tileset'
+SOUNDPACK = 'soundpack'
+MOD = 'mod'
+
+# Files identifying an asset directory, in the order they are looked for
+IDENT_FILES = {
+    TILESET: ('tileset.txt', 'tileset.txt.disabled'),
+    SOUNDPACK: ('soundpack.txt', 'soundpack.txt.disabled'),
+    MOD: ('modinfo.json', 'modinfo.json.disabled')
+}
+
+IDENT_REGEX = re.compile(r'(?<!\\)"ident"\s*:\s*"((?:[^"\\]|\\.)*)"')
+MOD_INFO_REGEX = re.compile(r'(?<!\\)"type"\s*:\s*"MOD_INFO"')
+
+
+def read_asset_name(file_path):
+    """Return the NAME of a tileset.txt or soundpack.txt file. Reading stops
+    at the line where it is found."""
+    try:
+        with open(file_path, 'r', encoding='latin1') as f:
+            for line in f:
+                if line.startswith('NAME'):
+                    space_index = line.find(' ')
+                    return line[space_index:].strip().replace(',', '')
+    except FileNotFoundError:
+        return None
+    return None
+
+
+def _json_mod_ident(text):
+    try:
+        values = json.loads(text)
+    except ValueError:
+        return None
+
+    if isinstance(values, dict):
+        if values.get('type', '') == 'MOD_INFO':
+            return values.get('ident', None)
+    elif isinstance(values, list):
+        for item in values:
+            if (isinstance(item, dict)
+                and item.get('type', '') == 'MOD_INFO'):
+                    return item.get('ident', None)
+
+    return None
+
+
+def _quick_mod_ident(text):
+    """Return the ident of the MOD_INFO object when it can be found without
+    parsing the whole file. Both keys must be in the same object and nothing
+    must be nested in it before them."""
+    ident_match = IDENT_REGEX.search(text)
+    if ident_match is None:
+        return None
+    mod_info_match = MOD_INFO_REGEX.search(text)
+    if mod_info_match is None:
+        return None
+
+    start = text.rfind('{', 0, min(ident_match.start(),
+        mod_info_match.start()))
+    end = max(ident_match.end(), mod_info_match.end())
+    if start == -1 or re.search('[{}]', text[start + 1:end]) is not None:
+        return None
+
+    try:
+        return json.loads('"' + ident_match.group(1) + '"')
+    except ValueError:
+        return None
+
+
+def read_mod_ident(file_path):
+    """Return the ident of the MOD_INFO object of a modinfo.json file.
+
+    The file is read in chunks until both the ident and the MOD_INFO type
+    are found. Files that cannot be understood this way are parsed as a
+    whole.
+    """
+    decoder = codecs.getincrementaldecoder('utf8')()
+    text = ''
+    try:
+        with open(file_path, 'rb') as f:
+            while True:
+                data = f.read(cons.READ_BUFFER_SIZE)
+                text += decoder.decode(data, final=len(data) == 0)
+
+                ident = _quick_mod_ident(text)
+                if ident is not None:
+                    return ident
+
+                if len(data) == 0:
+                    break
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        return None
+
+    return _json_mod_ident(text)
+
+
+READERS = {
+    TILESET: read_asset_name,
+    SOUNDPACK: read_asset_name,
+    MOD: read_mod_ident
+}
+
+
+def _directory_key(directory):
+    return os.path.normcase(os.path.abspath(directory))
+
+
+def _entry_ident(kind, entry_path, cached):
+    """Return what identifies an asset directory. A cached ident is reused
+    when its file has the same modification time and size."""
+    for file_name in IDENT_FILES[kind]:
+        file_path = os.path.join(entry_path, file_name)
+        try:
+            file_stat = os.stat(file_path)
+        except OSError:
+            continue
+
+        for cached_ident in cached:
+            if (cached_ident['file_name'] == file_name and
+                cached_ident['mtime'] == file_stat.st_mtime and
+                cached_ident['size'] == file_stat.st_size):
+                return cached_ident
+
+        return {
+            'file_name': file_name,
+            'mtime': file_stat.st_mtime,
+            'size': file_stat.st_size,
+            'ident': READERS[kind](file_path)
+        }
+
+    return None
+
+
+def custom_assets(kind, assets_dir, previous_assets_dir, cancelled=None):
+    """Return the assets found in the previous directory that are not part
+    of the new build as a dict of names to paths.
+
+    Asset directories are identified on a thread pool. Their idents are
+    saved per directory and reused by the next scan when their files did not
+    change. The previous install was the new one during the last update, so
+    the idents saved for assets_dir are also looked up for it.
+
+    cancelled is an optional function returning True when the scan should
+    stop. An empty dict is returned in that case.
+    """
+    directories = (assets_dir, previous_assets_dir)
+    keys = [_directory_key(directory) for directory in directories]
+
+    official_cached = get_asset_idents(keys[0])
+    previous_cached = get_asset_idents(keys[1])
+    cached = ((official_cached, ), (previous_cached, official_cached))
+
+    with ThreadPoolExecutor(max_workers=cons.FILE_OPERATION_WORKERS
+        ) as executor:
+        scans = []
+        for directory, directory_cached in zip(directories, cached):
+            futures = []
+            for entry in os.listdir(directory):
+                entry_path = os.path.join(directory, entry)
+                if os.path.isdir(entry_path):
+                    futures.append((entry, entry_path, executor.submit(
+                        _entry_ident, kind, entry_path,
+                        [saved[entry] for saved in directory_cached
+                            if entry in saved])))
+            scans.append(futures)
+
+        asset_sets = []
+        for key, futures in zip(keys, scans):
+            asset_set = {}
+            idents = {}
+            for entry, entry_path, future in futures:
+                if cancelled is not None and cancelled():
+                    for scan in scans:
+                        for entry, entry_path, future in scan:
+                            future.cancel()
+                    return {}
+
+                ident = future.result()
+                if ident is None:
+                    continue
+                idents[entry] = ident
+
+                name = ident['ident']
+                if name is not None and name not in asset_set:
+                    asset_set[name] = entry_path
+
+            set_asset_idents(key, idents)
+            asset_sets.append(asset_set)
+
+    official_set, previous_set = asset_sets
+    custom_set = set(previous_set.keys()) - set(official_set.keys())
+    return dict((name, previous_set[name]) for name in custom_set)
@@ -0,0 +1,790 @@
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import zipfile
+import zlib
+
+from concurrent.futures import ThreadPoolExecutor
+
+import cddagl.constants as cons
+from cddagl import __version__ as version
+from cddagl.bandwidth import FOREGROUND, bandwidth_limiter
+from cddagl.fileops import (
+    OperationCancelled, clone_file, make_read_only, remove_path, walk_entries
+)
+from cddagl.mirrors import urlopen_mirrored
+from cddagl.sql.functions import (
+    get_config_path, get_config_value, config_true,
+    get_install_manifest_digests, add_asset_link, get_asset_links,
+    remove_asset_links
+)
+
+logger = logging.getLogger('cddagl')
+
+
+def build_cache_dir():
+    cache_dir = os.path.join(os.path.dirname(get_config_path()), 'builds')
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    return cache_dir
+
+
+def cached_archive(name):
+    """Return the path of a build archive in the cache or None if it is not
+    cached anymore."""
+    if name is None:
+        return None
+
+    path = os.path.join(build_cache_dir(), name)
+    if not os.path.isfile(path):
+        return None
+    return path
+
+
+def build_cache_limit():
+    """Return how many archives the build cache keeps. 0 turns the cache
+    off."""
+    try:
+        return max(int(get_config_value('build_cache_max_archives',
+            str(cons.BUILD_CACHE_MAX_ARCHIVES))), 0)
+    except ValueError:
+        return cons.BUILD_CACHE_MAX_ARCHIVES
+
+
+def cache_archive(archive_path):
+    """Move a build archive into the build cache and return its new path. The
+    least recently used archives are removed from the cache. When the cache
+    is off, the archive is left where it is and its path is returned."""
+    if build_cache_limit() == 0:
+        return archive_path
+
+    target = os.path.join(build_cache_dir(), os.path.basename(archive_path))
+
+    if os.path.normcase(os.path.abspath(archive_path)) != os.path.normcase(
+        target):
+        if os.path.isfile(target):
+            remove_path(target, os.unlink)
+        shutil.move(archive_path, target)
+
+    # The modification time is used to know which archives were used last
+    os.utime(target)
+    prune_build_cache()
+
+    return target
+
+
+def prune_build_cache():
+    cache_dir = build_cache_dir()
+
+    with os.scandir(cache_dir) as entries:
+        archives = [entry for entry in entries if entry.is_file()]
+    archives.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+
+    for entry in archives[build_cache_limit():]:
+        try:
+            remove_path(entry.path, os.unlink)
+        except OSError:
+            logger.exception('Could not remove cached build %s', entry.path)
+
+
+def is_cached_archive(path):
+    return os.path.normcase(os.path.dirname(os.path.abspath(path))) == (
+        os.path.normcase(build_cache_dir()))
+
+
+def download_build(url, archive_path, progress=None, cancelled=None,
+    kind=FOREGROUND):
+    """Download a build archive. progress is called with the number of bytes
+    read and the total size, cancelled is an optional function returning True
+    when the download should stop. kind tells which limit of the bandwidth
+    limiter applies to the download."""
+    limiter = bandwidth_limiter()
+    limiter.begin(kind)
+    try:
+        response = urlopen_mirrored(url, {
+            'User-Agent': 'CDDA-Game-Launcher/' + version})
+        with response, open(archive_path, 'wb') as archive_file:
+            total_bytes = int(response.headers.get('Content-Length', 0))
+            bytes_read = 0
+            while True:
+                limiter.throttle(kind, cancelled)
+                buf = response.read(cons.READ_BUFFER_SIZE)
+                if len(buf) == 0:
+                    return
+                limiter.consume(kind, len(buf))
+                archive_file.write(buf)
+                bytes_read += len(buf)
+                if progress is not None:
+                    progress(bytes_read, total_bytes)
+    finally:
+        limiter.end(kind)
+
+
+def download_to_cache(url, archive_name, progress=None, cancelled=None,
+    kind=FOREGROUND):
+    """Download a build archive, check its content and move it into the
+    build cache. Return the path of the cached archive. The build cache must
+    be on, see build_cache_limit."""
+    download_dir = tempfile.mkdtemp(prefix=cons.TEMP_PREFIX)
+    try:
+        archive_path = os.path.join(download_dir, archive_name)
+        download_build(url, archive_path, progress, cancelled, kind)
+
+        with zipfile.ZipFile(archive_path) as z:
+            bad_file = z.testzip()
+            if bad_file is not None:
+                raise zipfile.BadZipFile('Bad CRC-32 for file ' + bad_file)
+
+        return cache_archive(archive_path)
+    finally:
+        shutil.rmtree(download_dir, ignore_errors=True)
+
+
+def extract_build(archive_path, target_dir, progress=None, cancelled=None):
+    """Extract a whole build archive in target_dir. progress is called with
+    the name of each extracted file, the number of files extracted so far and
+    the total number of files."""
+    with zipfile.ZipFile(archive_path) as z:
+        infolist = z.infolist()
+        for index, info in enumerate(infolist):
+            if cancelled is not None and cancelled():
+                raise OperationCancelled()
+            z.extract(info, target_dir)
+            if progress is not None:
+                progress(info.filename, index + 1, len(infolist))
+
+
+def manifest_path(game_dir, name):
+    return os.path.join(game_dir, *name.split('/'))
+
+
+def archive_manifest(archive_path, game_dir):
+    """Return the manifest of a build archive extracted in game_dir. The
+    modification time of every extracted file is kept so that verifying the
+    install only needs to hash the files that changed since."""
+    files = []
+    with zipfile.ZipFile(archive_path) as z:
+        for info in z.infolist():
+            if info.is_dir():
+                continue
+
+            try:
+                mtime = os.stat(manifest_path(game_dir, info.filename)
+                    ).st_mtime
+            except OSError:
+                mtime = None
+
+            files.append({
+                'path': info.filename,
+                'size': info.file_size,
+                'crc32': info.CRC,
+                'mtime': mtime
+            })
+
+    return files
+
+
+def file_crc32(path, cancelled=None):
+    crc = 0
+    with open(path, 'rb') as f:
+        while True:
+            if cancelled is not None and cancelled():
+                raise OperationCancelled()
+            chunk = f.read(cons.COPY_BUFFER_SIZE)
+            if len(chunk) == 0:
+                return crc
+            crc = zlib.crc32(chunk, crc)
+
+
+def verify_install(game_dir, files, progress=None, cancelled=None,
+    workers=cons.FILE_OPERATION_WORKERS):
+    """Check the files of an install against its manifest.
+
+    Sizes and modification times are compared first and a file is only
+    hashed when its modification time changed. progress is called with the
+    number of files checked so far and cancelled is an optional function
+    returning True when the check should stop. Return the list of missing or damaged
+    paths and a dict of the new modification times of the files that were
+    hashed and found intact.
+    """
+    def check(manifest_file):
+        if cancelled is not None and cancelled():
+            raise OperationCancelled()
+
+        path = manifest_path(game_dir, manifest_file['path'])
+        try:
+            file_stat = os.stat(path)
+        except OSError:
+            return False, None
+
+        if file_stat.st_size != manifest_file['size']:
+            return False, None
+        if file_stat.st_mtime == manifest_file['mtime']:
+            return True, None
+
+        intact = file_crc32(path, cancelled) == manifest_file['crc32']
+        return intact, file_stat.st_mtime if intact else None
+
+    broken = []
+    mtimes = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(check, files)
+        for checked, (manifest_file, result) in enumerate(zip(files, results),
+            1):
+            intact, mtime = result
+            if not intact:
+                broken.append(manifest_file['path'])
+            elif mtime is not None:
+                mtimes[manifest_file['path']] = mtime
+
+            if progress is not None:
+                progress(checked)
+
+    return broken, mtimes
+
+
+def repair_install(game_dir, archive_path, paths, progress=None,
+    cancelled=None):
+    """Extract paths from the build archive over the install. cancelled is
+    an optional function returning True when the repair should stop, the
+    files repaired so far are kept in that case. Return the new modification
+    times of the repaired files."""
+    mtimes = {}
+    with zipfile.ZipFile(archive_path) as z:
+        for repaired, path in enumerate(paths, 1):
+            if cancelled is not None and cancelled():
+                break
+
+            target = manifest_path(game_dir, path)
+            if os.path.isfile(target):
+                # Quarantined or read-only files cannot be overwritten
+                remove_path(target, os.unlink)
+
+            z.extract(path, game_dir)
+            mtimes[path] = os.stat(target).st_mtime
+
+            if progress is not None:
+                progress(repaired)
+
+    return mtimes
+
+
+# Windows reports ERROR_NOT_SAME_DEVICE when linking across volumes
+ERROR_NOT_SAME_DEVICE = 17
+# and ERROR_INVALID_FUNCTION or ERROR_NOT_SUPPORTED when a volume cannot
+# clone files
+ERROR_INVALID_FUNCTION = 1
+ERROR_NOT_SUPPORTED = 50
+
+
+def store_dir():
+    return os.path.join(os.path.dirname(get_config_path()), 'store')
+
+
+def store_path(digest):
+    """Return where a file is kept in the content store. Files are keyed by
+    the SHA-256 of their content."""
+    return os.path.join(store_dir(), digest[:2], digest)
+
+
+def file_sha256(path, cancelled=None):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            if cancelled is not None and cancelled():
+                raise OperationCancelled()
+            chunk = f.read(cons.COPY_BUFFER_SIZE)
+            if len(chunk) == 0:
+                return digest.hexdigest()
+            digest.update(chunk)
+
+
+def on_store_volume(path):
+    """Return True when path is on the volume of the content stores."""
+    try:
+        return (os.stat(path).st_dev ==
+            os.stat(os.path.dirname(get_config_path())).st_dev)
+    except OSError:
+        return False
+
+
+def cross_volume_error(e):
+    return (e.errno == errno.EXDEV or
+        getattr(e, 'winerror', None) == ERROR_NOT_SAME_DEVICE)
+
+
+def clone_unsupported(e):
+    return (cross_volume_error(e) or
+        e.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL) or
+        getattr(e, 'winerror', None) in (ERROR_INVALID_FUNCTION,
+            ERROR_NOT_SUPPORTED))
+
+
+def _replace_file(src, dst):
+    try:
+        os.replace(src, dst)
+    except PermissionError:
+        # Read-only files cannot be replaced on Windows
+        remove_path(dst, os.unlink)
+        os.replace(src, dst)
+
+
+def _clone_or_link(src, dst, cloning):
+    """Create dst as a clone of src or, when cloning is False or the file
+    system cannot clone files, as a hard link made read-only. Return whether
+    cloning can still be tried for the next files."""
+    if cloning:
+        try:
+            clone_file(src, dst)
+            return True
+        except OSError as e:
+            if not clone_unsupported(e):
+                raise
+
+    os.link(src, dst)
+    make_read_only(dst)
+    return False
+
+
+def _share_file(stored_path, path, cloning):
+    """Replace path by a clone of or a hard link to stored_path. Return
+    whether cloning can still be tried."""
+    temp_path = path + '.share'
+    remove_path(temp_path, os.unlink)
+    cloning = _clone_or_link(stored_path, temp_path, cloning)
+
+    try:
+        _replace_file(temp_path, path)
+    except OSError:
+        remove_path(temp_path, os.unlink)
+        raise
+    return cloning
+
+
+def _store_file(path, stored_path, cloning):
+    """Add path to the content store under stored_path. Return whether
+    cloning can still be tried."""
+    os.makedirs(os.path.dirname(stored_path), exist_ok=True)
+
+    # A clone interrupted by a crash is never seen under its final name
+    temp_path = stored_path + '.tmp'
+    remove_path(temp_path, os.unlink)
+    cloning = _clone_or_link(path, temp_path, cloning)
+    os.replace(temp_path, stored_path)
+    return cloning
+
+
+def _stored_intact(stored_path, path, digest, cancelled):
+    """Return True when the stored file still has the content its name says
+    it has. Files are hashed again since a writable copy could have been
+    changed since it was stored."""
+    try:
+        if os.path.samestat(os.stat(stored_path), os.stat(path)):
+            # Just hashed through path
+            return True
+        return file_sha256(stored_path, cancelled) == digest
+    except FileNotFoundError:
+        return False
+
+
+def link_install(game_dir, files, cancelled=None,
+    workers=cons.FILE_OPERATION_WORKERS):
+    """Share the files of an install with other installs through the content
+    store.
+
+    Files are stored under their SHA-256, which is computed when a file is
+    added and checked again before a stored file replaces a file of the
+    install. Files that are not in the store yet are added to it so that the
+    next install of a build sharing them only costs the changed files.
+
+    Where the file system can clone files, the install and the store get
+    copy on write clones. Otherwise, files are hard linked and made
+    read-only: writing to a hard link would change every install sharing it.
+    Launcher operations that rewrite a game file remove it first and
+    remove_path keeps the other links read-only.
+
+    cancelled is an optional function returning True when sharing should
+    stop. Return the new modification times and the SHA-256 of the shared
+    files and the number of bytes that are now shared with other installs.
+    """
+    def file_digest(manifest_file):
+        if cancelled is not None and cancelled():
+            raise OperationCancelled()
+
+        if manifest_file.get('sha256') is not None:
+            # Shared by a previous run
+            return None
+
+        path = manifest_path(game_dir, manifest_file['path'])
+        try:
+            file_stat = os.stat(path)
+        except OSError:
+            return None
+        if (file_stat.st_size != manifest_file['size'] or
+            file_stat.st_mtime != manifest_file['mtime']):
+            # Changed since the extraction, never share it
+            return None
+
+        return file_sha256(path, cancelled)
+
+    mtimes = {}
+    digests = {}
+    shared_bytes = 0
+    cloning = True
+
+    if not on_store_volume(game_dir):
+        logger.info('Game directory %s is not on the same volume as the '
+            'content store, its files are not shared', game_dir)
+        return mtimes, digests, shared_bytes
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(file_digest, files)
+        for manifest_file, digest in zip(files, results):
+            if digest is None:
+                continue
+
+            path = manifest_path(game_dir, manifest_file['path'])
+            stored_path = store_path(digest)
+
+            try:
+                if os.path.isfile(stored_path):
+                    if _stored_intact(stored_path, path, digest, cancelled):
+                        if not os.path.samestat(os.stat(stored_path),
+                            os.stat(path)):
+                            cloning = _share_file(stored_path, path, cloning)
+                            shared_bytes += manifest_file['size']
+                    else:
+                        logger.warning('Damaged content store file %s '
+                            'replaced', stored_path)
+                        remove_path(stored_path, os.unlink)
+                        cloning = _store_file(path, stored_path, cloning)
+                else:
+                    cloning = _store_file(path, stored_path, cloning)
+
+                mtimes[manifest_file['path']] = os.stat(path).st_mtime
+                digests[manifest_file['path']] = digest
+            except OSError as e:
+                if cross_volume_error(e):
+                    logger.info('Game directory %s is not on the same '
+                        'volume as the content store, its files are not '
+                        'shared', game_dir)
+                    break
+                logger.warning('Could not share %s: %s', path, e)
+
+    return mtimes, digests, shared_bytes
+
+
+def prune_store(cancelled=None):
+    """Remove the files of the content store that no install uses anymore.
+
+    Hard linked files are in use while they have other links. Cloned files
+    only have one link, they are in use while the manifest of an existing
+    game directory lists their SHA-256. Hard linked files still in use are
+    made read-only again in case one of their links was changed.
+    """
+    top = store_dir()
+    if not os.path.isdir(top):
+        return
+
+    referenced = set()
+    for game_dir, digests in get_install_manifest_digests().items():
+        if os.path.isdir(game_dir):
+            referenced.update(digests)
+
+    for entry in walk_entries(top):
+        if cancelled is not None and cancelled():
+            raise OperationCancelled()
+
+        if entry.is_file():
+            try:
+                # DirEntry does not know the number of links on Windows
+                if os.stat(entry.path).st_nlink > 1:
+                    make_read_only(entry.path)
+                elif entry.name not in referenced:
+                    remove_path(entry.path, os.unlink)
+            except OSError:
+                logger.exception('Could not prune %s', entry.path)
+
+
+def asset_store_dir():
+    return os.path.join(os.path.dirname(get_config_path()), 'assets')
+
+
+def shares_assets(game_dir):
+    """Return True when custom assets of game_dir can be hard linked into the
+    asset store."""
+    if not config_true(get_config_value('share_game_files', 'False')):
+        return False
+
+    return on_store_volume(game_dir)
+
+
+def _asset_key(name):
+    return ''.join(c if c.isalnum() or c in '-_.' else '_'
+        for c in name).strip('.') or '_'
+
+
+def stored_assets(kind, name):
+    """Return the stored copies of an asset, the most recently used first."""
+    name_dir = os.path.join(asset_store_dir(), kind, _asset_key(name))
+    if not os.path.isdir(name_dir):
+        return []
+
+    entries = []
+    with os.scandir(name_dir) as it:
+        for entry in it:
+            if entry.is_dir() and not entry.name.endswith('.tmp'):
+                with os.scandir(entry.path) as content:
+                    stored = [item.path for item in content]
+                if len(stored) == 1:
+                    entries.append((entry.stat().st_mtime, stored[0]))
+
+    entries.sort(reverse=True)
+    return [path for mtime, path in entries]
+
+
+def _asset_file_path(path, relpath):
+    if relpath == '':
+        return path
+    return os.path.join(path, relpath)
+
+
+def _asset_files(path):
+    """Return the relative paths of the files of an asset in a stable order.
+    An asset which is a single file has a single empty relative path."""
+    if os.path.isfile(path):
+        return ['']
+
+    return sorted(os.path.relpath(entry.path, path)
+        for entry in walk_entries(path)
+        if not entry.is_dir(follow_symlinks=False))
+
+
+def asset_digest(path, cancelled=None):
+    """Return the content hash of an asset file or directory. Relative paths
+    are part of the hash."""
+    digest = hashlib.sha256()
+    for relpath in _asset_files(path):
+        digest.update(relpath.replace(os.sep, '/').encode('utf8') + b'\0')
+        with open(_asset_file_path(path, relpath), 'rb') as f:
+            while True:
+                if cancelled is not None and cancelled():
+                    raise OperationCancelled()
+                chunk = f.read(cons.COPY_BUFFER_SIZE)
+                if len(chunk) == 0:
+                    break
+                digest.update(chunk)
+        digest.update(b'\0')
+    return digest.hexdigest()[:cons.ASSET_DIGEST_LENGTH]
+
+
+def link_tree(src, dst, cancelled=None):
+    """Recreate an asset file or directory with clones of its files or, when
+    the file system cannot clone files, with read-only hard links to them."""
+    if os.path.isfile(src):
+        _clone_or_link(src, dst, True)
+        return
+
+    cloning = True
+    os.makedirs(dst)
+    for entry in walk_entries(src):
+        if cancelled is not None and cancelled():
+            raise OperationCancelled()
+
+        target = os.path.join(dst, os.path.relpath(entry.path, src))
+        if entry.is_dir(follow_symlinks=False):
+            os.makedirs(target)
+        else:
+            cloning = _clone_or_link(entry.path, target, cloning)
+
+
+def _entry_key(entry_dir):
+    return os.path.relpath(entry_dir, asset_store_dir())
+
+
+def _record_asset_link(stored_path, path):
+    """Remember that path is a copy of a stored asset. Clones cannot be told
+    apart from other files, the asset store is pruned from these records."""
+    add_asset_link(_entry_key(os.path.dirname(stored_path)),
+        os.path.abspath(path))
+
+
+def _remove_tree(path):
+    """Remove an asset file or directory even when its files are read-only
+    hard links, without making the other links writable."""
+    if not os.path.isdir(path):
+        remove_path(path, os.unlink)
+        return
+
+    for entry in walk_entries(path, topdown=False):
+        if entry.is_dir(follow_symlinks=False):
+            remove_path(entry.path, os.rmdir)
+        else:
+            remove_path(entry.path, os.unlink)
+    remove_path(path, os.rmdir)
+
+
+def _asset_intact(stored_path, path, digest, cancelled):
+    """Return True when the stored copy of an asset still has the content
+    hashed from path as digest. Files linked to the ones of path were just
+    hashed, anything else is hashed again."""
+    try:
+        files = _asset_files(path)
+        if files == _asset_files(stored_path) and all(
+            os.path.samestat(os.stat(_asset_file_path(path, relpath)),
+                os.stat(_asset_file_path(stored_path, relpath)))
+            for relpath in files):
+            return True
+
+        return asset_digest(stored_path, cancelled) == digest
+    except FileNotFoundError:
+        return False
+
+
+def _relink_asset(stored_path, path, cancelled):
+    """Replace the files of path by clones of or links to the files of its
+    stored copy, which has the same content."""
+    cloning = True
+    for relpath in _asset_files(path):
+        if cancelled is not None and cancelled():
+            raise OperationCancelled()
+
+        file_path = _asset_file_path(path, relpath)
+        stored_file_path = _asset_file_path(stored_path, relpath)
+        if not os.path.samestat(os.stat(file_path),
+            os.stat(stored_file_path)):
+            cloning = _share_file(stored_file_path, file_path, cloning)
+
+
+def store_asset(kind, name, path, cancelled=None):
+    """Add a soundpack, tileset or font to the asset store and return the
+    path of its stored copy.
+
+    Assets are stored by kind, name and content hash so that every game
+    directory having the same asset can share a single copy. Stored files
+    are clones, which are copied on write, or read-only hard links. The
+    files of path are replaced by clones of or links to the stored copy.
+    """
+    digest = asset_digest(path, cancelled)
+    entry_dir = os.path.join(asset_store_dir(), kind, _asset_key(name),
+        digest)
+    stored_path = os.path.join(entry_dir, os.path.basename(path))
+
+    if os.path.isdir(entry_dir):
+        if _asset_intact(stored_path, path, digest, cancelled):
+            # Mark it as the most recently used copy
+            os.utime(entry_dir)
+            _relink_asset(stored_path, path, cancelled)
+            _record_asset_link(stored_path, path)
+            return stored_path
+
+        logger.warning('Damaged stored asset %s replaced', entry_dir)
+        _remove_tree(entry_dir)
+
+    # Incomplete copies are never seen under their final name
+    temp_dir = entry_dir + '.tmp'
+    if os.path.exists(temp_dir):
+        _remove_tree(temp_dir)
+    os.makedirs(temp_dir)
+    link_tree(path, os.path.join(temp_dir, os.path.basename(path)), cancelled)
+    os.replace(temp_dir, entry_dir)
+    _record_asset_link(stored_path, path)
+
+    return stored_path
+
+
+def link_stored_asset(stored_path, dst, cancelled=None):
+    """Create dst with clones of or links to a stored asset."""
+    link_tree(stored_path, dst, cancelled)
+    _record_asset_link(stored_path, dst)
+
+
+def link_asset(kind, name, src, dst, cancelled=None):
+    """Create dst with clones of or links to the stored copy of the asset at
+    src. Return False when the asset store cannot be used for dst, in which
+    case nothing was created and the caller should copy the asset instead."""
+    try:
+        link_stored_asset(store_asset(kind, name, src, cancelled), dst,
+            cancelled)
+    except OSError as e:
+        if not cross_volume_error(e):
+            raise
+
+        logger.info('%s is not on the same volume as the asset store, it is '
+            'copied instead', dst)
+        if os.path.exists(dst):
+            try:
+                _remove_tree(dst)
+            except OSError:
+                logger.exception('Could not remove %s', dst)
+        return False
+
+    return True
+
+
+def _asset_in_use(stored_path):
+    for relpath in _asset_files(stored_path):
+        if os.stat(_asset_file_path(stored_path, relpath)).st_nlink > 1:
+            return True
+    return False
+
+
+def prune_asset_store(cancelled=None):
+    """Remove the stored assets that no game directory has a copy of
+    anymore. Copies are found from the recorded links, which are the only
+    way to know about clones, and from the link count of hard links."""
+    top = asset_store_dir()
+    if not os.path.isdir(top):
+        return
+
+    asset_links = get_asset_links()
+    gone_links = []
+
+    for kind in os.listdir(top):
+        for key in os.listdir(os.path.join(top, kind)):
+            name_dir = os.path.join(top, kind, key)
+            for digest in os.listdir(name_dir):
+                if cancelled is not None and cancelled():
+                    raise OperationCancelled()
+
+                entry_dir = os.path.join(name_dir, digest)
+                if digest.endswith('.tmp'):
+                    # Being stored right now or left by a crash
+                    continue
+
+                links = asset_links.get(_entry_key(entry_dir), [])
+                linked = False
+                for path in links:
+                    if os.path.exists(path):
+                        linked = True
+                    else:
+                        gone_links.append(path)
+
+                try:
+                    stored_paths = [os.path.join(entry_dir, stored)
+                        for stored in os.listdir(entry_dir)]
+                    if linked or any(_asset_in_use(stored_path)
+                        for stored_path in stored_paths):
+                        # Linked files made writable by a game directory
+                        # would change every other copy
+                        for stored_path in stored_paths:
+                            for relpath in _asset_files(stored_path):
+                                make_read_only(_asset_file_path(stored_path,
+                                    relpath))
+                    else:
+                        _remove_tree(entry_dir)
+                        gone_links.extend(links)
+                except OSError:
+                    logger.exception('Could not prune %s', entry_dir)
+
+            # An asset may be stored there meanwhile
+            try:
+                if len(os.listdir(name_dir)) == 0:
+                    os.rmdir(name_dir)
+            except OSError:
+                logger.exception('Could not prune %s', name_dir)
+
+    remove_asset_links(gone_links)
@@ -0,0 +1,366 @@
+import logging
+import os
+import random
+import shutil
+import tempfile
+
+from PyQt5.QtCore import QObject, QThread, QUrl, QFileInfo, pyqtSignal
+from PyQt5.QtNetwork import QNetworkReply, QNetworkRequest
+from werkzeug.http import parse_options_header
+from werkzeug.utils import secure_filename
+
+import cddagl.constants as cons
+from cddagl.archives import ArchiveError, extract_archive
+from cddagl.bandwidth import QUEUED as QUEUED_DOWNLOAD, ThrottledReply
+from cddagl.fileops import OperationCancelled, walk_entries
+from cddagl.functions import delete_path
+from cddagl.i18n import proxy_gettext as _
+from cddagl.install import shares_assets, store_asset
+from cddagl.mirrors import MirroredReply
+from cddagl.network import offline_mode
+
+logger = logging.getLogger('cddagl')
+
+QUEUED = 'queued'
+DOWNLOADING = 'downloading'
+DOWNLOADED = 'downloaded'
+EXTRACTING = 'extracting'
+INSTALLED = 'installed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED_STATES = (INSTALLED, FAILED, CANCELLED)
+
+
+class InstallFailed(Exception):
+    pass
+
+
+def find_mod_dirs(extract_dir):
+    mod_dirs = set()
+
+    # Don't include submod dir/files in mod dir search
+    def in_mod_dir(entry):
+        return os.path.dirname(entry.path) in mod_dirs
+
+    for entry in walk_entries(extract_dir, in_mod_dir):
+        if entry.is_file() and entry.name.lower() == 'modinfo.json':
+            mod_dirs.add(os.path.dirname(entry.path))
+
+    return mod_dirs
+
+
+def find_soundpack_dirs(extract_dir):
+    for entry in walk_entries(extract_dir):
+        if entry.is_file() and entry.name == 'soundpack.txt':
+            return set((os.path.dirname(entry.path), ))
+
+    return set()
+
+
+class ExtractionThread(QThread):
+    progress = pyqtSignal('qint64', 'qint64')
+    completed = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    def __init__(self, item):
+        super(ExtractionThread, self).__init__()
+
+        self.item = item
+        self.cancelled = False
+
+    def __del__(self):
+        self.wait()
+
+    def run(self):
+        item = self.item
+
+        try:
+            extract_archive(item['downloaded_file'], item['extract_dir'],
+                lambda name, extracted, total: self.progress.emit(extracted,
+                    total), lambda: self.cancelled)
+
+            if item['kind'] == 'mod':
+                found_dirs = find_mod_dirs(item['extract_dir'])
+                if len(found_dirs) == 0:
+                    raise InstallFailed(_('There is no mod in the downloaded '
+                        'archive'))
+            else:
+                found_dirs = find_soundpack_dirs(item['extract_dir'])
+                if len(found_dirs) == 0:
+                    raise InstallFailed(_('There is no soundpack in the '
+                        'downloaded archive'))
+
+            for found_dir in found_dirs:
+                basename = os.path.basename(found_dir)
+                if os.path.exists(os.path.join(item['target_dir'], basename)):
+                    raise InstallFailed(_('There is already a {basename} '
+                        'directory in {target_dir}').format(basename=basename,
+                        target_dir=item['target_dir']))
+
+            for found_dir in found_dirs:
+                shutil.move(found_dir, item['target_dir'])
+
+            if item['share_assets']:
+                # Other game directories can link to it instead of
+                # downloading it again
+                for found_dir in found_dirs:
+                    path = os.path.join(item['target_dir'],
+                        os.path.basename(found_dir))
+                    try:
+                        store_asset('soundpack', item['asset_name'], path)
+                    except OSError as e:
+                        logger.warning('Could not store %s: %s', path, e)
+        except OperationCancelled:
+            self.failed.emit('')
+            return
+        except (InstallFailed, ArchiveError) as e:
+            self.failed.emit(str(e))
+            return
+        except OSError as e:
+            logger.exception('Could not install %s', item['name'])
+            self.failed.emit(str(e))
+            return
+
+        self.completed.emit()
+
+
+class InstallQueue(QObject):
+    """Download and install mods and soundpacks in the background.
+
+    A few archives are downloaded at once and the downloaded archives are
+    extracted one at a time by a worker thread. Nothing new is started while
+    the queue is held, which happens during a game update so that the build
+    download gets the bandwidth and the game directory is left alone.
+    """
+
+    item_changed = pyqtSignal(object)
+    item_installed = pyqtSignal(object)
+
+    def __init__(self):
+        super(InstallQueue, self).__init__()
+
+        self.items = []
+        self.held = False
+        self.extraction_thread = None
+
+    def add(self, kind, info, game_dir, target_dir):
+        item = {
+            'kind': kind,
+            'name': info['name'] if kind == 'mod' else info['viewname'],
+            'asset_name': info['name'],
+            'url': info['url'],
+            'game_dir': game_dir,
+            'target_dir': target_dir,
+            'state': QUEUED,
+            'message': None,
+            'progress': (0, 0),
+            'reply': None,
+            'throttle': None,
+            'download_dir': None,
+            'downloaded_file': None,
+            'downloading_file': None,
+            'extract_dir': None,
+            'share_assets': False
+        }
+        self.items.append(item)
+        self.item_changed.emit(item)
+
+        self.schedule()
+        return item
+
+    def is_queued(self, url, target_dir):
+        return any(item['url'] == url and item['target_dir'] == target_dir
+            and item['state'] not in FINISHED_STATES for item in self.items)
+
+    def hold(self, held):
+        self.held = held
+        self.schedule()
+
+    def schedule(self):
+        if self.held:
+            return
+
+        # Queued items wait for the offline mode to be turned off
+        offline = offline_mode()
+        downloading = sum(1 for item in self.items
+            if item['state'] == DOWNLOADING)
+        for item in self.items:
+            if downloading >= cons.INSTALL_QUEUE_DOWNLOADS or offline:
+                break
+            if item['state'] == QUEUED:
+                self.start_download(item)
+                downloading += 1
+
+        if self.extraction_thread is None:
+            for item in self.items:
+                if item['state'] == DOWNLOADED:
+                    self.start_extraction(item)
+                    break
+
+    def set_state(self, item, state, message=None):
+        item['state'] = state
+        item['message'] = message
+        self.item_changed.emit(item)
+
+    def start_download(self, item):
+        item['download_dir'] = tempfile.mkdtemp(prefix=cons.TEMP_PREFIX)
+
+        file_name = QFileInfo(QUrl(item['url']).path()).fileName()
+        item['downloaded_file'] = os.path.join(item['download_dir'],
+            file_name)
+
+        reply = MirroredReply(item['url'], cons.FAKE_USER_AGENT,
+            priority=QNetworkRequest.LowPriority)
+        item['throttle'] = ThrottledReply(reply, QUEUED_DOWNLOAD,
+            lambda data: self.download_ready_read(item, data))
+        reply.downloadProgress.connect(lambda bytes_read, total_bytes:
+            self.download_progress(item, bytes_read, total_bytes))
+        reply.finished.connect(lambda: self.download_finished(item))
+        item['reply'] = reply
+
+        self.set_state(item, DOWNLOADING)
+
+    def download_ready_read(self, item, data):
+        reply = item['reply']
+
+        if item['downloading_file'] is None:
+            cd_header = reply.header(QNetworkRequest.ContentDispositionHeader)
+            if cd_header is not None:
+                ctype, options = parse_options_header(cd_header)
+                if 'filename' in options:
+                    item['downloaded_file'] = os.path.join(
+                        item['download_dir'],
+                        secure_filename(options['filename']))
+
+            item['downloading_file'] = open(item['downloaded_file'], 'wb')
+
+        item['downloading_file'].write(data)
+
+    def download_progress(self, item, bytes_read, total_bytes):
+        item['progress'] = (bytes_read, total_bytes)
+        self.item_changed.emit(item)
+
+    def download_finished(self, item):
+        item['throttle'].finish()
+        item['throttle'] = None
+
+        reply = item['reply']
+        item['reply'] = None
+
+        if item['downloading_file'] is not None:
+            item['downloading_file'].close()
+            item['downloading_file'] = None
+
+        if item['state'] == CANCELLED:
+            delete_path(item['download_dir'])
+        elif reply.error() != QNetworkReply.NoError:
+            delete_path(item['download_dir'])
+            self.set_state(item, FAILED, reply.errorString())
+        elif not os.path.isfile(item['downloaded_file']):
+            delete_path(item['download_dir'])
+            self.set_state(item, FAILED, _('Could not find downloaded '
+                'archive ({file})').format(file=item['downloaded_file']))
+        else:
+            self.set_state(item, DOWNLOADED)
+
+        self.schedule()
+
+    def start_extraction(self, item):
+        extract_dir = os.path.join(item['game_dir'], 'new' + item['kind'])
+        while os.path.exists(extract_dir):
+            extract_dir = os.path.join(item['game_dir'], 'new{kind}-{0}'.format(
+                '%08x' % random.randrange(16**8), kind=item['kind']))
+        item['extract_dir'] = extract_dir
+
+        try:
+            os.makedirs(extract_dir)
+        except OSError as e:
+            self.finish_extraction(item, FAILED, str(e))
+            return
+
+        item['progress'] = (0, 0)
+        item['share_assets'] = (item['kind'] == 'soundpack' and
+            shares_assets(item['game_dir']))
+        self.set_state(item, EXTRACTING)
+
+        extraction_thread = ExtractionThread(item)
+
+        def progress(extracted, total):
+            item['progress'] = (extracted, total)
+            self.item_changed.emit(item)
+
+        def completed():
+            self.finish_extraction(item, INSTALLED)
+            self.item_installed.emit(item)
+
+        def failed(message):
+            if extraction_thread.cancelled:
+                self.finish_extraction(item, CANCELLED)
+            else:
+                self.finish_extraction(item, FAILED, message)
+
+        extraction_thread.progress.connect(progress)
+        extraction_thread.completed.connect(completed)
+        extraction_thread.failed.connect(failed)
+
+        self.extraction_thread = extraction_thread
+        extraction_thread.start()
+
+    def finish_extraction(self, item, state, message=None):
+        self.extraction_thread = None
+
+        if item['extract_dir'] is not None and os.path.isdir(
+            item['extract_dir']):
+            delete_path(item['extract_dir'])
+        delete_path(item['download_dir'])
+
+        self.set_state(item, state, message)
+        self.schedule()
+
+    def cancel(self, item):
+        state = item['state']
+
+        if state == QUEUED:
+            self.set_state(item, CANCELLED)
+        elif state == DOWNLOADED:
+            delete_path(item['download_dir'])
+            self.set_state(item, CANCELLED)
+        elif state == DOWNLOADING:
+            self.set_state(item, CANCELLED)
+            item['reply'].abort()
+        elif state == EXTRACTING:
+            self.extraction_thread.cancelled = True
+
+    def cancel_all(self):
+        for item in list(self.items):
+            self.cancel(item)
+
+    def clear_finished(self):
+        self.items = [item for item in self.items
+            if item['state'] not in FINISHED_STATES]
+
+    def extracting(self, game_dir):
+        """Return True while an archive is extracted and moved into game_dir.
+        Holding the queue does not stop a running extraction."""
+        extraction_thread = self.extraction_thread
+        if extraction_thread is None:
+            return False
+
+        return (os.path.normcase(os.path.abspath(
+            extraction_thread.item['game_dir'])) ==
+            os.path.normcase(os.path.abspath(game_dir)))
+
+    def busy(self):
+        return any(item['state'] not in FINISHED_STATES
+            for item in self.items)
+
+
+_install_queue = None
+
+
+def install_queue():
+    global _install_queue
+    if _install_queue is None:
+        _install_queue = InstallQueue()
+    return _install_queue
@@ -0,0 +1,363 @@
+import logging
+import time
+import urllib.error
+import urllib.request
+
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from PyQt5.QtNetwork import QNetworkReply, QNetworkRequest
+
+import cddagl.constants as cons
+from cddagl.network import network_access_manager, network_request
+from cddagl.sql.functions import (
+    get_config_value, get_mirror_stats, set_mirror_measure, set_mirror_failure
+)
+
+logger = logging.getLogger('cddagl')
+
+
+def mirror_list():
+    return get_config_value('download_mirrors', '').split()
+
+
+def mirror_url(mirror, url):
+    """Return the url of a file on a mirror. Mirrors serve files under the
+    host name and the path of their original url, like
+    http://mirror/github.com/CleverRaven/Cataclysm-DDA/releases/..."""
+    parts = urlsplit(url)
+    return mirror.rstrip('/') + '/' + parts.netloc + parts.path
+
+
+def url_origin(url):
+    parts = urlsplit(url)
+    return parts.scheme + '://' + parts.netloc
+
+
+def candidate_urls(url):
+    """Return the (source, url) pairs a file can be downloaded from. The
+    original url is always the last one."""
+    candidates = [(mirror.rstrip('/'), mirror_url(mirror, url))
+        for mirror in mirror_list()]
+    candidates.append((url_origin(url), url))
+    return candidates
+
+
+def rank_candidates(candidates, stats=None):
+    """Order download sources from the best one to the worst one with their
+    saved measures. Sources which were never measured go after the measured
+    ones and sources which failed recently go last."""
+    if stats is None:
+        stats = get_mirror_stats()
+
+    now = datetime.utcnow()
+    penalty = timedelta(seconds=cons.MIRROR_FAILURE_PENALTY)
+
+    def rank(candidate):
+        stat = stats.get(candidate[0])
+        if stat is None:
+            return (1, 0)
+        if stat['failed_on'] is not None and now - stat['failed_on'] < penalty:
+            return (2, 0)
+        if stat['throughput'] is None:
+            return (1, 0)
+
+        latency = stat['latency'] or 0
+        return (0, latency + cons.MIRROR_REFERENCE_SIZE /
+            max(stat['throughput'], 1))
+
+    # Stable sort, sources with the same rank keep their configured order
+    return sorted(candidates, key=rank)
+
+
+def rankings_fresh(candidates, stats):
+    now = datetime.utcnow()
+    ttl = timedelta(seconds=cons.MIRROR_RANKING_TTL)
+
+    for source, url in candidates:
+        stat = stats.get(source)
+        if stat is None:
+            return False
+        if stat['failed_on'] is not None and now - stat['failed_on'] < ttl:
+            continue
+        if stat['measured_on'] is None or now - stat['measured_on'] > ttl:
+            return False
+
+    return True
+
+
+def urlopen_mirrored(url, headers):
+    """Open url from the best ranked source, falling back on the next one
+    when a source cannot be reached or does not have the file. Meant for
+    worker threads, sources are not measured here."""
+    candidates = rank_candidates(candidate_urls(url))
+
+    for index, (source, candidate_url) in enumerate(candidates):
+        request = urllib.request.Request(candidate_url, headers=headers)
+        try:
+            return urllib.request.urlopen(request,
+                timeout=cons.DOWNLOAD_TIMEOUT)
+        except OSError as e:
+            if index == len(candidates) - 1:
+                raise
+
+            logger.warning('Could not download %s: %s', candidate_url, e)
+            if not (isinstance(e, urllib.error.HTTPError) and e.code == 404):
+                set_mirror_failure(source)
+
+
+class MirroredReply(QObject):
+    """Stand in for the QNetworkReply of a file which can be downloaded from
+    several sources.
+
+    The sources are measured with small range requests when their saved
+    measures are outdated and the file is requested from the best one. When
+    a source fails before any data was handed out, the next one is used
+    instead. Without configured mirrors, the original url is requested
+    right away.
+
+    A finished download also measures its source, unless its reader set
+    throttled because it held the data back: the throughput would then be
+    the one of the bandwidth limit.
+    """
+
+    finished = pyqtSignal()
+    readyRead = pyqtSignal()
+    downloadProgress = pyqtSignal('qint64', 'qint64')
+
+    def __init__(self, url, user_agent=None, cache=True,
+        priority=QNetworkRequest.NormalPriority):
+        super(MirroredReply, self).__init__()
+
+        self.user_agent = user_agent
+        self.cache = cache
+        self.priority = priority
+
+        self.reply = None
+        self.source = None
+        self.read_buffer_size = 0
+        self.delivered = False
+        self.aborted = False
+        self.done = False
+        self.throttled = False
+
+        self.probes = []
+        probe_timer = QTimer()
+        probe_timer.setSingleShot(True)
+        probe_timer.timeout.connect(self.probe_timeout)
+        self.probe_timer = probe_timer
+
+        self.candidates = candidate_urls(url)
+        self.origin = self.candidates[-1][0]
+        if len(self.candidates) == 1:
+            self.start_next()
+            return
+
+        stats = get_mirror_stats()
+        if rankings_fresh(self.candidates, stats):
+            self.candidates = rank_candidates(self.candidates, stats)
+            self.start_next()
+        else:
+            self.probe()
+
+    def probe(self):
+        for source, url in self.candidates:
+            request = network_request(url, self.user_agent, cache=False)
+            request.setRawHeader(b'Range', 'bytes=0-{0}'.format(
+                cons.MIRROR_PROBE_SIZE - 1).encode('ascii'))
+
+            reply = network_access_manager().get(request)
+            probe = {
+                'source': source,
+                'url': url,
+                'reply': reply,
+                'started': time.monotonic(),
+                'first_byte': None,
+                'received': 0,
+                'complete': False,
+                'missing': False
+            }
+            reply.readyRead.connect(lambda probe=probe:
+                self.probe_ready_read(probe))
+            reply.finished.connect(lambda probe=probe:
+                self.probe_finished(probe))
+            self.probes.append(probe)
+
+        self.probe_timer.start(cons.MIRROR_PROBE_TIMEOUT * 1000)
+
+    def probe_ready_read(self, probe):
+        if probe['first_byte'] is None:
+            probe['first_byte'] = time.monotonic()
+
+        probe['received'] += len(probe['reply'].readAll())
+        if probe['received'] >= cons.MIRROR_PROBE_SIZE:
+            # The source might not support range requests
+            probe['complete'] = True
+            probe['reply'].abort()
+
+    def probe_finished(self, probe):
+        if probe not in self.probes:
+            return
+        self.probes.remove(probe)
+
+        reply = probe['reply']
+        if self.aborted:
+            pass
+        elif probe['complete'] or reply.error() == QNetworkReply.NoError:
+            first_byte = probe['first_byte'] or time.monotonic()
+            elapsed = max(time.monotonic() - first_byte, 0.001)
+            set_mirror_measure(probe['source'], first_byte - probe['started'],
+                probe['received'] / elapsed)
+        elif reply.error() == QNetworkReply.ContentNotFoundError:
+            # Only this file is missing from the source
+            probe['missing'] = True
+        else:
+            logger.info('Download source %s failed: %s', probe['source'],
+                reply.errorString())
+            set_mirror_failure(probe['source'])
+
+        if probe['missing'] and probe['source'] != self.origin:
+            self.candidates = [candidate for candidate in self.candidates
+                if candidate[0] != probe['source']]
+
+        if len(self.probes) == 0 and not self.aborted:
+            self.probe_timer.stop()
+            self.candidates = rank_candidates(self.candidates)
+            self.start_next()
+
+    def probe_timeout(self):
+        for probe in list(self.probes):
+            probe['reply'].abort()
+
+    def start_next(self):
+        source, url = self.candidates.pop(0)
+        self.source = source
+
+        request = network_request(url, self.user_agent, self.cache)
+        request.setPriority(self.priority)
+
+        reply = network_access_manager().get(request)
+        reply.setReadBufferSize(self.read_buffer_size)
+        reply.readyRead.connect(lambda: self.reply_ready_read(reply))
+        reply.downloadProgress.connect(lambda bytes_read, total_bytes:
+            self.reply_download_progress(reply, bytes_read, total_bytes))
+        reply.finished.connect(lambda: self.reply_finished(reply))
+        self.reply = reply
+        self.started = time.monotonic()
+        self.bytes_read = 0
+
+    def can_fall_back(self):
+        return (not self.delivered and not self.aborted and
+            len(self.candidates) > 0)
+
+    def reply_ready_read(self, reply):
+        if reply is not self.reply:
+            return
+
+        # An error page is kept from the reader while another source can
+        # be tried
+        status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+        if status is not None and status >= 400 and self.can_fall_back():
+            return
+
+        self.delivered = True
+        self.readyRead.emit()
+
+    def reply_download_progress(self, reply, bytes_read, total_bytes):
+        if reply is not self.reply:
+            return
+
+        self.bytes_read = bytes_read
+        self.downloadProgress.emit(bytes_read, total_bytes)
+
+    def reply_finished(self, reply):
+        if reply is not self.reply:
+            return
+
+        error = reply.error()
+        if error != QNetworkReply.NoError and self.can_fall_back():
+            logger.warning('Could not download %s: %s', reply.url().toString(),
+                reply.errorString())
+            if error != QNetworkReply.ContentNotFoundError:
+                set_mirror_failure(self.source)
+            self.start_next()
+            return
+
+        if (error == QNetworkReply.NoError and not self.throttled and
+            self.bytes_read >= cons.MIRROR_PROBE_SIZE and
+            len(mirror_list()) > 0):
+            elapsed = max(time.monotonic() - self.started, 0.001)
+            set_mirror_measure(self.source, None, self.bytes_read / elapsed)
+
+        if not self.delivered and reply.bytesAvailable() > 0:
+            # No other source is left, hand out the error page
+            self.delivered = True
+            self.readyRead.emit()
+
+        self.done = True
+        self.finished.emit()
+
+    def abort(self):
+        self.aborted = True
+
+        if self.reply is not None:
+            self.reply.abort()
+            return
+
+        self.probe_timer.stop()
+        probes = self.probes
+        self.probes = []
+        for probe in probes:
+            probe['reply'].abort()
+
+        self.done = True
+        self.finished.emit()
+
+    def isRunning(self):
+        return not self.done
+
+    def error(self):
+        if self.reply is None:
+            return QNetworkReply.OperationCanceledError
+        return self.reply.error()
+
+    def errorString(self):
+        if self.reply is None:
+            return ''
+        return self.reply.errorString()
+
+    def url(self):
+        return self.reply.url()
+
+    def attribute(self, code):
+        return self.reply.attribute(code)
+
+    def header(self, header):
+        return self.reply.header(header)
+
+    def hasRawHeader(self, name):
+        return self.reply.hasRawHeader(name)
+
+    def rawHeader(self, name):
+        return self.reply.rawHeader(name)
+
+    def setReadBufferSize(self, size):
+        self.read_buffer_size = size
+        if self.reply is not None:
+            self.reply.setReadBufferSize(size)
+
+    def bytesAvailable(self):
+        if self.reply is None or not self.delivered:
+            return 0
+        return self.reply.bytesAvailable()
+
+    def read(self, size):
+        if self.reply is None or not self.delivered:
+            return b''
+        return self.reply.read(size)
+
+    def readAll(self):
+        if self.reply is None or not self.delivered:
+            return b''
+        return self.reply.readAll()
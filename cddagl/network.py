@@ -0,0 +1,164 @@
+import os
+
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+
+from PyQt5.QtCore import QObject, QUrl, pyqtSignal
+from PyQt5.QtNetwork import (
+    QNetworkAccessManager, QNetworkDiskCache, QNetworkRequest
+)
+
+import cddagl.constants as cons
+from cddagl import __version__ as version
+from cddagl.sql.functions import (
+    get_config_path, get_config_value, get_remote_file_info,
+    set_remote_file_info, config_true
+)
+
+_network_access_manager = None
+
+
+def network_cache_dir():
+    return os.path.join(os.path.dirname(get_config_path()), 'network')
+
+
+def offline_mode():
+    """Return True when the launcher must only use its local caches."""
+    return config_true(get_config_value('offline_mode', 'False'))
+
+
+def network_access_manager():
+    """Return the network access manager shared by the whole launcher so
+    that connections and TLS sessions to the same hosts are reused. Redirects
+    are followed here, a finished reply is always the final one."""
+    global _network_access_manager
+    if _network_access_manager is None:
+        qnam = QNetworkAccessManager()
+        qnam.setRedirectPolicy(QNetworkRequest.NoLessSafeRedirectPolicy)
+
+        disk_cache = QNetworkDiskCache(qnam)
+        disk_cache.setCacheDirectory(network_cache_dir())
+        disk_cache.setMaximumCacheSize(cons.NETWORK_CACHE_SIZE)
+        qnam.setCache(disk_cache)
+
+        _network_access_manager = qnam
+    return _network_access_manager
+
+
+def network_request(url, user_agent=None, cache=True):
+    """Return a request for the shared network access manager. Responses are
+    kept in the disk cache and revalidated unless cache is False, which
+    should be used for large files that are only downloaded once."""
+    if user_agent is None:
+        user_agent = b'CDDA-Game-Launcher/' + version.encode('utf8')
+
+    request = QNetworkRequest(QUrl(url))
+    request.setRawHeader(b'User-Agent', user_agent)
+    request.setAttribute(QNetworkRequest.HTTP2AllowedAttribute, True)
+
+    if not cache:
+        request.setAttribute(QNetworkRequest.CacheLoadControlAttribute,
+            QNetworkRequest.AlwaysNetwork)
+        request.setAttribute(QNetworkRequest.CacheSaveControlAttribute,
+            False)
+
+    return request
+
+
+class RemoteFileProber(QObject):
+    """Find the size and the modification date of remote files with HEAD
+    requests in the background.
+
+    A few files are probed at once. Results are kept in the configuration
+    database and reused until they are REMOTE_FILE_INFO_TTL seconds old.
+    """
+
+    probed = pyqtSignal(str, object, object)
+
+    def __init__(self, user_agent=None):
+        super(RemoteFileProber, self).__init__()
+
+        self.user_agent = user_agent
+        self.queue = []
+        self.replies = {}
+
+    def cached(self, url):
+        """Return the cached size and modification date of a remote file or
+        None when it needs to be probed."""
+        info = get_remote_file_info(url)
+        if info is None:
+            return None
+
+        # Outdated information is better than none while offline
+        age = datetime.utcnow() - info['probed_on']
+        if (age > timedelta(seconds=cons.REMOTE_FILE_INFO_TTL) and
+            not offline_mode()):
+            return None
+
+        return info
+
+    def probe(self, urls, first=False):
+        """Queue urls to be probed. With first, they go before the urls
+        already waiting. Nothing is probed in offline mode."""
+        if offline_mode():
+            return
+
+        urls = [url for url in urls if url not in self.replies]
+        self.queue = [url for url in self.queue if url not in urls]
+
+        if first:
+            self.queue[:0] = urls
+        else:
+            self.queue.extend(urls)
+
+        self.next_probes()
+
+    def next_probes(self):
+        while (len(self.queue) > 0 and
+            len(self.replies) < cons.REMOTE_PROBE_CONCURRENCY):
+            url = self.queue.pop(0)
+
+            request = network_request(url, self.user_agent)
+            reply = network_access_manager().head(request)
+            reply.finished.connect(lambda url=url, reply=reply:
+                self.probe_finished(url, reply))
+            self.replies[url] = reply
+
+    def probe_finished(self, url, reply):
+        if self.replies.get(url) is not reply:
+            # Aborted
+            return
+        del self.replies[url]
+
+        size = None
+        last_modified = None
+        if reply.attribute(QNetworkRequest.HttpStatusCodeAttribute) == 200:
+            if reply.hasRawHeader(b'Content-Length'):
+                try:
+                    size = int(reply.rawHeader(b'Content-Length'))
+                except ValueError:
+                    pass
+
+            if reply.hasRawHeader(b'Last-Modified'):
+                try:
+                    last_modified = parsedate_to_datetime(bytes(
+                        reply.rawHeader(b'Last-Modified')).decode('latin1'))
+                except (TypeError, ValueError):
+                    pass
+                else:
+                    last_modified = last_modified.astimezone(
+                        timezone.utc).replace(tzinfo=None)
+
+            set_remote_file_info(url, size, last_modified)
+
+        self.probed.emit(url, size, last_modified)
+
+        self.next_probes()
+
+    def abort(self):
+        self.queue = []
+
+        replies = list(self.replies.values())
+        self.replies = {}
+        for reply in replies:
+            reply.abort()
@@ -0,0 +1,151 @@
+import json
+import logging
+import re
+
+from functools import lru_cache
+
+logger = logging.getLogger('cddagl')
+
+BUILD_REGEX = re.compile(r'[Bb]uild #?(?P<build>[0-9\-]+)')
+
+# Windows archives of the game, whatever their platform or graphics
+GAME_ASSET_REGEX = re.compile(r'^(cataclysmdda-|cdda-windows-).+\.zip$')
+
+_TOKEN_REGEX = re.compile(rb'[\[\]{}"]')
+_STRING_END_REGEX = re.compile(rb'["\\]')
+
+
+def build_number_key(number):
+    """Sort key of a build number. Old builds are numbered, newer ones are
+    dated like 2021-01-01-0000 and come after them."""
+    if number.isdigit():
+        return (0, int(number), '')
+    return (1, 0, number)
+
+
+@lru_cache(maxsize=None)
+def asset_regexes(asset_platform, asset_graphics, new_asset_platform,
+    new_asset_graphics):
+    """Return the compiled regexes matching the old and the new names of the
+    game archives for a platform."""
+    target_regex = re.compile(r'cataclysmdda-(?P<major>.+)-' +
+        re.escape(asset_platform) + r'-' +
+        re.escape(asset_graphics) + r'-' +
+        r'b?(?P<build>\d+)\.zip'
+        )
+
+    new_target_regex = re.compile(
+        r'cdda-windows-' +
+        re.escape(new_asset_graphics) + r'-' +
+        re.escape(new_asset_platform) + r'-' +
+        r'b?(?P<build>[0-9\-]+)\.zip'
+        )
+
+    return target_regex, new_target_regex
+
+
+def compact_release(release):
+    """Keep only what the launcher uses from a GitHub release. Return None if
+    the release is missing a required field."""
+    if any(x not in release for x in ('id', 'name', 'created_at')):
+        return None
+
+    return {
+        'id': release['id'],
+        'name': release['name'],
+        'created_at': release['created_at'],
+        'assets': [{
+            'name': asset['name'],
+            'browser_download_url': asset['browser_download_url']
+        } for asset in release.get('assets', ())
+            if 'browser_download_url' in asset and 'name' in asset
+            and GAME_ASSET_REGEX.search(asset['name']) is not None]
+    }
+
+
+class ReleaseListParser:
+    """Parse a JSON list of GitHub releases while it is being downloaded.
+
+    Only the boundaries of the releases are tracked while scanning the bytes
+    received so far. Each release is decoded on its own as soon as it is
+    complete and the bytes it used are dropped, so the whole listing is never
+    held in memory at once.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.position = 0
+        self.depth = 0
+        self.in_string = False
+        self.release_start = None
+
+    def feed(self, data):
+        """Add received bytes and return the releases completed by them."""
+        self.buffer.extend(data)
+
+        releases = []
+        buffer = self.buffer
+        position = self.position
+
+        while True:
+            if self.in_string:
+                match = _STRING_END_REGEX.search(buffer, position)
+                if match is None:
+                    position = len(buffer)
+                    break
+
+                if match.group() == b'\\':
+                    if match.end() >= len(buffer):
+                        # Wait for the escaped character
+                        position = match.start()
+                        break
+                    position = match.end() + 1
+                    continue
+
+                self.in_string = False
+                position = match.end()
+                continue
+
+            match = _TOKEN_REGEX.search(buffer, position)
+            if match is None:
+                position = len(buffer)
+                break
+
+            token = match.group()
+            position = match.end()
+
+            if token == b'"':
+                self.in_string = True
+            elif token in (b'[', b'{'):
+                self.depth += 1
+                if self.depth == 2 and token == b'{':
+                    self.release_start = match.start()
+            else:
+                if self.depth == 2 and token == b'}':
+                    release = self.decode(buffer[self.release_start:position])
+                    if release is not None:
+                        releases.append(release)
+
+                    del buffer[:position]
+                    position = 0
+                    self.release_start = None
+                self.depth -= 1
+
+        if self.release_start is None and not self.in_string:
+            del buffer[:position]
+            position = 0
+
+        self.position = position
+        return releases
+
+    def decode(self, data):
+        try:
+            release = json.loads(bytes(data))
+        except (json.decoder.JSONDecodeError, UnicodeDecodeError):
+            logger.warning('Could not decode a release from the list')
+            return None
+
+        if not isinstance(release, dict):
+            return None
+
+        return compact_release(release)
@@ -0,0 +1,113 @@
+import logging
+
+logger = logging.getLogger('cddagl')
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class StageGraph:
+    """Run named stages as soon as all the stages they depend on are done.
+
+    Each stage is started by calling its start function without argument.
+    The stage is running until complete() or fail() is called with its name,
+    which can happen later from a timer, a thread signal or a network reply.
+    Independent stages run at the same time. Everything is expected to happen
+    on the same thread, usually the GUI thread.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.order = []
+        self.cancelled = False
+        self.on_stage_done = None
+
+        self._scheduling = False
+        self._reschedule = False
+
+    def add(self, name, start, after=()):
+        for dependency in after:
+            if dependency not in self.stages:
+                raise ValueError('Unknown stage dependency: ' + dependency)
+
+        self.stages[name] = {
+            'start': start,
+            'after': tuple(after),
+            'state': PENDING
+        }
+        self.order.append(name)
+
+    def state(self, name):
+        if name not in self.stages:
+            return None
+        return self.stages[name]['state']
+
+    def is_running(self, name):
+        return self.state(name) == RUNNING
+
+    def is_done(self, name):
+        return self.state(name) == DONE
+
+    def has_started(self, name):
+        return self.state(name) in (RUNNING, DONE, FAILED)
+
+    def mark_done(self, name):
+        """Consider a stage and everything it depends on done without running
+        them. Used when resuming."""
+        stage = self.stages[name]
+        stage['state'] = DONE
+        for dependency in stage['after']:
+            self.mark_done(dependency)
+
+    def run(self):
+        self._schedule()
+
+    def complete(self, name):
+        if self.cancelled or self.state(name) != RUNNING:
+            return
+
+        self.stages[name]['state'] = DONE
+        logger.debug('Update stage completed: %s', name)
+
+        if self.on_stage_done is not None:
+            self.on_stage_done(name)
+
+        self._schedule()
+
+    def fail(self, name):
+        if self.state(name) == RUNNING:
+            self.stages[name]['state'] = FAILED
+        self.cancelled = True
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _ready(self, name):
+        stage = self.stages[name]
+        return stage['state'] == PENDING and all(
+            self.stages[dependency]['state'] == DONE
+            for dependency in stage['after'])
+
+    def _schedule(self):
+        # Stages can complete synchronously from their start function, avoid
+        # starting the same stage twice by never nesting this loop
+        if self._scheduling:
+            self._reschedule = True
+            return
+
+        self._scheduling = True
+        try:
+            self._reschedule = True
+            while self._reschedule and not self.cancelled:
+                self._reschedule = False
+                for name in self.order:
+                    if self.cancelled:
+                        break
+                    if self._ready(name):
+                        self.stages[name]['state'] = RUNNING
+                        logger.debug('Update stage started: %s', name)
+                        self.stages[name]['start']()
+        finally:
+            self._scheduling = False
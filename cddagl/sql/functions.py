@@ -1,6 +1,9 @@
+import functools
 import os
 import threading
 
+from datetime import datetime
+
 from alembic import command
 from alembic.config import Config
 
@@ -8,7 +11,10 @@ from sqlalchemy import create_engine
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker, joinedload
 
-from cddagl.sql.model import ConfigValue, GameVersion, GameBuild
+from cddagl.sql.model import (ConfigValue, GameVersion, GameBuild, DirectorySize,
+    UpdateJournal, UpdateJournalEntry, InstallManifest, InstallManifestFile,
+    HttpCacheEntry, GithubRelease, GithubReleaseAsset, RemoteFileInfo,
+    MirrorStat, AssetIdent, AssetLink)
 
 
 class ThreadSafeSessionManager():
@@ -28,6 +34,20 @@ class ThreadSafeSessionManager():
         self._lock.release()
 
 
+# SQLite only has one writer at a time. Each thread has its own connection
+# and a thread waiting too long for another one fails with "database is
+# locked", so writes from the launcher threads wait for each other here.
+_write_lock = threading.RLock()
+
+
+def _serialized(function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with _write_lock:
+            return function(*args, **kwargs)
+    return wrapper
+
+
 def get_db_url():
     return 'sqlite:///{0}'.format(get_config_path())
 
@@ -87,6 +107,7 @@ def get_config_value(name, default=None):
     return db_value.value
 
 
+@_serialized
 def set_config_value(name, value):
     session = get_session()
 
@@ -101,6 +122,7 @@ def set_config_value(name, value):
     session.commit()
 
 
+@_serialized
 def new_version(version, sha256, stable):
     session = get_session()
 
@@ -116,6 +138,7 @@ def new_version(version, sha256, stable):
         session.commit()
 
 
+@_serialized
 def new_build(version, sha256, stable, number, release_date):
     session = get_session()
 
@@ -162,5 +185,509 @@ def get_build_from_sha256(sha256):
     return None
 
 
+def get_directory_size(path):
+    session = get_session()
+
+    directory_size = session.query(DirectorySize).filter_by(path=path).first()
+
+    if directory_size is None:
+        return None
+
+    return {
+        'size': directory_size.size,
+        'files': directory_size.files,
+        'mtime': directory_size.mtime,
+        'scanned_on': directory_size.scanned_on
+    }
+
+
+@_serialized
+def set_directory_size(path, files, size, mtime):
+    session = get_session()
+
+    directory_size = session.query(DirectorySize).filter_by(path=path).first()
+
+    if directory_size is None:
+        directory_size = DirectorySize()
+        directory_size.path = path
+
+    directory_size.files = files
+    directory_size.size = size
+    directory_size.mtime = mtime
+    directory_size.scanned_on = datetime.utcnow()
+    session.add(directory_size)
+    session.commit()
+
+
+@_serialized
+def delete_directory_sizes(path):
+    """Delete the sizes of path and of the directories below it."""
+    session = get_session()
+
+    prefix = path.rstrip('\\/') + os.sep
+    for directory_size in session.query(DirectorySize):
+        if (directory_size.path == path or
+            directory_size.path.startswith(prefix)):
+            session.delete(directory_size)
+    session.commit()
+
+
+@_serialized
+def start_update_journal(game_dir, build, downloaded_file, staged):
+    session = get_session()
+
+    # Only one update can be running at a time
+    for journal in session.query(UpdateJournal):
+        session.delete(journal)
+
+    journal = UpdateJournal()
+    journal.game_dir = game_dir
+    journal.build = build
+    journal.downloaded_file = downloaded_file
+    journal.staged = staged
+    session.add(journal)
+    session.commit()
+
+    return journal.id
+
+
+@_serialized
+def add_update_journal_entry(journal_id, kind, name, target=None):
+    session = get_session()
+
+    entry = UpdateJournalEntry()
+    entry.journal = journal_id
+    entry.kind = kind
+    entry.name = name
+    entry.target = target
+    session.add(entry)
+    session.commit()
+
+
+def get_update_journal():
+    session = get_session()
+
+    journal = (session.query(UpdateJournal)
+        .options(joinedload(UpdateJournal.entries))
+        .order_by(UpdateJournal.id.desc())
+        .first())
+
+    if journal is None:
+        return None
+
+    stages = set()
+    moves = []
+    copies = []
+    for entry in journal.entries:
+        if entry.kind == 'stage':
+            stages.add(entry.name)
+        elif entry.kind == 'move':
+            moves.append((entry.name, entry.target))
+        elif entry.kind == 'copy':
+            copies.append((entry.name, entry.target))
+
+    return {
+        'id': journal.id,
+        'game_dir': journal.game_dir,
+        'build': journal.build,
+        'downloaded_file': journal.downloaded_file,
+        'staged': journal.staged,
+        'stages': stages,
+        'moves': moves,
+        'copies': copies,
+        'started_on': journal.started_on
+    }
+
+
+@_serialized
+def close_update_journal(journal_id):
+    session = get_session()
+
+    journal = session.query(UpdateJournal).filter_by(id=journal_id).first()
+    if journal is not None:
+        session.delete(journal)
+        session.commit()
+
+
+def _game_dir_key(game_dir):
+    return os.path.normcase(os.path.abspath(game_dir))
+
+
+@_serialized
+def set_install_manifest(game_dir, build, archive, files):
+    session = get_session()
+
+    game_dir = _game_dir_key(game_dir)
+
+    manifest = session.query(InstallManifest).filter_by(
+        game_dir=game_dir).first()
+    if manifest is not None:
+        session.delete(manifest)
+        session.flush()
+
+    manifest = InstallManifest()
+    manifest.game_dir = game_dir
+    manifest.build = build
+    manifest.archive = archive
+    session.add(manifest)
+    session.flush()
+
+    session.bulk_insert_mappings(InstallManifestFile, [{
+        'manifest': manifest.id,
+        'path': manifest_file['path'],
+        'size': manifest_file['size'],
+        'crc32': manifest_file['crc32'],
+        'mtime': manifest_file['mtime']
+    } for manifest_file in files])
+    session.commit()
+
+
+def has_install_manifest(game_dir):
+    session = get_session()
+
+    return session.query(InstallManifest.id).filter_by(
+        game_dir=_game_dir_key(game_dir)).first() is not None
+
+
+def get_install_manifest(game_dir):
+    session = get_session()
+
+    manifest = session.query(InstallManifest).filter_by(
+        game_dir=_game_dir_key(game_dir)).first()
+
+    if manifest is None:
+        return None
+
+    files = session.query(InstallManifestFile.path, InstallManifestFile.size,
+        InstallManifestFile.crc32, InstallManifestFile.mtime,
+        InstallManifestFile.sha256).filter_by(manifest=manifest.id)
+
+    return {
+        'build': manifest.build,
+        'archive': manifest.archive,
+        'files': [{
+            'path': path,
+            'size': size,
+            'crc32': crc32,
+            'mtime': mtime,
+            'sha256': sha256
+        } for path, size, crc32, mtime, sha256 in files],
+        'created_on': manifest.created_on
+    }
+
+
+@_serialized
+def update_install_manifest_mtimes(game_dir, mtimes):
+    session = get_session()
+
+    manifest = session.query(InstallManifest).filter_by(
+        game_dir=_game_dir_key(game_dir)).first()
+
+    if manifest is None or len(mtimes) == 0:
+        return
+
+    # One executemany by primary key instead of one query per file
+    file_ids = dict(session.query(InstallManifestFile.path,
+        InstallManifestFile.id).filter_by(manifest=manifest.id))
+    session.bulk_update_mappings(InstallManifestFile, [
+        {'id': file_ids[path], 'mtime': mtime}
+        for path, mtime in mtimes.items() if path in file_ids])
+    session.commit()
+
+
+@_serialized
+def update_install_manifest_digests(game_dir, digests):
+    session = get_session()
+
+    manifest = session.query(InstallManifest).filter_by(
+        game_dir=_game_dir_key(game_dir)).first()
+
+    if manifest is None or len(digests) == 0:
+        return
+
+    file_ids = dict(session.query(InstallManifestFile.path,
+        InstallManifestFile.id).filter_by(manifest=manifest.id))
+    session.bulk_update_mappings(InstallManifestFile, [
+        {'id': file_ids[path], 'sha256': digest}
+        for path, digest in digests.items() if path in file_ids])
+    session.commit()
+
+
+def get_install_manifest_digests():
+    """Return the SHA-256 of the shared files of every install manifest as a
+    dict of game directories to sets of digests."""
+    session = get_session()
+
+    digests = {}
+    for game_dir, digest in session.query(InstallManifest.game_dir,
+        InstallManifestFile.sha256).join(InstallManifestFile,
+            InstallManifestFile.manifest == InstallManifest.id).filter(
+                InstallManifestFile.sha256 != None):
+        digests.setdefault(game_dir, set()).add(digest)
+
+    return digests
+
+
+def get_http_cache(url):
+    session = get_session()
+
+    entry = session.query(HttpCacheEntry).filter_by(url=url).first()
+
+    if entry is None:
+        return None
+
+    return {
+        'etag': entry.etag,
+        'last_modified': entry.last_modified,
+        'body': entry.body,
+        'fetched_on': entry.fetched_on
+    }
+
+
+@_serialized
+def set_http_cache(url, etag, last_modified, body):
+    session = get_session()
+
+    entry = session.query(HttpCacheEntry).filter_by(url=url).first()
+
+    if entry is None:
+        entry = HttpCacheEntry()
+        entry.url = url
+
+    entry.etag = etag
+    entry.last_modified = last_modified
+    entry.body = body
+    entry.fetched_on = datetime.utcnow()
+    session.add(entry)
+    session.commit()
+
+
+def has_release(release_id):
+    session = get_session()
+
+    return session.query(GithubRelease.id).filter_by(
+        release_id=release_id).first() is not None
+
+
+@_serialized
+def add_releases(releases):
+    """Add or refresh releases in the local release index. Assets are
+    replaced since they are often uploaded after the release is created."""
+    session = get_session()
+
+    for release in releases:
+        github_release = session.query(GithubRelease).filter_by(
+            release_id=release['id']).first()
+
+        if github_release is None:
+            github_release = GithubRelease()
+            github_release.release_id = release['id']
+
+        github_release.name = release['name']
+        github_release.build = release['build']
+        github_release.created_at = release['created_at']
+        github_release.synced_on = datetime.utcnow()
+
+        github_release.assets = [GithubReleaseAsset(name=asset['name'],
+            url=asset['browser_download_url'])
+            for asset in release['assets']]
+
+        session.add(github_release)
+
+    session.commit()
+
+
+def _release_dict(github_release):
+    return {
+        'id': github_release.release_id,
+        'name': github_release.name,
+        'build': github_release.build,
+        'created_at': github_release.created_at,
+        'assets': [{
+            'name': asset.name,
+            'browser_download_url': asset.url
+        } for asset in github_release.assets]
+    }
+
+
+def get_releases(limit=None):
+    session = get_session()
+
+    query = (session.query(GithubRelease)
+        .options(joinedload(GithubRelease.assets))
+        .order_by(GithubRelease.created_at.desc()))
+    if limit is not None:
+        query = query.limit(limit)
+
+    return [_release_dict(github_release) for github_release in query]
+
+
+def find_release(build):
+    session = get_session()
+
+    github_release = (session.query(GithubRelease)
+        .options(joinedload(GithubRelease.assets))
+        .filter_by(build=build)
+        .order_by(GithubRelease.created_at.desc())
+        .first())
+
+    if github_release is None:
+        return None
+
+    return _release_dict(github_release)
+
+
+def get_remote_file_info(url):
+    session = get_session()
+
+    info = session.query(RemoteFileInfo).filter_by(url=url).first()
+
+    if info is None:
+        return None
+
+    return {
+        'size': info.size,
+        'last_modified': info.last_modified,
+        'probed_on': info.probed_on
+    }
+
+
+@_serialized
+def set_remote_file_info(url, size, last_modified):
+    session = get_session()
+
+    info = session.query(RemoteFileInfo).filter_by(url=url).first()
+
+    if info is None:
+        info = RemoteFileInfo()
+        info.url = url
+
+    info.size = size
+    info.last_modified = last_modified
+    info.probed_on = datetime.utcnow()
+    session.add(info)
+    session.commit()
+
+
+def get_mirror_stats():
+    session = get_session()
+
+    return dict((stat.source, {
+        'latency': stat.latency,
+        'throughput': stat.throughput,
+        'measured_on': stat.measured_on,
+        'failed_on': stat.failed_on
+    }) for stat in session.query(MirrorStat))
+
+
+def _mirror_stat(session, source):
+    stat = session.query(MirrorStat).filter_by(source=source).first()
+
+    if stat is None:
+        stat = MirrorStat()
+        stat.source = source
+
+    return stat
+
+
+@_serialized
+def set_mirror_measure(source, latency, throughput):
+    """Save a measure of a download source. A latency of None keeps the
+    previous one."""
+    session = get_session()
+
+    stat = _mirror_stat(session, source)
+    if latency is not None:
+        stat.latency = latency
+    stat.throughput = throughput
+    stat.measured_on = datetime.utcnow()
+    stat.failed_on = None
+    session.add(stat)
+    session.commit()
+
+
+@_serialized
+def set_mirror_failure(source):
+    session = get_session()
+
+    stat = _mirror_stat(session, source)
+    stat.failed_on = datetime.utcnow()
+    session.add(stat)
+    session.commit()
+
+
+def get_asset_idents(directory):
+    """Return the idents found by the last scan of an assets directory as a
+    dict of entry names to their ident file, its modification time and size
+    and the ident read from it."""
+    session = get_session()
+
+    return dict((asset_ident.name, {
+        'file_name': asset_ident.file_name,
+        'mtime': asset_ident.mtime,
+        'size': asset_ident.size,
+        'ident': asset_ident.ident
+    }) for asset_ident in session.query(AssetIdent).filter_by(
+        directory=directory))
+
+
+@_serialized
+def set_asset_idents(directory, idents):
+    """Replace the saved idents of an assets directory by the ones of its
+    latest scan."""
+    session = get_session()
+
+    session.query(AssetIdent).filter_by(directory=directory).delete()
+
+    scanned_on = datetime.utcnow()
+    for name, values in idents.items():
+        asset_ident = AssetIdent()
+        asset_ident.directory = directory
+        asset_ident.name = name
+        asset_ident.file_name = values['file_name']
+        asset_ident.mtime = values['mtime']
+        asset_ident.size = values['size']
+        asset_ident.ident = values['ident']
+        asset_ident.scanned_on = scanned_on
+        session.add(asset_ident)
+
+    session.commit()
+
+
+@_serialized
+def add_asset_link(entry, path):
+    """Record that path is a copy of an entry of the asset store."""
+    session = get_session()
+
+    asset_link = session.query(AssetLink).filter_by(path=path).first()
+    if asset_link is None:
+        asset_link = AssetLink()
+        asset_link.path = path
+    asset_link.entry = entry
+    asset_link.linked_on = datetime.utcnow()
+    session.add(asset_link)
+    session.commit()
+
+
+def get_asset_links():
+    """Return the recorded copies of the asset store entries as a dict of
+    entries to lists of paths."""
+    session = get_session()
+
+    asset_links = {}
+    for asset_link in session.query(AssetLink):
+        asset_links.setdefault(asset_link.entry, []).append(asset_link.path)
+    return asset_links
+
+
+@_serialized
+def remove_asset_links(paths):
+    session = get_session()
+
+    for path in paths:
+        session.query(AssetLink).filter_by(path=path).delete()
+    session.commit()
+
+
 def config_true(value):
     return value == 'True' or value == '1'
@@ -43,3 +43,159 @@ class GameBuild(Base):
     released_on = sa.Column(sa.DateTime, nullable=False)
     discovered_on = sa.Column(sa.DateTime, nullable=False,
         default=datetime.utcnow)
+
+
+class DirectorySize(Base):
+    __tablename__ = 'directory_size'
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    path = sa.Column(sa.Text(), nullable=False, unique=True)
+    size = sa.Column(sa.BigInteger, nullable=False)
+    files = sa.Column(sa.Integer, nullable=False)
+    mtime = sa.Column(sa.Float, nullable=False)
+    scanned_on = sa.Column(sa.DateTime, nullable=False,
+        default=datetime.utcnow)
+
+
+class UpdateJournal(Base):
+    __tablename__ = 'update_journal'
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    game_dir = sa.Column(sa.Text(), nullable=False)
+    build = sa.Column(sa.Text(), nullable=False)
+    downloaded_file = sa.Column(sa.Text(), nullable=True)
+    staged = sa.Column(sa.Boolean, nullable=False)
+
+    entries = relationship('UpdateJournalEntry',
+        order_by='UpdateJournalEntry.id', cascade='all, delete-orphan')
+
+    started_on = sa.Column(sa.DateTime, nullable=False,
+        default=datetime.utcnow)
+
+
+class UpdateJournalEntry(Base):
+    __tablename__ = 'update_journal_entry'
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    journal = sa.Column(sa.Integer, sa.ForeignKey(UpdateJournal.id),
+        nullable=False)
+    kind = sa.Column(sa.String(16), nullable=False)
+    name = sa.Column(sa.Text(), nullable=False)
+    target = sa.Column(sa.Text(), nullable=True)
+    created_on = sa.Column(sa.DateTime, nullable=False,
+        default=datetime.utcnow)
+
+
+class InstallManifest(Base):
+    __tablename__ = 'install_manifest'
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    game_dir = sa.Column(sa.Text(), nullable=False, unique=True)
+    build = sa.Column(sa.String(16), nullable=True)
+    archive = sa.Column(sa.Text(), nullable=True)
+
+    files = relationship('InstallManifestFile',
+        cascade='all, delete-orphan')
+
+    created_on = sa.Column(sa.DateTime, nullable=False,
+        default=datetime.utcnow)
+
+
+class InstallManifestFile(Base):
+    __tablename__ = 'install_manifest_file'
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    manifest = sa.Column(sa.Integer, sa.ForeignKey(InstallManifest.id),
+        nullable=False)
+    path = sa.Column(sa.Text(), nullable=False)
+    size = sa.Column(sa.BigInteger, nullable=False)
+    crc32 = sa.Column(sa.BigInteger, nullable=False)
+    mtime = sa.Column(sa.Float, nullable=True)
+    # Key of the file in the content store once it is shared
+    sha256 = sa.Column(sa.String(64), nullable=True)
+
+
+class HttpCacheEntry(Base):
+    __tablename__ = 'http_cache_entry'
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    url = sa.Column(sa.Text(), nullable=False, unique=True)
+    etag = sa.Column(sa.Text(), nullable=True)
+    last_modified = sa.Column(sa.Text(), nullable=True)
+    body = sa.Column(sa.LargeBinary(), nullable=False)
+    fetched_on = sa.Column(sa.DateTime, nullable=False,
+        default=datetime.utcnow)
+
+
+class GithubRelease(Base):
+    __tablename__ = 'github_release'
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    release_id = sa.Column(sa.Integer, nullable=False, unique=True)
+    name = sa.Column(sa.Text(), nullable=False)
+    build = sa.Column(sa.String(32), nullable=True)
+    created_at = sa.Column(sa.DateTime, nullable=False)
+
+    assets = relationship('GithubReleaseAsset', order_by='GithubReleaseAsset.id',
+        cascade='all, delete-orphan')
+
+    synced_on = sa.Column(sa.DateTime, nullable=False,
+        default=datetime.utcnow)
+
+
+class GithubReleaseAsset(Base):
+    __tablename__ = 'github_release_asset'
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    release = sa.Column(sa.Integer, sa.ForeignKey(GithubRelease.id),
+        nullable=False)
+    name = sa.Column(sa.Text(), nullable=False)
+    url = sa.Column(sa.Text(), nullable=False)
+
+
+class RemoteFileInfo(Base):
+    __tablename__ = 'remote_file_info'
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    url = sa.Column(sa.Text(), nullable=False, unique=True)
+    size = sa.Column(sa.Integer, nullable=True)
+    last_modified = sa.Column(sa.DateTime, nullable=True)
+    probed_on = sa.Column(sa.DateTime, nullable=False,
+        default=datetime.utcnow)
+
+
+class MirrorStat(Base):
+    __tablename__ = 'mirror_stat'
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    source = sa.Column(sa.Text(), nullable=False, unique=True)
+    latency = sa.Column(sa.Float, nullable=True)
+    throughput = sa.Column(sa.Float, nullable=True)
+    measured_on = sa.Column(sa.DateTime, nullable=True)
+    failed_on = sa.Column(sa.DateTime, nullable=True)
+
+
+class AssetIdent(Base):
+    __tablename__ = 'asset_ident'
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    directory = sa.Column(sa.Text(), nullable=False, index=True)
+    name = sa.Column(sa.Text(), nullable=False)
+    file_name = sa.Column(sa.Text(), nullable=False)
+    mtime = sa.Column(sa.Float, nullable=False)
+    size = sa.Column(sa.BigInteger, nullable=False)
+    ident = sa.Column(sa.Text(), nullable=True)
+    scanned_on = sa.Column(sa.DateTime, nullable=False,
+        default=datetime.utcnow)
+
+
+class AssetLink(Base):
+    __tablename__ = 'asset_link'
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    # Entry of the asset store, relative to the store directory
+    entry = sa.Column(sa.Text(), nullable=False, index=True)
+    # Copy of the stored asset in a game directory
+    path = sa.Column(sa.Text(), nullable=False, unique=True)
+    linked_on = sa.Column(sa.DateTime, nullable=False,
+        default=datetime.utcnow)
@@ -19,6 +19,8 @@ from babel.dates import format_datetime
 from babel.numbers import format_percent
 
 import cddagl.constants as cons
+from cddagl.estimate import estimate_backup, index_directory_size, record_throughput
+from cddagl.fileops import walk_entries
 from cddagl.functions import sizeof_fmt, safe_filename, alphanum_key, delete_path, safe_humanize
 from cddagl.i18n import proxy_gettext as _
 from cddagl.sql.functions import get_config_value, set_config_value, config_true
@@ -895,11 +897,8 @@ class BackupsTab(QTabWidget):
         self.backup_searching = True
         self.backup_compressing = False
 
-        self.backup_files = deque()
-        self.backup_file_sizes = {}
-
+        self.backup_files = None
         self.backup_scan = None
-        self.next_backup_scans = deque()
 
         self.total_backup_size = 0
         self.total_files = 0
@@ -919,7 +918,7 @@ class BackupsTab(QTabWidget):
 
         def timeout():
             if self.backup_scan is None:
-                self.backup_scan = scandir(self.save_dir)
+                self.backup_scan = walk_entries(self.save_dir)
             else:
                 try:
                     entry = next(self.backup_scan)
@@ -929,58 +928,79 @@ class BackupsTab(QTabWidget):
                             _('Found {filename} in {path}').format(
                                 filename=entry.name,
                                 path=os.path.dirname(entry.path)))
-                        self.backup_files.append(entry.path)
                         self.total_backup_size += entry.stat().st_size
-                        self.backup_file_sizes[entry.path
-                            ] = entry.stat().st_size
                         self.total_files += 1
-                    elif entry.is_dir():
-                        self.next_backup_scans.append(entry.path)
                 except StopIteration:
-                    try:
-                        self.backup_scan = scandir(
-                            self.next_backup_scans.popleft())
-                    except IndexError:
-                        self.backup_searching = False
-                        self.backup_compressing = True
+                    self.backup_scan = None
+                    self.backup_searching = False
 
-                        self.compressing_label.setText(
-                            _('Compressing save files'))
-
-                        compressing_speed_label = QLabel()
-                        compressing_speed_label.setText(_('{bytes_sec}/s'
-                            ).format(bytes_sec=sizeof_fmt(0)))
-                        status_bar.addWidget(compressing_speed_label)
-                        self.compressing_speed_label = (
-                            compressing_speed_label)
-
-                        compressing_size_label = QLabel()
-                        compressing_size_label.setText(
-                            '{bytes_read}/{total_bytes}'
-                            .format(bytes_read=sizeof_fmt(0),
-                                    total_bytes=sizeof_fmt(self.total_backup_size))
-                        )
-                        status_bar.addWidget(compressing_size_label)
-                        self.compressing_size_label = (
-                            compressing_size_label)
-
-                        progress_bar = QProgressBar()
-                        progress_bar.setRange(0, self.total_backup_size)
-                        progress_bar.setValue(0)
-                        status_bar.addWidget(progress_bar)
-                        self.compressing_progress_bar = progress_bar
-
-                        self.comp_size = 0
-                        self.comp_files = 0
-                        self.last_comp_bytes = 0
-                        self.last_comp = datetime.utcnow()
-                        self.next_backup_file = None
+                    index_directory_size(self.save_dir, self.total_files,
+                        self.total_backup_size)
 
+                    estimate = estimate_backup(backup_dir,
+                        self.total_backup_size)
+                    if not estimate['enough_space']:
                         if self.compressing_timer is not None:
                             self.compressing_timer.stop()
                             self.compressing_timer = None
 
-                        self.backup_saves_step2()
+                        self.finish_backup_saves()
+                        self.after_backup = None
+
+                        status_bar.showMessage(_('Saves backup cancelled - '
+                            'It needs {required} of free space but only {free} '
+                            'is available').format(
+                                required=sizeof_fmt(estimate['required_size']),
+                                free=sizeof_fmt(estimate['free_size'])))
+                        return
+
+                    self.backup_compressing = True
+
+                    compressing_text = _('Compressing save files')
+                    if estimate['duration'] is not None:
+                        compressing_text = compressing_text + ' - ' + _(
+                            'Estimated time: {duration}').format(
+                                duration=safe_humanize(
+                                    arrow.utcnow().shift(
+                                        seconds=estimate['duration']),
+                                    arrow.utcnow(), locale=self.app_locale,
+                                    only_distance=True))
+                    self.compressing_label.setText(compressing_text)
+
+                    compressing_speed_label = QLabel()
+                    compressing_speed_label.setText(_('{bytes_sec}/s'
+                        ).format(bytes_sec=sizeof_fmt(0)))
+                    status_bar.addWidget(compressing_speed_label)
+                    self.compressing_speed_label = (
+                        compressing_speed_label)
+
+                    compressing_size_label = QLabel()
+                    compressing_size_label.setText(
+                        '{bytes_read}/{total_bytes}'
+                        .format(bytes_read=sizeof_fmt(0),
+                                total_bytes=sizeof_fmt(self.total_backup_size))
+                    )
+                    status_bar.addWidget(compressing_size_label)
+                    self.compressing_size_label = (
+                        compressing_size_label)
+
+                    progress_bar = QProgressBar()
+                    progress_bar.setRange(0, self.total_backup_size)
+                    progress_bar.setValue(0)
+                    status_bar.addWidget(progress_bar)
+                    self.compressing_progress_bar = progress_bar
+
+                    self.comp_size = 0
+                    self.comp_files = 0
+                    self.last_comp_bytes = 0
+                    self.last_comp = datetime.utcnow()
+                    self.next_backup_file = None
+
+                    if self.compressing_timer is not None:
+                        self.compressing_timer.stop()
+                        self.compressing_timer = None
+
+                    self.backup_saves_step2()
 
         timer.timeout.connect(timeout)
         timer.start(0)
@@ -1007,9 +1027,14 @@ class BackupsTab(QTabWidget):
         def backup_next_file():
             try:
                 if self.backup_compressing:
-                    next_file = self.backup_files.popleft()
+                    next_entry = next(self.backup_files)
+                    while not next_entry.is_file():
+                        next_entry = next(self.backup_files)
+
+                    next_file = next_entry.path
                     relpath = os.path.relpath(next_file, self.game_dir)
                     self.next_backup_file = next_file
+                    self.next_backup_size = next_entry.stat().st_size
 
                     self.compressing_label.setText(
                         _('Compressing {filename}').format(filename=relpath))
@@ -1021,10 +1046,15 @@ class BackupsTab(QTabWidget):
 
                     compress_thread.start()
 
-            except IndexError:
+            except StopIteration:
                 self.backup_compressing = False
+                self.backup_files = None
                 self.compress_thread = None
 
+                record_throughput('compress', self.total_backup_size,
+                    (datetime.utcnow() - self.compress_started
+                        ).total_seconds())
+
                 self.finish_backup_saves()
 
                 main_window = self.get_main_window()
@@ -1039,7 +1069,7 @@ class BackupsTab(QTabWidget):
                 self.update_backups_table()
 
         def completed_compress():
-            self.comp_size += self.backup_file_sizes[self.next_backup_file]
+            self.comp_size += self.next_backup_size
             self.compressing_progress_bar.setValue(self.comp_size)
 
             self.compressing_size_label.setText(
@@ -1062,6 +1092,10 @@ class BackupsTab(QTabWidget):
 
             backup_next_file()
 
+        # Walk the saves again instead of keeping every path found while
+        # searching
+        self.backup_files = walk_entries(self.save_dir)
+        self.compress_started = datetime.utcnow()
         self.backup_file = zipfile.ZipFile(self.backup_path, 'w',
             zipfile.ZIP_DEFLATED)
         backup_next_file()
@@ -9,7 +9,8 @@ from urllib.parse import urlencode
 from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import (
     QWidget, QGridLayout, QLabel, QLineEdit, QPushButton, QFileDialog, QToolButton,
-    QDialog, QTextBrowser, QMessageBox, QHBoxLayout, QTextEdit
+    QDialog, QTextBrowser, QMessageBox, QHBoxLayout, QTextEdit, QListWidget,
+    QListWidgetItem
 )
 
 import cddagl.constants as cons
@@ -144,6 +145,71 @@ class BrowserDownloadDialog(QDialog):
         self.done(0)
 
 
+class BatchUpdateDialog(QDialog):
+    def __init__(self, build_number, directories):
+        super(BatchUpdateDialog, self).__init__()
+
+        layout = QGridLayout()
+
+        info_label = QLabel()
+        info_label.setText(_('Build {number} will be downloaded once and '
+            'installed in each of the selected game directories.').format(
+            number=build_number))
+        info_label.setWordWrap(True)
+        layout.addWidget(info_label, 0, 0)
+        self.info_label = info_label
+
+        directories_list = QListWidget()
+        for directory in directories:
+            item = QListWidgetItem(directory)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked)
+            directories_list.addItem(item)
+        layout.addWidget(directories_list, 1, 0)
+        self.directories_list = directories_list
+
+        buttons_container = QWidget()
+        buttons_layout = QHBoxLayout()
+        buttons_layout.setContentsMargins(0, 0, 0, 0)
+        buttons_container.setLayout(buttons_layout)
+
+        update_button = QPushButton()
+        update_button.setText(_('Update selected directories'))
+        update_button.clicked.connect(self.update_clicked)
+        buttons_layout.addWidget(update_button)
+        self.update_button = update_button
+
+        cancel_button = QPushButton()
+        cancel_button.setText(_('Cancel'))
+        cancel_button.clicked.connect(self.cancel_clicked)
+        buttons_layout.addWidget(cancel_button)
+        self.cancel_button = cancel_button
+
+        layout.addWidget(buttons_container, 2, 0, Qt.AlignRight)
+        self.buttons_container = buttons_container
+        self.buttons_layout = buttons_layout
+
+        self.setMinimumSize(480, 300)
+
+        self.setLayout(layout)
+
+        self.setWindowTitle(_('Update several game directories'))
+
+    def selected_directories(self):
+        directories = []
+        for row in range(self.directories_list.count()):
+            item = self.directories_list.item(row)
+            if item.checkState() == Qt.Checked:
+                directories.append(item.text())
+        return directories
+
+    def update_clicked(self):
+        self.done(1)
+
+    def cancel_clicked(self):
+        self.done(0)
+
+
 class FaqDialog(QDialog):
     def __init__(self, parent=0, f=0):
         super(FaqDialog, self).__init__(parent, f)
@@ -5,25 +5,25 @@ import logging
 import os
 import re
 import shutil
-import stat
 import subprocess
 import sys
 import tempfile
+import threading
 import zipfile
 import random
 
-from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 from datetime import datetime, timedelta
-from io import BytesIO, TextIOWrapper
+from io import BytesIO
 from os import scandir
 from pathlib import Path
-from urllib.parse import urljoin
 
 import arrow
 from PyQt5.QtCore import (
     Qt, QTimer, QUrl, QFileInfo, pyqtSignal, QStringListModel, QThread, QRegularExpression
 )
-from PyQt5.QtNetwork import QNetworkAccessManager, QNetworkRequest
+from PyQt5.QtNetwork import QNetworkRequest
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QGridLayout, QGroupBox, QVBoxLayout, QLabel, QLineEdit,
     QPushButton, QFileDialog, QToolButton, QProgressBar, QButtonGroup, QRadioButton,
@@ -35,15 +35,49 @@ from pywintypes import error as PyWinError
 
 import cddagl.constants as cons
 from cddagl.constants import get_cddagl_path, get_cdda_uld_path
-from cddagl import __version__ as version
 from cddagl.functions import (
-    tryint, move_path, is_64_windows, sizeof_fmt, delete_path,
+    move_path, is_64_windows, sizeof_fmt, delete_path,
     clean_qt_path, unique, log_exception, ensure_slash, safe_humanize
 )
+from cddagl.bandwidth import (
+    BACKGROUND as BACKGROUND_DOWNLOAD, FOREGROUND as FOREGROUND_DOWNLOAD,
+    ThrottledReply
+)
+from cddagl.estimate import (
+    estimate_update, forget_directory_sizes, record_throughput
+)
+from cddagl.httpcache import (
+    HTTP_NOT_MODIFIED, cache_reply, cached_body, reply_content
+)
+from cddagl.idents import MOD, SOUNDPACK, TILESET, custom_assets
+from cddagl.fileops import (
+    CopyEngine, DeleteEngine, OperationCancelled, merge_move, walk_entries
+)
+from cddagl.github import BACKGROUND, USER, github_scheduler
+from cddagl.installqueue import install_queue
+from cddagl.mirrors import MirroredReply
+from cddagl.network import offline_mode
+from cddagl.install import (
+    archive_manifest, build_cache_limit, cache_archive, cached_archive,
+    download_build,
+    download_to_cache, extract_build, is_cached_archive, link_asset,
+    link_install, prune_asset_store, prune_store, repair_install,
+    shares_assets, verify_install
+)
+from cddagl.releases import (
+    BUILD_REGEX, ReleaseListParser, asset_regexes, build_number_key,
+    compact_release
+)
+from cddagl.scheduler import StageGraph
+from cddagl.ui.views.dialogs import BatchUpdateDialog
 from cddagl.i18n import proxy_ngettext as ngettext, proxy_gettext as _
 from cddagl.sql.functions import (
     get_config_value, set_config_value, new_version, get_build_from_sha256,
-    new_build, config_true
+    new_build, config_true, start_update_journal, add_update_journal_entry,
+    get_update_journal, close_update_journal, set_install_manifest,
+    has_install_manifest, get_install_manifest, update_install_manifest_mtimes,
+    update_install_manifest_digests,
+    has_release, add_releases, get_releases, find_release
 )
 from cddagl.win32 import (
     find_process_with_file_handle, activate_window, process_id_from_path, wait_for_pid,
@@ -52,6 +86,22 @@ from cddagl.win32 import (
 
 logger = logging.getLogger('cddagl')
 
+# Results of an update, passed to the after_updating callback with a message
+UPDATE_COMPLETED = 'completed'
+UPDATE_FAILED = 'failed'
+UPDATE_CANCELLED = 'cancelled'
+
+
+def extracting_assets(game_dir, status_bar):
+    """Return True, and say so in the status bar, while a queued mod or
+    soundpack is extracted into game_dir, which must be left alone until it
+    is done."""
+    if not install_queue().extracting(game_dir):
+        return False
+
+    status_bar.showMessage(_('Wait until the mod or soundpack being '
+        'installed in this game directory is extracted'))
+    return True
 
 class MainTab(QWidget):
     def __init__(self):
@@ -107,6 +157,7 @@ class GameDirGroupBox(QGroupBox):
 
         self.exe_reading_timer = None
         self.update_saves_timer = None
+        self.verify_thread = None
         self.saves_size = 0
 
         self.dir_combo_inserting = False
@@ -199,6 +250,12 @@ class GameDirGroupBox(QGroupBox):
         buttons_layout.addWidget(restore_button, 0, 3, 1, 1)
         self.restore_button = restore_button
 
+        verify_button = QPushButton()
+        verify_button.setEnabled(False)
+        verify_button.clicked.connect(self.verify_installation)
+        buttons_layout.addWidget(verify_button, 0, 4, 1, 1)
+        self.verify_button = verify_button
+
         layout.addWidget(buttons_container, 4, 0, 1, 3)
         self.buttons_container = buttons_container
         self.buttons_layout = buttons_layout
@@ -218,6 +275,9 @@ class GameDirGroupBox(QGroupBox):
             'directory" option in the settings tab.'))
         self.launch_game_button.setText(_('Launch game'))
         self.restore_button.setText(_('Restore previous version'))
+        self.verify_button.setText(_('Verify installation'))
+        self.verify_button.setToolTip(_('Check the game files against the '
+            'installed build and repair the missing or damaged ones'))
         self.setTitle(_('Game'))
 
     def set_dir_state_icon(self, state):
@@ -241,6 +301,10 @@ class GameDirGroupBox(QGroupBox):
 
             self.last_game_directory = None
 
+            main_tab = self.get_main_tab()
+            update_group_box = main_tab.update_group_box
+            update_group_box.recover_update()
+
             game_directory = get_config_value('game_directory')
             if game_directory is None:
                 documents_path = get_documents_directory()
@@ -273,6 +337,7 @@ class GameDirGroupBox(QGroupBox):
 
         self.launch_game_button.setEnabled(False)
         self.restore_button.setEnabled(False)
+        self.verify_button.setEnabled(False)
 
     def enable_controls(self):
         self.dir_combo.setEnabled(True)
@@ -285,7 +350,294 @@ class GameDirGroupBox(QGroupBox):
         previous_version_dir = os.path.join(directory, 'previous_version')
         self.restore_button.setEnabled(os.path.isdir(previous_version_dir))
 
+        self.update_verify_button()
+
+    def update_verify_button(self):
+        directory = self.dir_combo.currentText()
+        self.verify_button.setEnabled(self.exe_path is not None
+            and self.dir_combo.isEnabled() and has_install_manifest(directory))
+
+    def verify_installation(self):
+        if self.verify_thread is not None:
+            # The button cancels the running verification or repair
+            self.verify_thread.cancelled = True
+            self.verify_button.setEnabled(False)
+            return
+
+        game_dir = self.dir_combo.currentText()
+        manifest = get_install_manifest(game_dir)
+        if manifest is None:
+            return
+
+        main_window = self.get_main_window()
+        status_bar = main_window.statusBar()
+
+        if extracting_assets(game_dir, status_bar):
+            return
+
+        main_tab = self.get_main_tab()
+        update_group_box = main_tab.update_group_box
+
+        # Queued mods and soundpacks wait for the repair
+        install_queue().hold(True)
+
+        self.disable_controls()
+        update_group_box.disable_controls(True)
+
+        class VerifyThread(QThread):
+            progress = pyqtSignal(int)
+            completed = pyqtSignal(list, dict)
+            aborted = pyqtSignal()
+            failed = pyqtSignal(str)
+
+            def __init__(self, game_dir, files):
+                super(VerifyThread, self).__init__()
+
+                self.game_dir = game_dir
+                self.files = files
+                self.cancelled = False
+
+            def __del__(self):
+                self.wait()
+
+            def run(self):
+                def progress(checked):
+                    if (checked % cons.VERIFY_PROGRESS_FILES == 0 or
+                        checked == len(self.files)):
+                        self.progress.emit(checked)
+
+                try:
+                    broken, mtimes = verify_install(self.game_dir, self.files,
+                        progress, lambda: self.cancelled)
+                except OperationCancelled:
+                    self.aborted.emit()
+                    return
+                except OSError as e:
+                    self.failed.emit(str(e))
+                    return
+
+                self.completed.emit(broken, mtimes)
+
+        files = manifest['files']
+
+        status_bar.clearMessage()
+        status_bar.busy += 1
+
+        verify_label = QLabel()
+        verify_label.setText(_('Verifying {count} game files').format(
+            count=len(files)))
+        status_bar.addWidget(verify_label, 100)
+
+        verify_progress_bar = QProgressBar()
+        verify_progress_bar.setRange(0, len(files))
+        status_bar.addWidget(verify_progress_bar)
+
+        def finish_verifying():
+            self.verify_thread = None
+
+            status_bar.removeWidget(verify_label)
+            status_bar.removeWidget(verify_progress_bar)
+            status_bar.busy -= 1
+
+            self.verify_button.setText(_('Verify installation'))
+            self.verify_button.setEnabled(False)
+
+        def completed(broken, mtimes):
+            finish_verifying()
+
+            # Hashed files do not need to be hashed again next time
+            update_install_manifest_mtimes(game_dir, mtimes)
+
+            if len(broken) == 0:
+                install_queue().hold(False)
+                self.enable_controls()
+                update_group_box.enable_controls()
+
+                status_bar.showMessage(_('All {count} game files are '
+                    'intact').format(count=len(files)))
+                return
+
+            logger.info('Damaged or missing game files: {}'.format(
+                ', '.join(broken)))
+            self.repair_installation(game_dir, manifest, broken)
+
+        def aborted():
+            finish_verifying()
+
+            install_queue().hold(False)
+            self.enable_controls()
+            update_group_box.enable_controls()
+
+            status_bar.showMessage(_('Verification cancelled'))
+
+        def failed(error):
+            finish_verifying()
+
+            install_queue().hold(False)
+            self.enable_controls()
+            update_group_box.enable_controls()
+
+            status_bar.showMessage(_('Could not verify the game files: '
+                '{error}').format(error=error))
+
+        verify_thread = VerifyThread(game_dir, files)
+        verify_thread.progress.connect(verify_progress_bar.setValue)
+        verify_thread.completed.connect(completed)
+        verify_thread.aborted.connect(aborted)
+        verify_thread.failed.connect(failed)
+        self.verify_thread = verify_thread
+
+        self.verify_button.setText(_('Cancel verification'))
+        self.verify_button.setEnabled(True)
+
+        verify_thread.start()
+
+    def repair_installation(self, game_dir, manifest, broken):
+        main_window = self.get_main_window()
+        status_bar = main_window.statusBar()
+
+        main_tab = self.get_main_tab()
+        update_group_box = main_tab.update_group_box
+
+        archive_path = cached_archive(manifest['archive'])
+
+        repair_msgbox = QMessageBox()
+        repair_msgbox.setWindowTitle(_('Damaged installation'))
+        repair_msgbox.setText(ngettext(
+            '{count} game file is missing or damaged.',
+            '{count} game files are missing or damaged.',
+            len(broken)).format(count=len(broken)))
+        if archive_path is not None:
+            repair_msgbox.setInformativeText(_('Do you want to repair them '
+                'from the build archive?'))
+            repair_msgbox.addButton(_('Repair the game files'),
+                QMessageBox.YesRole)
+            repair_msgbox.addButton(_('Do not repair'), QMessageBox.NoRole)
+        else:
+            repair_msgbox.setInformativeText(_('The build archive is not '
+                'available anymore. Update the game again to repair your '
+                'installation.'))
+            repair_msgbox.addButton(_('OK'), QMessageBox.YesRole)
+        repair_msgbox.setDetailedText('\n'.join(broken))
+        repair_msgbox.setIcon(QMessageBox.Warning)
+
+        if repair_msgbox.exec() != 0 or archive_path is None:
+            install_queue().hold(False)
+            self.enable_controls()
+            update_group_box.enable_controls()
+
+            status_bar.showMessage(ngettext(
+                '{count} game file is missing or damaged',
+                '{count} game files are missing or damaged',
+                len(broken)).format(count=len(broken)))
+            return
+
+        class RepairThread(QThread):
+            progress = pyqtSignal(int)
+            completed = pyqtSignal(dict)
+            aborted = pyqtSignal(dict)
+            failed = pyqtSignal(str)
+
+            def __init__(self, game_dir, archive_path, paths):
+                super(RepairThread, self).__init__()
+
+                self.game_dir = game_dir
+                self.archive_path = archive_path
+                self.paths = paths
+                self.cancelled = False
+
+            def __del__(self):
+                self.wait()
+
+            def run(self):
+                try:
+                    mtimes = repair_install(self.game_dir, self.archive_path,
+                        self.paths, self.progress.emit, lambda: self.cancelled)
+                except (OSError, zipfile.BadZipFile, KeyError) as e:
+                    self.failed.emit(str(e))
+                    return
+
+                if self.cancelled:
+                    self.aborted.emit(mtimes)
+                else:
+                    self.completed.emit(mtimes)
+
+        status_bar.busy += 1
+
+        repair_label = QLabel()
+        repair_label.setText(_('Repairing {count} game files').format(
+            count=len(broken)))
+        status_bar.addWidget(repair_label, 100)
+
+        repair_progress_bar = QProgressBar()
+        repair_progress_bar.setRange(0, len(broken))
+        status_bar.addWidget(repair_progress_bar)
+
+        def finish_repairing():
+            self.verify_thread = None
+
+            status_bar.removeWidget(repair_label)
+            status_bar.removeWidget(repair_progress_bar)
+            status_bar.busy -= 1
+
+            self.verify_button.setText(_('Verify installation'))
+
+            install_queue().hold(False)
+            self.enable_controls()
+            update_group_box.enable_controls()
+
+            self.last_game_directory = None
+            self.game_directory_changed()
+
+        def record_repaired(mtimes):
+            update_install_manifest_mtimes(game_dir, mtimes)
+            # Repaired files are no longer shared
+            update_install_manifest_digests(game_dir,
+                dict.fromkeys(mtimes))
+
+        def completed(mtimes):
+            record_repaired(mtimes)
+            finish_repairing()
+
+            status_bar.showMessage(ngettext(
+                '{count} game file was repaired',
+                '{count} game files were repaired',
+                len(mtimes)).format(count=len(mtimes)))
+
+        def aborted(mtimes):
+            record_repaired(mtimes)
+            finish_repairing()
+
+            status_bar.showMessage(ngettext(
+                'Repair cancelled - {count} game file was repaired',
+                'Repair cancelled - {count} game files were repaired',
+                len(mtimes)).format(count=len(mtimes)))
+
+        def failed(error):
+            finish_repairing()
+
+            status_bar.showMessage(_('Could not repair the game files: '
+                '{error}').format(error=error))
+
+        repair_thread = RepairThread(game_dir, archive_path, broken)
+        repair_thread.progress.connect(repair_progress_bar.setValue)
+        repair_thread.completed.connect(completed)
+        repair_thread.aborted.connect(aborted)
+        repair_thread.failed.connect(failed)
+        self.verify_thread = repair_thread
+
+        self.verify_button.setText(_('Cancel repair'))
+        self.verify_button.setEnabled(True)
+
+        repair_thread.start()
+
     def restore_previous(self):
+        main_window = self.get_main_window()
+        status_bar = main_window.statusBar()
+
+        if extracting_assets(self.dir_combo.currentText(), status_bar):
+            return
+
         self.disable_controls()
 
         main_tab = self.get_main_tab()
@@ -333,9 +685,6 @@ class GameDirGroupBox(QGroupBox):
 
                 self.restored_previous = True
         except OSError as e:
-            main_window = self.get_main_window()
-            status_bar = main_window.statusBar()
-
             status_bar.showMessage(str(e))
 
         self.last_game_directory = None
@@ -362,6 +711,38 @@ class GameDirGroupBox(QGroupBox):
         if self.game_started:
             return self.focus_game()
 
+        main_window = self.get_main_window()
+        status_bar = main_window.statusBar()
+
+        if extracting_assets(self.dir_combo.currentText(), status_bar):
+            return
+
+        # Install the staged build first, then start the game
+        main_tab = self.get_main_tab()
+        update_group_box = main_tab.update_group_box
+        if not update_group_box.install_staged_build(
+            self.staged_build_installed):
+            self.start_game()
+
+    def staged_build_installed(self, result, message):
+        """Start the game once the staged build is swapped in place. When
+        the swap failed or was cancelled, the game is not started and the
+        reason is shown instead."""
+        if result == UPDATE_COMPLETED:
+            self.start_game()
+            return
+
+        main_window = self.get_main_window()
+        status_bar = main_window.statusBar()
+
+        if message is not None:
+            status_bar.showMessage(message)
+        self.enable_controls()
+
+    def start_game(self):
+        if self.game_started:
+            return
+
         if config_true(get_config_value('backup_on_launch', 'False')):
             main_tab = self.get_main_tab()
             backups_tab = main_tab.get_backups_tab()
@@ -428,6 +809,9 @@ antivirus whitelist or select the action to trust this binary when detected.</p>
         self.game_process = game_process
         self.game_started = True
 
+        # The game writes its saves and config, indexed sizes become stale
+        forget_directory_sizes(exe_dir)
+
         if not config_true(get_config_value('keep_launcher_open', 'False')):
             self.get_main_window().close()
         else:
@@ -679,6 +1063,8 @@ antivirus whitelist or select the action to trust this binary when detected.</p>
 
             self.check_running_process(self.exe_path)
 
+        self.update_verify_button()
+
         self.last_game_directory = directory
         
         set_config_value('game_directory', directory)
@@ -1018,6 +1404,20 @@ antivirus whitelist or select the action to trust this binary when detected.</p>
         timer.timeout.connect(timeout)
         timer.start(0)
 
+    def stop_analysing(self):
+        if (self.exe_reading_timer is not None
+            and self.exe_reading_timer.isActive()):
+            self.opened_exe.close()
+            self.exe_reading_timer.stop()
+
+            main_window = self.get_main_window()
+            status_bar = main_window.statusBar()
+
+            status_bar.removeWidget(self.reading_label)
+            status_bar.removeWidget(self.reading_progress_bar)
+
+            status_bar.busy -= 1
+
     def analyse_new_build(self, build):
         game_dir = self.dir_combo.currentText()
 
@@ -1043,7 +1443,7 @@ antivirus whitelist or select the action to trust this binary when detected.</p>
 
             main_tab = self.get_main_tab()
             update_group_box = main_tab.update_group_box
-            update_group_box.finish_updating()
+            update_group_box.new_build_not_found()
 
             self.launch_game_button.setEnabled(False)
 
@@ -1152,7 +1552,7 @@ antivirus whitelist or select the action to trust this binary when detected.</p>
                     main_tab = self.get_main_tab()
                     update_group_box = main_tab.update_group_box
 
-                    update_group_box.post_extraction()
+                    update_group_box.new_build_analysed()
 
                 else:
                     self.exe_total_read += len(bytes)
@@ -1170,17 +1570,33 @@ class UpdateGroupBox(QGroupBox):
         self.shown = False
         self.updating = False
         self.close_after_update = False
+        self.estimate_thread = None
+        self.update_estimate_message = ''
+        self.staging_thread = None
+        self.staged_build = None
+        self.prefetch_thread = None
+        self.prefetch_after_refresh = False
+        self.after_updating = None
         self.builds = []
         self.progress_rmtree = None
         self.progress_copy = None
+        self.soundpack_copy = None
+        self.restore_threads = {}
+        self.update_graph = None
+        self.update_journal = None
+        self.batch = None
 
-        self.qnam = QNetworkAccessManager()
         self.http_reply = None
 
-        self.api_reply = None
-        self.api_response_content = None
+        github_scheduler().rate_limit_low.connect(self.warn_rate_limit)
 
-        self.find_build_count = 0
+        self.find_build_queue = []
+        self.find_build_lookups = {}
+        self.tag_revalidations = []
+        self.find_build_found = []
+        self.find_build_missing = []
+        self.find_build_skipped = []
+        self.find_build_listing = None
 
         layout = QGridLayout()
 
@@ -1262,7 +1678,7 @@ class UpdateGroupBox(QGroupBox):
 
         find_build_value = QLineEdit()
         find_build_value.setValidator(QRegularExpressionValidator(
-            QRegularExpression(r'\d+(-\d+)*')))
+            QRegularExpression(r'\d+(-\d+)*((\.\.| *, *| +)\d+(-\d+)*)*')))
         find_build_value.returnPressed.connect(self.find_build)
         layout.addWidget(find_build_value, layout_row, 1, 1, 2)
         self.find_build_value = find_build_value
@@ -1301,9 +1717,25 @@ class UpdateGroupBox(QGroupBox):
         self.previous_ub_enabled = False
         update_button.setStyleSheet('font-size: 20px;')
         update_button.clicked.connect(self.update_game)
-        layout.addWidget(update_button, layout_row, 0, 1, 5)
+        layout.addWidget(update_button, layout_row, 0, 2, 4)
         self.update_button = update_button
 
+        stage_button = QPushButton()
+        stage_button.setEnabled(False)
+        stage_button.clicked.connect(self.stage_build)
+        stage_button.setSizePolicy(QSizePolicy.Preferred,
+            QSizePolicy.Expanding)
+        layout.addWidget(stage_button, layout_row, 4)
+        self.stage_button = stage_button
+
+        batch_button = QPushButton()
+        batch_button.setEnabled(False)
+        batch_button.clicked.connect(self.batch_update)
+        batch_button.setSizePolicy(QSizePolicy.Preferred,
+            QSizePolicy.Expanding)
+        layout.addWidget(batch_button, layout_row + 1, 4)
+        self.batch_button = batch_button
+
         layout.setColumnStretch(1, 100)
         layout.setColumnStretch(2, 100)
 
@@ -1319,10 +1751,14 @@ class UpdateGroupBox(QGroupBox):
         self.x86_radio_button.setText('{so} ({bit})'.format(so=_('Windows x86'), bit=_('32-bit')))
         self.available_builds_label.setText(_('Available builds:'))
         self.find_build_label.setText(_('Find build #:'))
+        self.find_build_value.setToolTip(_('Several builds can be found at '
+            'once by separating their numbers with commas. A range of build '
+            'numbers is written as 10500..10510.'))
         self.find_build_button.setText(_('Add to list'))
         self.refresh_builds_button.setText(_('Refresh'))
         self.changelog_groupbox.setTitle(_('Changelog'))
         self.update_button.setText(_('Update game'))
+        self.update_stage_button()
         self.setTitle(_('Update/Installation'))
 
     def showEvent(self, event):
@@ -1363,230 +1799,405 @@ class UpdateGroupBox(QGroupBox):
         self.shown = True
 
     def find_build(self):
-        build_number = self.find_build_value.text()
-        build_number = build_number.strip()
+        """Look up the build numbers typed in the find build field. Numbers
+        can be separated by commas or spaces and ranges of old build numbers
+        are written as 10500..10510.
+
+        Builds are looked up in the local release index first. When several
+        of them are missing, the paged releases listing is synced, which
+        costs one request per hundred releases. Only the builds still
+        missing are looked up by tag, two requests each, as long as the rate
+        limit budget lasts.
+        """
+        if (len(self.find_build_lookups) > 0 or
+            len(self.find_build_queue) > 0 or
+            self.find_build_listing is not None):
+            return
 
-        build_number = re.sub(r'[^0-9\-]', '', build_number)
+        build_numbers = self.parse_build_numbers(self.find_build_value.text())
+        if len(build_numbers) == 0:
+            return
 
-        if build_number == '':
+        self.find_build_queue = build_numbers
+        self.find_build_found = []
+        self.find_build_missing = []
+        self.find_build_skipped = []
+
+        unindexed = [build_number for build_number in build_numbers
+            if self.indexed_build(build_number) is None]
+        if len(unindexed) > 1 and not offline_mode():
+            self.find_build_listing = {
+                'page': 1,
+                'missing': unindexed,
+                'reply': None
+            }
+            self.request_find_build_page()
             return
 
-        if self.find_build_count == 0:
-            url = cons.GITHUB_REST_API_URL + cons.CDDA_RELEASE_BY_TAG(cons.BUILD_TAG(build_number))
-            self.find_build_count = 1
-        elif self.find_build_count == 1:
-            url = cons.GITHUB_REST_API_URL + cons.CDDA_RELEASE_BY_TAG(
-                cons.NEW_BUILD_TAG(build_number))
-            self.find_build_count = 0
+        self.next_build_lookups()
 
-        self.api_response_content = BytesIO()
+    def indexed_build(self, build_number):
+        release = find_release(build_number)
+        if release is not None:
+            builds = self.parse_builds([release])
+            if len(builds) > 0 and builds[0]['url'] is not None:
+                return builds[0]
+        return None
 
-        request = QNetworkRequest(QUrl(url))
-        request.setRawHeader(b'User-Agent',
-            b'CDDA-Game-Launcher/' + version.encode('utf8'))
-        request.setRawHeader(b'Accept', cons.GITHUB_API_VERSION)
+    def budget_allows(self, requests):
+        """Return False when making requests would use the GitHub requests
+        kept in reserve."""
+        requests_left = github_scheduler().requests_left()
+        return (requests_left is None or
+            requests_left - requests >= cons.GITHUB_BACKGROUND_RESERVE)
 
-        self.api_reply = self.qnam.get(request)
-        self.api_reply.finished.connect(self.find_build_finished)
-        self.api_reply.readyRead.connect(self.find_build_ready_read)
+    def request_find_build_page(self):
+        listing = self.find_build_listing
+        content = BytesIO()
 
-    def find_build_finished(self):
-        redirect = self.api_reply.attribute(
-            QNetworkRequest.RedirectionTargetAttribute)
-        if redirect is not None:
-            redirected_url = urljoin(
-                self.api_reply.request().url().toString(),
-                redirect.toString())
-
-            self.api_response_content = BytesIO()
-
-            request = QNetworkRequest(QUrl(redirected_url))
-            request.setRawHeader(b'User-Agent',
-                b'CDDA-Game-Launcher/' + version.encode('utf8'))
-            request.setRawHeader(b'Accept', cons.GITHUB_API_VERSION)
-
-            self.api_reply = self.qnam.get(request)
-            self.api_reply.finished.connect(self.find_build_finished)
-            self.api_reply.readyRead.connect(self.find_build_ready_read)
+        reply = github_scheduler().get(self.releases_page_url(
+            listing['page']))
+        reply.readyRead.connect(lambda: content.write(reply.readAll()))
+        reply.finished.connect(lambda: self.find_build_page_finished(reply,
+            content))
+        listing['reply'] = reply
+
+    def find_build_page_finished(self, reply, content):
+        listing = self.find_build_listing
+
+        status_code, body = reply_content(reply, content)
+
+        releases = None
+        if status_code == 200:
+            try:
+                releases = json.loads(body)
+            except json.decoder.JSONDecodeError:
+                pass
+
+        done = True
+        if isinstance(releases, list):
+            self.index_releases(releases)
+
+            listing['missing'] = [build_number
+                for build_number in listing['missing']
+                if self.indexed_build(build_number) is None]
+
+            # Releases are listed from the newest, the listing went past
+            # the missing builds once its oldest build is older than them
+            page_builds = [build_match.group('build')
+                for build_match in (BUILD_REGEX.search(release['name'])
+                    for release in releases
+                    if isinstance(release, dict) and 'name' in release)
+                if build_match is not None]
+            went_past = (len(page_builds) > 0 and
+                len(listing['missing']) > 0 and
+                min(map(build_number_key, page_builds)) <
+                min(map(build_number_key, listing['missing'])))
+
+            done = (len(listing['missing']) == 0 or went_past or
+                len(releases) < cons.GITHUB_RELEASES_PER_PAGE or
+                listing['page'] >= cons.GITHUB_RELEASES_MAX_PAGES or
+                not self.budget_allows(1))
+
+        if not done:
+            listing['page'] += 1
+            self.request_find_build_page()
             return
-        
-        requests_remaining = None
-        if self.api_reply.hasRawHeader(cons.GITHUB_XRL_REMAINING):
-            requests_remaining = self.api_reply.rawHeader(cons.GITHUB_XRL_REMAINING)
-            requests_remaining = tryint(requests_remaining)
-
-        reset_dt = None
-        if self.api_reply.hasRawHeader(cons.GITHUB_XRL_RESET):
-            reset_dt = self.api_reply.rawHeader(cons.GITHUB_XRL_RESET)
-            reset_dt = tryint(reset_dt)
-            reset_dt = arrow.get(reset_dt)
-
-        if requests_remaining is not None and requests_remaining <= 10:
-            self.warn_rate_limit(requests_remaining, reset_dt)
-        
-        main_window = self.get_main_window()
-        status_bar = main_window.statusBar()
 
-        status_code = self.api_reply.attribute(
-            QNetworkRequest.HttpStatusCodeAttribute)
-        if status_code != 200:
-            self.api_response_content = None
+        self.find_build_listing = None
+        self.next_build_lookups()
+
+    def parse_build_numbers(self, text):
+        build_numbers = []
+        for part in re.split(r'[\s,]+', text.strip()):
+            range_match = re.fullmatch(r'(?P<first>\d+)\.\.(?P<last>\d+)',
+                part)
+            if range_match is not None:
+                first = int(range_match.group('first'))
+                last = int(range_match.group('last'))
+                if first > last:
+                    first, last = last, first
+                last = min(last, first + cons.FIND_BUILD_MAX_RANGE - 1)
+
+                build_numbers.extend(str(number)
+                    for number in range(first, last + 1))
+                continue
 
-            build_number = self.find_build_value.text()
-            build_number = build_number.strip()
+            part = re.sub(r'[^0-9\-]', '', part)
+            if part != '':
+                build_numbers.append(part)
 
-            if self.find_build_count == 0:
-                status_bar.showMessage(_('Build #{build} not found on GitHub'
-                    ).format(build=build_number))
-                return
-            elif self.find_build_count == 1:
-                self.find_build()
-                return
+        return list(unique(build_numbers))
 
-        self.api_response_content.seek(0)
-        try:
-            release = json.loads(TextIOWrapper(self.api_response_content, encoding='utf8'
-                ).read())
-        except json.decoder.JSONDecodeError:
-            release = None
-        self.api_response_content = None
+    def next_build_lookups(self):
+        while (len(self.find_build_queue) > 0 and
+            len(self.find_build_lookups) < cons.FIND_BUILD_CONCURRENCY):
+            build_number = self.find_build_queue.pop(0)
 
-        if release is None:
-            return
-        
-        builds = self.builds
+            # Older builds are usually already in the local release index
+            build = self.indexed_build(build_number)
+            if build is not None:
+                self.find_build_found.append(build)
+                continue
 
-        asset_platform = self.base_asset['Platform']
-        asset_graphics = self.base_asset['Graphics']
+            build = self.cached_tag_build(build_number)
+            if build is not None:
+                self.find_build_found.append(build)
+                continue
 
-        target_regex = re.compile(r'cataclysmdda-(?P<major>.+)-' +
-            re.escape(asset_platform) + r'-' +
-            re.escape(asset_graphics) + r'-' +
-            r'b?(?P<build>\d+)\.zip'
-            )
-        
-        new_asset_platform = self.new_base_asset['Platform']
-        new_asset_graphics = self.new_base_asset['Graphics']
-
-        new_target_regex = re.compile(
-            r'cdda-windows-' +
-            re.escape(new_asset_graphics) + r'-' +
-            re.escape(new_asset_platform) + r'-' +
-            r'b?(?P<build>[0-9\-]+)\.zip'
-            )
+            if offline_mode():
+                self.find_build_missing.append(build_number)
+                continue
 
-        build_regex = re.compile(r'[Bb]uild #?(?P<build>[0-9\-]+)')
+            if not self.budget_allows(2):
+                # Left for when the rate limit budget is reset
+                self.find_build_skipped.append(build_number)
+                continue
 
-        if any(x not in release for x in ('name', 'created_at')):
-            return
+            # Both tag styles are requested at once, the first one found wins
+            self.find_build_lookups[build_number] = []
+            for url in self.tag_urls(build_number):
+                self.start_tag_lookup(build_number, url)
+
+        if len(self.find_build_lookups) == 0:
+            self.find_build_finished()
+
+    def tag_urls(self, build_number):
+        return [cons.GITHUB_REST_API_URL + cons.CDDA_RELEASE_BY_TAG(tag)
+            for tag in (cons.BUILD_TAG(build_number),
+                cons.NEW_BUILD_TAG(build_number))]
+
+    def cached_tag_build(self, build_number):
+        """Return the build of a release found by an earlier tag lookup. It
+        is used right away and the lookup is revalidated in the
+        background."""
+        for url in self.tag_urls(build_number):
+            body = cached_body(url)
+            if body is None:
+                continue
 
-        build_match = build_regex.search(release['name'])
-        build_number = None
-        if build_match is not None:
-            asset = None
-            if 'assets' in release:
-                asset_iter = (
-                    x for x in release['assets']
-                    if 'browser_download_url' in x
-                        and 'name' in x
-                        and (
-                            target_regex.search(x['name']) is not None or
-                            new_target_regex.search(x['name']) is not None )
-                )
-                asset = next(asset_iter, None)
-
-            build = {
-                'url': asset['browser_download_url'] if asset is not None
-                                                        else None,
-                'name': asset['name'] if asset is not None else None,
-                'number': build_match.group('build'),
-                'date': arrow.get(release['created_at']).datetime
-            }
-            build_number = build['number']
+            try:
+                release = json.loads(body)
+            except json.decoder.JSONDecodeError:
+                continue
+            if not isinstance(release, dict):
+                continue
 
-            self.find_build_value.setText('')
+            builds = self.parse_builds([release])
+            if len(builds) > 0 and builds[0]['url'] is not None:
+                if not offline_mode():
+                    self.revalidate_tag_lookup(url, body)
+                return builds[0]
 
-            for existing_build in builds:
-                if existing_build['number'] == build_number:
-                    status_bar.showMessage(
-                        _('Build #{build} is already in the available builds list'
-                        ).format(build=build_number))
-                    return
+        return None
 
-            builds.append(build)
+    def revalidate_tag_lookup(self, url, body):
+        content = BytesIO()
 
-            status_bar.showMessage(_('Build #{build} found and added to the available builds list'
-                ).format(build=build_number))
-        else:
-            return
+        reply = github_scheduler().get(url, BACKGROUND)
+        reply.readyRead.connect(lambda: content.write(reply.readAll()))
+        reply.finished.connect(lambda: self.tag_lookup_revalidated(reply,
+            content, body))
+        self.tag_revalidations.append(reply)
 
-        if len(builds) > 0:
-            builds.sort(key=lambda x: (x['date'], x['number']), reverse=True)
-            self.builds = builds
+    def tag_lookup_revalidated(self, reply, content, body):
+        self.tag_revalidations.remove(reply)
 
-            self.builds_combo.clear()
-            for build in builds:
-                if build['date'] is not None:
-                    build_date = arrow.get(build['date'], 'UTC')
-                    human_delta = safe_humanize(build_date, arrow.utcnow(),
-                        locale=self.app_locale)
-                else:
-                    human_delta = _('Unknown')
+        status_code, new_body = reply_content(reply, content)
+        if status_code != 200 or new_body == body:
+            return
 
-                self.builds_combo.addItem(
-                    '{number} ({delta})'.format(number=build['number'], delta=human_delta),
-                    userData=build
-                )
+        try:
+            release = json.loads(new_body)
+        except json.decoder.JSONDecodeError:
+            return
 
-            combo_model = self.builds_combo.model()
-            default_set = False
-            for x in range(combo_model.rowCount()):
-                if combo_model.item(x).data(Qt.UserRole)['url'] is None:
-                    combo_model.item(x).setEnabled(False)
-                    combo_model.item(x).setText(combo_model.item(x).text() +
-                        _(' - build unavailable'))
-                elif not default_set:
-                    default_set = True
-                    combo_model.item(x).setText(combo_model.item(x).text() +
-                        _(' - latest build available'))
+        # The release changed since it was found, the index is updated for
+        # the next lookups
+        if isinstance(release, dict) and 'id' in release:
+            self.index_releases([release])
 
-                if (combo_model.item(x).data(Qt.UserRole)['number'] == build_number and
-                    combo_model.item(x).isEnabled()):
-                    self.builds_combo.setCurrentIndex(x)
-            self.find_build_count = 0
-        elif self.find_build_count == 1:
-            self.find_build()
+    def start_tag_lookup(self, build_number, url):
+        content = BytesIO()
 
-    def find_build_ready_read(self):
-        self.api_response_content.write(self.api_reply.readAll())
+        reply = github_scheduler().get(url)
+        reply.readyRead.connect(lambda: content.write(reply.readAll()))
+        reply.finished.connect(lambda: self.tag_lookup_finished(build_number,
+            reply, content))
+        self.find_build_lookups[build_number].append(reply)
 
-    def update_game(self):
-        if not self.updating:
-            if self.builds is None or len(self.builds) < 1:
-                main_window = self.get_main_window()
-                status_bar = main_window.statusBar()
+    def tag_lookup_finished(self, build_number, reply, content):
+        replies = self.find_build_lookups.get(build_number)
+        if replies is None or reply not in replies:
+            # The other tag was already found and this one was aborted
+            return
+        replies.remove(reply)
 
-                status_bar.showMessage(_('Cannot update or install the game '
-                    'since no build was found'))
-                return
+        status_code, body = reply_content(reply, content)
 
-            main_tab = self.get_main_tab()
-            game_dir_group_box = main_tab.game_dir_group_box
-            game_dir = game_dir_group_box.dir_combo.currentText()
+        builds = []
+        if status_code == 200:
+            try:
+                release = json.loads(body)
+            except json.decoder.JSONDecodeError:
+                release = None
 
-            # Check if we are installing in an empty directory
-            if (game_dir_group_box.exe_path is None and
-                os.path.exists(game_dir) and
-                os.path.isdir(game_dir)):
+            if isinstance(release, dict):
+                if 'id' in release:
+                    self.index_releases([release])
+                builds = self.parse_builds([release])
 
-                current_scan = scandir(game_dir)
-                game_dir_empty = True
+        if len(builds) > 0:
+            del self.find_build_lookups[build_number]
+            for other_reply in replies:
+                other_reply.abort()
 
-                try:
-                    next(current_scan)
-                    game_dir_empty = False
-                except StopIteration:
-                    pass
+            self.find_build_found.append(builds[0])
+        elif len(replies) == 0:
+            del self.find_build_lookups[build_number]
+
+            self.find_build_missing.append(build_number)
+        else:
+            return
+
+        self.next_build_lookups()
+
+    def find_build_finished(self):
+        main_window = self.get_main_window()
+        status_bar = main_window.statusBar()
+
+        self.find_build_value.setText('')
+
+        found = self.find_build_found
+        missing = self.find_build_missing
+        skipped = self.find_build_skipped
+        added = self.add_found_builds(found)
+
+        self.find_build_found = []
+        self.find_build_missing = []
+        self.find_build_skipped = []
+
+        if len(skipped) > 0:
+            message = _('GitHub rate limit is too low to look up builds: '
+                '{builds}').format(builds=', '.join(skipped))
+            if len(found) + len(missing) > 0:
+                message = ngettext('{count} build added to the available '
+                    'builds list', '{count} builds added to the available '
+                    'builds list', added).format(count=added) + ' - ' + message
+            if len(missing) > 0:
+                message = message + ' - ' + _('Not found on GitHub: {builds}'
+                    ).format(builds=', '.join(missing))
+            status_bar.showMessage(message)
+            return
+
+        if len(found) + len(missing) == 1:
+            if len(missing) > 0:
+                status_bar.showMessage(_('Build #{build} not found on GitHub'
+                    ).format(build=missing[0]))
+            elif added == 0:
+                status_bar.showMessage(
+                    _('Build #{build} is already in the available builds list'
+                    ).format(build=found[0]['number']))
+            else:
+                status_bar.showMessage(_('Build #{build} found and added to the available builds list'
+                    ).format(build=found[0]['number']))
+            return
+
+        message = ngettext('{count} build added to the available builds list',
+            '{count} builds added to the available builds list', added).format(
+                count=added)
+        if len(missing) > 0:
+            message = message + ' - ' + _('Not found on GitHub: {builds}'
+                ).format(builds=', '.join(missing))
+        status_bar.showMessage(message)
+
+    def add_found_builds(self, found_builds):
+        """Add found builds to the available builds list and select the last
+        one. Return the number of builds that were not already listed."""
+        if len(found_builds) == 0:
+            return 0
+
+        if self.builds is None:
+            self.builds = []
+        builds = self.builds
+
+        added = 0
+        for build in found_builds:
+            if any(existing_build['number'] == build['number']
+                for existing_build in builds):
+                continue
+            builds.append(build)
+            added += 1
+
+        build_number = found_builds[-1]['number']
+
+        builds.sort(key=lambda x: (x['date'], x['number']), reverse=True)
+
+        self.builds_combo.clear()
+        for build in builds:
+            if build['date'] is not None:
+                build_date = arrow.get(build['date'], 'UTC')
+                human_delta = safe_humanize(build_date, arrow.utcnow(),
+                    locale=self.app_locale)
+            else:
+                human_delta = _('Unknown')
+
+            self.builds_combo.addItem(
+                '{number} ({delta})'.format(number=build['number'], delta=human_delta),
+                userData=build
+            )
+
+        combo_model = self.builds_combo.model()
+        default_set = False
+        for x in range(combo_model.rowCount()):
+            if combo_model.item(x).data(Qt.UserRole)['url'] is None:
+                combo_model.item(x).setEnabled(False)
+                combo_model.item(x).setText(combo_model.item(x).text() +
+                    _(' - build unavailable'))
+            elif not default_set:
+                default_set = True
+                combo_model.item(x).setText(combo_model.item(x).text() +
+                    _(' - latest build available'))
+
+            if (combo_model.item(x).data(Qt.UserRole)['number'] == build_number and
+                combo_model.item(x).isEnabled()):
+                self.builds_combo.setCurrentIndex(x)
+
+        return added
+
+    def update_game(self):
+        if not self.updating:
+            if self.builds is None or len(self.builds) < 1:
+                main_window = self.get_main_window()
+                status_bar = main_window.statusBar()
+
+                status_bar.showMessage(_('Cannot update or install the game '
+                    'since no build was found'))
+                return
+
+            main_tab = self.get_main_tab()
+            game_dir_group_box = main_tab.game_dir_group_box
+            game_dir = game_dir_group_box.dir_combo.currentText()
+
+            main_window = self.get_main_window()
+            status_bar = main_window.statusBar()
+
+            if extracting_assets(game_dir, status_bar):
+                return
+
+            # Check if we are installing in an empty directory
+            if (game_dir_group_box.exe_path is None and
+                os.path.exists(game_dir) and
+                os.path.isdir(game_dir)):
+
+                current_scan = scandir(game_dir)
+                game_dir_empty = True
+
+                try:
+                    next(current_scan)
+                    game_dir_empty = False
+                except StopIteration:
+                    pass
 
                 if not game_dir_empty:
                     subdir_name = 'cdda'
@@ -1617,148 +2228,244 @@ class UpdateGroupBox(QGroupBox):
                     game_dir = subdir
                     game_dir_group_box.set_dir_combo_value(subdir)
 
-            if config_true(get_config_value('backup_before_update', 'False')):
-                backups_tab = main_tab.get_backups_tab()
-
-                backups_tab.prune_auto_backups()
-
-                name = '{auto}_{name}'.format(auto=_('auto'),
-                    name=_('before_update'))
-
-                backups_tab.after_backup = self.update_game_process
-                backups_tab.backup_saves(name)
+            selected_build = self.builds[self.builds_combo.currentIndex()]
+            if self.get_staged_build(game_dir, selected_build) is not None:
+                # Nothing to download, the staged build is swapped in place
+                self.start_update()
             else:
-                self.update_game_process()
+                self.estimate_update(game_dir)
 
         else:
             # We are currently updating, try to cancel
+            if self.batch is not None:
+                self.batch['cancelled'] = True
+            self.cancel_update()
+
+    def cancel_update(self, message=None):
+        """Stop every running update stage and put back the previous game
+        where it was. The update failed when there is a message, it was
+        cancelled by the user otherwise."""
+        main_tab = self.get_main_tab()
+        game_dir_group_box = main_tab.game_dir_group_box
 
-            main_tab = self.get_main_tab()
-            game_dir_group_box = main_tab.game_dir_group_box
+        main_window = self.get_main_window()
+        status_bar = main_window.statusBar()
 
-            # Are we downloading the file?
-            if self.download_http_reply.isRunning():
-                self.download_aborted = True
-                self.download_http_reply.abort()
+        graph = self.update_graph
 
-                main_window = self.get_main_window()
+        if graph.is_done('finish'):
+            # Only the previous version is being removed, keep the new build
+            if self.progress_rmtree is not None:
+                self.progress_rmtree.stop()
+            return
 
-                status_bar = main_window.statusBar()
+        graph.cancel()
 
-                if game_dir_group_box.exe_path is not None:
-                    if status_bar.busy == 0:
-                        status_bar.showMessage(_('Update cancelled'))
-                else:
-                    if status_bar.busy == 0:
-                        status_bar.showMessage(_('Installation cancelled'))
-            elif self.clearing_previous_dir:
-                if self.progress_rmtree is not None:
-                    self.progress_rmtree.stop()
-            elif self.backing_up_game:
-                self.backup_timer.stop()
+        # Are we downloading the file?
+        downloading = (self.download_http_reply is not None and
+            self.download_http_reply.isRunning())
+        if downloading:
+            self.download_aborted = True
+            self.download_http_reply.abort()
 
-                main_window = self.get_main_window()
-                status_bar = main_window.statusBar()
+        if graph.is_running('backup'):
+            self.backup_timer.stop()
 
-                status_bar.removeWidget(self.backup_label)
-                status_bar.removeWidget(self.backup_progress_bar)
+            status_bar.removeWidget(self.backup_label)
+            status_bar.removeWidget(self.backup_progress_bar)
 
-                status_bar.busy -= 1
+            status_bar.busy -= 1
 
-                self.restore_backup()
+        if graph.is_running('install') and self.extracting_new_build:
+            self.extracting_timer.stop()
+            self.extracting_new_build = False
 
-                if game_dir_group_box.exe_path is not None:
-                    if status_bar.busy == 0:
-                        status_bar.showMessage(_('Update cancelled'))
-                else:
-                    if status_bar.busy == 0:
-                        status_bar.showMessage(_('Installation cancelled'))
+            status_bar.removeWidget(self.extracting_label)
+            status_bar.removeWidget(self.extracting_progress_bar)
 
-            elif self.extracting_new_build:
-                self.extracting_timer.stop()
+            status_bar.busy -= 1
 
-                main_window = self.get_main_window()
-                status_bar = main_window.statusBar()
+            self.extracting_zipfile.close()
 
-                status_bar.removeWidget(self.extracting_label)
-                status_bar.removeWidget(self.extracting_progress_bar)
+        if graph.is_running('analyse'):
+            game_dir_group_box.stop_analysing()
 
-                status_bar.busy -= 1
+        self.stop_restoring()
 
-                self.extracting_zipfile.close()
+        if graph.has_started('install'):
+            path = self.clean_game_dir()
+            self.restore_backup()
+            self.restore_previous_content(path)
+
+            if path is not None:
+                delete_path(path)
+        elif graph.has_started('backup'):
+            self.restore_backup()
+
+        # The testing thread still has the archive opened, it removes it
+        # once it is done
+        if not downloading and not graph.is_running('test'):
+            self.delete_download_dir()
+
+        result = UPDATE_FAILED
+        if message is None:
+            result = UPDATE_CANCELLED
+            if game_dir_group_box.exe_path is not None:
+                message = _('Update cancelled')
+            else:
+                message = _('Installation cancelled')
+
+        if status_bar.busy == 0:
+            status_bar.showMessage(message)
+
+        self.finish_updating(result, message)
 
+    def delete_download_dir(self):
+        if self.downloaded_file is not None:
+            # Archives from the build cache are kept for other updates
+            if not is_cached_archive(self.downloaded_file):
                 download_dir = os.path.dirname(self.downloaded_file)
-                delete_path(download_dir)
+                if os.path.isdir(download_dir):
+                    delete_path(download_dir)
+            self.downloaded_file = None
 
-                path = self.clean_game_dir()
-                self.restore_backup()
-                self.restore_previous_content(path)
+    def estimate_update(self, game_dir):
+        class EstimateUpdateThread(QThread):
+            completed = pyqtSignal(dict)
+            failed = pyqtSignal(str)
 
-                if path is not None:
-                    delete_path(path)
+            def __init__(self, url, game_dir):
+                super(EstimateUpdateThread, self).__init__()
 
-                if game_dir_group_box.exe_path is not None:
-                    if status_bar.busy == 0:
-                        status_bar.showMessage(_('Update cancelled'))
-                else:
-                    if status_bar.busy == 0:
-                        status_bar.showMessage(_('Installation cancelled'))
-            elif self.analysing_new_build:
-                game_dir_group_box.opened_exe.close()
-                game_dir_group_box.exe_reading_timer.stop()
+                self.url = url
+                self.game_dir = game_dir
 
-                main_window = self.get_main_window()
-                status_bar = main_window.statusBar()
+            def __del__(self):
+                self.wait()
 
-                status_bar.removeWidget(game_dir_group_box.reading_label)
-                status_bar.removeWidget(game_dir_group_box.reading_progress_bar)
+            def run(self):
+                try:
+                    estimate = estimate_update(self.url, self.game_dir)
+                except (OSError, ValueError, zipfile.BadZipFile) as e:
+                    self.failed.emit(str(e))
+                    return
 
-                status_bar.busy -= 1
+                self.completed.emit(estimate)
 
-                path = self.clean_game_dir()
-                self.restore_backup()
-                self.restore_previous_content(path)
+        main_window = self.get_main_window()
+        status_bar = main_window.statusBar()
+        status_bar.clearMessage()
+        status_bar.busy += 1
 
-                if path is not None:
-                    delete_path(path)
+        estimating_label = QLabel()
+        estimating_label.setText(_('Estimating the disk space needed for the '
+            'update'))
+        status_bar.addWidget(estimating_label, 100)
 
-                if game_dir_group_box.exe_path is not None:
-                    if status_bar.busy == 0:
-                        status_bar.showMessage(_('Update cancelled'))
-                else:
-                    if status_bar.busy == 0:
-                        status_bar.showMessage(_('Installation cancelled'))
-            elif self.in_post_extraction:
-                self.in_post_extraction = False
+        self.update_button.setEnabled(False)
 
-                if self.progress_copy is not None:
-                    self.progress_copy.stop()
+        def finish_estimate():
+            self.estimate_thread = None
 
-                main_window = self.get_main_window()
-                status_bar = main_window.statusBar()
-                status_bar.clearMessage()
+            status_bar.removeWidget(estimating_label)
+            status_bar.busy -= 1
 
-                path = self.clean_game_dir()
-                self.restore_backup()
-                self.restore_previous_content(path)
+            self.update_button.setEnabled(True)
+
+        def completed(estimate):
+            finish_estimate()
+
+            message = _('Download: {download} - Extracted: {extracted} - '
+                'Copied: {copied} - Moved: {moved} - Free space: {free}'
+                ).format(
+                    download=sizeof_fmt(estimate['download_size']),
+                    extracted=sizeof_fmt(estimate['extracted_size']),
+                    copied=sizeof_fmt(estimate['copy_size']),
+                    moved=sizeof_fmt(estimate['move_size']),
+                    free=sizeof_fmt(estimate['free_size']))
+            if estimate['duration'] is not None:
+                message = message + ' - ' + _('Estimated time: {duration}'
+                    ).format(duration=self.format_duration(
+                        estimate['duration']))
+            logger.info('Update estimate: {0}'.format(estimate))
+
+            if not estimate['enough_space']:
+                space_msgbox = QMessageBox()
+                space_msgbox.setWindowTitle(_('Not enough disk space'))
+                space_msgbox.setText(_('The update needs about {required} '
+                    'of free space but only {free} is available on the drive '
+                    'of the game directory.').format(
+                        required=sizeof_fmt(estimate['required_size']),
+                        free=sizeof_fmt(estimate['free_size'])))
+                space_msgbox.setInformativeText(message)
+                space_msgbox.addButton(_('Update anyway'),
+                    QMessageBox.YesRole)
+                space_msgbox.addButton(_('Cancel the update'),
+                    QMessageBox.NoRole)
+                space_msgbox.setIcon(QMessageBox.Warning)
+
+                if space_msgbox.exec() == 1:
+                    status_bar.showMessage(_('Update cancelled - Not enough '
+                        'disk space'))
+                    return
 
-                if path is not None:
-                    delete_path(path)
+            status_bar.showMessage(message)
+            self.update_estimate_message = message
+            self.start_update()
 
-                if game_dir_group_box.exe_path is not None:
-                    if status_bar.busy == 0:
-                        status_bar.showMessage(_('Update cancelled'))
-                else:
-                    if status_bar.busy == 0:
-                        status_bar.showMessage(_('Installation cancelled'))
+        def failed(error):
+            finish_estimate()
+            self.update_estimate_message = ''
+
+            # The estimate is only informative, do not prevent the update
+            logger.warning('Could not estimate the update: {0}'.format(error))
+            self.start_update()
+
+        url = self.builds[self.builds_combo.currentIndex()]['url']
+
+        estimate_thread = EstimateUpdateThread(url, game_dir)
+        estimate_thread.completed.connect(completed)
+        estimate_thread.failed.connect(failed)
+        self.estimate_thread = estimate_thread
+
+        estimate_thread.start()
+
+    def format_duration(self, seconds):
+        return safe_humanize(arrow.utcnow().shift(seconds=seconds),
+            arrow.utcnow(), locale=self.app_locale, only_distance=True)
+
+    def start_update(self):
+        main_tab = self.get_main_tab()
 
-            self.finish_updating()
+        if config_true(get_config_value('backup_before_update', 'False')):
+            backups_tab = main_tab.get_backups_tab()
+
+            backups_tab.prune_auto_backups()
+
+            name = '{auto}_{name}'.format(auto=_('auto'),
+                name=_('before_update'))
+
+            backups_tab.after_backup = self.update_game_process
+            backups_tab.backup_saves(name)
+        else:
+            self.update_game_process()
 
     def update_game_process(self):
         main_tab = self.get_main_tab()
         game_dir_group_box = main_tab.game_dir_group_box
         game_dir = game_dir_group_box.dir_combo.currentText()
-        
+
+        main_window = self.get_main_window()
+        status_bar = main_window.statusBar()
+
+        # An extraction may have started during the backup of the saves
+        if extracting_assets(game_dir, status_bar):
+            if self.after_updating is not None:
+                after_updating = self.after_updating
+                self.after_updating = None
+                after_updating(UPDATE_FAILED, status_bar.currentMessage())
+            return
+
         logger.info(
             'Updating CDDA...\n'
             'CDDAGL Directory: {}\n'
@@ -1768,19 +2475,22 @@ class UpdateGroupBox(QGroupBox):
 
         self.updating = True
         self.download_aborted = False
-        self.clearing_previous_dir = False
-        self.backing_up_game = False
+        self.download_http_reply = None
+        self.downloaded_file = None
         self.extracting_new_build = False
-        self.analysing_new_build = False
-        self.in_post_extraction = False
+        self.game_dir = game_dir
+        self.update_graph = StageGraph()
 
         self.selected_build = self.builds[self.builds_combo.currentIndex()]
+        self.staged_build = self.get_staged_build(game_dir,
+            self.selected_build)
 
         selected_branch = self.branch_button_group.checkedButton()
         experimental_selected = selected_branch is self.experimental_radio_button
 
         latest_build = self.builds[0]
-        if experimental_selected and game_dir_group_box.current_build == latest_build['number']:
+        if (experimental_selected and self.staged_build is None and
+            game_dir_group_box.current_build == latest_build['number']):
             confirm_msgbox = QMessageBox()
             confirm_msgbox.setWindowTitle(_('Game is up to date'))
             confirm_msgbox.setText(_('You already have the latest version.'
@@ -1797,6 +2507,66 @@ class UpdateGroupBox(QGroupBox):
                 self.updating = False
                 return
 
+        self.begin_updating()
+
+        download_url = None
+        if self.staged_build is None:
+            try:
+                if not os.path.exists(game_dir):
+                    os.makedirs(game_dir)
+                elif os.path.isfile(game_dir):
+                    main_window = self.get_main_window()
+                    status_bar = main_window.statusBar()
+
+                    message = _('Cannot install game on a file')
+                    status_bar.showMessage(message)
+
+                    self.finish_updating(UPDATE_FAILED, message)
+                    return
+
+                download_url = self.selected_build['url']
+
+                url = QUrl(download_url)
+                file_info = QFileInfo(url.path())
+                file_name = file_info.fileName()
+
+                # The build might already be downloaded for another game
+                # directory
+                self.downloaded_file = cached_archive(file_name)
+                if self.downloaded_file is None:
+                    download_dir = tempfile.mkdtemp(prefix=cons.TEMP_PREFIX)
+
+                    self.downloaded_file = os.path.join(download_dir,
+                        file_name)
+                    self.downloading_file = open(self.downloaded_file, 'wb')
+
+            except OSError as e:
+                main_window = self.get_main_window()
+                status_bar = main_window.statusBar()
+
+                self.finish_updating(UPDATE_FAILED, str(e))
+
+                status_bar.showMessage(str(e))
+                return
+
+        self.add_update_stages(download_url)
+
+        self.update_journal = start_update_journal(os.path.abspath(game_dir),
+            self.build_json(self.selected_build), self.downloaded_file,
+            self.staged_build is not None)
+        self.update_graph.on_stage_done = self.journal_stage_done
+
+        self.update_graph.run()
+
+    def begin_updating(self):
+        main_tab = self.get_main_tab()
+        game_dir_group_box = main_tab.game_dir_group_box
+
+        self.cancel_prefetch()
+
+        # Queued mods and soundpacks wait for the game build
+        install_queue().hold(True)
+
         game_dir_group_box.disable_controls()
         self.disable_controls()
 
@@ -1810,38 +2580,218 @@ class UpdateGroupBox(QGroupBox):
         settings_tab.disable_tab()
         backups_tab.disable_tab()
 
-        try:
-            if not os.path.exists(game_dir):
-                os.makedirs(game_dir)
-            elif os.path.isfile(game_dir):
-                main_window = self.get_main_window()
-                status_bar = main_window.statusBar()
+        self.update_stage_button()
+
+        if game_dir_group_box.exe_path is not None:
+            self.update_button.setText(_('Cancel update'))
+        else:
+            self.update_button.setText(_('Cancel installation'))
+
+    def add_update_stages(self, download_url):
+        main_tab = self.get_main_tab()
+        game_dir_group_box = main_tab.game_dir_group_box
 
-                status_bar.showMessage(_('Cannot install game on a file'))
+        graph = self.update_graph
 
-                self.finish_updating()
-                return
+        if self.staged_build is None:
+            if is_cached_archive(self.downloaded_file):
+                # Cached archives were already tested
+                graph.add('download', lambda: graph.complete('download'))
+                graph.add('test', lambda: graph.complete('test'),
+                    after=('download',))
+            else:
+                # The current game is moved aside while the new build is
+                # still downloading
+                graph.add('download', lambda: self.download_game_update(
+                    download_url))
+                graph.add('test', self.test_downloaded_file,
+                    after=('download',))
+            graph.add('clear_previous', self.clear_previous_dir)
+            graph.add('backup', self.backup_current_game,
+                after=('clear_previous',))
+            graph.add('install', self.extract_new_build,
+                after=('test', 'backup'))
+        else:
+            graph.add('clear_previous', self.clear_previous_dir)
+            graph.add('backup', self.backup_current_game,
+                after=('clear_previous',))
+            graph.add('install', self.swap_staged_build, after=('backup',))
+
+        # Custom content is restored while the new executable is hashed
+        graph.add('analyse', lambda: game_dir_group_box.analyse_new_build(
+            self.selected_build), after=('install',))
+        graph.add('copy_dirs', self.restore_previous_dirs, after=('install',))
+        graph.add('tilesets', self.restore_tilesets, after=('install',))
+        graph.add('soundpacks', self.restore_soundpacks, after=('install',))
+        graph.add('mods', self.restore_mods, after=('install',))
+        graph.add('fonts', self.restore_fonts, after=('install',))
+        # The executable cannot be replaced while it is being hashed, the
+        # asset store is pruned once the custom assets are linked and shared
+        # files become read-only once nothing is restored over them anymore
+        graph.add('share', self.share_game_files, after=('analyse',
+            'copy_dirs', 'tilesets', 'soundpacks', 'mods', 'fonts'))
+        graph.add('finish', self.update_stages_completed, after=('analyse',
+            'copy_dirs', 'tilesets', 'soundpacks', 'mods', 'fonts', 'share'))
+
+    def build_json(self, build):
+        return json.dumps({
+            'url': build['url'],
+            'name': build['name'],
+            'number': build['number'],
+            'date': build['date'].isoformat()
+                if build['date'] is not None else None
+        })
+
+    def journal_stage_done(self, name):
+        add_update_journal_entry(self.update_journal, 'stage', name)
+
+    def journal_copy(self, stage, path):
+        # Partial copies are removed before resuming an interrupted stage
+        add_update_journal_entry(self.update_journal, 'copy', stage, path)
+
+    def recover_update(self):
+        """Look for an update that was interrupted by a crash and either
+        resume it or roll it back."""
+        journal = get_update_journal()
+        if journal is None or self.updating:
+            return
+
+        stages = journal['stages']
+        if 'finish' in stages or not os.path.isdir(journal['game_dir']):
+            # Only the previous version was being removed
+            close_update_journal(journal['id'])
+            return
 
-            download_dir = tempfile.mkdtemp(prefix=cons.TEMP_PREFIX)
+        downloaded_file = journal['downloaded_file']
+        can_resume = 'install' in stages or (not journal['staged']
+            and 'test' in stages and 'backup' in stages
+            and downloaded_file is not None
+            and os.path.isfile(downloaded_file))
+
+        build = json.loads(journal['build'])
+
+        recover_msgbox = QMessageBox()
+        recover_msgbox.setWindowTitle(_('Interrupted update'))
+        recover_msgbox.setText(_('The update of {directory} to build {number} '
+            'was interrupted.').format(directory=journal['game_dir'],
+                number=build['number']))
+        if can_resume:
+            recover_msgbox.setInformativeText(_('Do you want to resume the '
+                'update or to put back your previous version?'))
+            recover_msgbox.addButton(_('Resume the update'),
+                QMessageBox.YesRole)
+            recover_msgbox.addButton(_('Put back my previous version'),
+                QMessageBox.NoRole)
+        else:
+            recover_msgbox.setInformativeText(_('The update cannot be resumed. '
+                'Your previous version will be put back.'))
+            recover_msgbox.addButton(_('OK'), QMessageBox.YesRole)
+        recover_msgbox.setIcon(QMessageBox.Warning)
+
+        if recover_msgbox.exec() == 0 and can_resume:
+            # Resume once the game directory is displayed
+            set_config_value('game_directory', journal['game_dir'])
+            QTimer.singleShot(0, lambda: self.resume_update(journal))
+        else:
+            self.rollback_update(journal)
 
-            download_url = self.selected_build['url']
+    def rollback_update(self, journal):
+        main_window = self.get_main_window()
+        status_bar = main_window.statusBar()
 
-            url = QUrl(download_url)
-            file_info = QFileInfo(url.path())
-            file_name = file_info.fileName()
+        self.game_dir = journal['game_dir']
+        stages = journal['stages']
 
-            self.downloaded_file = os.path.join(download_dir, file_name)
-            self.downloading_file = open(self.downloaded_file, 'wb')
+        try:
+            if 'backup' in stages:
+                # Everything left in the game directory is from the new build
+                path = self.clean_game_dir()
+                self.restore_backup()
 
-            self.download_game_update(download_url)
+                if path is not None:
+                    delete_path(path)
 
+                if journal['staged']:
+                    staged_build = json.loads(get_config_value('staged_build',
+                        'null'))
+                    if (staged_build is not None and
+                        os.path.isdir(staged_build['path'])):
+                        delete_path(staged_build['path'])
+                    self.clear_staged_build()
+            else:
+                # Undo the moves of the partial backup, newest first
+                for src, dst in reversed(journal['moves']):
+                    if os.path.exists(dst) and not os.path.exists(src):
+                        shutil.move(dst, src)
+
+                backup_dir = os.path.join(self.game_dir, 'previous_version')
+                if (len(journal['moves']) > 0 and os.path.isdir(backup_dir)
+                    and len(os.listdir(backup_dir)) == 0):
+                    os.rmdir(backup_dir)
         except OSError as e:
-            main_window = self.get_main_window()
-            status_bar = main_window.statusBar()
+            logger.exception('Could not roll back the interrupted update')
+            status_bar.showMessage(_('Could not put back your previous version: '
+                '{error}').format(error=str(e)))
+            return
 
-            self.finish_updating()
+        downloaded_file = journal['downloaded_file']
+        if (downloaded_file is not None and
+            not is_cached_archive(downloaded_file)):
+            download_dir = os.path.dirname(downloaded_file)
+            if os.path.isdir(download_dir):
+                delete_path(download_dir)
 
-            status_bar.showMessage(str(e))
+        close_update_journal(journal['id'])
+
+        status_bar.showMessage(_('The interrupted update was rolled back'))
+
+    def resume_update(self, journal):
+        game_dir = journal['game_dir']
+
+        logger.info(
+            'Resuming CDDA update...\n'
+            'CDDA Directory: {}'
+            .format(game_dir)
+        )
+
+        self.updating = True
+        self.download_aborted = False
+        self.download_http_reply = None
+        self.downloaded_file = journal['downloaded_file']
+        self.extracting_new_build = False
+        self.game_dir = game_dir
+        self.update_graph = StageGraph()
+        self.staged_build = None
+
+        build = json.loads(journal['build'])
+        if build['date'] is not None:
+            build['date'] = arrow.get(build['date']).datetime
+        self.selected_build = build
+
+        self.begin_updating()
+        self.add_update_stages(build['url'])
+
+        graph = self.update_graph
+        for name in journal['stages']:
+            if name in graph.stages:
+                graph.mark_done(name)
+
+        # Start over the interrupted copies
+        for stage, path in journal['copies']:
+            if not graph.is_done(stage):
+                if os.path.isdir(path):
+                    delete_path(path)
+                elif os.path.isfile(path):
+                    os.remove(path)
+
+        self.update_journal = journal['id']
+        graph.on_stage_done = self.journal_stage_done
+
+        main_window = self.get_main_window()
+        status_bar = main_window.statusBar()
+        status_bar.showMessage(_('Resuming the interrupted update'))
+
+        graph.run()
 
     def clean_game_dir(self):
         game_dir = self.game_dir
@@ -1918,6 +2868,7 @@ class UpdateGroupBox(QGroupBox):
         self.previous_ub_enabled = self.update_button.isEnabled()
         if update_button:
             self.update_button.setEnabled(False)
+            self.batch_button.setEnabled(False)
 
     def enable_controls(self, builds_combo=False):
         self.stable_radio_button.setEnabled(True)
@@ -1937,6 +2888,7 @@ class UpdateGroupBox(QGroupBox):
             self.builds_combo.setEnabled(self.previous_bc_enabled)
 
         self.update_button.setEnabled(self.previous_ub_enabled)
+        self.update_batch_button()
 
     def download_game_update(self, url):
         main_window = self.get_main_window()
@@ -1948,6 +2900,7 @@ class UpdateGroupBox(QGroupBox):
 
         downloading_label = QLabel()
         downloading_label.setText(_('Downloading: {0}').format(url))
+        downloading_label.setToolTip(self.update_estimate_message)
         status_bar.addWidget(downloading_label, 100)
         self.downloading_label = downloading_label
 
@@ -1967,27 +2920,20 @@ class UpdateGroupBox(QGroupBox):
         self.download_last_read = datetime.utcnow()
         self.download_last_bytes_read = 0
         self.download_speed_count = 0
+        self.download_started = datetime.utcnow()
 
-        request = QNetworkRequest(QUrl(url))
-        request.setRawHeader(b'User-Agent',
-            b'CDDA-Game-Launcher/' + version.encode('utf8'))
-
-        self.download_http_reply = self.qnam.get(request)
+        # Archives are kept in the build cache instead
+        self.download_http_reply = MirroredReply(url, cache=False)
         self.download_http_reply.finished.connect(self.download_http_finished)
-        self.download_http_reply.readyRead.connect(
-            self.download_http_ready_read)
+        self.download_throttle = ThrottledReply(self.download_http_reply,
+            FOREGROUND_DOWNLOAD, self.download_http_ready_read)
         self.download_http_reply.downloadProgress.connect(
             self.download_dl_progress)
 
-        main_tab = self.get_main_tab()
-        game_dir_group_box = main_tab.game_dir_group_box
-
-        if game_dir_group_box.exe_path is not None:
-            self.update_button.setText(_('Cancel update'))
-        else:
-            self.update_button.setText(_('Cancel installation'))
-
     def download_http_finished(self):
+        self.download_throttle.finish()
+        self.download_throttle = None
+
         self.downloading_file.close()
 
         main_window = self.get_main_window()
@@ -2001,125 +2947,82 @@ class UpdateGroupBox(QGroupBox):
         status_bar.busy -= 1
 
         if self.download_aborted:
-            download_dir = os.path.dirname(self.downloaded_file)
-            delete_path(download_dir)
+            self.delete_download_dir()
         else:
-            redirect = self.download_http_reply.attribute(
-                QNetworkRequest.RedirectionTargetAttribute)
-            if redirect is not None:
-                redirected_url = urljoin(
-                    self.download_http_reply.request().url().toString(),
-                    redirect.toString())
-
-                downloading_label = QLabel()
-                downloading_label.setText(_('Downloading: {0}').format(
-                    redirected_url))
-                status_bar.addWidget(downloading_label, 100)
-                self.downloading_label = downloading_label
-
-                dowloading_speed_label = QLabel()
-                status_bar.addWidget(dowloading_speed_label)
-                self.dowloading_speed_label = dowloading_speed_label
-
-                downloading_size_label = QLabel()
-                status_bar.addWidget(downloading_size_label)
-                self.downloading_size_label = downloading_size_label
-
-                progress_bar = QProgressBar()
-                status_bar.addWidget(progress_bar)
-                self.downloading_progress_bar = progress_bar
-                progress_bar.setMinimum(0)
-
-                self.download_last_read = datetime.utcnow()
-                self.download_last_bytes_read = 0
-                self.download_speed_count = 0
-
-                request = QNetworkRequest(QUrl(redirected_url))
-                request.setRawHeader(b'User-Agent',
-                    b'CDDA-Game-Launcher/' + version.encode('utf8'))
-
-                self.downloading_file = open(self.downloaded_file, 'wb')
-
-                self.download_http_reply = self.qnam.get(request)
-                self.download_http_reply.finished.connect(
-                    self.download_http_finished)
-                self.download_http_reply.readyRead.connect(
-                    self.download_http_ready_read)
-                self.download_http_reply.downloadProgress.connect(
-                    self.download_dl_progress)
+            record_throughput('download', os.path.getsize(self.downloaded_file),
+                (datetime.utcnow() - self.download_started).total_seconds())
 
-                return
+            self.update_graph.complete('download')
 
-            # Test downloaded file
-            status_bar.showMessage(_('Testing downloaded file archive'))
+    def test_downloaded_file(self):
+        main_window = self.get_main_window()
+        status_bar = main_window.statusBar()
 
-            class TestingZipThread(QThread):
-                completed = pyqtSignal()
-                invalid = pyqtSignal()
-                not_downloaded = pyqtSignal()
+        status_bar.showMessage(_('Testing downloaded file archive'))
 
-                def __init__(self, downloaded_file):
-                    super(TestingZipThread, self).__init__()
+        class TestingZipThread(QThread):
+            completed = pyqtSignal()
+            invalid = pyqtSignal()
+            not_downloaded = pyqtSignal()
 
-                    self.downloaded_file = downloaded_file
+            def __init__(self, downloaded_file):
+                super(TestingZipThread, self).__init__()
 
-                def __del__(self):
-                    self.wait()
+                self.downloaded_file = downloaded_file
 
-                def run(self):
-                    try:
-                        with zipfile.ZipFile(self.downloaded_file) as z:
-                            if z.testzip() is not None:
-                                self.invalid.emit()
-                                return
-                    except zipfile.BadZipFile:
-                        self.not_downloaded.emit()
-                        return
+            def __del__(self):
+                self.wait()
 
-                    self.completed.emit()
+            def run(self):
+                try:
+                    with zipfile.ZipFile(self.downloaded_file) as z:
+                        if z.testzip() is not None:
+                            self.invalid.emit()
+                            return
+                except zipfile.BadZipFile:
+                    self.not_downloaded.emit()
+                    return
 
-            def completed_test():
-                self.test_thread = None
+                self.completed.emit()
 
-                status_bar.clearMessage()
-                self.clear_previous_dir()
+        graph = self.update_graph
+        downloaded_file = self.downloaded_file
 
-            def invalid():
-                self.test_thread = None
+        def test_finished():
+            self.test_thread = None
 
-                status_bar.clearMessage()
-                status_bar.showMessage(_('Downloaded archive is invalid'))
+            if graph.cancelled:
+                # The update was cancelled while the archive was opened
+                delete_path(os.path.dirname(downloaded_file))
+                return False
 
-                download_dir = os.path.dirname(self.downloaded_file)
-                delete_path(download_dir)
-                self.finish_updating()
+            status_bar.clearMessage()
+            return True
 
-            def not_downloaded():
-                self.test_thread = None
+        def completed_test():
+            if test_finished():
+                graph.complete('test')
 
-                status_bar.clearMessage()
-                status_bar.showMessage(_('Could not download game'))
+        def invalid():
+            if test_finished():
+                graph.fail('test')
+                self.cancel_update(_('Downloaded archive is invalid'))
 
-                download_dir = os.path.dirname(self.downloaded_file)
-                delete_path(download_dir)
-                self.finish_updating()
+        def not_downloaded():
+            if test_finished():
+                graph.fail('test')
+                self.cancel_update(_('Could not download game'))
 
-            test_thread = TestingZipThread(self.downloaded_file)
-            test_thread.completed.connect(completed_test)
-            test_thread.invalid.connect(invalid)
-            test_thread.not_downloaded.connect(not_downloaded)
-            test_thread.start()
+        test_thread = TestingZipThread(downloaded_file)
+        test_thread.completed.connect(completed_test)
+        test_thread.invalid.connect(invalid)
+        test_thread.not_downloaded.connect(not_downloaded)
+        test_thread.start()
 
-            self.test_thread = test_thread
+        self.test_thread = test_thread
 
     def clear_previous_dir(self):
-        self.clearing_previous_dir = True
-
-        main_tab = self.get_main_tab()
-        game_dir_group_box = main_tab.game_dir_group_box
-
-        game_dir = game_dir_group_box.dir_combo.currentText()
-        self.game_dir = game_dir
+        game_dir = self.game_dir
 
         backup_dir = os.path.join(game_dir, 'previous_version')
         if os.path.isdir(backup_dir):
@@ -2130,25 +3033,19 @@ class UpdateGroupBox(QGroupBox):
                 name=_('previous_version directory')))
 
             if delete_path(backup_dir):
-                self.backup_current_game()
+                status_bar.clearMessage()
+                self.update_graph.complete('clear_previous')
             else:
-                status_bar.showMessage(_('Update cancelled - Could not delete '
+                self.update_graph.fail('clear_previous')
+                self.cancel_update(_('Update cancelled - Could not delete '
                 'the {name}.').format(name=_('previous_version directory')))
-                self.finish_updating()
         else:
-            self.backup_current_game()
+            self.update_graph.complete('clear_previous')
 
     def backup_current_game(self):
-        self.clearing_previous_dir = False
         self.progress_rmtree = None
 
-        self.backing_up_game = True
-
-        main_tab = self.get_main_tab()
-        game_dir_group_box = main_tab.game_dir_group_box
-
-        game_dir = game_dir_group_box.dir_combo.currentText()
-        self.game_dir = game_dir
+        game_dir = self.game_dir
 
         main_window = self.get_main_window()
         status_bar = main_window.statusBar()
@@ -2207,8 +3104,7 @@ class UpdateGroupBox(QGroupBox):
                     status_bar.busy -= 1
                     status_bar.clearMessage()
 
-                    self.backing_up_game = False
-                    self.extract_new_build()
+                    self.update_graph.complete('backup')
 
                 else:
                     backup_element = self.backup_dir_list[self.backup_index]
@@ -2219,27 +3115,19 @@ class UpdateGroupBox(QGroupBox):
                         self.backup_current_display = False
                     else:
                         srcpath = os.path.join(self.game_dir, backup_element)
+                        add_update_journal_entry(self.update_journal, 'move',
+                            srcpath, os.path.join(self.backup_dir,
+                                backup_element))
                         if not move_path(srcpath, self.backup_dir):
-                            self.backup_timer.stop()
-
-                            main_window = self.get_main_window()
-                            status_bar = main_window.statusBar()
-
-                            status_bar.removeWidget(self.backup_label)
-                            status_bar.removeWidget(self.backup_progress_bar)
-
-                            status_bar.busy -= 1
-                            status_bar.clearMessage()
-
-                            self.finish_updating()
-
                             msg = (_('Could not move {srcpath} in {dstpath} .')
                                 ).format(
                                     srcpath=srcpath,
                                     dstpath=self.backup_dir
                                 )
 
-                            status_bar.showMessage(msg)
+                            # Puts back what was already moved
+                            self.cancel_update(msg)
+                            return
 
                         self.backup_index += 1
                         self.backup_current_display = True
@@ -2247,8 +3135,729 @@ class UpdateGroupBox(QGroupBox):
             timer.timeout.connect(timeout)
             timer.start(0)
         else:
-            self.backing_up_game = False
-            self.extract_new_build()
+            self.update_graph.complete('backup')
+
+    def swap_staged_build(self):
+        main_window = self.get_main_window()
+        status_bar = main_window.statusBar()
+
+        staging_dir = self.staged_build['path']
+
+        status_bar.showMessage(_('Installing the staged build'))
+
+        try:
+            # Same volume renames, this only takes a moment. Entries kept in
+            # the game directory during the backup are merged
+            for entry in os.listdir(staging_dir):
+                merge_move(os.path.join(staging_dir, entry),
+                    os.path.join(self.game_dir, entry))
+            os.rmdir(staging_dir)
+        except OSError as e:
+            self.clear_staged_build()
+            self.update_graph.fail('install')
+            self.cancel_update(_('Could not install the staged build: '
+                '{error}').format(error=str(e)))
+            return
+
+        archive_path = cached_archive(self.staged_build.get('archive'))
+        self.clear_staged_build()
+        status_bar.clearMessage()
+
+        if archive_path is not None:
+            self.record_install_manifest(archive_path)
+
+        self.update_graph.complete('install')
+
+    def staging_dir(self, game_dir):
+        return os.path.normpath(os.path.abspath(game_dir)) + '.staged'
+
+    def get_staged_build(self, game_dir, build=None):
+        """Return the staged build for game_dir if there is one ready. When
+        build is given, only return it if it is the same build."""
+        staged_build = json.loads(get_config_value('staged_build', 'null'))
+        if staged_build is None:
+            return None
+
+        if (os.path.normcase(staged_build['game_dir']) !=
+                os.path.normcase(os.path.abspath(game_dir))
+            or not os.path.isdir(staged_build['path'])):
+            return None
+
+        if build is not None and staged_build['url'] != build['url']:
+            return None
+
+        staged_build['date'] = arrow.get(staged_build['date']).datetime
+
+        return staged_build
+
+    def clear_staged_build(self):
+        set_config_value('staged_build', 'null')
+        self.staged_build = None
+
+    def update_stage_button(self):
+        self.update_batch_button()
+
+        if self.staging_thread is not None:
+            self.stage_button.setText(_('Cancel staging'))
+            self.stage_button.setEnabled(True)
+            return
+
+        self.stage_button.setText(_('Stage next build'))
+        self.stage_button.setToolTip(_('Download and extract the selected '
+            'build in the background, even while the game is running. It '
+            'will be installed in a few seconds at the next update or '
+            'launch.'))
+        self.stage_button.setEnabled(not self.updating and
+            self.batch is None and self.builds is not None and
+            len(self.builds) > 0)
+
+    def update_batch_button(self):
+        if self.batch is not None:
+            self.batch_button.setText(_('Cancel batch update'))
+            self.batch_button.setEnabled(not self.batch['cancelled'])
+            return
+
+        self.batch_button.setText(_('Update several'))
+        self.batch_button.setToolTip(_('Download the selected build once '
+            'and install it in several of your game directories.'))
+        self.batch_button.setEnabled(not self.updating and
+            self.staging_thread is None and self.builds is not None and
+            len(self.builds) > 0)
+
+    def stage_build(self):
+        main_window = self.get_main_window()
+        status_bar = main_window.statusBar()
+
+        if self.staging_thread is not None:
+            self.staging_thread.cancelled = True
+            self.stage_button.setEnabled(False)
+            return
+
+        if self.builds is None or len(self.builds) < 1:
+            return
+
+        main_tab = self.get_main_tab()
+        game_dir_group_box = main_tab.game_dir_group_box
+        game_dir = game_dir_group_box.dir_combo.currentText()
+
+        build = self.builds[self.builds_combo.currentIndex()]
+        if build['url'] is None:
+            return
+
+        class StagingThread(QThread):
+            progress = pyqtSignal(str, int, int)
+            completed = pyqtSignal()
+            aborted = pyqtSignal()
+            failed = pyqtSignal(str)
+
+            def __init__(self, url, archive_name, staging_dir):
+                super(StagingThread, self).__init__()
+
+                self.url = url
+                self.archive_name = archive_name
+                self.staging_dir = staging_dir
+                self.cancelled = False
+
+            def __del__(self):
+                self.wait()
+
+            def run(self):
+                error = None
+                download_dir = tempfile.mkdtemp(prefix=cons.TEMP_PREFIX)
+                try:
+                    if os.path.exists(self.staging_dir):
+                        shutil.rmtree(self.staging_dir)
+
+                    archive_path = os.path.join(download_dir,
+                        self.archive_name)
+                    download_build(self.url, archive_path, self.downloading,
+                        lambda: self.cancelled)
+                    extract_build(archive_path, self.staging_dir,
+                        self.extracting, lambda: self.cancelled)
+
+                    # Kept to repair the install later
+                    cache_archive(archive_path)
+                except OperationCancelled:
+                    pass
+                except (OSError, zipfile.BadZipFile) as e:
+                    error = str(e)
+                finally:
+                    shutil.rmtree(download_dir, ignore_errors=True)
+                    if self.cancelled or error is not None:
+                        shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+                if error is not None:
+                    self.failed.emit(error)
+                elif self.cancelled:
+                    self.aborted.emit()
+                else:
+                    self.completed.emit()
+
+            def downloading(self, bytes_read, total_bytes):
+                self.progress.emit(_('Staging - Downloading {size}').format(
+                    size=sizeof_fmt(bytes_read)), bytes_read // 1024,
+                    total_bytes // 1024)
+
+            def extracting(self, filename, extracted, total):
+                self.progress.emit(_('Staging - Extracting {0}').format(
+                    filename), extracted, total)
+
+        staging_dir = self.staging_dir(game_dir)
+
+        status_bar.busy += 1
+
+        staging_label = QLabel()
+        staging_label.setText(_('Staging build {number}').format(
+            number=build['number']))
+        status_bar.addWidget(staging_label, 100)
+
+        staging_progress_bar = QProgressBar()
+        status_bar.addWidget(staging_progress_bar)
+
+        def progress(text, value, maximum):
+            staging_label.setText(text)
+            staging_progress_bar.setRange(0, maximum)
+            staging_progress_bar.setValue(value)
+
+        def finish_staging():
+            self.staging_thread = None
+
+            status_bar.removeWidget(staging_label)
+            status_bar.removeWidget(staging_progress_bar)
+            status_bar.busy -= 1
+
+            self.update_stage_button()
+
+        def completed():
+            finish_staging()
+
+            set_config_value('staged_build', json.dumps({
+                'game_dir': os.path.abspath(game_dir),
+                'path': staging_dir,
+                'url': build['url'],
+                'name': build['name'],
+                'number': build['number'],
+                'date': build['date'].isoformat()
+                    if build['date'] is not None else None,
+                'archive': archive_name
+            }))
+
+            status_bar.showMessage(_('Build {number} is staged and will be '
+                'installed at the next update or launch').format(
+                    number=build['number']))
+
+        def aborted():
+            finish_staging()
+
+            status_bar.showMessage(_('Staging cancelled'))
+
+        def failed(error):
+            finish_staging()
+
+            status_bar.showMessage(_('Could not stage build {number}: '
+                '{error}').format(number=build['number'], error=error))
+
+        archive_name = QFileInfo(QUrl(build['url']).path()).fileName()
+
+        staging_thread = StagingThread(build['url'], archive_name, staging_dir)
+        staging_thread.progress.connect(progress)
+        staging_thread.completed.connect(completed)
+        staging_thread.aborted.connect(aborted)
+        staging_thread.failed.connect(failed)
+        self.staging_thread = staging_thread
+
+        # A previous staged build is replaced by this one
+        self.clear_staged_build()
+        self.cancel_prefetch()
+
+        staging_thread.start()
+        self.update_stage_button()
+
+    def prefetch_build(self):
+        """Quietly download the newest build in the build cache when it is
+        newer than the installed one. The update then starts directly at the
+        extraction."""
+        if (not config_true(get_config_value('prefetch_builds', 'False')) or
+            offline_mode() or build_cache_limit() == 0):
+            return
+
+        if (self.prefetch_thread is not None or
+            self.staging_thread is not None or self.batch is not None or
+            self.updating or not self.builds):
+            return
+
+        main_tab = self.get_main_tab()
+        game_dir_group_box = main_tab.game_dir_group_box
+
+        build = next((build for build in self.builds
+            if build['url'] is not None), None)
+        if (build is None or game_dir_group_box.current_build is None or
+            build['number'] == game_dir_group_box.current_build):
+            return
+
+        archive_name = QFileInfo(QUrl(build['url']).path()).fileName()
+        if cached_archive(archive_name) is not None:
+            return
+
+        class PrefetchThread(QThread):
+            completed = pyqtSignal()
+            aborted = pyqtSignal()
+            failed = pyqtSignal(str)
+
+            def __init__(self, url, archive_name):
+                super(PrefetchThread, self).__init__()
+
+                self.url = url
+                self.archive_name = archive_name
+                self.cancelled = False
+
+            def __del__(self):
+                self.wait()
+
+            def run(self):
+                try:
+                    download_to_cache(self.url, self.archive_name,
+                        cancelled=lambda: self.cancelled,
+                        kind=BACKGROUND_DOWNLOAD)
+                except OperationCancelled:
+                    self.aborted.emit()
+                except (OSError, zipfile.BadZipFile) as e:
+                    self.failed.emit(str(e))
+                else:
+                    self.completed.emit()
+
+        def completed():
+            self.prefetch_thread = None
+
+            main_window = self.get_main_window()
+            status_bar = main_window.statusBar()
+
+            if status_bar.busy == 0 and not game_dir_group_box.game_started:
+                status_bar.showMessage(_('Build {number} was downloaded and '
+                    'is ready to be installed').format(number=build['number']))
+
+        def aborted():
+            self.prefetch_thread = None
+
+        def failed(error):
+            self.prefetch_thread = None
+
+            logger.warning('Could not prefetch build %s: %s', build['number'],
+                error)
+
+        prefetch_thread = PrefetchThread(build['url'], archive_name)
+        prefetch_thread.completed.connect(completed)
+        prefetch_thread.aborted.connect(aborted)
+        prefetch_thread.failed.connect(failed)
+        self.prefetch_thread = prefetch_thread
+
+        logger.info('Prefetching build %s', build['number'])
+        prefetch_thread.start(QThread.LowestPriority)
+
+    def cancel_prefetch(self):
+        if self.prefetch_thread is not None:
+            self.prefetch_thread.cancelled = True
+
+    def install_staged_build(self, after_updating):
+        """Swap the staged build in place if one is ready for the current game
+        directory. after_updating is called with the result of the update
+        and its message. Return False if there is nothing to install."""
+        if self.updating or self.builds is None:
+            return False
+
+        main_tab = self.get_main_tab()
+        game_dir_group_box = main_tab.game_dir_group_box
+        game_dir = game_dir_group_box.dir_combo.currentText()
+
+        staged_build = self.get_staged_build(game_dir)
+        if staged_build is None:
+            return False
+
+        if staged_build['number'] == game_dir_group_box.current_build:
+            # Already installed with a regular update
+            delete_path(staged_build['path'])
+            self.clear_staged_build()
+            return False
+
+        self.select_build(staged_build)
+
+        self.after_updating = after_updating
+        self.start_update()
+        return True
+
+    def select_build(self, selected_build):
+        for index, build in enumerate(self.builds):
+            if build['url'] == selected_build['url']:
+                self.builds_combo.setCurrentIndex(index)
+                return
+
+        self.builds.append(selected_build)
+        self.builds_combo.addItem(selected_build['number'],
+            userData=selected_build)
+        self.builds_combo.setCurrentIndex(len(self.builds) - 1)
+
+    def batch_update(self):
+        """Download the selected build once and install it in several game
+        directories. The build is extracted next to every directory at the
+        same time, one directory per volume, and each directory is then
+        updated in turn by swapping its staged build in place."""
+        if self.batch is not None:
+            self.cancel_batch_update()
+            return
+
+        if self.builds is None or len(self.builds) < 1:
+            return
+
+        build = self.builds[self.builds_combo.currentIndex()]
+        if build['url'] is None:
+            return
+
+        game_dirs = [game_dir for game_dir in json.loads(
+            get_config_value('game_directories', '[]'))
+            if os.path.isdir(game_dir)]
+
+        batch_dialog = BatchUpdateDialog(build['number'], game_dirs)
+        if not batch_dialog.exec():
+            return
+
+        game_dirs = batch_dialog.selected_directories()
+        if len(game_dirs) < 1:
+            return
+
+        main_window = self.get_main_window()
+        status_bar = main_window.statusBar()
+
+        main_tab = self.get_main_tab()
+        game_dir_group_box = main_tab.game_dir_group_box
+
+        class BatchStagingThread(QThread):
+            progress = pyqtSignal(str, int, int)
+            completed = pyqtSignal(str, dict)
+            aborted = pyqtSignal()
+            failed = pyqtSignal(str)
+
+            def __init__(self, url, archive_name, staging_dirs):
+                super(BatchStagingThread, self).__init__()
+
+                self.url = url
+                self.archive_name = archive_name
+                self.staging_dirs = staging_dirs
+                self.cancelled = False
+                self.download_dir = None
+
+                self.extracted = 0
+                self.extracted_lock = threading.Lock()
+
+            def __del__(self):
+                self.wait()
+
+            def run(self):
+                try:
+                    self.stage()
+                finally:
+                    if self.download_dir is not None:
+                        shutil.rmtree(self.download_dir, ignore_errors=True)
+
+            def stage(self):
+                try:
+                    archive_path = self.download()
+                except OperationCancelled:
+                    self.aborted.emit()
+                    return
+                except (OSError, zipfile.BadZipFile) as e:
+                    self.failed.emit(str(e))
+                    return
+
+                # Extracting on the same disk at the same time is slower than
+                # one directory after the other
+                volumes = {}
+                for game_dir, staging_dir in self.staging_dirs:
+                    volume = os.path.normcase(os.path.splitdrive(
+                        os.path.abspath(game_dir))[0])
+                    volumes.setdefault(volume, []).append(
+                        (game_dir, staging_dir))
+
+                try:
+                    with zipfile.ZipFile(archive_path) as z:
+                        self.total = len(z.infolist()) * len(self.staging_dirs)
+                except (OSError, zipfile.BadZipFile) as e:
+                    self.failed.emit(str(e))
+                    return
+
+                results = {}
+                with ThreadPoolExecutor(max_workers=len(volumes)) as executor:
+                    for volume_results in executor.map(
+                        lambda staging_dirs: self.extract(archive_path,
+                            staging_dirs), volumes.values()):
+                        results.update(volume_results)
+
+                if self.cancelled:
+                    for game_dir, staging_dir in self.staging_dirs:
+                        shutil.rmtree(staging_dir, ignore_errors=True)
+                    self.aborted.emit()
+                else:
+                    self.completed.emit(archive_path, results)
+
+            def download(self):
+                archive_path = cached_archive(self.archive_name)
+                if archive_path is not None:
+                    return archive_path
+
+                if build_cache_limit() == 0:
+                    # Only kept until every directory is staged
+                    self.download_dir = tempfile.mkdtemp(
+                        prefix=cons.TEMP_PREFIX)
+                    archive_path = os.path.join(self.download_dir,
+                        self.archive_name)
+                    download_build(self.url, archive_path, self.downloading,
+                        lambda: self.cancelled)
+                    return archive_path
+
+                return download_to_cache(self.url, self.archive_name,
+                    self.downloading, lambda: self.cancelled)
+
+            def extract(self, archive_path, staging_dirs):
+                results = {}
+                for game_dir, staging_dir in staging_dirs:
+                    if self.cancelled:
+                        break
+
+                    try:
+                        if os.path.exists(staging_dir):
+                            shutil.rmtree(staging_dir)
+
+                        extract_build(archive_path, staging_dir,
+                            self.extracting, lambda: self.cancelled)
+                        results[game_dir] = None
+                    except OperationCancelled:
+                        break
+                    except (OSError, zipfile.BadZipFile) as e:
+                        shutil.rmtree(staging_dir, ignore_errors=True)
+                        results[game_dir] = str(e)
+
+                return results
+
+            def downloading(self, bytes_read, total_bytes):
+                self.progress.emit(_('Downloading {size}').format(
+                    size=sizeof_fmt(bytes_read)), bytes_read // 1024,
+                    total_bytes // 1024)
+
+            def extracting(self, filename, extracted, total):
+                with self.extracted_lock:
+                    self.extracted += 1
+                    extracted = self.extracted
+
+                self.progress.emit(_('Extracting {0}').format(filename),
+                    extracted, self.total)
+
+        status_bar.busy += 1
+
+        batch_label = QLabel()
+        batch_label.setText(_('Preparing build {number}').format(
+            number=build['number']))
+        status_bar.addWidget(batch_label, 100)
+
+        batch_progress_bar = QProgressBar()
+        status_bar.addWidget(batch_progress_bar)
+
+        def progress(text, value, maximum):
+            batch_label.setText(text)
+            batch_progress_bar.setRange(0, maximum)
+            batch_progress_bar.setValue(value)
+
+        def finish_staging():
+            self.batch['thread'] = None
+
+            status_bar.removeWidget(batch_label)
+            status_bar.removeWidget(batch_progress_bar)
+            status_bar.busy -= 1
+
+        def completed(archive_path, results):
+            finish_staging()
+
+            for game_dir in game_dirs:
+                error = results.get(game_dir)
+                if error is None:
+                    self.batch['pending'].append(game_dir)
+                else:
+                    self.batch['results'][game_dir] = _('Could not extract '
+                        'the build: {error}').format(error=error)
+
+            self.update_next_directory()
+
+        def aborted():
+            finish_staging()
+            self.finish_batch_update()
+
+        def failed(error):
+            finish_staging()
+            for game_dir in game_dirs:
+                self.batch['results'][game_dir] = _('Could not download the '
+                    'build: {error}').format(error=error)
+            self.finish_batch_update()
+
+        archive_name = QFileInfo(QUrl(build['url']).path()).fileName()
+
+        batch_thread = BatchStagingThread(build['url'], archive_name,
+            [(game_dir, self.staging_dir(game_dir)) for game_dir in game_dirs])
+        batch_thread.progress.connect(progress)
+        batch_thread.completed.connect(completed)
+        batch_thread.aborted.connect(aborted)
+        batch_thread.failed.connect(failed)
+
+        self.batch = {
+            'build': build,
+            'archive': archive_name,
+            'directories': game_dirs,
+            'original_dir': game_dir_group_box.dir_combo.currentText(),
+            'pending': [],
+            'current': None,
+            'results': {},
+            'installed': 0,
+            'cancelled': False,
+            'thread': batch_thread,
+            'timer': None
+        }
+
+        # A previous staged build is replaced by the batch
+        self.clear_staged_build()
+        self.cancel_prefetch()
+
+        game_dir_group_box.disable_controls()
+        self.disable_controls(True)
+
+        batch_thread.start()
+        self.update_stage_button()
+
+    def cancel_batch_update(self):
+        batch = self.batch
+        batch['cancelled'] = True
+
+        if batch['thread'] is not None:
+            batch['thread'].cancelled = True
+        elif batch['timer'] is not None:
+            batch['timer'].stop()
+            batch['timer'] = None
+            self.finish_batch_update()
+            return
+        elif self.updating:
+            self.cancel_update()
+            return
+
+        self.update_batch_button()
+
+    def update_next_directory(self):
+        batch = self.batch
+
+        if batch['cancelled'] or len(batch['pending']) < 1:
+            self.finish_batch_update()
+            return
+
+        game_dir = batch['pending'].pop(0)
+        batch['current'] = game_dir
+
+        build = batch['build']
+        set_config_value('staged_build', json.dumps({
+            'game_dir': os.path.abspath(game_dir),
+            'path': self.staging_dir(game_dir),
+            'url': build['url'],
+            'name': build['name'],
+            'number': build['number'],
+            'date': build['date'].isoformat()
+                if build['date'] is not None else None,
+            'archive': batch['archive']
+        }))
+
+        main_tab = self.get_main_tab()
+        game_dir_group_box = main_tab.game_dir_group_box
+        game_dir_group_box.set_dir_combo_value(game_dir)
+
+        # The update needs to know which build the directory had before
+        def timeout():
+            reading_timer = game_dir_group_box.exe_reading_timer
+            if reading_timer is not None and reading_timer.isActive():
+                return
+
+            # A mod or soundpack being extracted there finishes first
+            if install_queue().extracting(game_dir):
+                return
+
+            batch['timer'].stop()
+            batch['timer'] = None
+
+            self.select_build(build)
+            self.after_updating = self.batch_directory_updated
+            self.start_update()
+
+        timer = QTimer(self)
+        timer.timeout.connect(timeout)
+        batch['timer'] = timer
+        timer.start(100)
+
+    def batch_directory_updated(self, result, message):
+        batch = self.batch
+
+        if result == UPDATE_COMPLETED:
+            batch['installed'] += 1
+            if message is None:
+                message = _('Update completed')
+        elif result == UPDATE_CANCELLED:
+            message = _('Update cancelled')
+        elif message is None:
+            message = _('Update failed')
+        batch['results'][batch['current']] = message
+        batch['current'] = None
+
+        self.update_next_directory()
+
+    def finish_batch_update(self):
+        batch = self.batch
+        self.batch = None
+
+        # Directories which were extracted but never updated
+        for game_dir in batch['pending']:
+            staging_dir = self.staging_dir(game_dir)
+            if os.path.isdir(staging_dir):
+                delete_path(staging_dir)
+        self.clear_staged_build()
+
+        main_tab = self.get_main_tab()
+        game_dir_group_box = main_tab.game_dir_group_box
+
+        game_dir_group_box.set_dir_combo_value(batch['original_dir'])
+
+        if not self.updating:
+            game_dir_group_box.enable_controls()
+            self.enable_controls(True)
+        self.update_stage_button()
+
+        results = []
+        for game_dir in batch['directories']:
+            result = batch['results'].get(game_dir)
+            if result is None:
+                result = _('Skipped')
+            results.append('{directory}: {result}'.format(
+                directory=game_dir, result=result))
+
+        results_msgbox = QMessageBox()
+        results_msgbox.setWindowTitle(_('Update several game directories'))
+        results_msgbox.setText(ngettext(
+            'Build {number} was installed in {count} game directory.',
+            'Build {number} was installed in {count} game directories.',
+            batch['installed']).format(number=batch['build']['number'],
+                count=batch['installed']))
+        results_msgbox.setInformativeText('\n'.join(results))
+        results_msgbox.addButton(_('OK'), QMessageBox.AcceptRole)
+        results_msgbox.setIcon(QMessageBox.Information)
+        results_msgbox.exec()
+
+    def record_install_manifest(self, archive_path):
+        try:
+            set_install_manifest(self.game_dir, self.selected_build['number'],
+                os.path.basename(archive_path),
+                archive_manifest(archive_path, self.game_dir))
+        except (OSError, zipfile.BadZipFile):
+            logger.exception('Could not record the install manifest')
 
     def extract_new_build(self):
         self.extracting_new_build = True
@@ -2258,6 +3867,7 @@ class UpdateGroupBox(QGroupBox):
 
         self.extracting_infolist = z.infolist()
         self.extracting_index = 0
+        self.extracting_started = datetime.utcnow()
 
         main_window = self.get_main_window()
         status_bar = main_window.statusBar()
@@ -2295,23 +3905,30 @@ class UpdateGroupBox(QGroupBox):
 
                 self.extracting_zipfile.close()
 
+                record_throughput('extract',
+                    sum(x.file_size for x in self.extracting_infolist),
+                    (datetime.utcnow() - self.extracting_started
+                        ).total_seconds())
+
                 # Keep a copy of the archive if selected in the settings
                 if config_true(get_config_value('keep_archive_copy', 'False')):
                     archive_dir = get_config_value('archive_directory', '')
                     archive_name = os.path.basename(self.downloaded_file)
-                    move_target = os.path.join(archive_dir, archive_name)
+                    copy_target = os.path.join(archive_dir, archive_name)
                     if (os.path.isdir(archive_dir)
-                        and not os.path.exists(move_target)):
-                        shutil.move(self.downloaded_file, archive_dir)
+                        and not os.path.exists(copy_target)):
+                        shutil.copy2(self.downloaded_file, archive_dir)
 
-                download_dir = os.path.dirname(self.downloaded_file)
-                delete_path(download_dir)
+                # The build cache keeps the archive to repair the install
+                try:
+                    archive_path = cache_archive(self.downloaded_file)
+                    self.record_install_manifest(archive_path)
+                except OSError:
+                    logger.exception('Could not cache the build archive')
 
-                main_tab = self.get_main_tab()
-                game_dir_group_box = main_tab.game_dir_group_box
+                self.delete_download_dir()
 
-                self.analysing_new_build = True
-                game_dir_group_box.analyse_new_build(self.selected_build)
+                self.update_graph.complete('install')
 
             else:
                 extracting_element = self.extracting_infolist[
@@ -2339,65 +3956,51 @@ class UpdateGroupBox(QGroupBox):
 
                     error_msgbox.exec()
 
-                    self.update_game()
+                    self.cancel_update(_('Cannot extract game archive: '
+                        '{error}').format(error=e.strerror))
+                    return
 
                 self.extracting_index += 1
 
         timer.timeout.connect(timeout)
         timer.start(0)
 
-    def asset_name(self, path, filename):
-        asset_file = os.path.join(path, filename)
+    def previous_version_dir(self):
+        return os.path.join(self.game_dir, 'previous_version')
 
-        if not os.path.isfile(asset_file):
-            disabled_asset_file = os.path.join(path, filename + '.disabled')
-            if not os.path.isfile(disabled_asset_file):
-                return None
-            else:
-                asset_file_path = disabled_asset_file
-        else:
-            asset_file_path = asset_file
+    def restore_previous_dirs(self):
+        # Copy config, save, templates and memorial directory from previous
+        # version
+        previous_version_dir = self.previous_version_dir()
+        if not os.path.isdir(previous_version_dir):
+            self.update_graph.complete('copy_dirs')
+            return
 
-        try:
-            with open(asset_file_path, 'r', encoding='latin1') as f:
-                for line in f:
-                    if line.startswith('NAME'):
-                        space_index = line.find(' ')
-                        name = line[space_index:].strip().replace(
-                            ',', '')
-                        return name
-        except FileNotFoundError:
-            return None
-        return None
+        previous_dirs = ['config', 'save', 'templates', 'memorial',
+            'graveyard', 'save_backups']
+        if (config_true(get_config_value('prevent_save_move', 'False')) and
+            'save' in previous_dirs):
+            previous_dirs.remove('save')
 
-    def mod_ident(self, path):
-        json_file = os.path.join(path, 'modinfo.json')
-        if not os.path.isfile(json_file):
-            json_file = os.path.join(path, 'modinfo.json.disabled')
-        if os.path.isfile(json_file):
-            try:
-                with open(json_file, 'r', encoding='utf8') as f:
-                    try:
-                        values = json.load(f)
-                        if isinstance(values, dict):
-                            if values.get('type', '') == 'MOD_INFO':
-                                return values.get('ident', None)
-                        elif isinstance(values, list):
-                            for item in values:
-                                if (isinstance(item, dict)
-                                    and item.get('type', '') == 'MOD_INFO'):
-                                        return item.get('ident', None)
-                    except ValueError:
-                        pass
-            except FileNotFoundError:
-                return None
+        self.previous_dirs = previous_dirs
 
-        return None
+        # Skip debug files
+        self.previous_dirs_skips = set()
+        self.previous_dirs_skips.update((
+             os.path.join(previous_version_dir, 'config', 'debug.log'),
+             os.path.join(previous_version_dir, 'config', 'debug.log.prev')
+        ))
+
+        self.progress_copy = None
+        self.copy_next_dir()
 
     def copy_next_dir(self):
-        if self.in_post_extraction and len(self.previous_dirs) > 0:
+        if self.update_graph.cancelled:
+            return
+
+        if len(self.previous_dirs) > 0:
             next_dir = self.previous_dirs.pop()
-            src_path = os.path.join(self.previous_version_dir, next_dir)
+            src_path = os.path.join(self.previous_version_dir(), next_dir)
             dst_path = os.path.join(self.game_dir, next_dir)
             if os.path.isdir(src_path) and not os.path.exists(dst_path):
                 main_window = self.get_main_window()
@@ -2407,144 +4010,200 @@ class UpdateGroupBox(QGroupBox):
                     self.previous_dirs_skips, status_bar,
                     _('{0} directory').format(next_dir))
                 progress_copy.completed.connect(self.copy_next_dir)
+                progress_copy.failed.connect(lambda error:
+                    self.restore_copy_failed('copy_dirs', error))
                 self.progress_copy = progress_copy
+                self.journal_copy('copy_dirs', dst_path)
                 progress_copy.start()
             else:
                 self.copy_next_dir()
-        elif self.in_post_extraction:
+        else:
             self.progress_copy = None
-            self.post_extraction_step2()
+            self.update_graph.complete('copy_dirs')
+
+    def restore_copy_failed(self, stage, error):
+        """A progress copy of a restore stage failed, cancel the update."""
+        if stage == 'copy_dirs':
+            self.progress_copy = None
+        else:
+            self.soundpack_copy = None
+
+        if self.update_graph.cancelled:
+            return
+
+        self.update_graph.fail(stage)
+        self.cancel_update(_('Could not restore your custom content: '
+            '{error}').format(error=error))
+
+    def run_restore_thread(self, stage, text, function, on_completed=None):
+        """Run a restore stage function on its own thread. The function is
+        expected to stop early when the update graph is cancelled. The stage
+        is completed when the thread ends unless on_completed is given, it is
+        then called instead to continue the stage."""
+        class RestoreThread(QThread):
+            completed = pyqtSignal()
+            failed = pyqtSignal(str)
+
+            def __init__(self, function):
+                super(RestoreThread, self).__init__()
+
+                self.function = function
+
+            def __del__(self):
+                self.wait()
+
+            def run(self):
+                try:
+                    self.function()
+                except OSError as e:
+                    self.failed.emit(str(e))
+                    return
 
-    def post_extraction(self):
-        self.analysing_new_build = False
-        self.in_post_extraction = True
+                self.completed.emit()
 
         main_window = self.get_main_window()
         status_bar = main_window.statusBar()
 
-        # Copy config, save, templates and memorial directory from previous
-        # version
-        previous_version_dir = os.path.join(self.game_dir, 'previous_version')
-        if os.path.isdir(previous_version_dir) and self.in_post_extraction:
+        status_bar.busy += 1
 
-            previous_dirs = ['config', 'save', 'templates', 'memorial',
-                'graveyard', 'save_backups']
-            if (config_true(get_config_value('prevent_save_move', 'False')) and
-                'save' in previous_dirs):
-                previous_dirs.remove('save')
+        restore_label = QLabel()
+        restore_label.setText(text)
+        status_bar.addWidget(restore_label, 100)
 
-            self.previous_dirs = previous_dirs
-            self.previous_version_dir = previous_version_dir
+        restore_thread = RestoreThread(function)
 
-            # Skip debug files
-            self.previous_dirs_skips = set()
-            self.previous_dirs_skips.update((
-                 os.path.join(previous_version_dir, 'config', 'debug.log'),
-                 os.path.join(previous_version_dir, 'config', 'debug.log.prev')
-            ))
+        def thread_finished():
+            if self.restore_threads.get(stage) is not restore_thread:
+                # Already cleaned up when the update was cancelled
+                return False
 
-            self.progress_copy = None
-            self.copy_next_dir()
-        elif self.in_post_extraction:
-            # New install
-            self.in_post_extraction = False
-            self.finish_updating()
+            self.remove_restore_thread(stage)
+            return True
 
-    def post_extraction_step2(self):
-        main_window = self.get_main_window()
-        status_bar = main_window.statusBar()
+        def completed():
+            if thread_finished():
+                if on_completed is not None:
+                    on_completed()
+                else:
+                    self.update_graph.complete(stage)
 
-        # Copy custom tilesets and soundpack from previous version
-        # tilesets
-        tilesets_dir = os.path.join(self.game_dir, 'gfx')
-        previous_tilesets_dir = os.path.join(self.game_dir, 'previous_version',
-            'gfx')
+        def failed(error):
+            if thread_finished():
+                self.update_graph.fail(stage)
+                self.cancel_update(_('Could not restore your custom '
+                    'content: {error}').format(error=error))
 
-        if (os.path.isdir(tilesets_dir) and os.path.isdir(previous_tilesets_dir)
-            and self.in_post_extraction):
-            status_bar.showMessage(_('Restoring custom tilesets'))
+        restore_thread.completed.connect(completed)
+        restore_thread.failed.connect(failed)
+        self.restore_threads[stage] = (restore_thread, restore_label)
+        restore_thread.start()
 
-            official_set = {}
-            for entry in os.listdir(tilesets_dir):
-                if not self.in_post_extraction:
-                    break
+    def remove_restore_thread(self, stage):
+        restore_thread, restore_label = self.restore_threads.pop(stage)
+        restore_thread.wait()
+
+        main_window = self.get_main_window()
+        status_bar = main_window.statusBar()
 
-                entry_path = os.path.join(tilesets_dir, entry)
-                if os.path.isdir(entry_path):
-                    name = self.asset_name(entry_path, 'tileset.txt')
-                    if name is not None and name not in official_set:
-                        official_set[name] = entry_path
+        status_bar.removeWidget(restore_label)
+        status_bar.busy -= 1
 
-            previous_set = {}
-            for entry in os.listdir(previous_tilesets_dir):
-                if not self.in_post_extraction:
+    def stop_restoring(self):
+        for progress_copy in (self.progress_copy, self.soundpack_copy):
+            if progress_copy is not None:
+                progress_copy.stop()
+        self.progress_copy = None
+        self.soundpack_copy = None
+
+        # The restoring threads check the cancelled graph between each item
+        for stage in list(self.restore_threads.keys()):
+            self.remove_restore_thread(stage)
+
+    def custom_assets(self, kind, assets_dir, previous_assets_dir):
+        """Return the assets found in the previous directory that are not
+        part of the new build as a dict of names to paths."""
+        return custom_assets(kind, assets_dir, previous_assets_dir,
+            lambda: self.update_graph.cancelled)
+
+    def copy_custom_assets(self, stage, assets_dir, custom_assets, kind=None):
+        """Copy custom assets in the new build. When kind is given, they are
+        linked from the asset store instead."""
+        cancelled = lambda: self.update_graph.cancelled
+        for name, path in custom_assets.items():
+            if self.update_graph.cancelled:
+                break
+
+            target_dir = os.path.join(assets_dir, os.path.basename(path))
+            if not os.path.exists(target_dir):
+                self.journal_copy(stage, target_dir)
+                try:
+                    if kind is not None and link_asset(kind, name, path,
+                        target_dir, cancelled):
+                        continue
+                except OperationCancelled:
                     break
+                shutil.copytree(path, target_dir)
 
-                entry_path = os.path.join(previous_tilesets_dir, entry)
-                if os.path.isdir(entry_path):
-                    name = self.asset_name(entry_path, 'tileset.txt')
-                    if name is not None and name not in previous_set:
-                        previous_set[name] = entry_path
+    def restore_tilesets(self):
+        # Copy custom tilesets from previous version
+        tilesets_dir = os.path.join(self.game_dir, 'gfx')
+        previous_tilesets_dir = os.path.join(self.previous_version_dir(),
+            'gfx')
 
-            custom_set = set(previous_set.keys()) - set(official_set.keys())
-            for item in custom_set:
-                if not self.in_post_extraction:
-                    break
+        if not (os.path.isdir(tilesets_dir) and
+            os.path.isdir(previous_tilesets_dir)):
+            self.update_graph.complete('tilesets')
+            return
 
-                target_dir = os.path.join(tilesets_dir, os.path.basename(
-                    previous_set[item]))
-                if not os.path.exists(target_dir):
-                    shutil.copytree(previous_set[item], target_dir)
+        kind = 'tileset' if shares_assets(self.game_dir) else None
 
-            status_bar.clearMessage()
+        def restore():
+            self.copy_custom_assets('tilesets', tilesets_dir, self.custom_assets(
+                TILESET, tilesets_dir, previous_tilesets_dir), kind)
+
+        self.run_restore_thread('tilesets', _('Restoring custom tilesets'),
+            restore)
 
-        # soundpacks
+    def restore_soundpacks(self):
+        # Copy custom soundpacks from previous version
         soundpack_dir = os.path.join(self.game_dir, 'data', 'sound')
-        previous_soundpack_dir = os.path.join(self.game_dir, 'previous_version',
+        previous_soundpack_dir = os.path.join(self.previous_version_dir(),
             'data', 'sound')
 
-        if (os.path.isdir(soundpack_dir) and os.path.isdir(
-            previous_soundpack_dir) and self.in_post_extraction):
-            status_bar.showMessage(_('Restoring custom soundpacks'))
-
-            official_set = {}
-            for entry in os.listdir(soundpack_dir):
-                if not self.in_post_extraction:
-                    break
-
-                entry_path = os.path.join(soundpack_dir, entry)
-                if os.path.isdir(entry_path):
-                    name = self.asset_name(entry_path, 'soundpack.txt')
-                    if name is not None and name not in official_set:
-                        official_set[name] = entry_path
+        if not (os.path.isdir(soundpack_dir) and
+            os.path.isdir(previous_soundpack_dir)):
+            self.update_graph.complete('soundpacks')
+            return
 
-            previous_set = {}
-            for entry in os.listdir(previous_soundpack_dir):
-                if not self.in_post_extraction:
-                    break
+        self.soundpack_dir = soundpack_dir
+        self.previous_soundpack_set = {}
+        self.custom_soundpacks = []
+        self.soundpack_copy = None
 
-                entry_path = os.path.join(previous_soundpack_dir, entry)
-                if os.path.isdir(entry_path):
-                    name = self.asset_name(entry_path, 'soundpack.txt')
-                    if name is not None and name not in previous_set:
-                        previous_set[name] = entry_path
+        share = shares_assets(self.game_dir)
 
-            custom_set = set(previous_set.keys()) - set(official_set.keys())
-            if len(custom_set) > 0:
-                self.soundpack_dir = soundpack_dir
-                self.previous_soundpack_set = previous_set
-                self.custom_soundpacks = list(custom_set)
+        def restore():
+            self.previous_soundpack_set = self.custom_assets(SOUNDPACK,
+                soundpack_dir, previous_soundpack_dir)
+            self.custom_soundpacks = list(self.previous_soundpack_set.keys())
 
-                self.copy_next_soundpack()
-            else:
-                status_bar.clearMessage()
-                self.post_extraction_step3()
+            if share:
+                # Linking does not need the copy progress
+                self.copy_custom_assets('soundpacks', soundpack_dir,
+                    self.previous_soundpack_set, 'soundpack')
 
+        if share:
+            self.run_restore_thread('soundpacks', _('Restoring custom '
+                'soundpacks'), restore)
         else:
-            self.post_extraction_step3()
+            self.run_restore_thread('soundpacks', _('Restoring custom '
+                'soundpacks'), restore, self.copy_next_soundpack)
 
     def copy_next_soundpack(self):
-        if self.in_post_extraction and len(self.custom_soundpacks) > 0:
+        if self.update_graph.cancelled:
+            return
+
+        if len(self.custom_soundpacks) > 0:
             next_item = self.custom_soundpacks.pop()
             dst_path = os.path.join(self.soundpack_dir, os.path.basename(
                 self.previous_soundpack_set[next_item]))
@@ -2556,29 +4215,83 @@ class UpdateGroupBox(QGroupBox):
                 progress_copy = ProgressCopyTree(src_path, dst_path, None,
                     status_bar, _('{name} soundpack').format(name=next_item))
                 progress_copy.completed.connect(self.copy_next_soundpack)
-                self.progress_copy = progress_copy
+                progress_copy.failed.connect(lambda error:
+                    self.restore_copy_failed('soundpacks', error))
+                self.soundpack_copy = progress_copy
+                self.journal_copy('soundpacks', dst_path)
                 progress_copy.start()
             else:
                 self.copy_next_soundpack()
-        elif self.in_post_extraction:
-            self.progress_copy = None
+        else:
+            self.soundpack_copy = None
+            self.update_graph.complete('soundpacks')
 
-            main_window = self.get_main_window()
-            status_bar = main_window.statusBar()
-            status_bar.clearMessage()
+    def restore_mods(self):
+        mods_dir = os.path.join(self.game_dir, 'data', 'mods')
+        previous_mods_dir = os.path.join(self.previous_version_dir(), 'data',
+            'mods')
+        user_mods_dir = os.path.join(self.game_dir, 'mods')
+        previous_user_mods_dir = os.path.join(self.previous_version_dir(),
+            'mods')
+
+        if not (os.path.isdir(previous_mods_dir) or
+            os.path.isdir(previous_user_mods_dir)):
+            self.update_graph.complete('mods')
+            return
 
-            self.post_extraction_step3()
+        def restore():
+            # Copy custom mods from previous version
+            if os.path.isdir(mods_dir) and os.path.isdir(previous_mods_dir):
+                self.copy_custom_assets('mods', mods_dir, self.custom_assets(
+                    MOD, mods_dir, previous_mods_dir))
 
-    def preserve_custom_fonts(self):
+            if self.update_graph.cancelled:
+                return
+
+            # user mods
+            if os.path.isdir(previous_user_mods_dir):
+                if not os.path.exists(user_mods_dir):
+                    os.makedirs(user_mods_dir)
+
+                self.copy_custom_assets('mods', user_mods_dir,
+                    self.custom_assets(MOD, user_mods_dir,
+                        previous_user_mods_dir))
+
+            if self.update_graph.cancelled:
+                return
+
+            # Copy user-default-mods.json if present
+            user_default_mods_file = os.path.join(mods_dir,
+                'user-default-mods.json')
+            previous_user_default_mods_file = os.path.join(previous_mods_dir,
+                'user-default-mods.json')
+
+            if (not os.path.exists(user_default_mods_file)
+                and os.path.isfile(previous_user_default_mods_file)):
+                self.journal_copy('mods', user_default_mods_file)
+                shutil.copy2(previous_user_default_mods_file,
+                    user_default_mods_file)
+
+        self.run_restore_thread('mods', _('Restoring custom mods'), restore)
+
+    def restore_fonts(self):
+        if not os.path.isdir(self.previous_version_dir()):
+            self.update_graph.complete('fonts')
+            return
+
+        share = shares_assets(self.game_dir)
+        self.run_restore_thread('fonts', _('Restoring custom fonts'),
+            lambda: self.preserve_custom_fonts(share))
+
+    def preserve_custom_fonts(self, share=False):
         """
         Copy over any files in the previous font directory
         that don't already exist in the current font directory.
 
         This assumes that fonts distributed with CDDA have already
-        been extracted into the current font directory.
+        been extracted into the current font directory. With share, they
+        are linked from the asset store instead.
         """
-        status_bar = self.get_main_window().statusBar()
-
         join_parts = lambda parts: Path(os.path.join(*parts))
 
         font_locations = [
@@ -2598,147 +4311,103 @@ class UpdateGroupBox(QGroupBox):
             )
         ))
 
-        if (any(font_paths) and self.in_post_extraction):
-            status_bar.showMessage(_('Restoring custom fonts'))
-
-            for font_dir, prev_font_dir in font_paths:
-                # Skip the dir if we have nothing to restore
-                if not prev_font_dir.exists() or not prev_font_dir.is_dir():
-                    continue
-
-                # Determine if the current version includes any bundled fonts
-                if font_dir.is_dir():
-                    with os.scandir(font_dir) as entries:
-                        current_set = set(entries)
-                else:
-                    # Create a new font directory if it doesn't already exist
-                    font_dir.mkdir(exist_ok=True)
-                    current_set = set()
-
-                with os.scandir(prev_font_dir) as entries:
-                    previous_set = set(entries)
-
-                # Determine what font files need to be restored
-                delta = previous_set - current_set
-
-                for entry in delta:
-                    source = prev_font_dir.joinpath(entry.name)
-                    target =      font_dir.joinpath(entry.name)
-
-                    if entry.is_file():
-                        shutil.copy2(source, target)
-                    elif entry.is_dir():
-                        shutil.copytree(source, target)
-
-            status_bar.clearMessage()
-
-    def post_extraction_step3(self):
-        if not self.in_post_extraction:
-            return
-
-        main_window = self.get_main_window()
-        status_bar = main_window.statusBar()
-
-        # Copy custom mods from previous version
-        # mods
-        mods_dir = os.path.join(self.game_dir, 'data', 'mods')
-        previous_mods_dir = os.path.join(self.game_dir, 'previous_version',
-            'data', 'mods')
-
-        if (os.path.isdir(mods_dir) and os.path.isdir(previous_mods_dir) and
-            self.in_post_extraction):
-            status_bar.showMessage(_('Restoring custom mods'))
-
-            official_set = {}
-            for entry in os.listdir(mods_dir):
-                entry_path = os.path.join(mods_dir, entry)
-                if os.path.isdir(entry_path):
-                    name = self.mod_ident(entry_path)
-                    if name is not None and name not in official_set:
-                        official_set[name] = entry_path
-            previous_set = {}
-            for entry in os.listdir(previous_mods_dir):
-                entry_path = os.path.join(previous_mods_dir, entry)
-                if os.path.isdir(entry_path):
-                    name = self.mod_ident(entry_path)
-                    if name is not None and name not in previous_set:
-                        previous_set[name] = entry_path
-
-            custom_set = set(previous_set.keys()) - set(official_set.keys())
-            for item in custom_set:
-                target_dir = os.path.join(mods_dir, os.path.basename(
-                    previous_set[item]))
-                if not os.path.exists(target_dir):
-                    shutil.copytree(previous_set[item], target_dir)
-
-            status_bar.clearMessage()
+        for font_dir, prev_font_dir in font_paths:
+            if self.update_graph.cancelled:
+                break
 
-        if not self.in_post_extraction:
-            return
+            # Skip the dir if we have nothing to restore
+            if not prev_font_dir.exists() or not prev_font_dir.is_dir():
+                continue
 
-        # user mods
-        user_mods_dir = os.path.join(self.game_dir, 'mods')
-        previous_user_mods_dir = os.path.join(self.game_dir, 'previous_version',
-            'mods')
+            # Determine if the current version includes any bundled fonts
+            if font_dir.is_dir():
+                with os.scandir(font_dir) as entries:
+                    current_set = set(entry.name for entry in entries)
+            else:
+                # Create a new font directory if it doesn't already exist
+                font_dir.mkdir(exist_ok=True)
+                current_set = set()
 
-        if (os.path.isdir(previous_user_mods_dir) and self.in_post_extraction):
-            status_bar.showMessage(_('Restoring user custom mods'))
-
-            if not os.path.exists(user_mods_dir):
-                os.makedirs(user_mods_dir)
-
-            official_set = {}
-            for entry in os.listdir(user_mods_dir):
-                entry_path = os.path.join(user_mods_dir, entry)
-                if os.path.isdir(entry_path):
-                    name = self.mod_ident(entry_path)
-                    if name is not None and name not in official_set:
-                        official_set[name] = entry_path
-            previous_set = {}
-            for entry in os.listdir(previous_user_mods_dir):
-                entry_path = os.path.join(previous_user_mods_dir, entry)
-                if os.path.isdir(entry_path):
-                    name = self.mod_ident(entry_path)
-                    if name is not None and name not in previous_set:
-                        previous_set[name] = entry_path
-
-            custom_set = set(previous_set.keys()) - set(official_set.keys())
-            for item in custom_set:
-                target_dir = os.path.join(user_mods_dir, os.path.basename(
-                    previous_set[item]))
-                if not os.path.exists(target_dir):
-                    shutil.copytree(previous_set[item], target_dir)
+            with os.scandir(prev_font_dir) as entries:
+                previous_entries = list(entries)
 
-            status_bar.clearMessage()
+            # Determine what font files need to be restored
+            delta = [entry for entry in previous_entries
+                if entry.name not in current_set]
 
-        if not self.in_post_extraction:
-            return
+            for entry in delta:
+                source = prev_font_dir.joinpath(entry.name)
+                target =      font_dir.joinpath(entry.name)
 
-        # Copy user-default-mods.json if present
-        user_default_mods_file = os.path.join(mods_dir, 'user-default-mods.json')
-        previous_user_default_mods_file = os.path.join(previous_mods_dir, 'user-default-mods.json')
+                if not (entry.is_file() or entry.is_dir()):
+                    continue
 
-        if (not os.path.exists(user_default_mods_file)
-            and os.path.isfile(previous_user_default_mods_file)):
-            status_bar.showMessage(_('Restoring {0}').format('user-default-mods.json'))
+                self.journal_copy('fonts', str(target))
 
-            shutil.copy2(previous_user_default_mods_file,
-                user_default_mods_file)
+                if share:
+                    try:
+                        if link_asset('font', entry.name, str(source),
+                            str(target), lambda: self.update_graph.cancelled):
+                            continue
+                    except OperationCancelled:
+                        return
 
-            status_bar.clearMessage()
+                if entry.is_file():
+                    shutil.copy2(source, target)
+                else:
+                    shutil.copytree(source, target)
 
-        self.preserve_custom_fonts()
+    def share_game_files(self):
+        manifest = None
+        if config_true(get_config_value('share_game_files', 'False')):
+            manifest = get_install_manifest(self.game_dir)
 
-        if not self.in_post_extraction:
+        if manifest is None:
+            self.update_graph.complete('share')
             return
 
-        self.in_post_extraction = False
+        game_dir = self.game_dir
+        cancelled = lambda: self.update_graph.cancelled
 
-        if config_true(get_config_value('remove_previous_version', 'False')):
+        def share():
+            try:
+                mtimes, digests, shared_bytes = link_install(game_dir,
+                    manifest['files'], cancelled)
+                update_install_manifest_mtimes(game_dir, mtimes)
+                update_install_manifest_digests(game_dir, digests)
+                logger.info('Shared {} of game files with other builds'
+                    .format(sizeof_fmt(shared_bytes)))
+
+                # Files that were only used by removed builds
+                prune_store(cancelled)
+                prune_asset_store(cancelled)
+            except OperationCancelled:
+                pass
+
+        self.run_restore_thread('share', _('Sharing identical game files '
+            'with other builds'), share)
+
+    def new_build_analysed(self):
+        self.update_graph.complete('analyse')
+
+    def new_build_not_found(self):
+        # Keep what was installed so that the user can look at it
+        self.update_graph.fail('analyse')
+        self.stop_restoring()
+        self.finish_updating(UPDATE_FAILED, _('No executable found in the '
+            'downloaded archive'))
+
+    def update_stages_completed(self):
+        self.update_graph.complete('finish')
+
+        if not os.path.isdir(self.previous_version_dir()):
+            # New install
+            self.finish_updating(UPDATE_COMPLETED, _('Installation completed'))
+        elif config_true(get_config_value('remove_previous_version', 'False')):
             self.remove_previous_version()
         else:
-            self.after_updating_message()
-            self.finish_updating()
+            self.finish_updating(UPDATE_COMPLETED,
+                self.after_updating_message())
 
     def remove_previous_version(self):
         previous_version_dir = os.path.join(self.game_dir, 'previous_version')
@@ -2752,8 +4421,8 @@ class UpdateGroupBox(QGroupBox):
         def rmtree_completed():
             self.progress_rmtree = None
 
-            self.after_updating_message()
-            self.finish_updating()
+            self.finish_updating(UPDATE_COMPLETED,
+                self.after_updating_message())
 
         progress_rmtree.completed.connect(rmtree_completed)
         progress_rmtree.aborted.connect(rmtree_completed)
@@ -2761,6 +4430,7 @@ class UpdateGroupBox(QGroupBox):
         progress_rmtree.start()
 
     def after_updating_message(self):
+        """Show the result of a successful update and return it."""
         main_window = self.get_main_window()
         status_bar = main_window.statusBar()
 
@@ -2773,7 +4443,7 @@ class UpdateGroupBox(QGroupBox):
             status_bar.showMessage(_('Installation completed'))
 
         if (game_dir_group_box.current_build is not None
-            and status_bar.busy == 0):
+            and self.builds and status_bar.busy == 0):
             last_build = self.builds[0]
 
             message = status_bar.currentMessage()
@@ -2786,14 +4456,23 @@ class UpdateGroupBox(QGroupBox):
                 message = message + _('There is a new update available')
             status_bar.showMessage(message)
 
-    def finish_updating(self):
+        return status_bar.currentMessage()
+
+    def finish_updating(self, result=UPDATE_COMPLETED, message=None):
         self.updating = False
+
+        if self.update_journal is not None:
+            close_update_journal(self.update_journal)
+            self.update_journal = None
+
         main_tab = self.get_main_tab()
         game_dir_group_box = main_tab.game_dir_group_box
 
         game_dir_group_box.enable_controls()
         self.enable_controls(True)
 
+        install_queue().hold(False)
+
         game_dir_group_box.update_soundpacks()
         game_dir_group_box.update_mods()
         game_dir_group_box.update_backups()
@@ -2813,11 +4492,17 @@ class UpdateGroupBox(QGroupBox):
         else:
             self.update_button.setText(_('Install game'))
 
+        self.update_stage_button()
+
         if self.close_after_update:
             self.get_main_window().close()
+        elif self.after_updating is not None:
+            after_updating = self.after_updating
+            self.after_updating = None
+            after_updating(result, message)
 
-    def download_http_ready_read(self):
-        self.downloading_file.write(self.download_http_reply.readAll())
+    def download_http_ready_read(self, data):
+        self.downloading_file.write(data)
 
     def download_dl_progress(self, bytes_read, total_bytes):
         self.downloading_progress_bar.setMaximum(total_bytes)
@@ -2842,6 +4527,13 @@ class UpdateGroupBox(QGroupBox):
             self.download_last_read = datetime.utcnow()
 
     def start_lb_request(self, base_asset, new_base_asset):
+        if offline_mode():
+            self.base_asset = base_asset
+            self.new_base_asset = new_base_asset
+
+            self.load_offline_builds()
+            return
+
         self.disable_controls(True)
         self.refresh_warning_label.hide()
         self.find_build_warning_label.hide()
@@ -2856,10 +4548,47 @@ class UpdateGroupBox(QGroupBox):
         self.builds_combo.clear()
         self.builds_combo.addItem(_('Fetching remote builds'))
 
-        url = cons.GITHUB_REST_API_URL + cons.CDDA_RELEASES
         self.base_asset = base_asset
         self.new_base_asset = new_base_asset
 
+        # Show the builds of the local release index while it is synced
+        builds = self.parse_builds(get_releases(cons.BUILDS_LIST_SIZE))
+        if len(builds) > 0:
+            self.set_builds(builds)
+
+        self.lb_page = 1
+        self.request_releases_page(self.releases_page_url(self.lb_page))
+
+    def load_offline_builds(self):
+        """Show the builds of the local release index without using the
+        network. Builds which are not in the build cache are unavailable."""
+        self.prefetch_after_refresh = False
+        self.refresh_warning_label.hide()
+        self.find_build_warning_label.hide()
+
+        builds = self.parse_builds(get_releases(cons.BUILDS_LIST_SIZE))
+
+        if not any(build['url'] is not None for build in builds):
+            self.builds = None
+
+            self.builds_combo.clear()
+            self.builds_combo.addItem(_('No downloaded build is available in '
+                'offline mode'))
+            self.builds_combo.setEnabled(False)
+            self.update_stage_button()
+            return
+
+        self.set_builds(builds)
+
+    def releases_page_url(self, page):
+        return '{url}?per_page={per_page}&page={page}'.format(
+            url=cons.GITHUB_REST_API_URL + cons.CDDA_RELEASES,
+            per_page=cons.GITHUB_RELEASES_PER_PAGE, page=page)
+
+    def request_releases_page(self, url):
+        main_window = self.get_main_window()
+        status_bar = main_window.statusBar()
+
         fetching_label = QLabel()
         fetching_label.setText(_('Fetching: {url}').format(url=url))
         self.base_url = url
@@ -2872,14 +4601,14 @@ class UpdateGroupBox(QGroupBox):
 
         progress_bar.setMinimum(0)
 
-        self.lb_html = BytesIO()
+        self.lb_parser = ReleaseListParser()
+        self.lb_releases = []
+        self.lb_reached_indexed = False
 
-        request = QNetworkRequest(QUrl(url))
-        request.setRawHeader(b'User-Agent',
-            b'CDDA-Game-Launcher/' + version.encode('utf8'))
-        request.setRawHeader(b'Accept', cons.GITHUB_API_VERSION)
+        # Automatic refreshes wait when the rate limit budget is low
+        priority = BACKGROUND if self.prefetch_after_refresh else USER
 
-        self.http_reply = self.qnam.get(request)
+        self.http_reply = github_scheduler().get(url, priority)
         self.http_reply.finished.connect(self.lb_http_finished)
         self.http_reply.readyRead.connect(self.lb_http_ready_read)
         self.http_reply.downloadProgress.connect(self.lb_dl_progress)
@@ -2922,44 +4651,33 @@ class UpdateGroupBox(QGroupBox):
         status_bar.removeWidget(self.fetching_label)
         status_bar.removeWidget(self.fetching_progress_bar)
 
-        redirect = self.http_reply.attribute(
-            QNetworkRequest.RedirectionTargetAttribute)
-        if redirect is not None:
-            redirected_url = urljoin(
-                self.http_reply.request().url().toString(),
-                redirect.toString())
-
-            fetching_label = QLabel()
-            fetching_label.setText(_('Fetching: {url}').format(
-                url=redirected_url))
-            self.base_url = redirected_url
-            status_bar.addWidget(fetching_label, 100)
-            self.fetching_label = fetching_label
-
-            progress_bar = QProgressBar()
-            status_bar.addWidget(progress_bar)
-            self.fetching_progress_bar = progress_bar
-
-            progress_bar.setMinimum(0)
-
-            self.lb_html = BytesIO()
-
-            request = QNetworkRequest(QUrl(redirected_url))
-            request.setRawHeader(b'User-Agent',
-                b'CDDA-Game-Launcher/' + version.encode('utf8'))
-            request.setRawHeader(b'Accept', cons.GITHUB_API_VERSION)
-
-            self.http_reply = self.qnam.get(request)
-            self.http_reply.finished.connect(self.lb_http_finished)
-            self.http_reply.readyRead.connect(self.lb_http_ready_read)
-            self.http_reply.downloadProgress.connect(self.lb_dl_progress)
-            return
+        status_code = self.http_reply.attribute(
+            QNetworkRequest.HttpStatusCodeAttribute)
+        releases = self.lb_releases
+        self.lb_parser = None
+        self.lb_releases = None
+
+        # Not modified means the local release index is already up to date
+        if status_code == 200:
+            cache_reply(self.http_reply)
+
+            # Releases were indexed while they were received
+            if (not self.lb_reached_indexed and
+                len(releases) >= cons.GITHUB_RELEASES_PER_PAGE and
+                self.lb_page < cons.GITHUB_RELEASES_MAX_PAGES):
+                self.lb_page += 1
+                self.request_releases_page(self.releases_page_url(
+                    self.lb_page))
+                return
 
         main_tab = self.get_main_tab()
         game_dir_group_box = main_tab.game_dir_group_box
 
         status_bar.busy -= 1
 
+        prefetch = self.prefetch_after_refresh
+        self.prefetch_after_refresh = False
+
         if not game_dir_group_box.game_started:
             if status_bar.busy == 0:
                 status_bar.showMessage(_('Ready'))
@@ -2969,23 +4687,9 @@ class UpdateGroupBox(QGroupBox):
             if status_bar.busy == 0:
                 status_bar.showMessage(_('Game process is running'))
 
-        requests_remaining = None
-        if self.http_reply.hasRawHeader(cons.GITHUB_XRL_REMAINING):
-            requests_remaining = self.http_reply.rawHeader(cons.GITHUB_XRL_REMAINING)
-            requests_remaining = tryint(requests_remaining)
-
-        reset_dt = None
-        if self.http_reply.hasRawHeader(cons.GITHUB_XRL_RESET):
-            reset_dt = self.http_reply.rawHeader(cons.GITHUB_XRL_RESET)
-            reset_dt = tryint(reset_dt)
-            reset_dt = arrow.get(reset_dt)
-
-        if requests_remaining is not None and requests_remaining <= 10:
-            self.warn_rate_limit(requests_remaining, reset_dt)
+        builds = self.parse_builds(get_releases(cons.BUILDS_LIST_SIZE))
 
-        status_code = self.http_reply.attribute(
-            QNetworkRequest.HttpStatusCodeAttribute)
-        if status_code != 200:
+        if status_code not in (200, HTTP_NOT_MODIFIED):
             reason = self.http_reply.attribute(
                 QNetworkRequest.HttpReasonPhraseAttribute)
             url = self.http_reply.request().url().toString()
@@ -2997,51 +4701,58 @@ class UpdateGroupBox(QGroupBox):
                 status_bar.showMessage(msg)
             logger.warning(msg)
 
-            self.builds = None
+            # The builds already in the local release index are still usable
+            if len(builds) == 0:
+                self.builds = None
 
-            self.builds_combo.clear()
-            self.builds_combo.addItem(msg)
-            self.builds_combo.setEnabled(False)
+                self.builds_combo.clear()
+                self.builds_combo.addItem(msg)
+                self.builds_combo.setEnabled(False)
 
-            self.lb_html = None
-            return
+                return
 
-        self.lb_html.seek(0)
-        try:
-            releases = json.loads(TextIOWrapper(self.lb_html, encoding='utf8'
-                ).read())
-        except json.decoder.JSONDecodeError:
-            releases = []
-        self.lb_html = None
+        self.set_builds(builds)
 
-        builds = []
+        if prefetch and self.builds is not None:
+            self.prefetch_build()
+
+    def index_releases(self, releases):
+        """Add releases to the local release index. Return True when one of
+        them was already indexed."""
+        indexed_releases = []
+        reached_indexed = False
+        for release in releases:
+            release = compact_release(release)
+            if release is None:
+                continue
 
-        asset_platform = self.base_asset['Platform']
-        asset_graphics = self.base_asset['Graphics']
+            if has_release(release['id']):
+                reached_indexed = True
 
-        target_regex = re.compile(r'cataclysmdda-(?P<major>.+)-' +
-            re.escape(asset_platform) + r'-' +
-            re.escape(asset_graphics) + r'-' +
-            r'b?(?P<build>\d+)\.zip'
-            )
-        
-        new_asset_platform = self.new_base_asset['Platform']
-        new_asset_graphics = self.new_base_asset['Graphics']
-
-        new_target_regex = re.compile(
-            r'cdda-windows-' +
-            re.escape(new_asset_graphics) + r'-' +
-            re.escape(new_asset_platform) + r'-' +
-            r'b?(?P<build>[0-9\-]+)\.zip'
-            )
+            build_match = BUILD_REGEX.search(release['name'])
+            release['build'] = (build_match.group('build')
+                if build_match is not None else None)
+            release['created_at'] = arrow.get(release['created_at']).naive
+            indexed_releases.append(release)
 
-        build_regex = re.compile(r'[Bb]uild #?(?P<build>[0-9\-]+)')
+        add_releases(indexed_releases)
+
+        return reached_indexed
+
+    def parse_builds(self, releases):
+        builds = []
+
+        target_regex, new_target_regex = asset_regexes(
+            self.base_asset['Platform'], self.base_asset['Graphics'],
+            self.new_base_asset['Platform'], self.new_base_asset['Graphics'])
+
+        offline = offline_mode()
 
         for release in releases:
             if any(x not in release for x in ('name', 'created_at')):
                 continue
 
-            build_match = build_regex.search(release['name'])
+            build_match = BUILD_REGEX.search(release['name'])
             if build_match is not None:
                 asset = None
                 if 'assets' in release:
@@ -3055,6 +4766,11 @@ class UpdateGroupBox(QGroupBox):
                     )
                     asset = next(asset_iter, None)
 
+                # Only the builds in the build cache can be installed offline
+                if (asset is not None and offline and
+                    cached_archive(asset['name']) is None):
+                    asset = None
+
                 build = {
                     'url': asset['browser_download_url'] if asset is not None
                                                          else None,
@@ -3064,23 +4780,23 @@ class UpdateGroupBox(QGroupBox):
                 }
                 builds.append(build)
 
+        return builds
+
+    def set_builds(self, builds):
+        main_window = self.get_main_window()
+        status_bar = main_window.statusBar()
+
+        main_tab = self.get_main_tab()
+        game_dir_group_box = main_tab.game_dir_group_box
+
         if len(builds) > 0:
             builds.sort(key=lambda x: (x['date'], x['number']), reverse=True)
             self.builds = builds
 
             self.builds_combo.clear()
             for build in builds:
-                if build['date'] is not None:
-                    build_date = arrow.get(build['date'], 'UTC')
-                    human_delta = safe_humanize(build_date, arrow.utcnow(),
-                        locale=self.app_locale)
-                else:
-                    human_delta = _('Unknown')
-
-                self.builds_combo.addItem(
-                    '{number} ({delta})'.format(number=build['number'], delta=human_delta),
-                    userData=build
-                )
+                self.builds_combo.addItem(self.build_item_text(build),
+                    userData=build)
 
             combo_model = self.builds_combo.model()
             default_set = False
@@ -3100,6 +4816,8 @@ class UpdateGroupBox(QGroupBox):
             else:
                 self.previous_bc_enabled = True
 
+            self.update_stage_button()
+
             if game_dir_group_box.exe_path is not None:
                 self.update_button.setText(_('Update game'))
 
@@ -3127,8 +4845,61 @@ class UpdateGroupBox(QGroupBox):
             self.builds_combo.addItem(_('Could not find remote builds'))
             self.builds_combo.setEnabled(False)
 
+    def build_item_text(self, build):
+        if build['date'] is not None:
+            build_date = arrow.get(build['date'], 'UTC')
+            human_delta = safe_humanize(build_date, arrow.utcnow(),
+                locale=self.app_locale)
+        else:
+            human_delta = _('Unknown')
+
+        return '{number} ({delta})'.format(number=build['number'],
+            delta=human_delta)
+
+    def merge_builds(self, builds):
+        """Add builds to the builds combo while the releases are still being
+        received. Builds already listed are kept, set_builds rebuilds the
+        whole list once the releases are synced."""
+        if self.builds is None:
+            self.builds = []
+            self.builds_combo.clear()
+
+        combo_model = self.builds_combo.model()
+        sort_key = lambda build: (build['date'], build['number'])
+
+        for build in builds:
+            if any(listed['number'] == build['number']
+                for listed in self.builds):
+                continue
+
+            index = next((index for index, listed in enumerate(self.builds)
+                if sort_key(listed) < sort_key(build)), len(self.builds))
+            if index >= cons.BUILDS_LIST_SIZE:
+                continue
+
+            self.builds.insert(index, build)
+            self.builds_combo.insertItem(index, self.build_item_text(build),
+                userData=build)
+            if build['url'] is None:
+                combo_model.item(index).setEnabled(False)
+                combo_model.item(index).setText(combo_model.item(index).text()
+                    + _(' - build unavailable'))
+
+        self.update_stage_button()
+
     def lb_http_ready_read(self):
-        self.lb_html.write(self.http_reply.readAll())
+        data = self.http_reply.readAll()
+
+        status_code = self.http_reply.attribute(
+            QNetworkRequest.HttpStatusCodeAttribute)
+        if status_code == 200:
+            releases = self.lb_parser.feed(bytes(data))
+            if len(releases) > 0:
+                # Complete releases are indexed and listed right away
+                self.lb_releases.extend(releases)
+                if self.index_releases(releases):
+                    self.lb_reached_indexed = True
+                self.merge_builds(self.parse_builds(releases))
 
     def lb_dl_progress(self, bytes_read, total_bytes):
         self.fetching_progress_bar.setMaximum(total_bytes)
@@ -3164,17 +4935,27 @@ class UpdateGroupBox(QGroupBox):
             selected_platform = 'x86'
 
         if selected_branch is self.stable_radio_button:
+            # Stable builds are bundled, there is nothing new to prefetch
+            self.prefetch_after_refresh = False
+
             # Populate stable builds and stable changelog
 
             # Add stable builds
 
             builds = []
 
+            offline = offline_mode()
+
             for stable_version in cons.STABLE_ASSETS:
                 version_details = cons.STABLE_ASSETS[stable_version]
 
+                url = version_details['Tiles'][selected_platform]
+                if offline and cached_archive(QFileInfo(QUrl(url).path()
+                    ).fileName()) is None:
+                    continue
+
                 build = {
-                    'url': version_details['Tiles'][selected_platform],
+                    'url': url,
                     'name': version_details['name'],
                     'number': version_details['number'],
                     'date': arrow.get(version_details['released_on']).datetime
@@ -3186,6 +4967,10 @@ class UpdateGroupBox(QGroupBox):
 
             self.builds_combo.clear()
 
+            if len(builds) == 0:
+                self.builds_combo.addItem(_('No downloaded build is available '
+                    'in offline mode'))
+
             for build in builds:
                 if build['date'] is not None:
                     build_date = arrow.get(build['date'], 'UTC')
@@ -3206,6 +4991,8 @@ class UpdateGroupBox(QGroupBox):
             else:
                 self.previous_bc_enabled = True
 
+            self.update_stage_button()
+
             if game_dir_group_box.exe_path is not None:
                 self.update_button.setText(_('Update game'))
             else:
@@ -3277,208 +5064,116 @@ class ProgressRmTree(QTimer):
         self.status_label = None
         self.progress_bar = None
 
-        self.analysing = False
-        self.deleting = False
+        self.delete_engine = None
         self.delete_completed = False
 
     def step(self):
-        if self.analysing:
-            if self.current_scan is None:
-                self.current_scan = scandir(self.src)
-            else:
-                try:
-                    entry = next(self.current_scan)
-                    self.source_entries.append(entry)
-                    if entry.is_dir():
-                        self.next_scans.append(entry.path)
-                    elif entry.is_file():
-                        self.total_files += 1
+        engine = self.delete_engine
 
-                        files_text = ngettext('file', 'files', self.total_files)
+        if engine.analysing:
+            files_text = ngettext('file', 'files', engine.total_files)
 
-                        self.status_label.setText(_('Analysing {name} - Found '
-                            '{file_count} {files}').format(
-                                name=self.name,
-                                file_count=self.total_files,
-                                files=files_text))
+            self.status_label.setText(_('Analysing {name} - Found '
+                '{file_count} {files}').format(
+                    name=self.name,
+                    file_count=engine.total_files,
+                    files=files_text))
+            return
 
-                except StopIteration:
-                    if len(self.next_scans) > 0:
-                        self.current_scan = scandir(self.next_scans.popleft())
-                    else:
-                        self.analysing = False
+        if self.progress_bar is None:
+            progress_bar = QProgressBar()
+            progress_bar.setRange(0, engine.total_files)
+            progress_bar.setValue(0)
+            self.status_bar.addWidget(progress_bar)
+            self.progress_bar = progress_bar
+
+        self.progress_bar.setValue(engine.deleted_files)
+        if engine.current_path is not None:
+            self.display_entry(engine.current_path)
+
+        if engine.finished:
+            if engine.failure is None:
+                self.delete_completed = True
+                self.stop()
+            elif self.retry_dialog(engine.failure):
+                self.status_bar.removeWidget(self.progress_bar)
+                self.progress_bar = None
+                self.start_engine()
+            else:
+                self.stop()
 
-                        if len(self.source_entries) > 0:
-                            self.deleting = True
+    def retry_dialog(self, e):
+        retry_msgbox = QMessageBox()
+        retry_msgbox.setWindowTitle(_('Cannot remove directory'))
 
-                            progress_bar = QProgressBar()
-                            progress_bar.setRange(0, self.total_files)
-                            progress_bar.setValue(0)
-                            self.status_bar.addWidget(progress_bar)
-                            self.progress_bar = progress_bar
+        process = None
+        if e.filename is not None:
+            process = find_process_with_file_handle(e.filename)
 
-                            self.deleted_files = 0
-                            self.current_entry = None
-                        else:
-                            self.delete_completed = True
-                            self.stop()
-
-        elif self.deleting:
-            if self.current_entry is None:
-                if len(self.source_entries) > 0:
-                    self.current_entry = self.source_entries.pop()
-                    self.display_entry(self.current_entry)
-                else:
-                    # Remove the source directory
-                    while os.path.exists(self.src):
-                        try:
-                            try:
-                                os.rmdir(self.src)
-                            except OSError:
-                                # Remove read-only and try again
-                                os.chmod(self.src, stat.S_IWRITE)
-                                os.rmdir(self.src)
-                        except OSError as e:
-                            retry_msgbox = QMessageBox()
-                            retry_msgbox.setWindowTitle(
-                                _('Cannot remove directory'))
-
-                            process = None
-                            if e.filename is not None:
-                                process = find_process_with_file_handle(
-                                    e.filename)
-
-                            text = _('''
+        text = _('''
 <p>The launcher failed to remove the following directory: {directory}</p>
 <p>When trying to remove or access {filename}, the launcher raised the
 following error: {error}</p>''').format(
-                                directory=html.escape(self.src),
-                                filename=html.escape(e.filename),
-                                error=html.escape(e.strerror))
+            directory=html.escape(self.src),
+            filename=html.escape(str(e.filename)),
+            error=html.escape(str(e.strerror)))
 
-                            if process is None:
-                                text = text + _('''
+        if process is None:
+            text = text + _('''
 <p>No process seems to be using that file or directory.</p>''')
-                            else:
-                                text = text + _('''
+        else:
+            text = text + _('''
 <p>The process <strong>{image_file_name} ({pid})</strong> is currently using
 that file or directory. You might need to end it if you want to retry.</p>'''
-                                ).format(
-                                    image_file_name=process['image_file_name'],
-                                    pid=process['pid'])
-
-                            retry_msgbox.setText(text)
-                            retry_msgbox.setInformativeText(_('Do you want to '
-                                'retry removing this directory?'))
-                            retry_msgbox.addButton(
-                                _('Retry removing the directory'),
-                                QMessageBox.YesRole)
-                            retry_msgbox.addButton(_('Cancel the operation'),
-                                QMessageBox.NoRole)
-                            retry_msgbox.setIcon(QMessageBox.Critical)
-
-                            if retry_msgbox.exec() == 1:
-                                self.deleting = False
-                                self.stop()
-                                break
-
-                    self.deleting = False
-                    self.delete_completed = True
-                    self.stop()
-            else:
-                while os.path.exists(self.current_entry.path):
-                    try:
-                        if self.current_entry.is_dir():
-                            try:
-                                os.rmdir(self.current_entry.path)
-                            except OSError:
-                                # Remove read-only and try again
-                                os.chmod(self.current_entry.path, stat.S_IWRITE)
-                                os.rmdir(self.current_entry.path)
-                        elif self.current_entry.is_file():
-                            try:
-                                os.unlink(self.current_entry.path)
-                            except OSError:
-                                # Remove read-only and try again
-                                os.chmod(self.current_entry.path, stat.S_IWRITE)
-                                os.unlink(self.current_entry.path)
-                    except OSError as e:
-                        retry_msgbox = QMessageBox()
-                        retry_msgbox.setWindowTitle(
-                            _('Cannot remove directory'))
-
-                        process = None
-                        if e.filename is not None:
-                            process = find_process_with_file_handle(e.filename)
-
-                        text = _('''
-<p>The launcher failed to remove the following directory: {directory}</p>
-<p>When trying to remove or access {filename}, the launcher raised the
-following error: {error}</p>''').format(
-                            directory=html.escape(self.src),
-                            filename=html.escape(e.filename),
-                            error=html.escape(e.strerror))
+            ).format(image_file_name=process['image_file_name'],
+                pid=process['pid'])
 
-                        if process is None:
-                            text = text + _('''
-<p>No process seems to be using that file or directory.</p>''')
-                        else:
-                            text = text + _('''
-<p>The process <strong>{image_file_name} ({pid})</strong> is currently using
-that file or directory. You might need to end it if you want to retry.</p>'''
-                            ).format(image_file_name=process['image_file_name'],
-                                pid=process['pid'])
-
-                        retry_msgbox.setText(text)
-                        retry_msgbox.setInformativeText(_('Do you want to '
-                            'retry removing this directory?'))
-                        retry_msgbox.addButton(
-                            _('Retry removing the directory'),
-                            QMessageBox.YesRole)
-                        retry_msgbox.addButton(_('Cancel the operation'),
-                            QMessageBox.NoRole)
-                        retry_msgbox.setIcon(QMessageBox.Critical)
-
-                        if retry_msgbox.exec() == 1:
-                            self.deleting = False
-                            self.stop()
-                            break
-
-                self.current_entry = None
-                self.deleted_files += 1
-
-                self.progress_bar.setValue(self.deleted_files)
-    def display_entry(self, entry):
+        retry_msgbox.setText(text)
+        retry_msgbox.setInformativeText(_('Do you want to '
+            'retry removing this directory?'))
+        retry_msgbox.addButton(_('Retry removing the directory'),
+            QMessageBox.YesRole)
+        retry_msgbox.addButton(_('Cancel the operation'), QMessageBox.NoRole)
+        retry_msgbox.setIcon(QMessageBox.Critical)
+
+        return retry_msgbox.exec() == 0
+
+    def display_entry(self, path):
         if self.status_label is not None:
-            entry_rel_path = os.path.relpath(entry.path, self.src)
+            entry_rel_path = os.path.relpath(path, self.src)
             self.status_label.setText(
                 _('Deleting {name} - {entry}').format(name=self.name,
                     entry=entry_rel_path))
 
+    def start_engine(self):
+        self.status_label.setText(_('Analysing {name}').format(name=self.name))
+
+        self.delete_engine = DeleteEngine(self.src)
+        self.delete_engine.start()
+
     def start(self):
         self.started = True
         self.status_bar.clearMessage()
         self.status_bar.busy += 1
 
-        self.analysing = True
         status_label = QLabel()
-        status_label.setText(_('Analysing {name}').format(name=self.name))
         self.status_bar.addWidget(status_label, 100)
         self.status_label = status_label
 
-        self.total_files = 0
+        self.start_engine()
 
         self.timeout.connect(self.step)
 
-        self.current_scan = None
-        self.next_scans = deque()
-        self.source_entries = deque()
-
-        super(ProgressRmTree, self).start(0)
+        super(ProgressRmTree, self).start(cons.PROGRESS_REFRESH_INTERVAL)
 
     def stop(self):
         super(ProgressRmTree, self).stop()
 
+        if self.delete_engine is not None and not self.delete_engine.finished:
+            # Abort and wait for the workers to let go of the files
+            self.delete_engine.cancel()
+            self.delete_engine.join()
+
         if self.started:
             self.status_bar.busy -= 1
             if self.status_label is not None:
@@ -3497,6 +5192,7 @@ that file or directory. You might need to end it if you want to retry.</p>'''
 class ProgressCopyTree(QTimer):
     completed = pyqtSignal()
     aborted = pyqtSignal()
+    failed = pyqtSignal(str)
 
     def __init__(self, src, dst, skips, status_bar, name):
         if not os.path.isdir(src):
@@ -3521,148 +5217,70 @@ class ProgressCopyTree(QTimer):
         self.copying_size_label = None
         self.progress_bar = None
 
-        self.source_file = None
-        self.destination_file = None
+        self.copy_engine = None
 
-        self.analysing = False
         self.copying = False
         self.copy_completed = False
+        self.error = None
 
-    def step(self):
-        if self.analysing:
-            if self.current_scan is None:
-                self.current_scan = scandir(self.src)
-            else:
-                try:
-                    entry = next(self.current_scan)
-                    if self.skips is None or entry.path not in self.skips:
-                        self.source_entries.append(entry)
-                        if entry.is_dir():
-                            self.next_scans.append(entry.path)
-                        elif entry.is_file():
-                            self.total_files += 1
-                            self.total_copy_size += entry.stat().st_size
-
-                            files_text = ngettext('file', 'files',
-                                self.total_files)
-
-                            self.status_label.setText(_('Analysing {name} - '
-                                'Found {file_count} {files} ({size})').format(
-                                    name=self.name,
-                                    file_count=self.total_files,
-                                    files=files_text,
-                                    size=sizeof_fmt(self.total_copy_size)))
-
-                except StopIteration:
-                    if len(self.next_scans) > 0:
-                        self.current_scan = scandir(self.next_scans.popleft())
-                    else:
-                        self.analysing = False
-
-                        os.makedirs(self.dst)
-
-                        if len(self.source_entries) > 0:
-                            self.copying = True
+    def skip_entry(self, entry):
+        return self.skips is not None and entry.path in self.skips
 
-                            copying_speed_label = QLabel()
-                            copying_speed_label.setText(_('{bytes_sec}/s'
-                                ).format(bytes_sec=sizeof_fmt(0)))
-                            self.status_bar.addWidget(copying_speed_label)
-                            self.copying_speed_label = copying_speed_label
-
-                            copying_size_label = QLabel()
-                            copying_size_label.setText(
-                                '{bytes_read}/{total_bytes}'
-                                .format(bytes_read=sizeof_fmt(0),
-                                        total_bytes=sizeof_fmt(self.total_copy_size))
-                            )
-                            self.status_bar.addWidget(copying_size_label)
-                            self.copying_size_label = copying_size_label
-
-                            progress_bar = QProgressBar()
-                            progress_bar.setRange(0, self.total_copy_size)
-                            progress_bar.setValue(0)
-                            self.status_bar.addWidget(progress_bar)
-                            self.progress_bar = progress_bar
-
-                            self.copied_size = 0
-                            self.copied_files = 0
-                            self.copy_speed_count = 0
-                            self.last_copied_bytes = 0
-                            self.last_copied = datetime.utcnow()
-                            self.current_entry = None
-                            self.source_file = None
-                            self.destination_file = None
-                        else:
-                            self.copy_completed = True
-                            self.stop()
-
-        elif self.copying:
-            if self.current_entry is None:
-                if len(self.source_entries) > 0:
-                    self.current_entry = self.source_entries.popleft()
-                    self.display_entry(self.current_entry)
-                else:
-                    self.copying = False
-                    self.copy_completed = True
-                    self.stop()
-            elif self.source_file is None and self.destination_file is None:
-                relpath = os.path.relpath(self.current_entry.path, self.src)
-                dstpath = os.path.join(self.dst, relpath)
-                self.dstpath = dstpath
-
-                if self.current_entry.is_dir():
-                    os.makedirs(dstpath)
-                    self.current_entry = None
-                elif self.current_entry.is_file():
-                    filedir = os.path.dirname(dstpath)
-                    if not os.path.isdir(filedir):
-                        os.makedirs(filedir)
-                    self.source_file = open(self.current_entry.path, 'rb')
-                    self.destination_file = open(dstpath, 'wb')
-            else:
-                buf = self.source_file.read(cons.READ_BUFFER_SIZE)
-                buf_len = len(buf)
-                if buf_len == 0:
-                    self.source_file.close()
-                    self.destination_file.close()
-                    shutil.copystat(self.current_entry.path, self.dstpath)
-                    self.source_file = None
-                    self.destination_file = None
-                    self.current_entry = None
-
-                    self.copied_files += 1
-                else:
-                    self.destination_file.write(buf)
-
-                    self.copied_size += buf_len
-                    self.progress_bar.setValue(self.copied_size)
+    def step(self):
+        if not self.copying:
+            return
 
-                    self.copy_speed_count += 1
+        engine = self.copy_engine
+
+        if engine.current_path is not None:
+            self.display_entry(engine.current_path)
+        elif engine.counting:
+            files_text = ngettext('file', 'files', engine.total_files)
+
+            self.status_label.setText(_('Analysing {name} - '
+                'Found {file_count} {files} ({size})').format(
+                    name=self.name,
+                    file_count=engine.total_files,
+                    files=files_text,
+                    size=sizeof_fmt(engine.total_bytes)))
+
+        # The total keeps growing while the tree is still being counted
+        self.progress_bar.setRange(0, max(engine.total_bytes,
+            engine.copied_bytes))
+        self.progress_bar.setValue(engine.copied_bytes)
+        self.copying_size_label.setText(
+            '{bytes_read}/{total_bytes}'
+            .format(bytes_read=sizeof_fmt(engine.copied_bytes),
+                    total_bytes=sizeof_fmt(engine.total_bytes))
+        )
 
-                    if self.copy_speed_count % 10 == 0:
-                        self.copying_size_label.setText(
-                            '{bytes_read}/{total_bytes}'
-                            .format(bytes_read=sizeof_fmt(self.copied_size),
-                                    total_bytes=sizeof_fmt(self.total_copy_size))
-                        )
+        delta_bytes = engine.copied_bytes - self.last_copied_bytes
+        delta_time = datetime.utcnow() - self.last_copied
+        if delta_time.total_seconds() == 0:
+            delta_time = timedelta.resolution
 
-                        delta_bytes = self.copied_size - self.last_copied_bytes
-                        delta_time = datetime.utcnow() - self.last_copied
-                        if delta_time.total_seconds() == 0:
-                            delta_time = timedelta.resolution
+        bytes_secs = delta_bytes / delta_time.total_seconds()
+        self.copying_speed_label.setText(_('{bytes_sec}/s'
+            ).format(bytes_sec=sizeof_fmt(bytes_secs)))
 
-                        bytes_secs = delta_bytes / delta_time.total_seconds()
-                        self.copying_speed_label.setText(_('{bytes_sec}/s'
-                            ).format(bytes_sec=sizeof_fmt(bytes_secs)))
+        self.last_copied_bytes = engine.copied_bytes
+        self.last_copied = datetime.utcnow()
 
-                        self.last_copied_bytes = self.copied_size
-                        self.last_copied = datetime.utcnow()
+        if engine.finished:
+            self.copying = False
+            if engine.error is None:
+                record_throughput('copy', engine.copied_bytes,
+                    (datetime.utcnow() - self.copy_started).total_seconds())
 
+                self.copy_completed = True
+                self.stop()
+            else:
+                self.error = engine.error
+                self.stop()
 
-    def display_entry(self, entry):
+    def display_entry(self, path):
         if self.status_label is not None:
-            entry_rel_path = os.path.relpath(entry.path, self.src)
+            entry_rel_path = os.path.relpath(path, self.src)
             self.status_label.setText(
                 _('Copying {name} - {entry}').format(name=self.name,
                     entry=entry_rel_path))
@@ -3672,26 +5290,57 @@ class ProgressCopyTree(QTimer):
         self.status_bar.clearMessage()
         self.status_bar.busy += 1
 
-        self.analysing = True
         status_label = QLabel()
         status_label.setText(_('Analysing {name}').format(name=self.name))
         self.status_bar.addWidget(status_label, 100)
         self.status_label = status_label
 
-        self.total_copy_size = 0
-        self.total_files = 0
+        copying_speed_label = QLabel()
+        copying_speed_label.setText(_('{bytes_sec}/s'
+            ).format(bytes_sec=sizeof_fmt(0)))
+        self.status_bar.addWidget(copying_speed_label)
+        self.copying_speed_label = copying_speed_label
 
-        self.timeout.connect(self.step)
+        copying_size_label = QLabel()
+        copying_size_label.setText(
+            '{bytes_read}/{total_bytes}'
+            .format(bytes_read=sizeof_fmt(0), total_bytes=sizeof_fmt(0))
+        )
+        self.status_bar.addWidget(copying_size_label)
+        self.copying_size_label = copying_size_label
 
-        self.current_scan = None
-        self.next_scans = deque()
-        self.source_entries = deque()
+        progress_bar = QProgressBar()
+        progress_bar.setRange(0, 0)
+        progress_bar.setValue(0)
+        self.status_bar.addWidget(progress_bar)
+        self.progress_bar = progress_bar
+
+        self.last_copied_bytes = 0
+        self.last_copied = datetime.utcnow()
+        self.copy_started = datetime.utcnow()
+
+        os.makedirs(self.dst)
+
+        # Both walks are lazy: the tree is counted while it is being copied
+        self.copying = True
+        self.copy_engine = CopyEngine(self.src, self.dst)
+        self.copy_engine.start(walk_entries(self.src, self.skip_entry),
+            walk_entries(self.src, self.skip_entry))
 
-        super(ProgressCopyTree, self).start(0)
+        self.timeout.connect(self.step)
+
+        # Publish the progress at a fixed rate while the worker threads are
+        # copying
+        super(ProgressCopyTree, self).start(cons.PROGRESS_REFRESH_INTERVAL)
 
     def stop(self):
         super(ProgressCopyTree, self).stop()
 
+        if self.copy_engine is not None and not self.copy_engine.finished:
+            # Abort and wait for the workers to let go of the files
+            self.copy_engine.cancel()
+            self.copy_engine.join()
+
         if self.started:
             self.status_bar.busy -= 1
             if self.status_label is not None:
@@ -3703,12 +5352,9 @@ class ProgressCopyTree(QTimer):
             if self.copying_size_label is not None:
                 self.status_bar.removeWidget(self.copying_size_label)
 
-            if self.source_file is not None:
-                self.source_file.close()
-            if self.destination_file is not None:
-                self.destination_file.close()
-
         if self.copy_completed:
             self.completed.emit()
+        elif self.error is not None:
+            self.failed.emit(str(self.error))
         else:
             self.aborted.emit()
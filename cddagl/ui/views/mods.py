@@ -5,33 +5,40 @@ import os
 import random
 import shutil
 import tempfile
-import zipfile
-from collections import deque
 from datetime import datetime
 from os import scandir
-from urllib.parse import urljoin, urlencode
+from urllib.parse import urlencode
 
-import rarfile
-from PyQt5.QtCore import Qt, QTimer, QUrl, QFileInfo, QStringListModel
-from PyQt5.QtNetwork import QNetworkAccessManager, QNetworkRequest
+from PyQt5.QtCore import (
+    Qt, QThread, QUrl, QFileInfo, QStringListModel, pyqtSignal
+)
+from PyQt5.QtGui import QStandardItem, QStandardItemModel
+from PyQt5.QtNetwork import QNetworkRequest
 from PyQt5.QtWidgets import (
     QWidget, QGridLayout, QGroupBox, QVBoxLayout, QLabel, QLineEdit, QPushButton, QProgressBar, QTextBrowser,
-    QTabWidget, QMessageBox, QHBoxLayout, QListView, QAbstractItemView, QTextEdit
+    QTabWidget, QMessageBox, QHBoxLayout, QListView, QAbstractItemView, QTextEdit, QTreeView, QHeaderView
 )
-from py7zlib import Archive7z, NoPasswordGivenError, FormatError
 from werkzeug.http import parse_options_header
 from werkzeug.utils import secure_filename
 
 import cddagl.constants as cons
+from cddagl.archives import ArchiveError, extract_archive
+from cddagl.bandwidth import FOREGROUND, ThrottledReply
 from cddagl import __version__ as version
-from cddagl.constants import get_data_path, get_cddagl_path
+from cddagl.constants import get_data_path
+from cddagl.fileops import OperationCancelled, walk_entries, tree_size
 from cddagl.functions import sizeof_fmt, delete_path
-from cddagl.i18n import proxy_gettext as _
+from cddagl.i18n import proxy_ngettext as ngettext, proxy_gettext as _
+from cddagl.installqueue import install_queue
+from cddagl.mirrors import MirroredReply
+from cddagl.network import RemoteFileProber, offline_mode
 from cddagl.ui.views.dialogs import BrowserDownloadDialog
 
 logger = logging.getLogger('cddagl')
 
-rarfile.UNRAR_TOOL = get_cddagl_path('UnRAR.exe')
+# Repository rows are sorted on this role and point back to their entry
+REPO_SORT_ROLE = Qt.UserRole
+REPO_INDEX_ROLE = Qt.UserRole + 1
 
 
 class ModsTab(QTabWidget):
@@ -39,10 +46,11 @@ class ModsTab(QTabWidget):
         super(ModsTab, self).__init__()
 
         self.tab_disabled = False
-        self.qnam = QNetworkAccessManager()
 
-        self.http_reply = None
-        self.current_repo_info = None
+        self.size_prober = RemoteFileProber(cons.FAKE_USER_AGENT)
+        self.size_prober.probed.connect(self.size_probed)
+
+        install_queue().item_installed.connect(self.queue_installed)
 
         self.mods = []
         self.mods_model = None
@@ -52,8 +60,7 @@ class ModsTab(QTabWidget):
         self.extracting_new_mod = False
 
         self.install_type = None
-        self.extracting_file = None
-        self.extracting_zipfile = None
+        self.extracting_thread = None
 
         self.close_after_install = False
 
@@ -110,9 +117,15 @@ class ModsTab(QTabWidget):
         repository_gb.setLayout(repository_gb_layout)
         self.repository_gb_layout = repository_gb_layout
 
-        repository_lv = QListView()
+        repository_lv = QTreeView()
         repository_lv.clicked.connect(self.repository_clicked)
         repository_lv.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        repository_lv.setRootIsDecorated(False)
+        repository_lv.setAllColumnsShowFocus(True)
+        repository_lv.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        repository_lv.setSortingEnabled(True)
+        repository_lv.sortByColumn(0, Qt.AscendingOrder)
+        repository_lv.header().setStretchLastSection(False)
         repository_gb_layout.addWidget(repository_lv)
         self.repository_lv = repository_lv
 
@@ -127,6 +140,12 @@ class ModsTab(QTabWidget):
         repository_gb_layout.addWidget(install_new_button)
         self.install_new_button = install_new_button
 
+        queue_button = QPushButton()
+        queue_button.clicked.connect(self.queue_selected)
+        queue_button.setEnabled(False)
+        repository_gb_layout.addWidget(queue_button)
+        self.queue_button = queue_button
+
         top_part.setLayout(tp_layout)
         layout.addWidget(top_part)
         self.top_part = top_part
@@ -247,6 +266,7 @@ class ModsTab(QTabWidget):
             'on GitHub</a>').format(url=suggest_url))
         self.repository_gb.setTitle(_('Repository'))
         self.install_new_button.setText(_('Install this mod'))
+        self.queue_button.setText(_('Add selected to the download queue'))
         self.details_gb.setTitle(_('Details'))
         self.name_label.setText(_('Name:'))
         self.ident_label.setText(_('Ident:'))
@@ -264,6 +284,8 @@ class ModsTab(QTabWidget):
         self.homepage_label.setText(_('Home page:'))
         self.version_label.setText(_('Version:'))
 
+        self.repo_mods_model.setHorizontalHeaderLabels([_('Name'), _('Size')])
+
     def get_main_window(self):
         return self.parentWidget().parentWidget().parentWidget()
 
@@ -287,6 +309,8 @@ class ModsTab(QTabWidget):
 
         self.install_new_button.setEnabled(False)
 
+        self.queue_button.setEnabled(False)
+
         installed_selection = self.installed_lv.selectionModel()
         if installed_selection is not None:
             installed_selection.clearSelection()
@@ -315,13 +339,21 @@ class ModsTab(QTabWidget):
 
         self.install_new_button.setEnabled(repository_selected)
 
+        self.queue_button.setEnabled(repository_selected)
+
     def load_repository(self):
         self.repo_mods = []
 
         self.install_new_button.setEnabled(False)
 
-        self.repo_mods_model = QStringListModel()
+        self.queue_button.setEnabled(False)
+
+        self.repo_mods_model = QStandardItemModel()
+        self.repo_mods_model.setSortRole(REPO_SORT_ROLE)
         self.repository_lv.setModel(self.repo_mods_model)
+        header = self.repository_lv.header()
+        header.setSectionResizeMode(0, QHeaderView.Stretch)
+        header.setSectionResizeMode(1, QHeaderView.ResizeToContents)
         self.repository_lv.selectionModel().currentChanged.connect(
             self.repository_selection)
 
@@ -335,17 +367,112 @@ class ModsTab(QTabWidget):
                         values.sort(key=lambda x: x['name'])
                         self.repo_mods = values
 
-                        self.repo_mods_model.insertRows(
-                            self.repo_mods_model.rowCount(),
-                            len(self.repo_mods))
                         for index, mod_info in enumerate(
                             self.repo_mods):
-                            self.repo_mods_model.setData(
-                                self.repo_mods_model.index(index),
-                                mod_info['name'])
+                            self.repo_mods_model.appendRow(
+                                self.repository_row(index, mod_info))
                 except ValueError:
                     pass
 
+        self.probe_repository()
+
+    def repository_row(self, index, mod_info):
+        name_item = QStandardItem(mod_info['name'])
+        name_item.setData(mod_info['name'].lower(), REPO_SORT_ROLE)
+        name_item.setData(index, REPO_INDEX_ROLE)
+
+        size_item = QStandardItem()
+        size_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+        self.set_size_item(size_item, mod_info)
+
+        return [name_item, size_item]
+
+    def set_size_item(self, size_item, mod_info):
+        size = mod_info.get('size')
+        if size is None:
+            size_item.setText('')
+            size_item.setData(-1, REPO_SORT_ROLE)
+        else:
+            size_item.setText(sizeof_fmt(size))
+            size_item.setData(size, REPO_SORT_ROLE)
+
+        last_modified = mod_info.get('last_modified')
+        if last_modified is not None:
+            size_item.setToolTip(_('Last modified: {date}').format(
+                date=last_modified.strftime('%Y-%m-%d')))
+
+    def repo_info(self, index):
+        return self.repo_mods[self.repo_mods_model.item(index.row(), 0).data(
+            REPO_INDEX_ROLE)]
+
+    def probe_repository(self):
+        urls = []
+        for mod_info in self.repo_mods:
+            if mod_info['type'] != 'direct_download':
+                continue
+
+            cached = self.size_prober.cached(mod_info['url'])
+            if cached is None:
+                urls.append(mod_info['url'])
+            else:
+                self.set_remote_info(mod_info, cached['size'],
+                    cached['last_modified'])
+
+        for row in range(self.repo_mods_model.rowCount()):
+            mod_info = self.repo_info(self.repo_mods_model.index(row, 0))
+            self.set_size_item(self.repo_mods_model.item(row, 1), mod_info)
+
+        self.size_prober.probe(urls)
+
+    def set_remote_info(self, mod_info, size, last_modified):
+        # A size which could not be probed keeps the one from the repository
+        if size is not None:
+            mod_info['size'] = size
+        if last_modified is not None:
+            mod_info['last_modified'] = last_modified
+        mod_info['probed'] = True
+
+    def queue_selected(self):
+        selection_model = self.repository_lv.selectionModel()
+        if selection_model is None or self.mods_dir is None:
+            return
+
+        if offline_mode():
+            main_window = self.get_main_window()
+            status_bar = main_window.statusBar()
+            status_bar.showMessage(_('Mods cannot be downloaded in offline '
+                'mode'))
+            return
+
+        # Already installed and already queued entries are skipped
+        queued = 0
+        for index in selection_model.selectedRows():
+            info = self.repo_info(index)
+            if info['type'] != 'direct_download':
+                continue
+            mod_idents = info['ident']
+            if not isinstance(mod_idents, list):
+                mod_idents = (mod_idents, )
+            if any(mod['ident'] in mod_idents for mod in self.mods):
+                continue
+            if install_queue().is_queued(info['url'], self.mods_dir):
+                continue
+
+            install_queue().add('mod', info, self.game_dir,
+                self.mods_dir)
+            queued += 1
+
+        main_window = self.get_main_window()
+        status_bar = main_window.statusBar()
+        status_bar.showMessage(ngettext('{count} mod was added to the '
+            'download queue', '{count} mods were added to the download '
+            'queue', queued).format(count=queued))
+
+    def queue_installed(self, item):
+        if (item['kind'] == 'mod' and item['game_dir'] == self.game_dir
+            and not self.installing_new_mod):
+            self.game_dir_changed(self.game_dir)
+
     def install_new(self):
         if not self.installing_new_mod:
             selection_model = self.repository_lv.selectionModel()
@@ -353,7 +480,7 @@ class ModsTab(QTabWidget):
                 return
 
             selected = selection_model.currentIndex()
-            selected_info = self.repo_mods[selected.row()]
+            selected_info = self.repo_info(selected)
 
             mod_idents = selected_info['ident']
             if isinstance(mod_idents, list):
@@ -386,13 +513,17 @@ class ModsTab(QTabWidget):
                         return
                     break
 
+            if (selected_info['type'] == 'direct_download' and
+                offline_mode()):
+                main_window = self.get_main_window()
+                status_bar = main_window.statusBar()
+                status_bar.showMessage(_('Mods cannot be downloaded in '
+                    'offline mode'))
+                return
+
             self.install_type = selected_info['type']
 
             if selected_info['type'] == 'direct_download':
-                if self.http_reply is not None and self.http_reply.isRunning():
-                    self.http_reply_aborted = True
-                    self.http_reply.abort()
-
                 self.installing_new_mod = True
                 self.download_aborted = False
 
@@ -441,13 +572,12 @@ class ModsTab(QTabWidget):
 
                 self.downloading_new_mod = True
 
-                request = QNetworkRequest(QUrl(url))
-                request.setRawHeader(b'User-Agent', cons.FAKE_USER_AGENT)
-
-                self.download_http_reply = self.qnam.get(request)
+                self.download_http_reply = MirroredReply(url,
+                    cons.FAKE_USER_AGENT)
                 self.download_http_reply.finished.connect(
                     self.download_http_finished)
-                self.download_http_reply.readyRead.connect(
+                self.download_throttle = ThrottledReply(
+                    self.download_http_reply, FOREGROUND,
                     self.download_http_ready_read)
                 self.download_http_reply.downloadProgress.connect(
                     self.download_dl_progress)
@@ -488,56 +618,6 @@ class ModsTab(QTabWidget):
                         self.get_settings_tab().disable_tab()
                         self.get_backups_tab().disable_tab()
 
-                        # Test downloaded file
-                        status_bar.showMessage(_('Testing downloaded file '
-                            'archive'))
-
-                        if self.downloaded_file.lower().endswith('.7z'):
-                            try:
-                                with open(self.downloaded_file, 'rb') as f:
-                                    archive = Archive7z(f)
-                            except FormatError:
-                                status_bar.clearMessage()
-                                status_bar.showMessage(_('Selected file is a '
-                                    'bad archive file'))
-
-                                self.finish_install_new_mod()
-                                return
-                            except NoPasswordGivenError:
-                                status_bar.clearMessage()
-                                status_bar.showMessage(_('Selected file is a '
-                                    'password protected archive file'))
-
-                                self.finish_install_new_mod()
-                                return
-                        else:
-                            if self.downloaded_file.lower().endswith('.zip'):
-                                archive_class = zipfile.ZipFile
-                                archive_exception = zipfile.BadZipFile
-                                test_method = 'testzip'
-                            elif self.downloaded_file.lower().endswith('.rar'):
-                                archive_class = rarfile.RarFile
-                                archive_exception = rarfile.Error
-                                test_method = 'testrar'
-
-                            try:
-                                with archive_class(self.downloaded_file) as z:
-                                    test = getattr(z, test_method)
-                                    if test() is not None:
-                                        status_bar.clearMessage()
-                                        status_bar.showMessage(
-                                            _('Downloaded archive is invalid'))
-
-                                        self.finish_install_new_mod()
-                                        return
-                            except archive_exception:
-                                status_bar.clearMessage()
-                                status_bar.showMessage(_('Selected file is a '
-                                    'bad archive file'))
-
-                                self.finish_install_new_mod()
-                                return
-
                         status_bar.clearMessage()
                         self.extract_new_mod()
         else:
@@ -549,7 +629,10 @@ class ModsTab(QTabWidget):
                 self.download_aborted = True
                 self.download_http_reply.abort()
             elif self.extracting_new_mod:
-                self.extracting_timer.stop()
+                extracting_thread = self.extracting_thread
+                self.extracting_thread = None
+                extracting_thread.cancelled = True
+                extracting_thread.wait()
 
                 status_bar.removeWidget(self.extracting_label)
                 status_bar.removeWidget(self.extracting_progress_bar)
@@ -558,9 +641,6 @@ class ModsTab(QTabWidget):
 
                 self.extracting_new_mod = False
 
-                if self.extracting_zipfile is not None:
-                    self.extracting_zipfile.close()
-
                 if self.install_type == 'direct_download':
                     download_dir = os.path.dirname(self.downloaded_file)
                     delete_path(download_dir)
@@ -573,6 +653,9 @@ class ModsTab(QTabWidget):
             self.finish_install_new_mod()
 
     def download_http_finished(self):
+        self.download_throttle.finish()
+        self.download_throttle = None
+
         if self.downloading_file is not None:
             self.downloading_file.close()
 
@@ -591,127 +674,18 @@ class ModsTab(QTabWidget):
 
             self.downloading_new_mod = False
         else:
-            redirect = self.download_http_reply.attribute(
-                QNetworkRequest.RedirectionTargetAttribute)
-            if redirect is not None:
-                delete_path(self.download_dir)
-                os.makedirs(self.download_dir)
-
-                status_bar.busy += 1
-
-                redirected_url = urljoin(
-                    self.download_http_reply.request().url().toString(),
-                    redirect.toString())
-
-                downloading_label = QLabel()
-                downloading_label.setText(_('Downloading: {0}').format(
-                    redirected_url))
-                status_bar.addWidget(downloading_label, 100)
-                self.downloading_label = downloading_label
-
-                dowloading_speed_label = QLabel()
-                status_bar.addWidget(dowloading_speed_label)
-                self.dowloading_speed_label = dowloading_speed_label
-
-                downloading_size_label = QLabel()
-                status_bar.addWidget(downloading_size_label)
-                self.downloading_size_label = downloading_size_label
-
-                progress_bar = QProgressBar()
-                status_bar.addWidget(progress_bar)
-                self.downloading_progress_bar = progress_bar
-                progress_bar.setMinimum(0)
-
-                self.download_last_read = datetime.utcnow()
-                self.download_last_bytes_read = 0
-                self.download_speed_count = 0
-
-                progress_bar.setValue(0)
-
-                self.download_first_ready = True
-                self.downloading_file = None
-
-                request = QNetworkRequest(QUrl(redirected_url))
-                request.setRawHeader(b'User-Agent', cons.FAKE_USER_AGENT)
-
-                self.download_http_reply = self.qnam.get(request)
-                self.download_http_reply.finished.connect(
-                    self.download_http_finished)
-                self.download_http_reply.readyRead.connect(
-                    self.download_http_ready_read)
-                self.download_http_reply.downloadProgress.connect(
-                    self.download_dl_progress)
-            else:
-                if not os.path.exists(self.downloaded_file):
-                    status_bar.clearMessage()
-                    status_bar.showMessage(
-                        _('Could not find downloaded archive ({file})'
-                        ).format(file=self.downloaded_file))
-
-                    self.finish_install_new_mod()
-                    return
-
-                # Test downloaded file
-                status_bar.showMessage(_('Testing downloaded file archive'))
-
-                if self.downloaded_file.lower().endswith('.7z'):
-                    try:
-                        with open(self.downloaded_file, 'rb') as f:
-                            archive = Archive7z(f)
-                    except FormatError:
-                        status_bar.clearMessage()
-                        status_bar.showMessage(_('Selected file is a '
-                            'bad archive file'))
-
-                        self.finish_install_new_mod()
-                        return
-                    except NoPasswordGivenError:
-                        status_bar.clearMessage()
-                        status_bar.showMessage(_('Selected file is a '
-                            'password protected archive file'))
-
-                        self.finish_install_new_mod()
-                        return
-                else:
-                    if self.downloaded_file.lower().endswith('.zip'):
-                        archive_class = zipfile.ZipFile
-                        archive_exception = zipfile.BadZipFile
-                        test_method = 'testzip'
-                    elif self.downloaded_file.lower().endswith('.rar'):
-                        archive_class = rarfile.RarFile
-                        archive_exception = rarfile.Error
-                        test_method = 'testrar'
-                    else:
-                        extension = os.path.splitext(self.downloaded_file)[1]
-                        status_bar.clearMessage()
-                        status_bar.showMessage(
-                            _('Unknown downloaded archive format ({extension})'
-                            ).format(extension=extension))
-
-                        self.finish_install_new_mod()
-                        return
-
-                    try:
-                        with archive_class(self.downloaded_file) as z:
-                            test = getattr(z, test_method)
-                            if test() is not None:
-                                status_bar.clearMessage()
-                                status_bar.showMessage(
-                                    _('Downloaded archive is invalid'))
-
-                                self.finish_install_new_mod()
-                                return
-                    except archive_exception:
-                        status_bar.clearMessage()
-                        status_bar.showMessage(_('Selected file is a '
-                            'bad archive file'))
+            if not os.path.exists(self.downloaded_file):
+                status_bar.clearMessage()
+                status_bar.showMessage(
+                    _('Could not find downloaded archive ({file})'
+                    ).format(file=self.downloaded_file))
 
-                        self.finish_install_new_mod()
-                        return
+                self.finish_install_new_mod()
+                return
 
-                status_bar.clearMessage()
-                self.downloading_new_mod = False
-                self.extract_new_mod()
+            status_bar.clearMessage()
+            self.downloading_new_mod = False
+            self.extract_new_mod()
 
     def finish_install_new_mod(self):
         self.installing_new_mod = False
@@ -729,7 +703,7 @@ class ModsTab(QTabWidget):
         if self.close_after_install:
             self.get_main_window().close()
 
-    def download_http_ready_read(self):
+    def download_http_ready_read(self, data):
         if self.download_first_ready:
             self.download_first_ready = False
 
@@ -743,11 +717,7 @@ class ModsTab(QTabWidget):
 
             self.downloading_file = open(self.downloaded_file, 'wb')
 
-        while True:
-            data = self.download_http_reply.read(cons.READ_BUFFER_SIZE)
-            if not data:
-                break
-            self.downloading_file.write(data)
+        self.downloading_file.write(data)
 
     def download_dl_progress(self, bytes_read, total_bytes):
         self.downloading_progress_bar.setMaximum(total_bytes)
@@ -774,99 +744,99 @@ class ModsTab(QTabWidget):
     def extract_new_mod(self):
         self.extracting_new_mod = True
 
-        if self.downloaded_file.lower().endswith('.7z'):
-            self.extracting_zipfile = open(self.downloaded_file, 'rb')
-            self.extracting_archive = Archive7z(self.extracting_zipfile)
-
-            self.extracting_infolist = self.extracting_archive.getmembers()
-        else:
-            if self.downloaded_file.lower().endswith('.zip'):
-                archive_class = zipfile.ZipFile
-            elif self.downloaded_file.lower().endswith('.rar'):
-                archive_class = rarfile.RarFile
-
-            z = archive_class(self.downloaded_file)
-            self.extracting_zipfile = z
-
-            self.extracting_infolist = z.infolist()
-
         self.extract_dir = os.path.join(self.game_dir, 'newmod')
         while os.path.exists(self.extract_dir):
             self.extract_dir = os.path.join(self.game_dir,
                 'newmod-{0}'.format('%08x' % random.randrange(16**8)))
         os.makedirs(self.extract_dir)
 
-        self.extracting_index = 0
-
         main_window = self.get_main_window()
         status_bar = main_window.statusBar()
 
         status_bar.busy += 1
 
         extracting_label = QLabel()
+        extracting_label.setText(_('Testing downloaded file archive'))
         status_bar.addWidget(extracting_label, 100)
         self.extracting_label = extracting_label
 
         progress_bar = QProgressBar()
+        progress_bar.setRange(0, 0)
         status_bar.addWidget(progress_bar)
         self.extracting_progress_bar = progress_bar
 
-        timer = QTimer(self)
-        self.extracting_timer = timer
+        class ExtractingThread(QThread):
+            progress = pyqtSignal(str, 'qint64', 'qint64')
+            completed = pyqtSignal()
+            failed = pyqtSignal(str)
 
-        progress_bar.setRange(0, len(self.extracting_infolist))
+            def __init__(self, archive_path, extract_dir):
+                super(ExtractingThread, self).__init__()
 
-        def timeout():
-            self.extracting_progress_bar.setValue(self.extracting_index)
+                self.archive_path = archive_path
+                self.extract_dir = extract_dir
+                self.cancelled = False
 
-            if self.extracting_index == len(self.extracting_infolist):
-                self.extracting_timer.stop()
+            def __del__(self):
+                self.wait()
 
-                main_window = self.get_main_window()
-                status_bar = main_window.statusBar()
+            def run(self):
+                try:
+                    extract_archive(self.archive_path, self.extract_dir,
+                        self.progress.emit, lambda: self.cancelled)
+                except OperationCancelled:
+                    return
+                except (ArchiveError, OSError) as e:
+                    self.failed.emit(str(e))
+                    return
 
-                status_bar.removeWidget(self.extracting_label)
-                status_bar.removeWidget(self.extracting_progress_bar)
+                self.completed.emit()
 
-                status_bar.busy -= 1
+        extracting_thread = ExtractingThread(self.downloaded_file,
+            self.extract_dir)
 
-                self.extracting_new_mod = False
+        def progress(name, extracted, total):
+            if self.extracting_thread is not extracting_thread:
+                return
 
-                self.extracting_zipfile.close()
-                self.extracting_zipfile = None
+            self.extracting_label.setText(_('Extracting {0}').format(name))
+            self.extracting_progress_bar.setRange(0, total)
+            self.extracting_progress_bar.setValue(extracted)
 
-                if self.downloaded_file.lower().endswith('.7z'):
-                    self.extracting_archive = None
+        def ended(message=None):
+            if self.extracting_thread is not extracting_thread:
+                # Cancelled
+                return
+            self.extracting_thread = None
 
-                if self.install_type == 'direct_download':
-                    download_dir = os.path.dirname(self.downloaded_file)
-                    delete_path(download_dir)
+            main_window = self.get_main_window()
+            status_bar = main_window.statusBar()
 
-                self.move_new_mod()
+            status_bar.removeWidget(self.extracting_label)
+            status_bar.removeWidget(self.extracting_progress_bar)
+
+            status_bar.busy -= 1
+
+            self.extracting_new_mod = False
 
+            if self.install_type == 'direct_download':
+                download_dir = os.path.dirname(self.downloaded_file)
+                delete_path(download_dir)
+
+            if message is None:
+                self.move_new_mod()
             else:
-                extracting_element = self.extracting_infolist[
-                    self.extracting_index]
-
-                self.extracting_label.setText(_('Extracting {0}').format(
-                    extracting_element.filename))
-
-                if self.downloaded_file.lower().endswith('.7z'):
-                    destination = os.path.join(self.extract_dir,
-                        *extracting_element.filename.split('/'))
-                    dest_dir = os.path.dirname(destination)
-                    if not os.path.isdir(dest_dir):
-                        os.makedirs(dest_dir)
-                    with open(destination, 'wb') as f:
-                        f.write(extracting_element.read())
-                else:
-                    self.extracting_zipfile.extract(extracting_element,
-                        self.extract_dir)
+                delete_path(self.extract_dir)
 
-                self.extracting_index += 1
+                status_bar.showMessage(message)
+                self.finish_install_new_mod()
 
-        timer.timeout.connect(timeout)
-        timer.start(0)
+        extracting_thread.progress.connect(progress)
+        extracting_thread.completed.connect(ended)
+        extracting_thread.failed.connect(ended)
+
+        self.extracting_thread = extracting_thread
+        extracting_thread.start()
 
     def move_new_mod(self):
         # Find the mod(s) in the self.extract_dir
@@ -879,33 +849,15 @@ class ModsTab(QTabWidget):
 
         status_bar.showMessage(_('Finding the mod(s)'))
 
-        next_scans = deque()
-        current_scan = scandir(self.extract_dir)
-
         mod_dirs = set()
 
-        while True:
-            try:
-                entry = next(current_scan)
-                dirname, basename = os.path.split(entry.path)
-
-                # Don't include submod dir/files in mod dir search
-                if dirname in mod_dirs:
-                    continue
-
-                if entry.is_dir():
-                    next_scans.append(entry.path)
-                elif entry.is_file():
-                    if basename.lower() == 'modinfo.json':
-                        mod_dirs.add(dirname)
-            except StopIteration:
-                if len(next_scans) > 0:
-                    current_scan = scandir(next_scans.popleft())
-                else:
-                    break
+        # Don't include submod dir/files in mod dir search
+        def in_mod_dir(entry):
+            return os.path.dirname(entry.path) in mod_dirs
 
-        for item in current_scan:
-            pass
+        for entry in walk_entries(self.extract_dir, in_mod_dir):
+            if entry.is_file() and entry.name.lower() == 'modinfo.json':
+                mod_dirs.add(os.path.dirname(entry.path))
 
         if len(mod_dirs) == 0:
             status_bar.showMessage(_('Mod installation cancelled - There '
@@ -1051,6 +1003,7 @@ class ModsTab(QTabWidget):
             self.disable_existing_button.setEnabled(True)
             self.delete_existing_button.setEnabled(True)
         self.install_new_button.setEnabled(False)
+        self.queue_button.setEnabled(False)
 
         repository_selection = self.repository_lv.selectionModel()
         if repository_selection is not None:
@@ -1063,7 +1016,7 @@ class ModsTab(QTabWidget):
         selection_model = self.repository_lv.selectionModel()
         if selection_model is not None and selection_model.hasSelection():
             selected = selection_model.currentIndex()
-            selected_info = self.repo_mods[selected.row()]
+            selected_info = self.repo_info(selected)
 
             self.name_le.setText(selected_info.get('name', ''))
             mod_idents = selected_info.get('ident', '')
@@ -1089,28 +1042,13 @@ class ModsTab(QTabWidget):
                 self.path_le.setText(selected_info['url'])
                 self.homepage_tb.setText('<a href="{url}">{url}</a>'.format(
                     url=html.escape(selected_info['homepage'])))
-                if 'size' not in selected_info:
-                    if not (self.current_repo_info is not None
-                        and self.http_reply is not None
-                        and self.http_reply.isRunning()
-                        and self.current_repo_info is selected_info):
-                        if (self.http_reply is not None
-                            and self.http_reply.isRunning()):
-                            self.http_reply_aborted = True
-                            self.http_reply.abort()
-
-                        self.http_reply_aborted = False
-                        self.size_le.setText(_('Getting remote size'))
-                        self.current_repo_info = selected_info
-
-                        request = QNetworkRequest(QUrl(selected_info['url']))
-                        request.setRawHeader(b'User-Agent', cons.FAKE_USER_AGENT)
-
-                        self.http_reply = self.qnam.head(request)
-                        self.http_reply.finished.connect(
-                            self.size_query_finished)
-                else:
+                if 'size' in selected_info:
                     self.size_le.setText(sizeof_fmt(selected_info['size']))
+                elif selected_info.get('probed', False):
+                    self.size_le.setText(_('Unknown'))
+                else:
+                    self.size_le.setText(_('Getting remote size'))
+                    self.size_prober.probe([selected_info['url']], first=True)
             elif selected_info['type'] == 'browser_download':
                 self.path_label.setText(_('Url:'))
                 self.path_le.setText(selected_info['url'])
@@ -1125,6 +1063,7 @@ class ModsTab(QTabWidget):
             and os.path.isdir(self.mods_dir)
             and not self.tab_disabled):
             self.install_new_button.setEnabled(True)
+            self.queue_button.setEnabled(True)
         self.disable_existing_button.setEnabled(False)
         self.delete_existing_button.setEnabled(False)
 
@@ -1132,29 +1071,24 @@ class ModsTab(QTabWidget):
         if installed_selection is not None:
             installed_selection.clearSelection()
 
-    def size_query_finished(self):
-        if (not self.http_reply_aborted
-            and self.http_reply.attribute(
-                QNetworkRequest.HttpStatusCodeAttribute) == 200
-            and self.http_reply.hasRawHeader(b'Content-Length')):
+    def size_probed(self, url, size, last_modified):
+        for row in range(self.repo_mods_model.rowCount()):
+            mod_info = self.repo_info(self.repo_mods_model.index(row, 0))
+            if mod_info.get('url') != url:
+                continue
 
-            content_length = int(self.http_reply.rawHeader(b'Content-Length'))
-            self.current_repo_info['size'] = content_length
-
-            selection_model = self.repository_lv.selectionModel()
-            if selection_model is not None and selection_model.hasSelection():
-                selected = selection_model.currentIndex()
-                selected_info = self.repo_soundpacks[selected.row()]
+            self.set_remote_info(mod_info, size, last_modified)
+            self.set_size_item(self.repo_mods_model.item(row, 1), mod_info)
 
-                if selected_info is self.current_repo_info:
-                    self.size_le.setText(sizeof_fmt(content_length))
-        else:
-            selection_model = self.repository_lv.selectionModel()
-            if selection_model is not None and selection_model.hasSelection():
-                selected = selection_model.currentIndex()
-                selected_info = self.repo_mods[selected.row()]
+        selection_model = self.repository_lv.selectionModel()
+        if selection_model is not None and selection_model.hasSelection():
+            selected_info = self.repo_info(selection_model.currentIndex())
 
-                if selected_info is self.current_repo_info:
+            if (selected_info['type'] == 'direct_download'
+                and selected_info['url'] == url):
+                if 'size' in selected_info:
+                    self.size_le.setText(sizeof_fmt(selected_info['size']))
+                else:
                     self.size_le.setText(_('Unknown'))
 
     def config_info(self, config_file):
@@ -1183,24 +1117,7 @@ class ModsTab(QTabWidget):
         return val
 
     def scan_size(self, mod_info):
-        next_scans = deque()
-        current_scan = scandir(mod_info['path'])
-
-        total_size = 0
-
-        while True:
-            try:
-                entry = next(current_scan)
-                if entry.is_dir():
-                    next_scans.append(entry.path)
-                elif entry.is_file():
-                    total_size += entry.stat().st_size
-            except StopIteration:
-                if len(next_scans) > 0:
-                    current_scan = scandir(next_scans.popleft())
-                else:
-                    break
-
+        files, total_size = tree_size(mod_info['path'])
         return total_size
 
     def add_mod(self, mod_info):
@@ -1231,6 +1148,7 @@ class ModsTab(QTabWidget):
         self.disable_existing_button.setEnabled(False)
         self.delete_existing_button.setEnabled(False)
         self.install_new_button.setEnabled(False)
+        self.queue_button.setEnabled(False)
 
         if self.mods_model is not None:
             self.mods_model.setStringList([])
@@ -1258,6 +1176,7 @@ class ModsTab(QTabWidget):
         if repository_selection is not None:
             repository_selection.clearSelection()
         self.install_new_button.setEnabled(False)
+        self.queue_button.setEnabled(False)
 
         self.clear_details()
 
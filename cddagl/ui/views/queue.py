@@ -0,0 +1,155 @@
+import logging
+
+from PyQt5.QtWidgets import (
+    QGridLayout, QTabWidget, QTableWidget, QTableWidgetItem, QProgressBar,
+    QPushButton, QHeaderView, QAbstractItemView
+)
+
+from cddagl.functions import sizeof_fmt
+from cddagl.i18n import proxy_gettext as _
+import cddagl.installqueue as iq
+
+logger = logging.getLogger('cddagl')
+
+
+class QueueTab(QTabWidget):
+    def __init__(self):
+        super(QueueTab, self).__init__()
+
+        self.items = []
+
+        layout = QGridLayout()
+
+        queue_table = QTableWidget()
+        queue_table.setColumnCount(4)
+        queue_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        queue_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        queue_table.verticalHeader().hide()
+        queue_table.horizontalHeader().setSectionResizeMode(0,
+            QHeaderView.Stretch)
+        queue_table.itemSelectionChanged.connect(self.selection_changed)
+        layout.addWidget(queue_table, 0, 0, 1, 2)
+        self.queue_table = queue_table
+
+        cancel_button = QPushButton()
+        cancel_button.setEnabled(False)
+        cancel_button.clicked.connect(self.cancel_selected)
+        layout.addWidget(cancel_button, 1, 0)
+        self.cancel_button = cancel_button
+
+        clear_button = QPushButton()
+        clear_button.clicked.connect(self.clear_finished)
+        layout.addWidget(clear_button, 1, 1)
+        self.clear_button = clear_button
+
+        self.setLayout(layout)
+
+        install_queue = iq.install_queue()
+        install_queue.item_changed.connect(self.item_changed)
+
+        self.set_text()
+
+    def set_text(self):
+        self.queue_table.setHorizontalHeaderLabels((_('Name'), _('Type'),
+            _('Status'), _('Progress')))
+        self.cancel_button.setText(_('Cancel selected'))
+        self.clear_button.setText(_('Clear finished'))
+
+        for row, item in enumerate(self.items):
+            self.update_row(row, item)
+
+    def get_main_window(self):
+        return self.parentWidget().parentWidget().parentWidget()
+
+    def get_main_tab(self):
+        return self.parentWidget().parentWidget().main_tab
+
+    def item_changed(self, item):
+        # Items are compared by identity, two of them can hold the same values
+        for row, existing_item in enumerate(self.items):
+            if existing_item is item:
+                break
+        else:
+            row = len(self.items)
+            self.items.append(item)
+            self.queue_table.insertRow(row)
+
+            progress_bar = QProgressBar()
+            progress_bar.setTextVisible(False)
+            self.queue_table.setCellWidget(row, 3, progress_bar)
+
+        self.update_row(row, item)
+
+    def update_row(self, row, item):
+        if item['kind'] == 'mod':
+            kind = _('Mod')
+        else:
+            kind = _('Soundpack')
+
+        state = item['state']
+        if state == iq.QUEUED:
+            status = _('Queued')
+        elif state == iq.DOWNLOADING:
+            bytes_read, total_bytes = item['progress']
+            if total_bytes > 0:
+                status = _('Downloading {size}/{total}').format(
+                    size=sizeof_fmt(bytes_read), total=sizeof_fmt(total_bytes))
+            else:
+                status = _('Downloading {size}').format(
+                    size=sizeof_fmt(bytes_read))
+        elif state == iq.DOWNLOADED:
+            status = _('Waiting for extraction')
+        elif state == iq.EXTRACTING:
+            status = _('Extracting')
+        elif state == iq.INSTALLED:
+            status = _('Installed')
+        elif state == iq.CANCELLED:
+            status = _('Cancelled')
+        else:
+            status = _('Failed')
+            if item['message']:
+                status = status + ' (' + item['message'] + ')'
+
+        for column, text in enumerate((item['name'], kind, status)):
+            table_item = QTableWidgetItem(text)
+            if column == 2 and state == iq.FAILED:
+                table_item.setToolTip(text)
+            self.queue_table.setItem(row, column, table_item)
+
+        progress_bar = self.queue_table.cellWidget(row, 3)
+        if state in (iq.DOWNLOADING, iq.EXTRACTING):
+            value, maximum = item['progress']
+            progress_bar.setRange(0, max(maximum, 0))
+            progress_bar.setValue(value)
+        elif state == iq.INSTALLED:
+            progress_bar.setRange(0, 1)
+            progress_bar.setValue(1)
+        else:
+            progress_bar.setRange(0, 1)
+            progress_bar.setValue(0)
+
+        self.selection_changed()
+
+    def selected_items(self):
+        rows = set(index.row() for index
+            in self.queue_table.selectionModel().selectedRows())
+        return [self.items[row] for row in sorted(rows)]
+
+    def selection_changed(self):
+        self.cancel_button.setEnabled(any(item['state']
+            not in iq.FINISHED_STATES for item in self.selected_items()))
+
+    def cancel_selected(self):
+        install_queue = iq.install_queue()
+        for item in self.selected_items():
+            install_queue.cancel(item)
+
+    def clear_finished(self):
+        iq.install_queue().clear_finished()
+
+        for row in reversed(range(len(self.items))):
+            if self.items[row]['state'] in iq.FINISHED_STATES:
+                del self.items[row]
+                self.queue_table.removeRow(row)
+
+        self.selection_changed()
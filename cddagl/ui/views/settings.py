@@ -9,8 +9,12 @@ from PyQt5.QtWidgets import (
 from babel.core import Locale
 
 import cddagl.constants as cons
+from cddagl.bandwidth import BACKGROUND, FOREGROUND, bandwidth_limiter
 from cddagl.constants import get_locale_path, get_cdda_uld_path
 from cddagl.functions import clean_qt_path
+from cddagl.github import github_scheduler
+from cddagl.install import build_cache_limit, prune_build_cache
+from cddagl.installqueue import install_queue
 from cddagl.i18n import load_gettext_locale, get_available_locales, proxy_gettext as _
 from cddagl.sql.functions import get_config_value, set_config_value, config_true
 from cddagl.win32 import get_ui_locale
@@ -135,6 +139,14 @@ class LauncherSettingsGroupBox(QGroupBox):
         self.no_launcher_version_check_checkbox = (
             no_launcher_version_check_checkbox)
 
+        offline_mode_checkbox = QCheckBox()
+        check_state = (Qt.Checked if config_true(get_config_value(
+            'offline_mode', 'False')) else Qt.Unchecked)
+        offline_mode_checkbox.setCheckState(check_state)
+        offline_mode_checkbox.stateChanged.connect(self.omc_changed)
+        layout.addWidget(offline_mode_checkbox, 5, 0, 1, 2)
+        self.offline_mode_checkbox = offline_mode_checkbox
+
         self.setLayout(layout)
         self.set_text()
 
@@ -154,6 +166,11 @@ class LauncherSettingsGroupBox(QGroupBox):
             'the launcher to be started'))
         self.no_launcher_version_check_checkbox.setText(_('Do not check '
             'for new version of the CDDA Game Launcher on launch'))
+        self.offline_mode_checkbox.setText(_('Offline mode'))
+        self.offline_mode_checkbox.setToolTip(_('Only use what the launcher '
+            'already downloaded: the builds list comes from the local '
+            'builds index, only the downloaded builds can be installed and '
+            'nothing is requested from the network.'))
         self.setTitle(_('Launcher'))
 
     @property
@@ -202,6 +219,26 @@ class LauncherSettingsGroupBox(QGroupBox):
         set_config_value('prevent_version_check_launch',
             str(state != Qt.Unchecked))
 
+    def omc_changed(self, state):
+        offline = state != Qt.Unchecked
+        set_config_value('offline_mode', str(offline))
+
+        main_tab = self.get_main_tab()
+        update_group_box = main_tab.update_group_box
+
+        if offline:
+            update_group_box.cancel_prefetch()
+
+        for tab in (main_tab.get_mods_tab(), main_tab.get_soundpacks_tab()):
+            if offline:
+                tab.size_prober.abort()
+            tab.probe_repository()
+
+        if update_group_box.refresh_builds_button.isEnabled():
+            update_group_box.refresh_builds()
+
+        install_queue().schedule()
+
     def klo_changed(self, state):
         checked = state != Qt.Unchecked
 
@@ -227,9 +264,11 @@ class LauncherSettingsGroupBox(QGroupBox):
 
     def disable_controls(self):
         self.locale_combo.setEnabled(False)
+        self.offline_mode_checkbox.setEnabled(False)
 
     def enable_controls(self):
         self.locale_combo.setEnabled(True)
+        self.offline_mode_checkbox.setEnabled(True)
 
 
 class UpdateSettingsGroupBox(QGroupBox):
@@ -325,6 +364,77 @@ class UpdateSettingsGroupBox(QGroupBox):
         self.permanently_delete_files_checkbox = (
             permanently_delete_files_checkbox)
 
+        share_game_files_checkbox = QCheckBox()
+        check_state = (Qt.Checked if config_true(get_config_value(
+            'share_game_files', 'False')) else Qt.Unchecked)
+        share_game_files_checkbox.setCheckState(check_state)
+        share_game_files_checkbox.stateChanged.connect(self.sgfc_changed)
+        layout.addWidget(share_game_files_checkbox, 5, 0, 1, 3)
+        self.share_game_files_checkbox = share_game_files_checkbox
+
+        prefetch_builds_checkbox = QCheckBox()
+        check_state = (Qt.Checked if config_true(get_config_value(
+            'prefetch_builds', 'False')) else Qt.Unchecked)
+        prefetch_builds_checkbox.setCheckState(check_state)
+        prefetch_builds_checkbox.stateChanged.connect(self.pbc_changed)
+        layout.addWidget(prefetch_builds_checkbox, 6, 0, 1, 3)
+        self.prefetch_builds_checkbox = prefetch_builds_checkbox
+
+        downloads_group = QWidget()
+        downloads_layout = QGridLayout()
+        downloads_layout.setContentsMargins(0, 0, 0, 0)
+
+        foreground_limit_label = QLabel()
+        downloads_layout.addWidget(foreground_limit_label, 0, 0)
+        self.foreground_limit_label = foreground_limit_label
+
+        foreground_limit_spinbox = QSpinBox()
+        foreground_limit_spinbox.setMaximum(cons.MAX_DOWNLOAD_LIMIT)
+        foreground_limit_spinbox.setValue(int(get_config_value(
+            'foreground_download_limit', '0')))
+        foreground_limit_spinbox.valueChanged.connect(self.fls_changed)
+        downloads_layout.addWidget(foreground_limit_spinbox, 0, 1)
+        self.foreground_limit_spinbox = foreground_limit_spinbox
+
+        background_limit_label = QLabel()
+        downloads_layout.addWidget(background_limit_label, 1, 0)
+        self.background_limit_label = background_limit_label
+
+        background_limit_spinbox = QSpinBox()
+        background_limit_spinbox.setMaximum(cons.MAX_DOWNLOAD_LIMIT)
+        background_limit_spinbox.setValue(int(get_config_value(
+            'background_download_limit',
+            str(cons.BACKGROUND_DOWNLOAD_LIMIT))))
+        background_limit_spinbox.valueChanged.connect(self.bls_changed)
+        downloads_layout.addWidget(background_limit_spinbox, 1, 1)
+        self.background_limit_spinbox = background_limit_spinbox
+
+        downloads_group.setLayout(downloads_layout)
+        layout.addWidget(downloads_group, 7, 0, 1, 3)
+        self.downloads_group = downloads_group
+        self.downloads_layout = downloads_layout
+
+        mirrors_label = QLabel()
+        downloads_layout.addWidget(mirrors_label, 2, 0)
+        self.mirrors_label = mirrors_label
+
+        mirrors_line = QLineEdit()
+        mirrors_line.setText(get_config_value('download_mirrors', ''))
+        mirrors_line.editingFinished.connect(self.mirrors_changed)
+        downloads_layout.addWidget(mirrors_line, 2, 1)
+        self.mirrors_line = mirrors_line
+
+        build_cache_label = QLabel()
+        downloads_layout.addWidget(build_cache_label, 3, 0)
+        self.build_cache_label = build_cache_label
+
+        build_cache_spinbox = QSpinBox()
+        build_cache_spinbox.setMaximum(cons.MAX_BUILD_CACHE_ARCHIVES)
+        build_cache_spinbox.setValue(build_cache_limit())
+        build_cache_spinbox.valueChanged.connect(self.bcs_changed)
+        downloads_layout.addWidget(build_cache_spinbox, 3, 1)
+        self.build_cache_spinbox = build_cache_spinbox
+
         self.setLayout(layout)
         self.set_text()
 
@@ -347,6 +457,44 @@ class UpdateSettingsGroupBox(QGroupBox):
         self.permanently_delete_files_checkbox.setText(_(
             'Permanently delete files instead of moving them in the recycle '
             'bin (not recommended)'))
+        self.share_game_files_checkbox.setText(_(
+            'Share identical game files between game directories'))
+        self.share_game_files_checkbox.setToolTip(_(
+            'Files that did not change between builds and custom '
+            'soundpacks, tilesets and fonts are stored once. They are cloned '
+            'in each game directory on drives supporting it, otherwise they '
+            'are hard linked and made read-only.\nOnly game directories on '
+            'the same drive as the launcher configuration can share files.'))
+        self.prefetch_builds_checkbox.setText(_(
+            'Download new builds in the background when the builds list is '
+            'automatically refreshed'))
+        self.prefetch_builds_checkbox.setToolTip(_(
+            'New builds are downloaded slowly while you play so that updating '
+            'only needs to extract them.'))
+        self.foreground_limit_label.setText(_('Limit downloads to:'))
+        self.foreground_limit_label.setToolTip(_('Applies to the builds, '
+            'mods, soundpacks and launcher updates you download.'))
+        self.background_limit_label.setText(_('Limit background downloads '
+            'to:'))
+        self.background_limit_label.setToolTip(_('Applies to the builds '
+            'downloaded in the background. Background downloads also wait '
+            'for your other downloads to finish.'))
+        for spinbox in (self.foreground_limit_spinbox,
+            self.background_limit_spinbox):
+            spinbox.setSuffix(_(' KiB/s'))
+            spinbox.setSpecialValueText(_('No limit'))
+        self.mirrors_label.setText(_('Download mirrors:'))
+        self.mirrors_line.setToolTip(_('Addresses of servers which mirror '
+            'the game builds, mods and soundpacks, separated by spaces.\nA '
+            'mirror serves files under the host name and path of their '
+            'original address. The fastest source is used and the original '
+            'address is used when no mirror works.'))
+        self.build_cache_label.setText(_('Build archives kept:'))
+        self.build_cache_label.setToolTip(_('The last downloaded build '
+            'archives are kept to update other game directories, swap in '
+            'prefetched builds and repair installations without '
+            'downloading them again.\nEach archive takes a few hundred MB.'))
+        self.build_cache_spinbox.setSpecialValueText(_('None'))
         self.setTitle(_('Update/Installation'))
 
     def get_settings_tab(self):
@@ -360,7 +508,13 @@ class UpdateSettingsGroupBox(QGroupBox):
         update_group_box = main_tab.update_group_box
         refresh_builds_button = update_group_box.refresh_builds_button
 
+        if not github_scheduler().background_allowed():
+            logger.info('Automatic builds refresh skipped, the GitHub API '
+                'rate limit is low')
+            return
+
         if refresh_builds_button.isEnabled():
+            update_group_box.prefetch_after_refresh = True
             update_group_box.refresh_builds()
 
     def ams_changed(self, value):
@@ -393,6 +547,34 @@ class UpdateSettingsGroupBox(QGroupBox):
     def prfc_changed(self, state):
         set_config_value('permanently_delete_files', str(state != Qt.Unchecked))
 
+    def sgfc_changed(self, state):
+        set_config_value('share_game_files', str(state != Qt.Unchecked))
+
+    def pbc_changed(self, state):
+        set_config_value('prefetch_builds', str(state != Qt.Unchecked))
+        if state == Qt.Unchecked:
+            main_tab = self.get_main_tab()
+            main_tab.update_group_box.cancel_prefetch()
+
+    def fls_changed(self, value):
+        set_config_value('foreground_download_limit', value)
+        bandwidth_limiter().set_limit(FOREGROUND, value)
+
+    def bls_changed(self, value):
+        set_config_value('background_download_limit', value)
+        bandwidth_limiter().set_limit(BACKGROUND, value)
+
+    def bcs_changed(self, value):
+        set_config_value('build_cache_max_archives', value)
+        try:
+            prune_build_cache()
+        except OSError:
+            logger.exception('Could not prune the build cache')
+
+    def mirrors_changed(self):
+        set_config_value('download_mirrors',
+            ' '.join(self.mirrors_line.text().split()))
+
     def kacc_changed(self, state):
         set_config_value('keep_archive_copy', str(state != Qt.Unchecked))
 
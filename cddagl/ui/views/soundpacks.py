@@ -5,32 +5,41 @@ import os
 import random
 import shutil
 import tempfile
-import zipfile
-from collections import deque
 from datetime import datetime
 from os import scandir
-from urllib.parse import urljoin, urlencode
+from urllib.parse import urlencode
 
-import rarfile
-from PyQt5.QtCore import Qt, QTimer, QUrl, QFileInfo, QStringListModel
-from PyQt5.QtNetwork import QNetworkAccessManager, QNetworkRequest
+from PyQt5.QtCore import (
+    Qt, QThread, QUrl, QFileInfo, QStringListModel, pyqtSignal
+)
+from PyQt5.QtGui import QStandardItem, QStandardItemModel
 from PyQt5.QtWidgets import (
     QWidget, QGridLayout, QGroupBox, QVBoxLayout, QLabel, QLineEdit, QPushButton,
     QProgressBar, QTextBrowser, QTabWidget, QMessageBox, QHBoxLayout,
-    QListView, QAbstractItemView, QTextEdit
+    QListView, QAbstractItemView, QTextEdit, QTreeView, QHeaderView
 )
-from py7zlib import Archive7z, NoPasswordGivenError, FormatError
 
 import cddagl.constants as cons
+from cddagl.archives import ArchiveError, extract_archive
+from cddagl.bandwidth import FOREGROUND, ThrottledReply
 from cddagl import __version__ as version
-from cddagl.constants import get_data_path, get_cddagl_path
+from cddagl.constants import get_data_path
+from cddagl.fileops import OperationCancelled, walk_entries, tree_size
 from cddagl.functions import sizeof_fmt, delete_path
-from cddagl.i18n import proxy_gettext as _
+from cddagl.i18n import proxy_ngettext as ngettext, proxy_gettext as _
+from cddagl.install import (
+    link_stored_asset, shares_assets, store_asset, stored_assets
+)
+from cddagl.installqueue import install_queue
+from cddagl.mirrors import MirroredReply
+from cddagl.network import RemoteFileProber, offline_mode
 from cddagl.ui.views.dialogs import BrowserDownloadDialog
 
 logger = logging.getLogger('cddagl')
 
-rarfile.UNRAR_TOOL = get_cddagl_path('UnRAR.exe')
+# Repository rows are sorted on this role and point back to their entry
+REPO_SORT_ROLE = Qt.UserRole
+REPO_INDEX_ROLE = Qt.UserRole + 1
 
 
 class SoundpacksTab(QTabWidget):
@@ -39,11 +48,11 @@ class SoundpacksTab(QTabWidget):
 
         self.tab_disabled = False
 
-        self.qnam = QNetworkAccessManager()
-
-        self.http_reply = None
         self.download_http_reply = None
-        self.current_repo_info = None
+        self.size_prober = RemoteFileProber(cons.FAKE_USER_AGENT)
+        self.size_prober.probed.connect(self.size_probed)
+
+        install_queue().item_installed.connect(self.queue_installed)
 
         self.soundpacks = []
         self.soundpacks_model = None
@@ -52,6 +61,10 @@ class SoundpacksTab(QTabWidget):
         self.downloading_new_soundpack = False
         self.extracting_new_soundpack = False
 
+        self.extracting_thread = None
+        self.installing_name = None
+        self.store_thread = None
+
         self.close_after_install = False
 
         self.game_dir = None
@@ -106,9 +119,15 @@ class SoundpacksTab(QTabWidget):
         repository_gb.setLayout(repository_gb_layout)
         self.repository_gb_layout = repository_gb_layout
 
-        repository_lv = QListView()
+        repository_lv = QTreeView()
         repository_lv.clicked.connect(self.repository_clicked)
         repository_lv.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        repository_lv.setRootIsDecorated(False)
+        repository_lv.setAllColumnsShowFocus(True)
+        repository_lv.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        repository_lv.setSortingEnabled(True)
+        repository_lv.sortByColumn(0, Qt.AscendingOrder)
+        repository_lv.header().setStretchLastSection(False)
         repository_gb_layout.addWidget(repository_lv)
         self.repository_lv = repository_lv
 
@@ -123,6 +142,12 @@ class SoundpacksTab(QTabWidget):
         repository_gb_layout.addWidget(install_new_button)
         self.install_new_button = install_new_button
 
+        queue_button = QPushButton()
+        queue_button.clicked.connect(self.queue_selected)
+        queue_button.setEnabled(False)
+        repository_gb_layout.addWidget(queue_button)
+        self.queue_button = queue_button
+
         top_part.setLayout(tp_layout)
         layout.addWidget(top_part)
         self.top_part = top_part
@@ -208,6 +233,7 @@ class SoundpacksTab(QTabWidget):
             _('<a href="{url}">Suggest a new soundpack '
             'on GitHub</a>').format(url=suggest_url))
         self.install_new_button.setText(_('Install this soundpack'))
+        self.queue_button.setText(_('Add selected to the download queue'))
         self.details_gb.setTitle(_('Details'))
         self.viewname_label.setText(_('View name:'))
         self.name_label.setText(_('Name:'))
@@ -221,6 +247,9 @@ class SoundpacksTab(QTabWidget):
         self.size_label.setText(_('Size:'))
         self.homepage_label.setText(_('Home page:'))
 
+        self.repo_soundpacks_model.setHorizontalHeaderLabels([_('Name'),
+            _('Size')])
+
     def get_main_window(self):
         return self.parentWidget().parentWidget().parentWidget()
 
@@ -244,6 +273,8 @@ class SoundpacksTab(QTabWidget):
 
         self.install_new_button.setEnabled(False)
 
+        self.queue_button.setEnabled(False)
+
         installed_selection = self.installed_lv.selectionModel()
         if installed_selection is not None:
             installed_selection.clearSelection()
@@ -272,13 +303,21 @@ class SoundpacksTab(QTabWidget):
 
         self.install_new_button.setEnabled(repository_selected)
 
+        self.queue_button.setEnabled(repository_selected)
+
     def load_repository(self):
         self.repo_soundpacks = []
 
         self.install_new_button.setEnabled(False)
 
-        self.repo_soundpacks_model = QStringListModel()
+        self.queue_button.setEnabled(False)
+
+        self.repo_soundpacks_model = QStandardItemModel()
+        self.repo_soundpacks_model.setSortRole(REPO_SORT_ROLE)
         self.repository_lv.setModel(self.repo_soundpacks_model)
+        header = self.repository_lv.header()
+        header.setSectionResizeMode(0, QHeaderView.Stretch)
+        header.setSectionResizeMode(1, QHeaderView.ResizeToContents)
         self.repository_lv.selectionModel().currentChanged.connect(
             self.repository_selection)
 
@@ -292,17 +331,110 @@ class SoundpacksTab(QTabWidget):
                         values.sort(key=lambda x: x['name'])
                         self.repo_soundpacks = values
 
-                        self.repo_soundpacks_model.insertRows(
-                            self.repo_soundpacks_model.rowCount(),
-                            len(self.repo_soundpacks))
                         for index, soundpack_info in enumerate(
                             self.repo_soundpacks):
-                            self.repo_soundpacks_model.setData(
-                                self.repo_soundpacks_model.index(index),
-                                soundpack_info['viewname'])
+                            self.repo_soundpacks_model.appendRow(
+                                self.repository_row(index, soundpack_info))
                 except ValueError:
                     pass
 
+        self.probe_repository()
+
+    def repository_row(self, index, soundpack_info):
+        name_item = QStandardItem(soundpack_info['viewname'])
+        name_item.setData(soundpack_info['viewname'].lower(), REPO_SORT_ROLE)
+        name_item.setData(index, REPO_INDEX_ROLE)
+
+        size_item = QStandardItem()
+        size_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+        self.set_size_item(size_item, soundpack_info)
+
+        return [name_item, size_item]
+
+    def set_size_item(self, size_item, soundpack_info):
+        size = soundpack_info.get('size')
+        if size is None:
+            size_item.setText('')
+            size_item.setData(-1, REPO_SORT_ROLE)
+        else:
+            size_item.setText(sizeof_fmt(size))
+            size_item.setData(size, REPO_SORT_ROLE)
+
+        last_modified = soundpack_info.get('last_modified')
+        if last_modified is not None:
+            size_item.setToolTip(_('Last modified: {date}').format(
+                date=last_modified.strftime('%Y-%m-%d')))
+
+    def repo_info(self, index):
+        return self.repo_soundpacks[self.repo_soundpacks_model.item(index.row(), 0).data(
+            REPO_INDEX_ROLE)]
+
+    def probe_repository(self):
+        urls = []
+        for soundpack_info in self.repo_soundpacks:
+            if soundpack_info['type'] != 'direct_download':
+                continue
+
+            cached = self.size_prober.cached(soundpack_info['url'])
+            if cached is None:
+                urls.append(soundpack_info['url'])
+            else:
+                self.set_remote_info(soundpack_info, cached['size'],
+                    cached['last_modified'])
+
+        for row in range(self.repo_soundpacks_model.rowCount()):
+            soundpack_info = self.repo_info(self.repo_soundpacks_model.index(row, 0))
+            self.set_size_item(self.repo_soundpacks_model.item(row, 1), soundpack_info)
+
+        self.size_prober.probe(urls)
+
+    def set_remote_info(self, soundpack_info, size, last_modified):
+        # A size which could not be probed keeps the one from the repository
+        if size is not None:
+            soundpack_info['size'] = size
+        if last_modified is not None:
+            soundpack_info['last_modified'] = last_modified
+        soundpack_info['probed'] = True
+
+    def queue_selected(self):
+        selection_model = self.repository_lv.selectionModel()
+        if selection_model is None or self.soundpacks_dir is None:
+            return
+
+        if offline_mode():
+            main_window = self.get_main_window()
+            status_bar = main_window.statusBar()
+            status_bar.showMessage(_('Soundpacks cannot be downloaded in offline '
+                'mode'))
+            return
+
+        # Already installed and already queued entries are skipped
+        queued = 0
+        for index in selection_model.selectedRows():
+            info = self.repo_info(index)
+            if info['type'] != 'direct_download':
+                continue
+            if any(soundpack['NAME'] == info['name']
+                for soundpack in self.soundpacks):
+                continue
+            if install_queue().is_queued(info['url'], self.soundpacks_dir):
+                continue
+
+            install_queue().add('soundpack', info, self.game_dir,
+                self.soundpacks_dir)
+            queued += 1
+
+        main_window = self.get_main_window()
+        status_bar = main_window.statusBar()
+        status_bar.showMessage(ngettext('{count} soundpack was added to the '
+            'download queue', '{count} soundpacks were added to the download '
+            'queue', queued).format(count=queued))
+
+    def queue_installed(self, item):
+        if (item['kind'] == 'soundpack' and item['game_dir'] == self.game_dir
+            and not self.installing_new_soundpack):
+            self.game_dir_changed(self.game_dir)
+
     def install_new(self):
         if not self.installing_new_soundpack:
             selection_model = self.repository_lv.selectionModel()
@@ -310,7 +442,7 @@ class SoundpacksTab(QTabWidget):
                 return
 
             selected = selection_model.currentIndex()
-            selected_info = self.repo_soundpacks[selected.row()]
+            selected_info = self.repo_info(selected)
 
             # Is it already installed?
             for soundpack in self.soundpacks:
@@ -338,13 +470,21 @@ class SoundpacksTab(QTabWidget):
                         return
                     break
 
+            if self.install_stored(selected_info):
+                return
+
+            if (selected_info['type'] == 'direct_download' and
+                offline_mode()):
+                main_window = self.get_main_window()
+                status_bar = main_window.statusBar()
+                status_bar.showMessage(_('Soundpacks cannot be downloaded in '
+                    'offline mode'))
+                return
+
             self.install_type = selected_info['type']
+            self.installing_name = selected_info['name']
 
             if selected_info['type'] == 'direct_download':
-                if self.http_reply is not None and self.http_reply.isRunning():
-                    self.http_reply_aborted = True
-                    self.http_reply.abort()
-
                 self.installing_new_soundpack = True
                 self.download_aborted = False
 
@@ -391,13 +531,12 @@ class SoundpacksTab(QTabWidget):
 
                 self.downloading_new_soundpack = True
 
-                request = QNetworkRequest(QUrl(url))
-                request.setRawHeader(b'User-Agent', cons.FAKE_USER_AGENT)
-
-                self.download_http_reply = self.qnam.get(request)
+                self.download_http_reply = MirroredReply(url,
+                    cons.FAKE_USER_AGENT)
                 self.download_http_reply.finished.connect(
                     self.download_http_finished)
-                self.download_http_reply.readyRead.connect(
+                self.download_throttle = ThrottledReply(
+                    self.download_http_reply, FOREGROUND,
                     self.download_http_ready_read)
                 self.download_http_reply.downloadProgress.connect(
                     self.download_dl_progress)
@@ -434,66 +573,6 @@ class SoundpacksTab(QTabWidget):
                     main_window = self.get_main_window()
                     status_bar = main_window.statusBar()
 
-                    # Test downloaded file
-                    status_bar.showMessage(_('Testing downloaded file archive'))
-
-                    if self.downloaded_file.lower().endswith('.7z'):
-                        try:
-                            with open(self.downloaded_file, 'rb') as f:
-                                archive = Archive7z(f)
-                        except FormatError:
-                            status_bar.clearMessage()
-                            status_bar.showMessage(_('Selected file is a '
-                                'bad archive file'))
-
-                            self.finish_install_new_soundpack()
-                            return
-                        except NoPasswordGivenError:
-                            status_bar.clearMessage()
-                            status_bar.showMessage(_('Selected file is a '
-                                'password protected archive file'))
-
-                            self.finish_install_new_soundpack()
-                            return
-                    else:
-                        archive_exception = None
-                        if self.downloaded_file.lower().endswith('.zip'):
-                            archive_class = zipfile.ZipFile
-                            archive_exception = zipfile.BadZipFile
-                            test_method = 'testzip'
-                        elif self.downloaded_file.lower().endswith('.rar'):
-                            archive_class = rarfile.RarFile
-                            archive_exception = rarfile.Error
-                            test_method = 'testrar'
-                        else:
-                            extension = os.path.splitext(self.downloaded_file
-                                )[1]
-                            status_bar.clearMessage()
-                            status_bar.showMessage(
-                                _('Unknown downloaded archive format '
-                                '({extension})').format(extension=extension))
-
-                            self.finish_install_new_soundpack()
-                            return
-
-                        try:
-                            with archive_class(self.downloaded_file) as z:
-                                test = getattr(z, test_method)
-                                if test() is not None:
-                                    status_bar.clearMessage()
-                                    status_bar.showMessage(
-                                        _('Downloaded archive is invalid'))
-
-                                    self.finish_install_new_soundpack()
-                                    return
-                        except archive_exception:
-                            status_bar.clearMessage()
-                            status_bar.showMessage(_('Selected file is a '
-                                'bad archive file'))
-
-                            self.finish_install_new_soundpack()
-                            return
-
                     status_bar.clearMessage()
                     self.extract_new_soundpack()
 
@@ -506,7 +585,10 @@ class SoundpacksTab(QTabWidget):
                 self.download_aborted = True
                 self.download_http_reply.abort()
             elif self.extracting_new_soundpack:
-                self.extracting_timer.stop()
+                extracting_thread = self.extracting_thread
+                self.extracting_thread = None
+                extracting_thread.cancelled = True
+                extracting_thread.wait()
 
                 status_bar.removeWidget(self.extracting_label)
                 status_bar.removeWidget(self.extracting_progress_bar)
@@ -515,10 +597,9 @@ class SoundpacksTab(QTabWidget):
 
                 self.extracting_new_soundpack = False
 
-                self.extracting_zipfile.close()
-
-                download_dir = os.path.dirname(self.downloaded_file)
-                delete_path(download_dir)
+                if self.install_type == 'direct_download':
+                    download_dir = os.path.dirname(self.downloaded_file)
+                    delete_path(download_dir)
 
                 if os.path.isdir(self.extract_dir):
                     delete_path(self.extract_dir)
@@ -527,7 +608,64 @@ class SoundpacksTab(QTabWidget):
 
             self.finish_install_new_soundpack()
 
+    def install_stored(self, selected_info):
+        """Link a soundpack from the asset store when another game directory
+        already has it. Return True when it was installed that way."""
+        if not shares_assets(self.game_dir):
+            return False
+
+        for stored_path in stored_assets('soundpack', selected_info['name']):
+            target_dir = os.path.join(self.soundpacks_dir,
+                os.path.basename(stored_path))
+            if os.path.exists(target_dir):
+                continue
+
+            main_window = self.get_main_window()
+            status_bar = main_window.statusBar()
+
+            try:
+                link_stored_asset(stored_path, target_dir)
+            except OSError as e:
+                logger.warning('Could not link %s: %s', stored_path, e)
+                delete_path(target_dir)
+                return False
+
+            status_bar.showMessage(_('Soundpack installation completed'))
+            self.game_dir_changed(self.game_dir)
+            return True
+
+        return False
+
+    def store_installed(self, name, path):
+        """Add a newly installed soundpack to the asset store in the
+        background so that other game directories can link to it."""
+        if not shares_assets(self.game_dir):
+            return
+
+        class StoreThread(QThread):
+            def __init__(self, name, path):
+                super(StoreThread, self).__init__()
+
+                self.name = name
+                self.path = path
+
+            def __del__(self):
+                self.wait()
+
+            def run(self):
+                try:
+                    store_asset('soundpack', self.name, self.path)
+                except OSError as e:
+                    logger.warning('Could not store %s: %s', self.path, e)
+
+        store_thread = StoreThread(name, path)
+        self.store_thread = store_thread
+        store_thread.start()
+
     def download_http_finished(self):
+        self.download_throttle.finish()
+        self.download_throttle = None
+
         self.downloading_file.close()
 
         main_window = self.get_main_window()
@@ -546,119 +684,9 @@ class SoundpacksTab(QTabWidget):
 
             self.downloading_new_soundpack = False
         else:
-            redirect = self.download_http_reply.attribute(
-                QNetworkRequest.RedirectionTargetAttribute)
-            if redirect is not None:
-                download_dir = os.path.dirname(self.downloaded_file)
-                delete_path(download_dir)
-                os.makedirs(download_dir)
-
-                self.downloading_file = open(self.downloaded_file, 'wb')
-
-                status_bar.busy += 1
-
-                redirected_url = urljoin(
-                    self.download_http_reply.request().url().toString(),
-                    redirect.toString())
-
-                downloading_label = QLabel()
-                downloading_label.setText(_('Downloading: {0}').format(
-                    redirected_url))
-                status_bar.addWidget(downloading_label, 100)
-                self.downloading_label = downloading_label
-
-                dowloading_speed_label = QLabel()
-                status_bar.addWidget(dowloading_speed_label)
-                self.dowloading_speed_label = dowloading_speed_label
-
-                downloading_size_label = QLabel()
-                status_bar.addWidget(downloading_size_label)
-                self.downloading_size_label = downloading_size_label
-
-                progress_bar = QProgressBar()
-                status_bar.addWidget(progress_bar)
-                self.downloading_progress_bar = progress_bar
-                progress_bar.setMinimum(0)
-
-                self.download_last_read = datetime.utcnow()
-                self.download_last_bytes_read = 0
-                self.download_speed_count = 0
-
-                progress_bar.setValue(0)
-
-                request = QNetworkRequest(QUrl(redirected_url))
-                request.setRawHeader(b'User-Agent', cons.FAKE_USER_AGENT)
-
-                self.download_http_reply = self.qnam.get(request)
-                self.download_http_reply.finished.connect(
-                    self.download_http_finished)
-                self.download_http_reply.readyRead.connect(
-                    self.download_http_ready_read)
-                self.download_http_reply.downloadProgress.connect(
-                    self.download_dl_progress)
-            else:
-                # Test downloaded file
-                status_bar.showMessage(_('Testing downloaded file archive'))
-
-                if self.downloaded_file.lower().endswith('.7z'):
-                    try:
-                        with open(self.downloaded_file, 'rb') as f:
-                            archive = Archive7z(f)
-                    except FormatError:
-                        status_bar.clearMessage()
-                        status_bar.showMessage(_('Selected file is a '
-                            'bad archive file'))
-
-                        self.finish_install_new_soundpack()
-                        return
-                    except NoPasswordGivenError:
-                        status_bar.clearMessage()
-                        status_bar.showMessage(_('Selected file is a '
-                            'password protected archive file'))
-
-                        self.finish_install_new_soundpack()
-                        return
-                else:
-                    archive_exception = None
-                    if self.downloaded_file.lower().endswith('.zip'):
-                        archive_class = zipfile.ZipFile
-                        archive_exception = zipfile.BadZipFile
-                        test_method = 'testzip'
-                    elif self.downloaded_file.lower().endswith('.rar'):
-                        archive_class = rarfile.RarFile
-                        archive_exception = rarfile.Error
-                        test_method = 'testrar'
-                    else:
-                        extension = os.path.splitext(self.downloaded_file)[1]
-                        status_bar.clearMessage()
-                        status_bar.showMessage(
-                            _('Unknown downloaded archive format ({extension})'
-                            ).format(extension=extension))
-
-                        self.finish_install_new_soundpack()
-                        return
-
-                    try:
-                        with archive_class(self.downloaded_file) as z:
-                            test = getattr(z, test_method)
-                            if test() is not None:
-                                status_bar.clearMessage()
-                                status_bar.showMessage(
-                                    _('Downloaded archive is invalid'))
-
-                                self.finish_install_new_soundpack()
-                                return
-                    except archive_exception:
-                        status_bar.clearMessage()
-                        status_bar.showMessage(_('Selected file is a '
-                            'bad archive file'))
-
-                        self.finish_install_new_soundpack()
-                        return
-
-                status_bar.clearMessage()
-                self.downloading_new_soundpack = False
-                self.extract_new_soundpack()
+            status_bar.clearMessage()
+            self.downloading_new_soundpack = False
+            self.extract_new_soundpack()
 
     def finish_install_new_soundpack(self):
         self.installing_new_soundpack = False
@@ -676,8 +704,8 @@ class SoundpacksTab(QTabWidget):
         if self.close_after_install:
             self.get_main_window().close()
 
-    def download_http_ready_read(self):
-        self.downloading_file.write(self.download_http_reply.readAll())
+    def download_http_ready_read(self, data):
+        self.downloading_file.write(data)
 
     def download_dl_progress(self, bytes_read, total_bytes):
         self.downloading_progress_bar.setMaximum(total_bytes)
@@ -704,99 +732,99 @@ class SoundpacksTab(QTabWidget):
     def extract_new_soundpack(self):
         self.extracting_new_soundpack = True
 
-        if self.downloaded_file.lower().endswith('.7z'):
-            self.extracting_zipfile = open(self.downloaded_file, 'rb')
-            self.extracting_archive = Archive7z(self.extracting_zipfile)
-
-            self.extracting_infolist = self.extracting_archive.getmembers()
-        else:
-            if self.downloaded_file.lower().endswith('.zip'):
-                archive_class = zipfile.ZipFile
-            elif self.downloaded_file.lower().endswith('.rar'):
-                archive_class = rarfile.RarFile
-
-            z = archive_class(self.downloaded_file)
-            self.extracting_zipfile = z
-
-            self.extracting_infolist = z.infolist()
-
         self.extract_dir = os.path.join(self.game_dir, 'newsoundpack')
         while os.path.exists(self.extract_dir):
             self.extract_dir = os.path.join(self.game_dir,
                 'newsoundpack-{0}'.format('%08x' % random.randrange(16**8)))
         os.makedirs(self.extract_dir)
 
-        self.extracting_index = 0
-
         main_window = self.get_main_window()
         status_bar = main_window.statusBar()
 
         status_bar.busy += 1
 
         extracting_label = QLabel()
+        extracting_label.setText(_('Testing downloaded file archive'))
         status_bar.addWidget(extracting_label, 100)
         self.extracting_label = extracting_label
 
         progress_bar = QProgressBar()
+        progress_bar.setRange(0, 0)
         status_bar.addWidget(progress_bar)
         self.extracting_progress_bar = progress_bar
 
-        timer = QTimer(self)
-        self.extracting_timer = timer
+        class ExtractingThread(QThread):
+            progress = pyqtSignal(str, 'qint64', 'qint64')
+            completed = pyqtSignal()
+            failed = pyqtSignal(str)
 
-        progress_bar.setRange(0, len(self.extracting_infolist))
+            def __init__(self, archive_path, extract_dir):
+                super(ExtractingThread, self).__init__()
 
-        def timeout():
-            self.extracting_progress_bar.setValue(self.extracting_index)
+                self.archive_path = archive_path
+                self.extract_dir = extract_dir
+                self.cancelled = False
 
-            if self.extracting_index == len(self.extracting_infolist):
-                self.extracting_timer.stop()
+            def __del__(self):
+                self.wait()
 
-                main_window = self.get_main_window()
-                status_bar = main_window.statusBar()
+            def run(self):
+                try:
+                    extract_archive(self.archive_path, self.extract_dir,
+                        self.progress.emit, lambda: self.cancelled)
+                except OperationCancelled:
+                    return
+                except (ArchiveError, OSError) as e:
+                    self.failed.emit(str(e))
+                    return
 
-                status_bar.removeWidget(self.extracting_label)
-                status_bar.removeWidget(self.extracting_progress_bar)
+                self.completed.emit()
 
-                status_bar.busy -= 1
+        extracting_thread = ExtractingThread(self.downloaded_file,
+            self.extract_dir)
 
-                self.extracting_new_soundpack = False
+        def progress(name, extracted, total):
+            if self.extracting_thread is not extracting_thread:
+                return
 
-                self.extracting_zipfile.close()
-                self.extracting_zipfile = None
+            self.extracting_label.setText(_('Extracting {0}').format(name))
+            self.extracting_progress_bar.setRange(0, total)
+            self.extracting_progress_bar.setValue(extracted)
 
-                if self.downloaded_file.lower().endswith('.7z'):
-                    self.extracting_archive = None
+        def ended(message=None):
+            if self.extracting_thread is not extracting_thread:
+                # Cancelled
+                return
+            self.extracting_thread = None
 
-                if self.install_type == 'direct_download':
-                    download_dir = os.path.dirname(self.downloaded_file)
-                    delete_path(download_dir)
+            main_window = self.get_main_window()
+            status_bar = main_window.statusBar()
 
-                self.move_new_soundpack()
+            status_bar.removeWidget(self.extracting_label)
+            status_bar.removeWidget(self.extracting_progress_bar)
+
+            status_bar.busy -= 1
+
+            self.extracting_new_soundpack = False
+
+            if self.install_type == 'direct_download':
+                download_dir = os.path.dirname(self.downloaded_file)
+                delete_path(download_dir)
 
+            if message is None:
+                self.move_new_soundpack()
             else:
-                extracting_element = self.extracting_infolist[
-                    self.extracting_index]
-
-                self.extracting_label.setText(_('Extracting {0}').format(
-                    extracting_element.filename))
-
-                if self.downloaded_file.lower().endswith('.7z'):
-                    destination = os.path.join(self.extract_dir,
-                        *extracting_element.filename.split('/'))
-                    dest_dir = os.path.dirname(destination)
-                    if not os.path.isdir(dest_dir):
-                        os.makedirs(dest_dir)
-                    with open(destination, 'wb') as f:
-                        f.write(extracting_element.read())
-                else:
-                    self.extracting_zipfile.extract(extracting_element,
-                        self.extract_dir)
+                delete_path(self.extract_dir)
+
+                status_bar.showMessage(message)
+                self.finish_install_new_soundpack()
 
-                self.extracting_index += 1
+        extracting_thread.progress.connect(progress)
+        extracting_thread.completed.connect(ended)
+        extracting_thread.failed.connect(ended)
 
-        timer.timeout.connect(timeout)
-        timer.start(0)
+        self.extracting_thread = extracting_thread
+        extracting_thread.start()
 
     def move_new_soundpack(self):
         # Find the soundpack in the self.extract_dir
@@ -809,30 +837,12 @@ class SoundpacksTab(QTabWidget):
 
         status_bar.showMessage(_('Finding the soundpack'))
 
-        next_scans = deque()
-        current_scan = scandir(self.extract_dir)
-
         soundpack_dir = None
 
-        while True:
-            try:
-                entry = next(current_scan)
-                if entry.is_dir():
-                    next_scans.append(entry.path)
-                elif entry.is_file():
-                    dirname, basename = os.path.split(entry.path)
-                    if basename == 'soundpack.txt':
-                        soundpack_dir = dirname
-                        entry = None
-                        break
-            except StopIteration:
-                if len(next_scans) > 0:
-                    current_scan = scandir(next_scans.popleft())
-                else:
-                    break
-
-        for item in current_scan:
-            pass
+        for entry in walk_entries(self.extract_dir):
+            if entry.is_file() and entry.name == 'soundpack.txt':
+                soundpack_dir = os.path.dirname(entry.path)
+                break
 
         if soundpack_dir is None:
             status_bar.showMessage(_('Soundpack installation cancelled - There '
@@ -853,6 +863,8 @@ class SoundpacksTab(QTabWidget):
                 shutil.move(soundpack_dir, self.soundpacks_dir)
                 status_bar.showMessage(_('Soundpack installation completed'))
 
+                self.store_installed(self.installing_name, target_dir)
+
             delete_path(self.extract_dir)
             self.moving_new_soundpack = False
 
@@ -957,6 +969,8 @@ class SoundpacksTab(QTabWidget):
 
         self.install_new_button.setEnabled(False)
 
+        self.queue_button.setEnabled(False)
+
         repository_selection = self.repository_lv.selectionModel()
         if repository_selection is not None:
             repository_selection.clearSelection()
@@ -968,7 +982,7 @@ class SoundpacksTab(QTabWidget):
         selection_model = self.repository_lv.selectionModel()
         if selection_model is not None and selection_model.hasSelection():
             selected = selection_model.currentIndex()
-            selected_info = self.repo_soundpacks[selected.row()]
+            selected_info = self.repo_info(selected)
 
             self.viewname_le.setText(selected_info['viewname'])
             self.name_le.setText(selected_info['name'])
@@ -978,28 +992,13 @@ class SoundpacksTab(QTabWidget):
                 self.path_le.setText(selected_info['url'])
                 self.homepage_tb.setText('<a href="{url}">{url}</a>'.format(
                     url=html.escape(selected_info['homepage'])))
-                if 'size' not in selected_info:
-                    if not (self.current_repo_info is not None
-                        and self.http_reply is not None
-                        and self.http_reply.isRunning()
-                        and self.current_repo_info is selected_info):
-                        if (self.http_reply is not None
-                            and self.http_reply.isRunning()):
-                            self.http_reply_aborted = True
-                            self.http_reply.abort()
-
-                        self.http_reply_aborted = False
-                        self.size_le.setText(_('Getting remote size'))
-                        self.current_repo_info = selected_info
-
-                        request = QNetworkRequest(QUrl(selected_info['url']))
-                        request.setRawHeader(b'User-Agent', cons.FAKE_USER_AGENT)
-
-                        self.http_reply = self.qnam.head(request)
-                        self.http_reply.finished.connect(
-                            self.size_query_finished)
-                else:
+                if 'size' in selected_info:
                     self.size_le.setText(sizeof_fmt(selected_info['size']))
+                elif selected_info.get('probed', False):
+                    self.size_le.setText(_('Unknown'))
+                else:
+                    self.size_le.setText(_('Getting remote size'))
+                    self.size_prober.probe([selected_info['url']], first=True)
             elif selected_info['type'] == 'browser_download':
                 self.path_label.setText(_('Url:'))
                 self.path_le.setText(selected_info['url'])
@@ -1014,6 +1013,7 @@ class SoundpacksTab(QTabWidget):
             and os.path.isdir(self.soundpacks_dir)
             and not self.tab_disabled):
             self.install_new_button.setEnabled(True)
+            self.queue_button.setEnabled(True)
         self.disable_existing_button.setEnabled(False)
         self.delete_existing_button.setEnabled(False)
 
@@ -1021,29 +1021,24 @@ class SoundpacksTab(QTabWidget):
         if installed_selection is not None:
             installed_selection.clearSelection()
 
-    def size_query_finished(self):
-        if (not self.http_reply_aborted
-            and self.http_reply.attribute(
-                QNetworkRequest.HttpStatusCodeAttribute) == 200
-            and self.http_reply.hasRawHeader(b'Content-Length')):
+    def size_probed(self, url, size, last_modified):
+        for row in range(self.repo_soundpacks_model.rowCount()):
+            soundpack_info = self.repo_info(self.repo_soundpacks_model.index(row, 0))
+            if soundpack_info.get('url') != url:
+                continue
 
-            content_length = int(self.http_reply.rawHeader(b'Content-Length'))
-            self.current_repo_info['size'] = content_length
+            self.set_remote_info(soundpack_info, size, last_modified)
+            self.set_size_item(self.repo_soundpacks_model.item(row, 1), soundpack_info)
 
-            selection_model = self.repository_lv.selectionModel()
-            if selection_model is not None and selection_model.hasSelection():
-                selected = selection_model.currentIndex()
-                selected_info = self.repo_soundpacks[selected.row()]
-
-                if selected_info is self.current_repo_info:
-                    self.size_le.setText(sizeof_fmt(content_length))
-        else:
-            selection_model = self.repository_lv.selectionModel()
-            if selection_model is not None and selection_model.hasSelection():
-                selected = selection_model.currentIndex()
-                selected_info = self.repo_soundpacks[selected.row()]
+        selection_model = self.repository_lv.selectionModel()
+        if selection_model is not None and selection_model.hasSelection():
+            selected_info = self.repo_info(selection_model.currentIndex())
 
-                if selected_info is self.current_repo_info:
+            if (selected_info['type'] == 'direct_download'
+                and selected_info['url'] == url):
+                if 'size' in selected_info:
+                    self.size_le.setText(sizeof_fmt(selected_info['size']))
+                else:
                     self.size_le.setText(_('Unknown'))
 
     def config_info(self, config_file):
@@ -1068,24 +1063,7 @@ class SoundpacksTab(QTabWidget):
         return val
 
     def scan_size(self, soundpack_info):
-        next_scans = deque()
-        current_scan = scandir(soundpack_info['path'])
-
-        total_size = 0
-
-        while True:
-            try:
-                entry = next(current_scan)
-                if entry.is_dir():
-                    next_scans.append(entry.path)
-                elif entry.is_file():
-                    total_size += entry.stat().st_size
-            except StopIteration:
-                if len(next_scans) > 0:
-                    current_scan = scandir(next_scans.popleft())
-                else:
-                    break
-
+        files, total_size = tree_size(soundpack_info['path'])
         return total_size
 
     def add_soundpack(self, soundpack_info):
@@ -1104,6 +1082,7 @@ class SoundpacksTab(QTabWidget):
         self.disable_existing_button.setEnabled(False)
         self.delete_existing_button.setEnabled(False)
         self.install_new_button.setEnabled(False)
+        self.queue_button.setEnabled(False)
 
         if self.soundpacks_model is not None:
             self.soundpacks_model.setStringList([])
@@ -1135,6 +1114,7 @@ class SoundpacksTab(QTabWidget):
         if repository_selection is not None:
             repository_selection.clearSelection()
         self.install_new_button.setEnabled(False)
+        self.queue_button.setEnabled(False)
 
         self.viewname_le.setText('')
         self.name_le.setText('')
@@ -8,12 +8,11 @@ import sys
 import tempfile
 from datetime import datetime
 from distutils.version import LooseVersion
-from io import BytesIO, TextIOWrapper
-from urllib.parse import urljoin
+from io import BytesIO
 
 import markdown2
 from PyQt5.QtCore import Qt, QUrl, pyqtSignal, QByteArray, QThread
-from PyQt5.QtNetwork import QNetworkAccessManager, QNetworkRequest
+from PyQt5.QtNetwork import QNetworkRequest
 from PyQt5.QtWidgets import (
     QGridLayout, QMainWindow, QLabel, QLineEdit, QPushButton, QProgressBar,
     QAction, QDialog, QTabWidget, QCheckBox, QMessageBox, QMenu
@@ -23,14 +22,22 @@ from pywintypes import error as PyWinError
 
 import cddagl.constants as cons
 from cddagl import __version__ as version
+from cddagl.bandwidth import FOREGROUND, ThrottledReply
 from cddagl.functions import sizeof_fmt, delete_path
+from cddagl.github import BACKGROUND, USER, github_scheduler
+from cddagl.httpcache import cached_body, reply_content
 from cddagl.i18n import proxy_gettext as _
+from cddagl.installqueue import install_queue
+from cddagl.network import (
+    network_access_manager, network_request, offline_mode
+)
 from cddagl.sql.functions import get_config_value, set_config_value, config_true
 from cddagl.ui.views.backups import BackupsTab
 from cddagl.ui.views.dialogs import AboutDialog, FaqDialog
 from cddagl.ui.views.fonts import FontsTab
 from cddagl.ui.views.main import MainTab
 from cddagl.ui.views.mods import ModsTab
+from cddagl.ui.views.queue import QueueTab
 from cddagl.ui.views.settings import SettingsTab
 from cddagl.ui.views.soundpacks import SoundpacksTab
 from cddagl.ui.views.tilesets import TilesetsTab
@@ -50,7 +57,6 @@ class TabbedWindow(QMainWindow):
         self.create_menu()
 
         self.shown = False
-        self.qnam = QNetworkAccessManager()
         self.http_reply = None
         self.in_manual_update_check = False
 
@@ -149,41 +155,35 @@ class TabbedWindow(QMainWindow):
         self.about_dialog.exec()
 
     def check_new_launcher_version(self):
+        if offline_mode():
+            if self.in_manual_update_check:
+                self.statusBar().showMessage(_('New launcher versions cannot '
+                    'be checked in offline mode'))
+            return
+
         self.lv_html = BytesIO()
 
         url = cons.GITHUB_REST_API_URL + cons.CDDAGL_LATEST_RELEASE
 
-        request = QNetworkRequest(QUrl(url))
-        request.setRawHeader(b'User-Agent',
-            b'CDDA-Game-Launcher/' + version.encode('utf8'))
-        request.setRawHeader(b'Accept', cons.GITHUB_API_VERSION)
+        # The check made on startup waits when the rate limit budget is low
+        priority = USER if self.in_manual_update_check else BACKGROUND
 
-        self.http_reply = self.qnam.get(request)
+        self.http_reply = github_scheduler().get(url, priority)
         self.http_reply.finished.connect(self.lv_http_finished)
         self.http_reply.readyRead.connect(self.lv_http_ready_read)
 
+        # The last known release is used right away, the request only tells
+        # whether it changed since
+        self.lv_served = cached_body(url)
+        if self.lv_served is not None:
+            self.latest_launcher_release(self.lv_served)
+
     def lv_http_finished(self):
-        redirect = self.http_reply.attribute(
-            QNetworkRequest.RedirectionTargetAttribute)
-        if redirect is not None:
-            redirected_url = urljoin(
-                self.http_reply.request().url().toString(),
-                redirect.toString())
-
-            self.lv_html = BytesIO()
-
-            request = QNetworkRequest(QUrl(redirected_url))
-            request.setRawHeader(b'User-Agent',
-                b'CDDA-Game-Launcher/' + version.encode('utf8'))
-            request.setRawHeader(b'Accept', cons.GITHUB_API_VERSION)
-
-            self.http_reply = self.qnam.get(request)
-            self.http_reply.finished.connect(self.lv_http_finished)
-            self.http_reply.readyRead.connect(self.lv_http_ready_read)
+        status_code, body = reply_content(self.http_reply, self.lv_html)
+        if status_code == 200 and body == self.lv_served:
+            self.lv_html = None
             return
 
-        status_code = self.http_reply.attribute(
-            QNetworkRequest.HttpStatusCodeAttribute)
         if status_code != 200:
             reason = self.http_reply.attribute(
                 QNetworkRequest.HttpReasonPhraseAttribute)
@@ -199,18 +199,17 @@ class TabbedWindow(QMainWindow):
             self.lv_html = None
             return
 
-        self.lv_html.seek(0)
+        self.lv_html = None
+        self.latest_launcher_release(body)
 
+    def latest_launcher_release(self, body):
         try:
-            latest_release = json.loads(TextIOWrapper(self.lv_html,
-                encoding='utf8').read())
+            latest_release = json.loads(body)
         except json.decoder.JSONDecodeError:
             latest_release = {
                 'cannot_decode': True
             }
 
-        self.lv_html = None
-
         if 'name' not in latest_release:
             return
         if 'html_url' not in latest_release:
@@ -387,6 +386,13 @@ class TabbedWindow(QMainWindow):
         update_group_box = self.central_widget.main_tab.update_group_box
         soundpacks_tab = self.central_widget.soundpacks_tab
 
+        if update_group_box.staging_thread is not None:
+            # A partially staged build is useless, drop it
+            update_group_box.staging_thread.cancelled = True
+
+        update_group_box.cancel_prefetch()
+        install_queue().cancel_all()
+
         if update_group_box.updating:
             update_group_box.close_after_update = True
             update_group_box.update_game()
@@ -419,6 +425,7 @@ class CentralWidget(QTabWidget):
         self.create_mods_tab()
         #self.create_tilesets_tab()
         self.create_soundpacks_tab()
+        self.create_queue_tab()
         #self.create_fonts_tab()
         self.create_settings_tab()
 
@@ -428,6 +435,7 @@ class CentralWidget(QTabWidget):
         self.setTabText(self.indexOf(self.mods_tab), _('Mods'))
         #self.setTabText(self.indexOf(self.tilesets_tab), _('Tilesets'))
         self.setTabText(self.indexOf(self.soundpacks_tab), _('Soundpacks'))
+        self.setTabText(self.indexOf(self.queue_tab), _('Downloads'))
         #self.setTabText(self.indexOf(self.fonts_tab), _('Fonts'))
         self.setTabText(self.indexOf(self.settings_tab), _('Settings'))
 
@@ -436,6 +444,7 @@ class CentralWidget(QTabWidget):
         self.mods_tab.set_text()
         #self.tilesets_tab.set_text()
         self.soundpacks_tab.set_text()
+        self.queue_tab.set_text()
         #self.fonts_tab.set_text()
         self.settings_tab.set_text()
 
@@ -464,6 +473,11 @@ class CentralWidget(QTabWidget):
         self.addTab(soundpacks_tab, _('Soundpacks'))
         self.soundpacks_tab = soundpacks_tab
 
+    def create_queue_tab(self):
+        queue_tab = QueueTab()
+        self.addTab(queue_tab, _('Downloads'))
+        self.queue_tab = queue_tab
+
     def create_fonts_tab(self):
         fonts_tab = FontsTab()
         self.addTab(fonts_tab, _('Fonts'))
@@ -485,7 +499,6 @@ class LauncherUpdateDialog(QDialog):
         layout = QGridLayout()
 
         self.shown = False
-        self.qnam = QNetworkAccessManager()
         self.http_reply = None
 
         progress_label = QLabel()
@@ -553,9 +566,13 @@ class LauncherUpdateDialog(QDialog):
             self.download_speed_count = 0
             self.download_aborted = False
 
-            self.http_reply = self.qnam.get(QNetworkRequest(QUrl(self.url)))
+            # The launcher executable is only downloaded once
+            request = network_request(self.url, cache=False)
+
+            self.http_reply = network_access_manager().get(request)
             self.http_reply.finished.connect(self.http_finished)
-            self.http_reply.readyRead.connect(self.http_ready_read)
+            self.download_throttle = ThrottledReply(self.http_reply,
+                FOREGROUND, self.http_ready_read)
             self.http_reply.downloadProgress.connect(self.dl_progress)
 
         self.shown = True
@@ -564,46 +581,23 @@ class LauncherUpdateDialog(QDialog):
         self.cancel_update(True)
 
     def http_finished(self):
+        self.download_throttle.finish()
+        self.download_throttle = None
+
         self.downloading_file.close()
 
         if self.download_aborted:
             download_dir = os.path.dirname(self.downloaded_file)
             delete_path(download_dir)
         else:
-            redirect = self.http_reply.attribute(
-                QNetworkRequest.RedirectionTargetAttribute)
-            if redirect is not None:
-                download_dir = os.path.dirname(self.downloaded_file)
-                delete_path(download_dir)
-                os.makedirs(download_dir)
-
-                redirected_url = urljoin(
-                    self.http_reply.request().url().toString(),
-                    redirect.toString())
-
-                self.downloading_file = open(self.downloaded_file, 'wb')
-
-                self.download_last_read = datetime.utcnow()
-                self.download_last_bytes_read = 0
-                self.download_speed_count = 0
-                self.download_aborted = False
-
-                self.progress_bar.setValue(0)
-
-                self.http_reply = self.qnam.get(QNetworkRequest(QUrl(
-                    redirected_url)))
-                self.http_reply.finished.connect(self.http_finished)
-                self.http_reply.readyRead.connect(self.http_ready_read)
-                self.http_reply.downloadProgress.connect(self.dl_progress)
-            else:
-                # Download completed
-                subprocess.Popen([self.downloaded_file])
+            # Download completed
+            subprocess.Popen([self.downloaded_file])
 
-                self.updated = True
-                self.done(0)
+            self.updated = True
+            self.done(0)
 
-    def http_ready_read(self):
-        self.downloading_file.write(self.http_reply.readAll())
+    def http_ready_read(self, data):
+        self.downloading_file.write(data)
 
     def dl_progress(self, bytes_read, total_bytes):
         self.progress_bar.setMaximum(total_bytes)
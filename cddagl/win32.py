@@ -1,5 +1,6 @@
 import os
 import sys
+import struct
 
 from ctypes import *
 from ctypes.wintypes import *
@@ -790,3 +791,101 @@ def write_named_pipe(name, value):
     finally:
         if fileh is not None:
             win32api.CloseHandle(fileh)
+
+
+FSCTL_GET_INTEGRITY_INFORMATION = 0x9027C
+FSCTL_SET_INTEGRITY_INFORMATION = 0x9C280
+FSCTL_DUPLICATE_EXTENTS_TO_FILE = 0x98344
+FILE_ATTRIBUTE_SPARSE_FILE = 0x200
+
+# Block cloning is limited to 4 GiB per call
+CLONE_CHUNK_SIZE = 1 << 30
+
+FileDispositionInfoEx = 21
+FILE_DISPOSITION_FLAG_DELETE = 0x1
+FILE_DISPOSITION_FLAG_POSIX_SEMANTICS = 0x2
+FILE_DISPOSITION_FLAG_IGNORE_READONLY_ATTRIBUTE = 0x10
+DELETE = 0x10000
+
+def _os_error(e, path):
+    return OSError(None, e.strerror, path, e.winerror)
+
+def clone_file(src, dst):
+    """Create dst as a block clone of src. Both files share their clusters
+    until one of them is written to. Only ReFS volumes can clone files,
+    OSError is raised elsewhere and dst is not created."""
+    try:
+        source = win32file.CreateFile(src, win32file.GENERIC_READ,
+            win32file.FILE_SHARE_READ, None, win32file.OPEN_EXISTING, 0, None)
+    except WinError as e:
+        raise _os_error(e, src)
+
+    try:
+        if win32file.GetFileAttributes(src) & FILE_ATTRIBUTE_SPARSE_FILE:
+            raise OSError(None, 'Sparse files are not cloned', src, 50)
+
+        try:
+            # Fails with ERROR_INVALID_FUNCTION on other file systems
+            integrity = win32file.DeviceIoControl(source,
+                FSCTL_GET_INTEGRITY_INFORMATION, None, 16)
+        except WinError as e:
+            raise _os_error(e, src)
+        checksum_algorithm, reserved, flags, chunk_size, cluster_size = (
+            struct.unpack('HHLLL', integrity))
+
+        size = win32file.GetFileSize(source)
+
+        try:
+            target = win32file.CreateFile(dst, win32file.GENERIC_READ |
+                win32file.GENERIC_WRITE | DELETE, 0, None,
+                win32file.CREATE_NEW, 0, None)
+        except WinError as e:
+            raise _os_error(e, dst)
+
+        try:
+            # Both files must use the same integrity settings
+            win32file.DeviceIoControl(target, FSCTL_SET_INTEGRITY_INFORMATION,
+                struct.pack('HHL', checksum_algorithm, 0, flags), 0)
+            win32file.SetFilePointer(target, size, win32file.FILE_BEGIN)
+            win32file.SetEndOfFile(target)
+
+            offset = 0
+            while offset < size:
+                count = min(CLONE_CHUNK_SIZE, size - offset)
+                # The last cluster is cloned whole, past the end of the file
+                count = -(-count // cluster_size) * cluster_size
+                win32file.DeviceIoControl(target,
+                    FSCTL_DUPLICATE_EXTENTS_TO_FILE, struct.pack('Pqqq',
+                        int(source), offset, offset, count), 0)
+                offset += count
+        except WinError as e:
+            target.Close()
+            os.unlink(dst)
+            raise _os_error(e, dst)
+
+        target.Close()
+    finally:
+        source.Close()
+
+def delete_file(path):
+    """Delete a file even when it is read-only. Unlike clearing the read-only
+    attribute first, the other hard links of the file stay read-only. Needs
+    Windows 10 1809 or later, OSError is raised before."""
+    try:
+        handle = win32file.CreateFile(path, DELETE,
+            win32file.FILE_SHARE_READ | win32file.FILE_SHARE_WRITE |
+            win32file.FILE_SHARE_DELETE, None, win32file.OPEN_EXISTING,
+            win32file.FILE_FLAG_OPEN_REPARSE_POINT, None)
+    except WinError as e:
+        raise _os_error(e, path)
+
+    try:
+        flags = DWORD(FILE_DISPOSITION_FLAG_DELETE |
+            FILE_DISPOSITION_FLAG_POSIX_SEMANTICS |
+            FILE_DISPOSITION_FLAG_IGNORE_READONLY_ATTRIBUTE)
+        if not kernel32.SetFileInformationByHandle(HANDLE(int(handle)),
+            FileDispositionInfoEx, byref(flags), sizeof(flags)):
+            error = GetLastError()
+            raise OSError(None, FormatError(error), path, error)
+    finally:
+        handle.Close()
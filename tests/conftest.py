@@ -0,0 +1,35 @@
+import gettext
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+# The launcher installs its translations on startup
+gettext.NullTranslations().install(names=('gettext', 'ngettext'))
+
+
+@pytest.fixture(scope='session')
+def config_db(tmp_path_factory):
+    """Point the launcher configuration at a new database. Database sessions
+    are kept per thread for the whole run, so there is one database for
+    every test."""
+    pytest.importorskip('sqlalchemy')
+    pytest.importorskip('alembic')
+
+    os.environ['LOCALAPPDATA'] = str(tmp_path_factory.mktemp('appdata'))
+
+    from cddagl.sql.functions import init_config
+    init_config(ROOT_DIR)
+
+
+@pytest.fixture(scope='session')
+def qt_app():
+    QtCore = pytest.importorskip('PyQt5.QtCore')
+
+    app = QtCore.QCoreApplication.instance()
+    if app is None:
+        app = QtCore.QCoreApplication([])
+    return app
@@ -0,0 +1,127 @@
+import random
+import struct
+import zipfile
+import zlib
+
+import pytest
+
+pytest.importorskip('pylzma')
+pytest.importorskip('py7zlib')
+pytest.importorskip('rarfile')
+# Only used to write the 7z archives read by the launcher
+py7zr = pytest.importorskip('py7zr')
+
+from cddagl.archives import extract_archive
+
+FILES = {
+    'modinfo.json': b'{"type": "MOD_INFO", "ident": "test"}',
+    'data/random.bin': random.Random(0).randbytes(3 * 1024 * 1024 + 17),
+    'data/text.txt': b'Cataclysm: Dark Days Ahead\n' * 100000,
+    'empty.txt': b''
+}
+
+SEVEN_ZIP_FILTERS = {
+    'lzma': [{'id': py7zr.FILTER_LZMA}],
+    'lzma2': [{'id': py7zr.FILTER_LZMA2}],
+    'copy': [{'id': py7zr.FILTER_COPY}],
+    'deflate': [{'id': py7zr.FILTER_DEFLATE}],
+    'bzip2': [{'id': py7zr.FILTER_BZIP2}]
+}
+
+
+@pytest.fixture
+def source_dir(tmp_path):
+    source = tmp_path / 'source' / 'mod'
+    for name, content in FILES.items():
+        path = source.joinpath(*name.split('/'))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+    return source
+
+
+def check_extracted(target_dir):
+    for name, content in FILES.items():
+        path = target_dir.joinpath('mod', *name.split('/'))
+        assert path.read_bytes() == content, name
+
+
+def extract(archive_path, target_dir):
+    progress = []
+    extract_archive(str(archive_path), str(target_dir),
+        lambda name, extracted, total: progress.append((extracted, total)))
+    check_extracted(target_dir)
+
+    total = sum(len(content) for content in FILES.values())
+    assert progress[-1] == (total, total)
+
+
+def write_stored_rar(archive_path):
+    """Write a RAR 4 archive with stored files. Stored files are read by
+    rarfile itself, without the unrar tool."""
+    def block(block_type, flags, fields):
+        header = struct.pack('<BHH', block_type, flags, 7 + len(fields)
+            ) + fields
+        return struct.pack('<H', zlib.crc32(header) & 0xFFFF) + header
+
+    dos_time = 0x21 << 16
+    archive = bytearray(b'Rar!\x1a\x07\x00')
+    archive += block(0x73, 0, b'\0' * 6)
+    for name, content in FILES.items():
+        name = ('mod/' + name).replace('/', '\\').encode('ascii')
+        # LONG_BLOCK, host is Windows and method is store
+        archive += block(0x74, 0x8000, struct.pack('<LLBLLBBHL',
+            len(content), len(content), 2, zlib.crc32(content), dos_time, 20,
+            0x30, len(name), 0x20) + name)
+        archive += content
+    archive += block(0x7b, 0x4000, b'')
+
+    archive_path.write_bytes(bytes(archive))
+
+
+def test_zip(tmp_path, source_dir):
+    archive_path = tmp_path / 'mod.zip'
+    with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as z:
+        for name in FILES:
+            z.write(source_dir.joinpath(*name.split('/')), 'mod/' + name)
+
+    extract(archive_path, tmp_path / 'target')
+
+
+def test_rar(tmp_path):
+    archive_path = tmp_path / 'mod.rar'
+    write_stored_rar(archive_path)
+
+    extract(archive_path, tmp_path / 'target')
+
+
+@pytest.mark.parametrize('solid', [True, False])
+@pytest.mark.parametrize('method', sorted(SEVEN_ZIP_FILTERS))
+def test_7z(tmp_path, source_dir, method, solid):
+    archive_path = tmp_path / 'mod.7z'
+    with py7zr.SevenZipFile(archive_path, 'w',
+        filters=SEVEN_ZIP_FILTERS[method]) as z:
+        if solid:
+            z.writeall(source_dir, 'mod')
+        else:
+            # One block per file
+            for name in FILES:
+                z.write(source_dir.joinpath(*name.split('/')),
+                    'mod/' + name)
+
+    extract(archive_path, tmp_path / 'target')
+
+
+def test_damaged_7z(tmp_path, source_dir):
+    from cddagl.archives import ArchiveError
+
+    archive_path = tmp_path / 'mod.7z'
+    with py7zr.SevenZipFile(archive_path, 'w',
+        filters=SEVEN_ZIP_FILTERS['copy']) as z:
+        z.writeall(source_dir, 'mod')
+
+    data = bytearray(archive_path.read_bytes())
+    data[100] ^= 0xFF
+    archive_path.write_bytes(bytes(data))
+
+    with pytest.raises(ArchiveError):
+        extract_archive(str(archive_path), str(tmp_path / 'target'))
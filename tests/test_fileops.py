@@ -0,0 +1,54 @@
+import os
+
+from cddagl.fileops import merge_move
+
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def read_file(path):
+    with open(path) as f:
+        return f.read()
+
+
+def test_swap_into_game_dir_with_kept_save(tmp_path):
+    game_dir = tmp_path / 'cdda'
+    staging_dir = tmp_path / 'cdda.staged'
+
+    # Kept in place by prevent_save_move while the rest was backed up
+    write_file(str(game_dir / 'save' / 'world' / 'master.gsav'), 'player')
+    write_file(str(game_dir / 'cataclysm-launcher.exe'), 'launcher')
+    os.makedirs(str(game_dir / 'previous_version'))
+
+    write_file(str(staging_dir / 'cataclysm-tiles.exe'), 'game')
+    write_file(str(staging_dir / 'data' / 'json' / 'items.json'), '[]')
+    write_file(str(staging_dir / 'save' / 'README.txt'), 'new')
+    write_file(str(staging_dir / 'save' / 'world' / 'master.gsav'), 'empty')
+    write_file(str(staging_dir / 'cataclysm-launcher.exe'), 'other')
+
+    for entry in os.listdir(str(staging_dir)):
+        merge_move(str(staging_dir / entry), str(game_dir / entry))
+    os.rmdir(str(staging_dir))
+
+    assert read_file(str(game_dir / 'cataclysm-tiles.exe')) == 'game'
+    assert read_file(str(game_dir / 'data' / 'json' / 'items.json')) == '[]'
+    assert read_file(str(game_dir / 'save' / 'README.txt')) == 'new'
+    # What was already in the game directory is kept
+    assert read_file(str(game_dir / 'save' / 'world' / 'master.gsav')
+        ) == 'player'
+    assert read_file(str(game_dir / 'cataclysm-launcher.exe')) == 'launcher'
+    assert not staging_dir.exists()
+
+
+def test_merge_move_keeps_directory_over_file(tmp_path):
+    write_file(str(tmp_path / 'src' / 'config' / 'options.json'), '{}')
+    write_file(str(tmp_path / 'dst' / 'config'), 'file')
+
+    merge_move(str(tmp_path / 'src' / 'config'),
+        str(tmp_path / 'dst' / 'config'))
+
+    assert read_file(str(tmp_path / 'dst' / 'config')) == 'file'
+    assert not (tmp_path / 'src' / 'config').exists()
@@ -0,0 +1,154 @@
+import json
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+import pytest
+
+pytest.importorskip('PyQt5.QtNetwork')
+# cddagl.functions needs the Windows extensions
+pytest.importorskip('winutils')
+
+from PyQt5.QtCore import QEventLoop, QTimer
+
+ETAG = '"v1"'
+BODY = json.dumps({'tag_name': 'v1.0.0'}).encode('utf8')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(dict(self.headers))
+
+        time.sleep(server.delay)
+
+        if self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.send_header('ETag', ETAG)
+            self.send_header('X-RateLimit-Remaining', '41')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.send_header('ETag', ETAG)
+        self.send_header('X-RateLimit-Remaining', '42')
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.delay = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def stub_url(server, path):
+    return 'http://127.0.0.1:{port}{path}'.format(port=server.server_port,
+        path=path)
+
+
+def wait_finished(replies, timeout=5):
+    loop = QEventLoop()
+    timer = QTimer()
+    timer.setSingleShot(True)
+    timer.timeout.connect(loop.quit)
+
+    def check():
+        if not any(reply.isRunning() for reply in replies):
+            loop.quit()
+
+    for reply in replies:
+        reply.finished.connect(check)
+    timer.start(timeout * 1000)
+    check()
+    if any(reply.isRunning() for reply in replies):
+        loop.exec_()
+
+    assert not any(reply.isRunning() for reply in replies)
+
+
+def fetch(scheduler, url):
+    content = BytesIO()
+    reply = scheduler.get(url)
+    reply.readyRead.connect(lambda: content.write(reply.readAll()))
+    return reply, content
+
+
+@pytest.fixture
+def scheduler(qt_app, config_db):
+    from cddagl.github import GithubScheduler
+    from cddagl.network import network_access_manager
+
+    # Only the validators kept by the launcher are tested here
+    network_access_manager().cache().clear()
+    return GithubScheduler()
+
+
+def test_not_modified_reply_is_answered_from_the_cache(stub_server,
+    scheduler):
+    from cddagl.httpcache import cached_body, reply_content
+    from cddagl.network import network_access_manager
+
+    url = stub_url(stub_server, '/releases/latest')
+
+    reply, content = fetch(scheduler, url)
+    wait_finished([reply])
+    assert reply_content(reply, content) == (200, BODY)
+    assert 'If-None-Match' not in stub_server.requests[0]
+    assert cached_body(url) == BODY
+    assert scheduler.remaining == 42
+
+    network_access_manager().cache().clear()
+
+    reply, content = fetch(scheduler, url)
+    wait_finished([reply])
+    assert stub_server.requests[1].get('If-None-Match') == ETAG
+    assert reply_content(reply, content) == (200, BODY)
+    assert scheduler.remaining == 41
+
+
+def test_requests_for_the_same_url_share_a_reply(stub_server, scheduler):
+    from cddagl.httpcache import reply_content
+
+    stub_server.delay = 0.5
+    url = stub_url(stub_server, '/releases/tags/shared')
+
+    first, first_content = fetch(scheduler, url)
+    second, second_content = fetch(scheduler, url)
+    wait_finished([first, second])
+
+    assert len(stub_server.requests) == 1
+    assert reply_content(first, first_content) == (200, BODY)
+    assert reply_content(second, second_content) == (200, BODY)
+
+
+def test_aborted_shared_request_keeps_the_other_one(stub_server, scheduler):
+    from cddagl.httpcache import reply_content
+
+    stub_server.delay = 0.5
+    url = stub_url(stub_server, '/releases/tags/aborted')
+
+    first, first_content = fetch(scheduler, url)
+    second, second_content = fetch(scheduler, url)
+    first.abort()
+    wait_finished([second])
+
+    assert len(stub_server.requests) == 1
+    assert reply_content(second, second_content) == (200, BODY)
@@ -0,0 +1,89 @@
+import pytest
+
+pytest.importorskip('PyQt5.QtWidgets')
+pytest.importorskip('winutils')
+
+from cddagl.ui.views import main
+
+
+class StatusBar:
+    def __init__(self):
+        self.message = None
+
+    def showMessage(self, message):
+        self.message = message
+
+
+class MainWindow:
+    def __init__(self):
+        self.status_bar = StatusBar()
+
+    def statusBar(self):
+        return self.status_bar
+
+
+class DirCombo:
+    def currentText(self):
+        return 'C:\\cdda'
+
+
+class UpdateGroupBox:
+    def __init__(self, result, message):
+        self.result = result
+        self.message = message
+
+    def install_staged_build(self, after_updating):
+        after_updating(self.result, self.message)
+        return True
+
+
+class MainTab:
+    def __init__(self, update_group_box):
+        self.update_group_box = update_group_box
+
+
+class GameDirGroupBox:
+    """Runs the launch code of the game directory group box without its
+    widgets."""
+
+    launch_game = main.GameDirGroupBox.launch_game
+    staged_build_installed = main.GameDirGroupBox.staged_build_installed
+
+    def __init__(self, result, message=None):
+        self.game_started = False
+        self.started = False
+        self.controls_enabled = False
+        self.dir_combo = DirCombo()
+        self.main_window = MainWindow()
+        self.main_tab = MainTab(UpdateGroupBox(result, message))
+
+    def get_main_window(self):
+        return self.main_window
+
+    def get_main_tab(self):
+        return self.main_tab
+
+    def start_game(self):
+        self.started = True
+
+    def enable_controls(self):
+        self.controls_enabled = True
+
+
+def test_launch_after_staged_build_installed(qt_app):
+    group_box = GameDirGroupBox(main.UPDATE_COMPLETED, 'Update completed')
+    group_box.launch_game()
+
+    assert group_box.started
+
+
+@pytest.mark.parametrize('result', [main.UPDATE_FAILED,
+    main.UPDATE_CANCELLED])
+def test_no_launch_after_failed_swap(qt_app, result):
+    message = 'Could not install the staged build: access denied'
+    group_box = GameDirGroupBox(result, message)
+    group_box.launch_game()
+
+    assert not group_box.started
+    assert group_box.controls_enabled
+    assert group_box.main_window.status_bar.message == message